@@ -1,12 +1,20 @@
 import argparse
 import csv
 import json
+import math
 import os
 from collections import Counter, defaultdict
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from functools import cached_property
 from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+import asof
+import instrument
+import report_sections
+import run_index
+import warehouse
+
 
 @dataclass(frozen=True)
 class Call:
@@ -47,21 +55,6 @@ def _cv(xs: Sequence[float]) -> Optional[float]:
     return (var**0.5) / m
 
 
-def _cluster_runs(calls_sorted: Sequence[Call], gap_s: int) -> List[List[Call]]:
-    if not calls_sorted:
-        return []
-    runs: List[List[Call]] = []
-    current: List[Call] = [calls_sorted[0]]
-    for i in range(1, len(calls_sorted)):
-        if calls_sorted[i].ts - calls_sorted[i - 1].ts > gap_s:
-            runs.append(current)
-            current = [calls_sorted[i]]
-        else:
-            current.append(calls_sorted[i])
-    runs.append(current)
-    return runs
-
-
 def _fmt_ts(ts: int, tz: timezone) -> str:
     return datetime.fromtimestamp(ts, tz=timezone.utc).astimezone(tz).strftime("%Y-%m-%d %H:%M:%S")
 
@@ -181,29 +174,6 @@ def _load_coingecko_prices(path: str) -> Dict[str, List[Tuple[int, float]]]:
     return out
 
 
-def _price_at(series: Sequence[Tuple[int, float]], ts_s: int) -> Optional[float]:
-    if not series:
-        return None
-    ts_ms = int(ts_s) * 1000
-    if ts_ms <= series[0][0]:
-        return float(series[0][1])
-    if ts_ms >= series[-1][0]:
-        return float(series[-1][1])
-    lo = 0
-    hi = len(series) - 1
-    while lo + 1 < hi:
-        mid = (lo + hi) // 2
-        if series[mid][0] == ts_ms:
-            return float(series[mid][1])
-        if series[mid][0] < ts_ms:
-            lo = mid
-        else:
-            hi = mid
-    if abs(series[lo][0] - ts_ms) <= abs(series[hi][0] - ts_ms):
-        return float(series[lo][1])
-    return float(series[hi][1])
-
-
 COMPOUNDER_SEL = "0x04117561"
 VAULT_SEL = "0xc7f884c6"
 FX_SEL = "0x78f26f5b"
@@ -310,512 +280,839 @@ def _job_out_token(sel: str, tgt: str) -> Optional[Tuple[str, str]]:
     return None
 
 
-def main() -> int:
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--in-csv", default="data/f88e_harvester_calls_7d.csv")
-    parser.add_argument("--asd-harvest-logs", default="data/asdpendle_harvest_logs.csv")
-    parser.add_argument(
-        "--receipts-sample",
-        default="data/f88e_harvester_receipts_sample.csv",
-        help="Optional: output from reports/tools/fetch_receipts_sample.py",
+def _write_run_gap_sweep(calls: Sequence[Call], args: argparse.Namespace) -> None:
+    from pathlib import Path
+
+    from generate_pendle_pricing_figures import Series, _render_panel, _render_svg_document, _write_svg
+
+    try:
+        lo, hi, count = (int(x) for x in str(args.run_gap_sweep).split(":"))
+    except ValueError:
+        raise SystemExit(f"bad --run-gap-sweep (want lo:hi:count): {args.run_gap_sweep!r}")
+    thresholds = run_index.gap_thresholds(lo, hi, count)
+    rows = run_index.gap_sweep([c.ts for c in calls], thresholds)
+
+    xs = [math.log10(r.gap_s) for r in rows]
+    x_range = (xs[0], xs[-1] if xs[-1] > xs[0] else xs[0] + 1.0)
+    vlines = [(math.log10(max(int(args.run_gap_s), 1)), f"--run-gap-s={int(args.run_gap_s)}")]
+    panel1 = _render_panel(
+        width=920,
+        height=320,
+        margin_left=70,
+        margin_right=30,
+        margin_top=50,
+        margin_bottom=60,
+        title="run count vs gap threshold",
+        x_label="log10(gap_s)",
+        y_label="runs",
+        x_range=x_range,
+        y_range=(0.0, float(rows[0].n_runs) * 1.05),
+        series_list=[Series(name="runs", points=list(zip(xs, [float(r.n_runs) for r in rows])), color="#2563EB")],
+        vlines=vlines,
     )
-    parser.add_argument(
-        "--prices-json",
-        default="data/coingecko_prices_7d.json",
-        help="Optional: output from reports/tools/fetch_coingecko_prices.py",
+    size_max = max(float(r.size_max) for r in rows)
+    panel2 = _render_panel(
+        width=920,
+        height=320,
+        margin_left=70,
+        margin_right=30,
+        margin_top=50,
+        margin_bottom=60,
+        title="run size vs gap threshold",
+        x_label="log10(gap_s)",
+        y_label="run size",
+        x_range=x_range,
+        y_range=(0.0, size_max * 1.05),
+        series_list=[
+            Series(name="p50", points=list(zip(xs, [r.size_p50 for r in rows])), color="#059669"),
+            Series(name="p90", points=list(zip(xs, [r.size_p90 for r in rows])), color="#D97706"),
+            Series(name="max", points=list(zip(xs, [float(r.size_max) for r in rows])), color="#DC2626", dasharray="6 4"),
+        ],
+        vlines=vlines,
     )
-    parser.add_argument("--out-md", default="asdpendle/harvester-bot-strategy.md")
-    parser.add_argument("--run-gap-s", type=int, default=120)
-    args = parser.parse_args()
+    body = "\n".join(
+        [
+            f'<g transform="translate(0,0)">\n{panel1}\n</g>',
+            f'<g transform="translate(0,340)">\n{panel2}\n</g>',
+        ]
+    )
+    _write_svg(Path(args.sweep_out_svg), _render_svg_document(width=920, height=680, body=body))
+
+    os.makedirs(os.path.dirname(args.sweep_out_md), exist_ok=True)
+    with open(args.sweep_out_md, "w") as f:
+        f.write("# harvester bot run 聚类阈值敏感性\n\n")
+        f.write(f"- 数据源：`{args.in_csv}`（{len(calls)} 笔调用）\n")
+        f.write(f"- 阈值：{len(rows)} 个（{rows[0].gap_s}s → {rows[-1].gap_s}s，对数间隔），每个阈值用 numpy 向量化计算\n")
+        svg_rel = os.path.relpath(args.sweep_out_svg, os.path.dirname(args.sweep_out_md) or ".")
+        f.write(f"- 图：`{svg_rel}`\n\n")
+        f.write("![run gap sweep](" + svg_rel + ")\n\n")
+        f.write("| gap_s | runs | 多笔 run 覆盖调用占比 | run_size p50 | p90 | max |\n")
+        f.write("|---:|---:|---:|---:|---:|---:|\n")
+        for r in rows:
+            f.write(
+                f"| {r.gap_s} | {r.n_runs} | {r.multi_call_share * 100:.1f}% | "
+                f"{r.size_p50:.0f} | {r.size_p90:.0f} | {r.size_max} |\n"
+            )
 
-    calls = _load_calls(args.in_csv)
-    if not calls:
-        raise SystemExit("no calls")
 
-    tz_bj = timezone(timedelta(hours=8))
-    start_ts = calls[0].ts
-    end_ts = calls[-1].ts
+class _Inputs:
+    # Datasets the sections read, loaded on first use (a fully cached report loads none of them).
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+
+    @cached_property
+    def calls(self) -> List[Call]:
+        calls = _load_calls(self.args.in_csv)
+        if not calls:
+            raise SystemExit("no calls")
+        return calls
+
+    @cached_property
+    def runs(self) -> run_index.RunIndex:
+        return run_index.load_or_update(
+            self.args.in_csv,
+            [run_index.CallKey(c.ts, c.tx_hash, f"{c.selector}:{c.target}") for c in self.calls],
+            gap_s=int(self.args.run_gap_s),
+        )
 
-    runs = _cluster_runs(calls, gap_s=int(args.run_gap_s))
-    run_sizes = sorted([float(len(r)) for r in runs])
+    @cached_property
+    def group_counts(self) -> Counter[Tuple[str, str, str]]:
+        # Group counts by job key (selector,target,subkey)
+        return Counter((c.selector, c.target, _call_subkey(c)) for c in self.calls)
+
+    @cached_property
+    def asd_assets_by_tx(self) -> Dict[str, int]:
+        return _load_asdpendle_harvest_assets(self.args.asd_harvest_logs)
+
+    @cached_property
+    def receipts_csv(self) -> str:
+        return warehouse.receipts_source(self.args.receipts_full, self.args.receipts_sample)
+
+    @cached_property
+    def receipts_rows(self) -> List[Dict[str, Any]]:
+        return _load_receipts_sample(self.receipts_csv)
+
+    @cached_property
+    def receipts_by_group(self) -> Dict[Tuple[str, str, str], List[Dict[str, Any]]]:
+        out: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = defaultdict(list)
+        for row in self.receipts_rows:
+            sel = str(row.get("selector", "")).lower()
+            tgt = str(row.get("target", "")).lower()
+            sub = str(row.get("subkey", ""))
+            if sel and tgt:
+                out[(sel, tgt, sub)].append(row)
+        return out
+
+    @cached_property
+    def gas_used_est_by_group(self) -> Dict[Tuple[str, str, str], int]:
+        out: Dict[Tuple[str, str, str], int] = {}
+        for key, rows in self.receipts_by_group.items():
+            gas_useds: List[float] = []
+            for row in rows:
+                gu = _try_int(row.get("gas_used"))
+                if gu is not None and gu > 0:
+                    gas_useds.append(float(gu))
+            if gas_useds:
+                out[key] = int(round(_pct(sorted(gas_useds), 50)))
+        return out
+
+    @cached_property
+    def prices_by_key(self) -> Dict[str, List[Tuple[int, float]]]:
+        return _load_coingecko_prices(self.args.prices_json)
+
+
+def _short(tgt: str, key: str = "symbol") -> str:
+    return TARGET_META.get(tgt, {}).get(key) or (tgt[:6] + "…" + tgt[-4:])
+
+
+# ---- header ----
+
+_T_HEADER = (
+    "# harvester bot 策略推断（基于 7 天链上调用）\n\n"
+    "- 数据源：`{in_csv}`（{n_calls} 笔 bot→harvester 调用）\n"
+    "- 时间窗口：`{start}` → `{end}` (UTC+8)\n"
+    "- run 聚类：gap>{run_gap_s}s 断开，runs={n_runs}\n\n"
+)
+
+
+def _compute_header(inp: _Inputs) -> Dict[str, Any]:
+    tz_bj = timezone(timedelta(hours=8))
+    calls = inp.calls
+    return {
+        "in_csv": inp.args.in_csv,
+        "n_calls": len(calls),
+        "start": _fmt_ts(calls[0].ts, tz_bj),
+        "end": _fmt_ts(calls[-1].ts, tz_bj),
+        "run_gap_s": int(inp.args.run_gap_s),
+        "n_runs": inp.runs.n_runs,
+    }
+
+
+def _render_header(r: Dict[str, Any]) -> str:
+    return report_sections.fill(_T_HEADER, r)
+
+
+# ---- 1) job list ----
+
+_T_JOBS = "## 1) 固定 job 列表（不是随机扫全网）\n\nbot 在 7 天里只调用了 3 个 selector，对应 9 个 target：\n\n"
+_T_JOBS_ROW = "- `{sel}` `{tgt}`: {cnt}{label}\n"
+
+
+def _compute_jobs(inp: _Inputs) -> Dict[str, Any]:
+    jobs = []
+    for (sel, tgt), cnt in Counter((c.selector, c.target) for c in inp.calls).most_common():
+        meta = TARGET_META.get(tgt, {})
+        label = meta.get("symbol") or meta.get("name") or ""
+        jobs.append({"sel": sel, "tgt": tgt, "cnt": cnt, "label": f" ({label})" if label else ""})
+    return {"jobs": jobs}
+
+
+def _render_jobs(r: Dict[str, Any]) -> str:
+    return _T_JOBS + report_sections.rows(_T_JOBS_ROW, r["jobs"])
+
+
+# ---- 2) runs ----
+
+_T_RUNS = (
+    "\n## 2) run/批处理特征（一次扫到多个就同一波全发）\n\n"
+    "- run_size：p50={size_p50:.0f}, p90={size_p90:.0f}, max={size_max}\n"
+    "- 常见多笔 run 组合（按出现次数 Top 10）：\n"
+)
+_T_RUNS_SIG = "  - {cnt}×: {parts}\n"
+_T_RUNS_MAX = "\n- 最大批次（同一波发了所有常用 job）：\n"
+_T_RUNS_CALL = "  - ts={ts} block={block} `{sel}` {short}\n"
+
+
+def _compute_runs(inp: _Inputs) -> Dict[str, Any]:
+    runs = inp.runs
+    sigs = []
+    for sig_parts, cnt in runs.top_signatures(10):
+        parts = []
+        for p in sig_parts:
+            sel, tgt = p.split(":", 1)
+            parts.append(f"{sel}:{_short(tgt)}")
+        sigs.append({"cnt": cnt, "parts": ", ".join(parts)})
+    max_run = [
+        {"ts": c.ts, "block": c.block_number, "sel": c.selector, "short": _short(c.target)}
+        for c in inp.calls[runs.run_start[runs.max_run] : runs.run_end[runs.max_run]]
+    ]
+    return {
+        "size_p50": runs.size_pct(50),
+        "size_p90": runs.size_pct(90),
+        "size_max": runs.run_size(runs.max_run),
+        "signatures": sigs,
+        "max_run": max_run,
+    }
+
+
+def _render_runs(r: Dict[str, Any]) -> str:
+    return (
+        report_sections.fill(_T_RUNS, r)
+        + report_sections.rows(_T_RUNS_SIG, r["signatures"])
+        + _T_RUNS_MAX
+        + report_sections.rows(_T_RUNS_CALL, r["max_run"])
+    )
 
-    selector_target_counts = Counter((c.selector, c.target) for c in calls)
 
-    # Run signature patterns
-    sig_counts: Counter[str] = Counter()
-    for run in runs:
-        if len(run) <= 1:
+# ---- 3.1) compounder coefficients ----
+
+_T_K_TARGETS = (
+    "\n## 3) 触发阈值：更像“expected_out 与交易成本线性绑定”\n\n"
+    "直接从 tx 参数看，minOut 与 `gas_price` 强相关，且 `minOut/gas_price` 波动很小。\n"
+    "但更底层的成本是 `tx_fee = gas_used * effectiveGasPrice`；当某个 job 的 `gas_used` 很稳定时，"
+    "统计上就会呈现出 `minOut ~ gas_price*k` 这种“线性绑定”。\n\n"
+    "### 3.1 各 target 的拟合系数（用 p50(minAssets/gas_price) 近似 k_target）\n\n"
+    "| target | 7d次数 | minAssets(p50) | gas_price(p50) | k≈p50(minAssets/gas_price) | CV(k) | gap_s(p50) |\n"
+    "|---|---:|---:|---:|---:|---:|---:|\n"
+)
+_T_K_ROW = "| {short} | {n} | {out_p50:.4g} | {gp_p50:.0f} | {k_p50:.4g} | {k_cv:.3f} | {gap_p50:.0f} |\n"
+
+
+def _k_row(short: str, items: Sequence[Call], arg: str) -> Optional[Dict[str, Any]]:
+    # minOut/gas_price fit for one job: arg is the Call field holding minOut.
+    seq = sorted(items, key=lambda c: (c.ts, c.tx_hash))
+    outs = []
+    gps = []
+    ratios = []
+    for c in seq:
+        try:
+            out = int(getattr(c, arg))
+        except ValueError:
             continue
-        parts = [f"{c.selector}:{c.target}" for c in run]
-        sig_counts["|".join(sorted(parts))] += 1
-
-    # Compounder stats
+        outs.append(out / 1e18)
+        gps.append(float(c.gas_price))
+        if c.gas_price:
+            ratios.append((out / 1e18) / float(c.gas_price))
+    if not outs or not gps or not ratios:
+        return None
+    gaps = [float(seq[i].ts - seq[i - 1].ts) for i in range(1, len(seq))]
+    return {
+        "short": short,
+        "n": len(seq),
+        "out_p50": _pct(sorted(outs), 50),
+        "gp_p50": _pct(sorted(gps), 50),
+        "k_p50": _pct(sorted(ratios), 50),
+        "k_cv": _cv(ratios) or 0,
+        "gap_p50": _pct(sorted(gaps), 50) if gaps else 0,
+    }
+
+
+def _compute_k_targets(inp: _Inputs) -> Dict[str, Any]:
     per_target: Dict[str, List[Call]] = defaultdict(list)
-    for c in calls:
+    for c in inp.calls:
         if c.selector == COMPOUNDER_SEL:
             per_target[c.target].append(c)
-
-    # Group counts by job key (selector,target,subkey)
-    group_counts: Counter[Tuple[str, str, str]] = Counter()
-    for c in calls:
-        group_counts[(c.selector, c.target, _call_subkey(c))] += 1
-
-    asd_assets_by_tx = _load_asdpendle_harvest_assets(args.asd_harvest_logs)
-
-    receipts_rows = _load_receipts_sample(args.receipts_sample)
-    receipts_by_group: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = defaultdict(list)
+    out = []
+    for tgt, items in sorted(per_target.items(), key=lambda kv: len(kv[1]), reverse=True):
+        row = _k_row(_short(tgt), items, "arg1")
+        if row is not None:
+            out.append(row)
+    return {"rows": out}
+
+
+def _render_k_targets(r: Dict[str, Any]) -> str:
+    return _T_K_TARGETS + report_sections.rows(_T_K_ROW, r["rows"])
+
+
+# ---- 3.2) tx fee view ----
+
+_T_FEE = "\n### 3.2 交易成本视角：minOut 与 tx_fee 线性绑定（更贴近 bot 决策）\n\n"
+_T_FEE_SKIP = "- 未提供 receipts（`{receipts_sample}` 不存在或为空），跳过本节。\n"
+_T_FEE_DIFFS = (
+    "- receipt sample：{n_rows} 笔；effectiveGasPrice-tx_gas_price："
+    "p50={p50:.0f}, p90={p90:.0f}, max={max:.0f}；mismatch={mismatches}\n"
+)
+_T_FEE_SAMPLE = "- receipt sample：{n_rows} 笔\n"
+_T_FEE_BODY = (
+    "- 定义 `tx_fee = gas_used * effectiveGasPrice`（单位 wei）。在 sample 内 effectiveGasPrice==tx_gas_price，因此可把 "
+    "`gas_price` 当作成本 proxy。\n"
+    "- 更关键的是：同一 job 的 `gas_used` 非常稳定，所以 `minOut ~ gas_price` 的现象更像来自 `minOut ~ tx_fee`。\n\n"
+    "- 注：`out/tx_fee` 的量纲是 `token_wei/wei`，等价于 `token/ETH`（这里默认这些 out 都是 18 decimals）。\n\n"
+    "| job | 7d次数 | sample | gas_used(p50) | CV(gas_used) | out/tx_fee(p50) | CV(out/tx_fee) |\n"
+    "|---|---:|---:|---:|---:|---:|---:|\n"
+)
+_T_FEE_ROW = "| {label} | {cnt} | {n_sample} | {gu_p50:.0f} | {gu_cv:.3f} | {ratio_p50:.4g} | {ratio_cv:.3f} |\n"
+
+
+def _compute_fee(inp: _Inputs) -> Dict[str, Any]:
+    receipts_rows = inp.receipts_rows
+    out: Dict[str, Any] = {"receipts_sample": inp.receipts_csv, "n_rows": len(receipts_rows)}
+    if not receipts_rows:
+        return out
+    gp_diffs: List[float] = []
+    mismatches = 0
     for row in receipts_rows:
-        sel = str(row.get("selector", "")).lower()
-        tgt = str(row.get("target", "")).lower()
-        sub = str(row.get("subkey", ""))
-        if sel and tgt:
-            receipts_by_group[(sel, tgt, sub)].append(row)
-
-    prices_by_key = _load_coingecko_prices(args.prices_json)
-
-    gas_used_est_by_group: Dict[Tuple[str, str, str], int] = {}
-    for key, rows in receipts_by_group.items():
+        tx_gp = _try_int(row.get("tx_gas_price"))
+        eff_gp = _try_int(row.get("effective_gas_price"))
+        if tx_gp is None or eff_gp is None:
+            continue
+        d = eff_gp - tx_gp
+        gp_diffs.append(float(d))
+        if d != 0:
+            mismatches += 1
+    if gp_diffs:
+        diffs_sorted = sorted(gp_diffs)
+        out["diffs"] = {
+            "n_rows": len(receipts_rows),
+            "p50": _pct(diffs_sorted, 50),
+            "p90": _pct(diffs_sorted, 90),
+            "max": diffs_sorted[-1],
+            "mismatches": mismatches,
+        }
+
+    group_counts = inp.group_counts
+    group_items = sorted(
+        inp.receipts_by_group.items(),
+        key=lambda kv: (group_counts.get(kv[0], 0), len(kv[1])),
+        reverse=True,
+    )
+    table = []
+    for (sel, tgt, subkey), rows in group_items:
         gas_useds: List[float] = []
+        ratios: List[float] = []
         for row in rows:
-            gu = _try_int(row.get("gas_used"))
-            if gu is not None and gu > 0:
-                gas_useds.append(float(gu))
-        if gas_useds:
-            gas_used_est_by_group[key] = int(round(_pct(sorted(gas_useds), 50)))
-
-    os.makedirs(os.path.dirname(args.out_md), exist_ok=True)
-    with open(args.out_md, "w") as f:
-        f.write("# harvester bot 策略推断（基于 7 天链上调用）\n\n")
-        f.write(f"- 数据源：`{args.in_csv}`（{len(calls)} 笔 bot→harvester 调用）\n")
-        f.write(f"- 时间窗口：`{_fmt_ts(start_ts, tz_bj)}` → `{_fmt_ts(end_ts, tz_bj)}` (UTC+8)\n")
-        f.write(f"- run 聚类：gap>{int(args.run_gap_s)}s 断开，runs={len(runs)}\n\n")
-
-        f.write("## 1) 固定 job 列表（不是随机扫全网）\n\n")
-        f.write("bot 在 7 天里只调用了 3 个 selector，对应 9 个 target：\n\n")
-        for (sel, tgt), cnt in selector_target_counts.most_common():
-            meta = TARGET_META.get(tgt, {})
-            label = meta.get("symbol") or meta.get("name") or ""
-            if label:
-                label = f" ({label})"
-            f.write(f"- `{sel}` `{tgt}`: {cnt}{label}\n")
-
-        f.write("\n## 2) run/批处理特征（一次扫到多个就同一波全发）\n\n")
-        f.write(
-            f"- run_size：p50={_pct(run_sizes, 50):.0f}, p90={_pct(run_sizes, 90):.0f}, max={int(run_sizes[-1])}\n"
-        )
-        f.write("- 常见多笔 run 组合（按出现次数 Top 10）：\n")
-        for sig, cnt in sig_counts.most_common(10):
-            parts = []
-            for p in sig.split("|"):
-                sel, tgt = p.split(":", 1)
-                meta = TARGET_META.get(tgt, {})
-                short = meta.get("symbol") or (tgt[:6] + "…" + tgt[-4:])
-                parts.append(f"{sel}:{short}")
-            f.write(f"  - {cnt}×: {', '.join(parts)}\n")
-
-        max_run = max(runs, key=len)
-        f.write("\n- 最大批次（同一波发了所有常用 job）：\n")
-        for c in max_run:
-            meta = TARGET_META.get(c.target, {})
-            short = meta.get("symbol") or (c.target[:6] + "…" + c.target[-4:])
-            f.write(f"  - ts={c.ts} block={c.block_number} `{c.selector}` {short}\n")
-
-        f.write("\n## 3) 触发阈值：更像“expected_out 与交易成本线性绑定”\n\n")
-        f.write(
-            "直接从 tx 参数看，minOut 与 `gas_price` 强相关，且 `minOut/gas_price` 波动很小。\n"
-            "但更底层的成本是 `tx_fee = gas_used * effectiveGasPrice`；当某个 job 的 `gas_used` 很稳定时，"
-            "统计上就会呈现出 `minOut ~ gas_price*k` 这种“线性绑定”。\n\n"
-        )
-
-        f.write("### 3.1 各 target 的拟合系数（用 p50(minAssets/gas_price) 近似 k_target）\n\n")
-        f.write(
-            "| target | 7d次数 | minAssets(p50) | gas_price(p50) | k≈p50(minAssets/gas_price) | CV(k) | gap_s(p50) |\n"
-        )
-        f.write("|---|---:|---:|---:|---:|---:|---:|\n")
-        for tgt, items in sorted(per_target.items(), key=lambda kv: len(kv[1]), reverse=True):
-            seq = sorted(items, key=lambda c: (c.ts, c.tx_hash))
-            outs = []
-            gps = []
-            ratios = []
-            for c in seq:
-                try:
-                    out = int(c.arg1)
-                except ValueError:
-                    continue
-                outs.append(out / 1e18)
-                gps.append(float(c.gas_price))
-                if c.gas_price:
-                    ratios.append((out / 1e18) / float(c.gas_price))
-            if not outs or not gps or not ratios:
+            gas_used = _try_int(row.get("gas_used"))
+            eff_gp = _try_int(row.get("effective_gas_price"))
+            tx_gp = _try_int(row.get("tx_gas_price"))
+            fee_wei = _try_int(row.get("fee_wei"))
+            if fee_wei is None and gas_used is not None and (eff_gp or tx_gp):
+                fee_wei = gas_used * int(eff_gp or tx_gp or 0)
+            if gas_used is None or fee_wei is None or fee_wei <= 0:
                 continue
-            gaps = [float(seq[i].ts - seq[i - 1].ts) for i in range(1, len(seq))]
-            meta = TARGET_META.get(tgt, {})
-            short = meta.get("symbol") or (tgt[:6] + "…" + tgt[-4:])
-            f.write(
-                f"| {short} | {len(seq)} | {_pct(sorted(outs), 50):.4g} | {_pct(sorted(gps), 50):.0f} | "
-                f"{_pct(sorted(ratios), 50):.4g} | {_cv(ratios) or 0:.3f} | {_pct(sorted(gaps), 50) if gaps else 0:.0f} |\n"
-            )
 
-        f.write("\n### 3.2 交易成本视角：minOut 与 tx_fee 线性绑定（更贴近 bot 决策）\n\n")
-        if not receipts_rows:
-            f.write(f"- 未提供 receipts sample（`{args.receipts_sample}` 不存在或为空），跳过本节。\n")
-        else:
-            gp_diffs: List[float] = []
-            mismatches = 0
-            for row in receipts_rows:
-                tx_gp = _try_int(row.get("tx_gas_price"))
-                eff_gp = _try_int(row.get("effective_gas_price"))
-                if tx_gp is None or eff_gp is None:
-                    continue
-                d = eff_gp - tx_gp
-                gp_diffs.append(float(d))
-                if d != 0:
-                    mismatches += 1
-
-            if gp_diffs:
-                diffs_sorted = sorted(gp_diffs)
-                f.write(
-                    f"- receipt sample：{len(receipts_rows)} 笔；effectiveGasPrice-tx_gas_price："
-                    f"p50={_pct(diffs_sorted, 50):.0f}, p90={_pct(diffs_sorted, 90):.0f}, max={diffs_sorted[-1]:.0f}；"
-                    f"mismatch={mismatches}\n"
-                )
+            out_raw: Any
+            if sel == COMPOUNDER_SEL:
+                out_raw = row.get("arg1")
+            elif sel == VAULT_SEL:
+                out_raw = row.get("arg2")
+            elif sel == FX_SEL:
+                out_raw = row.get("arg1")
             else:
-                f.write(f"- receipt sample：{len(receipts_rows)} 笔\n")
-
-            f.write(
-                "- 定义 `tx_fee = gas_used * effectiveGasPrice`（单位 wei）。在 sample 内 effectiveGasPrice==tx_gas_price，因此可把 "
-                "`gas_price` 当作成本 proxy。\n"
-            )
-            f.write(
-                "- 更关键的是：同一 job 的 `gas_used` 非常稳定，所以 `minOut ~ gas_price` 的现象更像来自 `minOut ~ tx_fee`。\n\n"
-            )
-            f.write("- 注：`out/tx_fee` 的量纲是 `token_wei/wei`，等价于 `token/ETH`（这里默认这些 out 都是 18 decimals）。\n\n")
+                continue
 
-            f.write(
-                "| job | 7d次数 | sample | gas_used(p50) | CV(gas_used) | out/tx_fee(p50) | CV(out/tx_fee) |\n"
-            )
-            f.write("|---|---:|---:|---:|---:|---:|---:|\n")
+            out_wei = _try_int(out_raw)
+            if out_wei is None:
+                continue
 
-            group_items = sorted(
-                receipts_by_group.items(),
-                key=lambda kv: (group_counts.get(kv[0], 0), len(kv[1])),
-                reverse=True,
-            )
-            for (sel, tgt, subkey), rows in group_items:
-                gas_useds: List[float] = []
-                ratios: List[float] = []
-                for row in rows:
-                    gas_used = _try_int(row.get("gas_used"))
-                    eff_gp = _try_int(row.get("effective_gas_price"))
-                    tx_gp = _try_int(row.get("tx_gas_price"))
-                    fee_wei = _try_int(row.get("fee_wei"))
-                    if fee_wei is None and gas_used is not None and (eff_gp or tx_gp):
-                        fee_wei = gas_used * int(eff_gp or tx_gp or 0)
-                    if gas_used is None or fee_wei is None or fee_wei <= 0:
-                        continue
+            gas_useds.append(float(gas_used))
+            ratios.append(float(out_wei) / float(fee_wei))
 
-                    out_raw: Any
-                    if sel == COMPOUNDER_SEL:
-                        out_raw = row.get("arg1")
-                    elif sel == VAULT_SEL:
-                        out_raw = row.get("arg2")
-                    elif sel == FX_SEL:
-                        out_raw = row.get("arg1")
-                    else:
-                        continue
+        if not gas_useds or not ratios:
+            continue
+        table.append(
+            {
+                "label": _job_label(sel, tgt, subkey),
+                "cnt": group_counts.get((sel, tgt, subkey), 0),
+                "n_sample": len(rows),
+                "gu_p50": _pct(sorted(gas_useds), 50),
+                "gu_cv": _cv(gas_useds) or 0,
+                "ratio_p50": _pct(sorted(ratios), 50),
+                "ratio_cv": _cv(ratios) or 0,
+            }
+        )
+    out["rows"] = table
+    return out
 
-                    out_wei = _try_int(out_raw)
-                    if out_wei is None:
-                        continue
 
-                    gas_useds.append(float(gas_used))
-                    ratios.append(float(out_wei) / float(fee_wei))
+def _render_fee(r: Dict[str, Any]) -> str:
+    if not r["n_rows"]:
+        return _T_FEE + report_sections.fill(_T_FEE_SKIP, r)
+    head = report_sections.fill(_T_FEE_DIFFS, r["diffs"]) if "diffs" in r else report_sections.fill(_T_FEE_SAMPLE, r)
+    return _T_FEE + head + _T_FEE_BODY + report_sections.rows(_T_FEE_ROW, r["rows"])
+
+
+# ---- 3.3) USD ROI ----
+
+_T_ROI = "\n### 3.3 USD 口径：是否存在跨 job 的统一 ROI 阈值？\n\n"
+_T_ROI_SKIP = (
+    "- 未提供 USD 价格数据（`{prices_json}` 不存在/无效），跳过本节；可先运行 "
+    "`python reports/tools/fetch_coingecko_prices.py` 生成。\n"
+)
+_T_ROI_INTRO = (
+    "- 定义 `ROI = yield_usd / tx_cost_usd`，其中 `yield_usd ≈ minOut * price_usd`，"
+    "`tx_cost_usd ≈ (gas_price * gas_used_est) * ETH_usd`。\n"
+    "- 如果 bot 是“统一的 USD ROI 阈值”，则不同 job 的 `ROI(p50)` 应该接近；反之说明是 job-specific 的系数。\n\n"
+)
+_T_ROI_MISSING = (
+    "- 统计缺失：missing_token={missing_token}, missing_price={missing_price}, missing_gas_est={missing_gas}\n\n"
+)
+_T_ROI_STALE = (
+    "- 价格过期：最近价格点距调用 > {max_staleness_s:.0f}s 的样本已丢弃（计入 missing_price；{stale}）\n\n"
+)
+_T_ROI_ALIAS = "- 价格回退：`{src}` 无有效价格点，使用 `{dst}` 价格近似（hits={cnt}）\n"
+_T_ROI_TABLE = (
+    "| job | 7d次数 | ROI(p50) | CV(ROI) | yield_usd(p50) | tx_cost_usd(p50) |\n"
+    "|---|---:|---:|---:|---:|---:|\n"
+)
+_T_ROI_ROW = "| {label} | {cnt} | {roi_p50:.3g} | {roi_cv:.3f} | {out_p50:.3g} | {cost_p50:.3g} |\n"
+_T_ROI_CONCLUSION = (
+    "\n- 结论：`ROI(p50)` 跨 job 差异很大（min≈{min_roi:.3g} `{min_label}`, max≈{max_roi:.3g} `{max_label}`, "
+    "max/min≈{ratio:.3g}），更像每个 job 维护独立阈值系数，而非全局统一 ROI。\n"
+)
+
+
+def _compute_roi(inp: _Inputs) -> Dict[str, Any]:
+    prices_by_key = inp.prices_by_key
+    if not prices_by_key or "eth" not in prices_by_key:
+        return {"prices_json": inp.args.prices_json, "available": False}
+
+    calls = inp.calls
+    group_counts = inp.group_counts
+    gas_used_est_by_group = inp.gas_used_est_by_group
+    roi_by_job: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
+    cost_by_job: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
+    out_by_job: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
+
+    missing_token = 0
+    missing_price = 0
+    missing_gas = 0
+    alias_used: Counter[Tuple[str, str]] = Counter()
+    sdpendle_addr = (TARGET_META.get("0x606462126e4bd5c4d153fe09967e4c46c9c7fecf", {}).get("base_addr") or "").lower()
+    pendle_addr = "0x808507121b80c02388fad14726482e061b8da827"
+    price_alias: Dict[str, str] = {}
+    if sdpendle_addr:
+        price_alias[sdpendle_addr] = pendle_addr.lower()
+
+    px = asof.PriceLookup(prices_by_key, [c.ts for c in calls], max_staleness_s=inp.args.max_price_staleness_s)
+    for i, c in enumerate(calls):
+        subkey = _call_subkey(c)
+        job_key = (c.selector, c.target, subkey)
+        tok = _job_out_token(c.selector, c.target)
+        if not tok:
+            missing_token += 1
+            continue
+        tok_sym, tok_addr = tok
+        tok_addr = tok_addr.lower()
+        series_key = tok_addr
+        if series_key not in prices_by_key:
+            alias = price_alias.get(series_key)
+            if alias and alias in prices_by_key:
+                alias_used[(series_key, alias)] += 1
+                series_key = alias
+            else:
+                missing_price += 1
+                continue
 
-                if not gas_useds or not ratios:
-                    continue
+        eth_px = px.at("eth", i)
+        tok_px = px.at(series_key, i)
+        if eth_px is None or tok_px is None or eth_px <= 0 or tok_px <= 0:
+            missing_price += 1
+            continue
 
-                label = _job_label(sel, tgt, subkey)
-                f.write(
-                    f"| {label} | {group_counts.get((sel, tgt, subkey), 0)} | {len(rows)} | "
-                    f"{_pct(sorted(gas_useds), 50):.0f} | {_cv(gas_useds) or 0:.3f} | "
-                    f"{_pct(sorted(ratios), 50):.4g} | {_cv(ratios) or 0:.3f} |\n"
-                )
+        gu = gas_used_est_by_group.get(job_key)
+        if not gu or gu <= 0:
+            missing_gas += 1
+            continue
+        fee_wei = int(c.gas_price) * int(gu)
+        cost_usd = (fee_wei / 1e18) * float(eth_px)
+        if cost_usd <= 0:
+            continue
 
-        f.write("\n### 3.3 USD 口径：是否存在跨 job 的统一 ROI 阈值？\n\n")
-        if not prices_by_key or "eth" not in prices_by_key:
-            f.write(
-                f"- 未提供 USD 价格数据（`{args.prices_json}` 不存在/无效），跳过本节；可先运行 "
-                "`python reports/tools/fetch_coingecko_prices.py` 生成。\n"
-            )
-        else:
-            roi_by_job: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
-            cost_by_job: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
-            out_by_job: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
-
-            missing_token = 0
-            missing_price = 0
-            missing_gas = 0
-            alias_used: Counter[Tuple[str, str]] = Counter()
-            sdpendle_addr = (
-                TARGET_META.get("0x606462126e4bd5c4d153fe09967e4c46c9c7fecf", {}).get("base_addr") or ""
-            ).lower()
-            pendle_addr = "0x808507121b80c02388fad14726482e061b8da827"
-            price_alias: Dict[str, str] = {}
-            if sdpendle_addr:
-                price_alias[sdpendle_addr] = pendle_addr.lower()
-
-            for c in calls:
-                subkey = _call_subkey(c)
-                job_key = (c.selector, c.target, subkey)
-                tok = _job_out_token(c.selector, c.target)
-                if not tok:
-                    missing_token += 1
-                    continue
-                tok_sym, tok_addr = tok
-                tok_addr = tok_addr.lower()
-                series_key = tok_addr
-                if series_key not in prices_by_key:
-                    alias = price_alias.get(series_key)
-                    if alias and alias in prices_by_key:
-                        alias_used[(series_key, alias)] += 1
-                        series_key = alias
-                    else:
-                        missing_price += 1
-                        continue
+        try:
+            if c.selector == COMPOUNDER_SEL:
+                out_wei = int(c.arg1)
+            elif c.selector == VAULT_SEL:
+                out_wei = int(c.arg2)
+            elif c.selector == FX_SEL:
+                out_wei = int(c.arg1)
+            else:
+                continue
+        except ValueError:
+            continue
 
-                eth_px = _price_at(prices_by_key["eth"], c.ts)
-                tok_px = _price_at(prices_by_key[series_key], c.ts)
-                if eth_px is None or tok_px is None or eth_px <= 0 or tok_px <= 0:
-                    missing_price += 1
-                    continue
+        out_usd = (out_wei / 1e18) * float(tok_px)
+        roi = out_usd / cost_usd
+        roi_by_job[job_key].append(float(roi))
+        cost_by_job[job_key].append(float(cost_usd))
+        out_by_job[job_key].append(float(out_usd))
 
-                gu = gas_used_est_by_group.get(job_key)
-                if not gu or gu <= 0:
-                    missing_gas += 1
-                    continue
-                fee_wei = int(c.gas_price) * int(gu)
-                cost_usd = (fee_wei / 1e18) * float(eth_px)
-                if cost_usd <= 0:
-                    continue
+    job_rows: List[Dict[str, Any]] = []
+    job_items = sorted(roi_by_job.items(), key=lambda kv: group_counts.get(kv[0], 0), reverse=True)
+    for (sel, tgt, subkey), rois in job_items:
+        if not rois:
+            continue
+        rois_sorted = sorted(rois)
+        outs_sorted = sorted(out_by_job.get((sel, tgt, subkey), []))
+        costs_sorted = sorted(cost_by_job.get((sel, tgt, subkey), []))
+        if not outs_sorted or not costs_sorted:
+            continue
+        job_rows.append(
+            {
+                "label": _job_label(sel, tgt, subkey),
+                "cnt": group_counts.get((sel, tgt, subkey), 0),
+                "roi_p50": float(_pct(rois_sorted, 50)),
+                "roi_cv": float(_cv(rois_sorted) or 0.0),
+                "out_p50": float(_pct(outs_sorted, 50)),
+                "cost_p50": float(_pct(costs_sorted, 50)),
+            }
+        )
 
-                try:
-                    if c.selector == COMPOUNDER_SEL:
-                        out_wei = int(c.arg1)
-                    elif c.selector == VAULT_SEL:
-                        out_wei = int(c.arg2)
-                    elif c.selector == FX_SEL:
-                        out_wei = int(c.arg1)
-                    else:
-                        continue
-                except ValueError:
-                    continue
+    conclusion = None
+    if job_rows:
+        min_row = min(job_rows, key=lambda r: r["roi_p50"])
+        max_row = max(job_rows, key=lambda r: r["roi_p50"])
+        min_roi = min_row["roi_p50"]
+        max_roi = max_row["roi_p50"]
+        conclusion = {
+            "min_roi": min_roi,
+            "min_label": min_row["label"],
+            "max_roi": max_roi,
+            "max_label": max_row["label"],
+            "ratio": (max_roi / min_roi) if min_roi > 0 else 0.0,
+        }
+    return {
+        "available": True,
+        "missing_token": missing_token,
+        "missing_price": missing_price,
+        "missing_gas": missing_gas,
+        "n_stale": px.n_stale,
+        "max_staleness_s": inp.args.max_price_staleness_s,
+        "stale": ", ".join(f"`{k}`={n}" for k, n in px.stale_by_series()),
+        "aliases": [{"src": src, "dst": dst, "cnt": cnt} for (src, dst), cnt in alias_used.most_common()],
+        "rows": job_rows,
+        "conclusion": conclusion,
+    }
+
+
+def _render_roi(r: Dict[str, Any]) -> str:
+    if not r["available"]:
+        return _T_ROI + report_sections.fill(_T_ROI_SKIP, r)
+    out = [_T_ROI, _T_ROI_INTRO]
+    if r["missing_token"] or r["missing_price"] or r["missing_gas"]:
+        out.append(report_sections.fill(_T_ROI_MISSING, r))
+    if r["n_stale"]:
+        out.append(report_sections.fill(_T_ROI_STALE, r))
+    if r["aliases"]:
+        out.append(report_sections.rows(_T_ROI_ALIAS, r["aliases"]) + "\n")
+    out.append(_T_ROI_TABLE + report_sections.rows(_T_ROI_ROW, r["rows"]))
+    if r["conclusion"]:
+        out.append(report_sections.fill(_T_ROI_CONCLUSION, r["conclusion"]))
+    return "".join(out)
+
+
+# ---- 3.4) vaults / fxUSD ----
+
+_T_VAULTS = (
+    "\n### 3.4 vault/fxUSD：也呈现“expected_out 与 gas_price 线性绑定”\n\n"
+    "对 vault 调用（`0xc7f884c6`），`minOut` 同样与 `gas_price` 强相关，且 `minOut/gas_price` 波动很小；"
+    "这说明 bot 对 vault 也在用同一类阈值规则。\n\n"
+    "| vault(pid) | 7d次数 | minOut(p50) | gas_price(p50) | k≈p50(minOut/gas_price) | CV(k) | gap_s(p50) |\n"
+    "|---|---:|---:|---:|---:|---:|---:|\n"
+)
+_T_FX = (
+    "\n- FxUSDCompounder（`0x78f26f5b`）观察：\n"
+    "  - target `{short}`：minBaseOut 与 gas_price 强相关（k≈p50(minBaseOut/gas_price)={k_p50:.4g}，CV={k_cv:.3f}）\n"
+    "  - minFxUSDOut 在 7 天内恒为 `1` wei（fx_unique={fx_unique}），等价于“几乎不设阈值，只设 base_out 阈值”。\n"
+)
+_T_FX_GAP = "  - gap_s(p50)≈{gap_p50:.0f}\n"
+
+
+def _compute_vaults(inp: _Inputs) -> Dict[str, Any]:
+    calls = inp.calls
+    # Vaults (selector 0xc7f884c6): group by (target,pid), use minOut as expected_out proxy.
+    vault_groups: Dict[Tuple[str, int], List[Call]] = defaultdict(list)
+    for c in calls:
+        if c.selector != VAULT_SEL:
+            continue
+        try:
+            pid = int(c.arg1)
+        except ValueError:
+            continue
+        vault_groups[(c.target, pid)].append(c)
+    vaults = []
+    for (tgt, pid), items in sorted(vault_groups.items(), key=lambda kv: len(kv[1]), reverse=True)[:10]:
+        row = _k_row(f"{_short(tgt, 'name').split(' ')[0]}({pid})", items, "arg2")
+        if row is not None:
+            vaults.append(row)
+
+    fx = None
+    fx_calls = [c for c in calls if c.selector == FX_SEL]
+    if fx_calls:
+        # This selector takes (target, minBaseOut, minFxUSDOut); observed minFxUSDOut == 1 always.
+        seq = sorted(fx_calls, key=lambda c: (c.ts, c.tx_hash))
+        base_outs = []
+        fx_outs = []
+        gps = []
+        base_ratios = []
+        for c in seq:
+            try:
+                base_out = int(c.arg1)
+                fx_out = int(c.arg2)
+            except ValueError:
+                continue
+            base_outs.append(base_out / 1e18)
+            fx_outs.append(fx_out / 1e18)
+            gps.append(float(c.gas_price))
+            if c.gas_price:
+                base_ratios.append((base_out / 1e18) / float(c.gas_price))
+        if base_outs and gps and base_ratios:
+            gaps = [float(seq[i].ts - seq[i - 1].ts) for i in range(1, len(seq))]
+            fx = {
+                "short": _short(seq[0].target),
+                "k_p50": _pct(sorted(base_ratios), 50),
+                "k_cv": _cv(base_ratios) or 0,
+                "fx_unique": len(set(int(x * 1e18) for x in fx_outs)),
+                "gap_p50": _pct(sorted(gaps), 50) if gaps else None,
+            }
+    return {"has_vaults": bool(vault_groups), "vaults": vaults, "fx": fx}
+
+
+def _render_vaults(r: Dict[str, Any]) -> str:
+    out = []
+    if r["has_vaults"]:
+        out.append(_T_VAULTS + report_sections.rows(_T_K_ROW, r["vaults"]))
+    fx = r["fx"]
+    if fx:
+        out.append(report_sections.fill(_T_FX, fx))
+        if fx["gap_p50"] is not None:
+            out.append(report_sections.fill(_T_FX_GAP, fx))
+    return "".join(out)
+
+
+# ---- 3.5) asdPENDLE minAssets vs Harvest.assets ----
+
+_T_ASD = "\n### 3.5 asdPENDLE：minAssets≈Harvest.assets（先模拟再发 tx）\n\n"
+_T_ASD_DIFFS = (
+    "- 匹配到 {matched} 笔同时有 Harvest 事件的 tx；其中 {eq} 笔 `minAssets == assets`。\n"
+    "- |assets-minAssets|：p90≈{diff_p90:.3f}，max≈{diff_max:.3f}。\n"
+)
+_T_ASD_BPS = (
+    "- (assets-minAssets)/assets：p90≈{bps_p90:.2f} bps，max≈{bps_max:.2f} bps（buffer 很小，符合“先模拟再发 tx”）。\n"
+)
+_T_ASD_MISSING = "- 未匹配到足够的 Harvest 事件数据（缺少 `asdpendle_harvest_logs.csv`）。\n"
+
+
+def _compute_asd(inp: _Inputs) -> Dict[str, Any]:
+    asd_assets_by_tx = inp.asd_assets_by_tx
+    asd = "0x606462126e4bd5c4d153fe09967e4c46c9c7fecf"
+    asd_calls = [c for c in inp.calls if c.selector == COMPOUNDER_SEL and c.target == asd]
+    diffs: List[float] = []
+    diff_bps: List[float] = []
+    eq = 0
+    matched = 0
+    for c in asd_calls:
+        if c.tx_hash not in asd_assets_by_tx:
+            continue
+        matched += 1
+        assets = asd_assets_by_tx[c.tx_hash]
+        try:
+            min_assets = int(c.arg1)
+        except ValueError:
+            continue
+        if assets == min_assets:
+            eq += 1
+        diffs.append(abs(float(assets - min_assets) / 1e18))
+        if 0 <= min_assets <= assets and assets > 0:
+            diff_bps.append((assets - min_assets) / assets * 10000.0)
+    if not diffs:
+        return {"diffs": None}
+    diffs_sorted = sorted(diffs)
+    out: Dict[str, Any] = {
+        "diffs": {"matched": matched, "eq": eq, "diff_p90": _pct(diffs_sorted, 90), "diff_max": diffs_sorted[-1]}
+    }
+    if diff_bps:
+        diff_bps_sorted = sorted(diff_bps)
+        out["bps"] = {"bps_p90": _pct(diff_bps_sorted, 90), "bps_max": diff_bps_sorted[-1]}
+    return out
 
-                out_usd = (out_wei / 1e18) * float(tok_px)
-                roi = out_usd / cost_usd
-                roi_by_job[job_key].append(float(roi))
-                cost_by_job[job_key].append(float(cost_usd))
-                out_by_job[job_key].append(float(out_usd))
 
-            f.write(
-                "- 定义 `ROI = yield_usd / tx_cost_usd`，其中 `yield_usd ≈ minOut * price_usd`，"
-                "`tx_cost_usd ≈ (gas_price * gas_used_est) * ETH_usd`。\n"
-            )
-            f.write(
-                "- 如果 bot 是“统一的 USD ROI 阈值”，则不同 job 的 `ROI(p50)` 应该接近；反之说明是 job-specific 的系数。\n\n"
-            )
-            if missing_token or missing_price or missing_gas:
-                f.write(
-                    f"- 统计缺失：missing_token={missing_token}, missing_price={missing_price}, missing_gas_est={missing_gas}\n\n"
-                )
-            if alias_used:
-                for (src, dst), cnt in alias_used.most_common():
-                    f.write(f"- 价格回退：`{src}` 无有效价格点，使用 `{dst}` 价格近似（hits={cnt}）\n")
-                f.write("\n")
-
-            f.write("| job | 7d次数 | ROI(p50) | CV(ROI) | yield_usd(p50) | tx_cost_usd(p50) |\n")
-            f.write("|---|---:|---:|---:|---:|---:|\n")
-
-            job_rows: List[Tuple[str, int, float, float, float, float]] = []
-            job_items = sorted(roi_by_job.items(), key=lambda kv: group_counts.get(kv[0], 0), reverse=True)
-            for (sel, tgt, subkey), rois in job_items:
-                if not rois:
-                    continue
-                label = _job_label(sel, tgt, subkey)
-                rois_sorted = sorted(rois)
-                outs_sorted = sorted(out_by_job.get((sel, tgt, subkey), []))
-                costs_sorted = sorted(cost_by_job.get((sel, tgt, subkey), []))
-                if not outs_sorted or not costs_sorted:
-                    continue
-                cnt = group_counts.get((sel, tgt, subkey), 0)
-                roi_p50 = float(_pct(rois_sorted, 50))
-                roi_cv = float(_cv(rois_sorted) or 0.0)
-                out_p50 = float(_pct(outs_sorted, 50))
-                cost_p50 = float(_pct(costs_sorted, 50))
-                job_rows.append((label, cnt, roi_p50, roi_cv, out_p50, cost_p50))
-                f.write(
-                    f"| {label} | {cnt} | {roi_p50:.3g} | {roi_cv:.3f} | {out_p50:.3g} | {cost_p50:.3g} |\n"
-                )
+def _render_asd(r: Dict[str, Any]) -> str:
+    if not r["diffs"]:
+        return _T_ASD + _T_ASD_MISSING
+    out = _T_ASD + report_sections.fill(_T_ASD_DIFFS, r["diffs"])
+    if r.get("bps"):
+        out += report_sections.fill(_T_ASD_BPS, r["bps"])
+    return out
 
-            if job_rows:
-                min_row = min(job_rows, key=lambda r: r[2])
-                max_row = max(job_rows, key=lambda r: r[2])
-                min_roi = min_row[2]
-                max_roi = max_row[2]
-                ratio = (max_roi / min_roi) if min_roi > 0 else 0.0
-                f.write(
-                    f"\n- 结论：`ROI(p50)` 跨 job 差异很大（min≈{min_roi:.3g} `{min_row[0]}`, max≈{max_roi:.3g} `{max_row[0]}`, "
-                    f"max/min≈{ratio:.3g}），更像每个 job 维护独立阈值系数，而非全局统一 ROI。\n"
-                )
 
-        # Vaults (selector 0xc7f884c6): group by (target,pid), use minOut as expected_out proxy.
-        vault_groups: Dict[Tuple[str, int], List[Call]] = defaultdict(list)
-        for c in calls:
-            if c.selector != VAULT_SEL:
-                continue
-            try:
-                pid = int(c.arg1)
-            except ValueError:
-                continue
-            vault_groups[(c.target, pid)].append(c)
+# ---- 4) pseudocode ----
+
+_T_PSEUDOCODE = (
+    "\n## 4) 可复现的策略伪代码（推测）\n\n"
+    "```text\n"
+    "jobs = [\n"
+    "  # selector=0x04117561\n"
+    "  {type: 'compounder', target: aFXN,      gas_used: GU_aFXN,      m: m_aFXN},\n"
+    "  {type: 'compounder', target: aCRV,      gas_used: GU_aCRV,      m: m_aCRV},\n"
+    "  {type: 'compounder', target: aCVX,      gas_used: GU_aCVX,      m: m_aCVX},\n"
+    "  {type: 'compounder', target: abcCVX,    gas_used: GU_abcCVX,    m: m_abcCVX},\n"
+    "  {type: 'compounder', target: asdCRV,    gas_used: GU_asdCRV,    m: m_asdCRV},\n"
+    "  {type: 'compounder', target: asdPENDLE, gas_used: GU_asdPENDLE, m: m_asdPENDLE},\n"
+    "  # selector=0xc7f884c6\n"
+    "  {type: 'vault',      target: vault1, pid: X, gas_used: GU_vault1, m: m_vault1},\n"
+    "  {type: 'vault',      target: vault2, pid: Y, gas_used: GU_vault2, m: m_vault2},\n"
+    "  # selector=0x78f26f5b\n"
+    "  {type: 'fxusd',      target: arUSD, gas_used: GU_arUSD, m_base: m1, min_fxusd_out: 1},\n"
+    "]\n"
+    "\n"
+    "loop:\n"
+    "  gp = current_gas_price()\n"
+    "  for job in jobs:\n"
+    "    expected = eth_call(simulate_harvest(job, min=0))\n"
+    "    fee_est = gp * job.gas_used             # ≈ tx_fee\n"
+    "    threshold = fee_est * (job.m_base if job.type=='fxusd' else job.m)\n"
+    "    if expected >= threshold:\n"
+    "       min = expected * (1 - buffer_bps)\n"
+    "       send_tx(harvest(job, min))\n"
+    "  sleep(...)   # 扫描频率链上不可见\n"
+    "```\n"
+)
+
+
+def _compute_pseudocode(inp: _Inputs) -> Dict[str, Any]:
+    return {}
+
+
+def _render_pseudocode(r: Dict[str, Any]) -> str:
+    return _T_PSEUDOCODE
+
+
+SECTIONS: List[report_sections.Section] = [
+    report_sections.Section("header", _compute_header, _render_header, ("in_csv",), ("in_csv", "run_gap_s")),
+    report_sections.Section("1_jobs", _compute_jobs, _render_jobs, ("in_csv",)),
+    report_sections.Section("2_runs", _compute_runs, _render_runs, ("in_csv",), ("run_gap_s",)),
+    report_sections.Section("3.1_k_targets", _compute_k_targets, _render_k_targets, ("in_csv",)),
+    report_sections.Section(
+        "3.2_tx_fee",
+        _compute_fee,
+        _render_fee,
+        ("in_csv", "receipts_full", "receipts_sample"),
+        ("receipts_full", "receipts_sample"),
+    ),
+    report_sections.Section(
+        "3.3_usd_roi",
+        _compute_roi,
+        _render_roi,
+        ("in_csv", "receipts_full", "receipts_sample", "prices_json"),
+        ("prices_json", "max_price_staleness_s"),
+    ),
+    report_sections.Section("3.4_vaults", _compute_vaults, _render_vaults, ("in_csv",)),
+    report_sections.Section("3.5_asdpendle", _compute_asd, _render_asd, ("in_csv", "asd_harvest_logs")),
+    report_sections.Section("4_pseudocode", _compute_pseudocode, _render_pseudocode),
+]
 
-        if vault_groups:
-            f.write("\n### 3.4 vault/fxUSD：也呈现“expected_out 与 gas_price 线性绑定”\n\n")
-            f.write(
-                "对 vault 调用（`0xc7f884c6`），`minOut` 同样与 `gas_price` 强相关，且 `minOut/gas_price` 波动很小；"
-                "这说明 bot 对 vault 也在用同一类阈值规则。\n\n"
-            )
-            f.write(
-                "| vault(pid) | 7d次数 | minOut(p50) | gas_price(p50) | k≈p50(minOut/gas_price) | CV(k) | gap_s(p50) |\n"
-            )
-            f.write("|---|---:|---:|---:|---:|---:|---:|\n")
-            for (tgt, pid), items in sorted(vault_groups.items(), key=lambda kv: len(kv[1]), reverse=True)[:10]:
-                seq = sorted(items, key=lambda c: (c.ts, c.tx_hash))
-                outs = []
-                gps = []
-                ratios = []
-                for c in seq:
-                    try:
-                        out = int(c.arg2)
-                    except ValueError:
-                        continue
-                    outs.append(out / 1e18)
-                    gps.append(float(c.gas_price))
-                    if c.gas_price:
-                        ratios.append((out / 1e18) / float(c.gas_price))
-                if not outs or not gps or not ratios:
-                    continue
-                gaps = [float(seq[i].ts - seq[i - 1].ts) for i in range(1, len(seq))]
-                meta = TARGET_META.get(tgt, {})
-                short = meta.get("name") or (tgt[:6] + "…" + tgt[-4:])
-                short = f"{short.split(' ')[0]}({pid})"
-                f.write(
-                    f"| {short} | {len(seq)} | {_pct(sorted(outs), 50):.4g} | {_pct(sorted(gps), 50):.0f} | "
-                    f"{_pct(sorted(ratios), 50):.4g} | {_cv(ratios) or 0:.3f} | {_pct(sorted(gaps), 50) if gaps else 0:.0f} |\n"
-                )
 
-        fx_calls = [c for c in calls if c.selector == FX_SEL]
-        if fx_calls:
-            # This selector takes (target, minBaseOut, minFxUSDOut); observed minFxUSDOut == 1 always.
-            seq = sorted(fx_calls, key=lambda c: (c.ts, c.tx_hash))
-            base_outs = []
-            fx_outs = []
-            gps = []
-            base_ratios = []
-            for c in seq:
-                try:
-                    base_out = int(c.arg1)
-                    fx_out = int(c.arg2)
-                except ValueError:
-                    continue
-                base_outs.append(base_out / 1e18)
-                fx_outs.append(fx_out / 1e18)
-                gps.append(float(c.gas_price))
-                if c.gas_price:
-                    base_ratios.append((base_out / 1e18) / float(c.gas_price))
-            if base_outs and gps and base_ratios:
-                gaps = [float(seq[i].ts - seq[i - 1].ts) for i in range(1, len(seq))]
-                tgt = seq[0].target
-                meta = TARGET_META.get(tgt, {})
-                short = meta.get("symbol") or (tgt[:6] + "…" + tgt[-4:])
-                f.write("\n- FxUSDCompounder（`0x78f26f5b`）观察：\n")
-                f.write(
-                    f"  - target `{short}`：minBaseOut 与 gas_price 强相关（k≈p50(minBaseOut/gas_price)={_pct(sorted(base_ratios), 50):.4g}，CV={_cv(base_ratios) or 0:.3f}）\n"
-                )
-                fx_unique = len(set(int(x * 1e18) for x in fx_outs))
-                f.write(
-                    f"  - minFxUSDOut 在 7 天内恒为 `1` wei（fx_unique={fx_unique}），等价于“几乎不设阈值，只设 base_out 阈值”。\n"
-                )
-                if gaps:
-                    f.write(f"  - gap_s(p50)≈{_pct(sorted(gaps), 50):.0f}\n")
-
-        f.write("\n### 3.5 asdPENDLE：minAssets≈Harvest.assets（先模拟再发 tx）\n\n")
-        asd = "0x606462126e4bd5c4d153fe09967e4c46c9c7fecf"
-        asd_calls = [c for c in calls if c.selector == COMPOUNDER_SEL and c.target == asd]
-        diffs: List[float] = []
-        diff_bps: List[float] = []
-        eq = 0
-        matched = 0
-        for c in asd_calls:
-            if c.tx_hash not in asd_assets_by_tx:
-                continue
-            matched += 1
-            assets = asd_assets_by_tx[c.tx_hash]
-            try:
-                min_assets = int(c.arg1)
-            except ValueError:
-                continue
-            if assets == min_assets:
-                eq += 1
-            diffs.append(abs(float(assets - min_assets) / 1e18))
-            if 0 <= min_assets <= assets and assets > 0:
-                diff_bps.append((assets - min_assets) / assets * 10000.0)
-        if diffs:
-            diffs_sorted = sorted(diffs)
-            f.write(
-                f"- 匹配到 {matched} 笔同时有 Harvest 事件的 tx；其中 {eq} 笔 `minAssets == assets`。\n"
-                f"- |assets-minAssets|：p90≈{_pct(diffs_sorted, 90):.3f}，max≈{diffs_sorted[-1]:.3f}。\n"
-            )
-            if diff_bps:
-                diff_bps_sorted = sorted(diff_bps)
-                f.write(
-                    f"- (assets-minAssets)/assets：p90≈{_pct(diff_bps_sorted, 90):.2f} bps，max≈{diff_bps_sorted[-1]:.2f} bps（buffer 很小，符合“先模拟再发 tx”）。\n"
-                )
-        else:
-            f.write("- 未匹配到足够的 Harvest 事件数据（缺少 `asdpendle_harvest_logs.csv`）。\n")
-
-        f.write("\n## 4) 可复现的策略伪代码（推测）\n\n")
-        f.write(
-            "```text\n"
-            "jobs = [\n"
-            "  # selector=0x04117561\n"
-            "  {type: 'compounder', target: aFXN,      gas_used: GU_aFXN,      m: m_aFXN},\n"
-            "  {type: 'compounder', target: aCRV,      gas_used: GU_aCRV,      m: m_aCRV},\n"
-            "  {type: 'compounder', target: aCVX,      gas_used: GU_aCVX,      m: m_aCVX},\n"
-            "  {type: 'compounder', target: abcCVX,    gas_used: GU_abcCVX,    m: m_abcCVX},\n"
-            "  {type: 'compounder', target: asdCRV,    gas_used: GU_asdCRV,    m: m_asdCRV},\n"
-            "  {type: 'compounder', target: asdPENDLE, gas_used: GU_asdPENDLE, m: m_asdPENDLE},\n"
-            "  # selector=0xc7f884c6\n"
-            "  {type: 'vault',      target: vault1, pid: X, gas_used: GU_vault1, m: m_vault1},\n"
-            "  {type: 'vault',      target: vault2, pid: Y, gas_used: GU_vault2, m: m_vault2},\n"
-            "  # selector=0x78f26f5b\n"
-            "  {type: 'fxusd',      target: arUSD, gas_used: GU_arUSD, m_base: m1, min_fxusd_out: 1},\n"
-            "]\n"
-            "\n"
-            "loop:\n"
-            "  gp = current_gas_price()\n"
-            "  for job in jobs:\n"
-            "    expected = eth_call(simulate_harvest(job, min=0))\n"
-            "    fee_est = gp * job.gas_used             # ≈ tx_fee\n"
-            "    threshold = fee_est * (job.m_base if job.type=='fxusd' else job.m)\n"
-            "    if expected >= threshold:\n"
-            "       min = expected * (1 - buffer_bps)\n"
-            "       send_tx(harvest(job, min))\n"
-            "  sleep(...)   # 扫描频率链上不可见\n"
-            "```\n"
-        )
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--in-csv", default="data/f88e_harvester_calls_7d.csv")
+    parser.add_argument("--asd-harvest-logs", default="data/asdpendle_harvest_logs.csv")
+    parser.add_argument(
+        "--receipts-full",
+        default="data/f88e_harvester_receipts_full.csv",
+        help="Optional: output from reports/tools/backfill_receipts.py; replaces --receipts-sample when non-empty",
+    )
+    parser.add_argument(
+        "--receipts-sample",
+        default="data/f88e_harvester_receipts_sample.csv",
+        help="Optional: output from reports/tools/fetch_receipts_sample.py",
+    )
+    parser.add_argument(
+        "--prices-json",
+        default="data/coingecko_prices_7d.json",
+        help="Optional: output from reports/tools/fetch_coingecko_prices.py",
+    )
+    parser.add_argument(
+        "--max-price-staleness-s",
+        type=float,
+        default=asof.DEFAULT_MAX_PRICE_STALENESS_S,
+        help="Drop a call's USD price if the nearest price point is further than this (0 = accept any)",
+    )
+    parser.add_argument("--out-md", default="asdpendle/harvester-bot-strategy.md")
+    parser.add_argument("--run-gap-s", type=int, default=120)
+    parser.add_argument(
+        "--run-gap-sweep",
+        default="",
+        help="Sweep mode: 'lo:hi:count' log-spaced gap thresholds (seconds); writes only the sweep outputs",
+    )
+    parser.add_argument("--sweep-out-md", default="asdpendle/harvester-run-gap-sweep.md")
+    parser.add_argument("--sweep-out-svg", default="asdpendle/assets/harvester-run-gap-sweep.svg")
+    parser.add_argument(
+        "--sections-cache",
+        default="",
+        help="Section result cache (default: data/<out-md stem>.sections.json); 'none' disables it",
+    )
+    parser.add_argument("--refresh-sections", action="store_true", help="Recompute every section")
+    args = parser.parse_args()
+    instrument.phase("load")
+
+    if args.run_gap_sweep:
+        calls = _load_calls(args.in_csv)
+        if not calls:
+            raise SystemExit("no calls")
+        _write_run_gap_sweep(calls, args)
+        return 0
+
+    instrument.phase("report")
+    cache = args.sections_cache or report_sections.cache_path(args.out_md)
+    text = report_sections.render_report(
+        SECTIONS, _Inputs(args), args, None if cache == "none" else cache, refresh=bool(args.refresh_sections)
+    )
+    os.makedirs(os.path.dirname(args.out_md), exist_ok=True)
+    with open(args.out_md, "w") as f:
+        f.write(text)
 
     return 0
 
 
 if __name__ == "__main__":
-    raise SystemExit(main())
+    raise SystemExit(instrument.run(main))
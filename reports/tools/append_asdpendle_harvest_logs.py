@@ -1,74 +1,76 @@
 import argparse
-import csv
-import json
-import os
-import sys
+from typing import Any, Dict
 
+import append_store
+import harvester_abi
+import instrument
+import json_stream
+import warehouse
 
-def _topic_to_address(topic: str) -> str:
-    topic = topic.lower()
-    if topic.startswith("0x"):
-        topic = topic[2:]
-    return "0x" + topic[-40:]
 
+LOG_FIELDS = [
+    "tx_hash",
+    "block_number",
+    "time_stamp",
+    "caller",
+    "receiver",
+    "assets",
+    "performance_fee",
+    "harvester_bounty",
+    "log_index",
+]
 
-def _parse_u256_words(data_hex: str) -> list[int]:
-    if data_hex.startswith("0x"):
-        data_hex = data_hex[2:]
-    if len(data_hex) % 64 != 0:
-        raise ValueError(f"unexpected data length {len(data_hex)}")
-    return [int(data_hex[i : i + 64], 16) for i in range(0, len(data_hex), 64)]
+
+def _log_index(log: Dict[str, Any]) -> str:
+    value = log.get("log_index", log.get("logIndex", ""))
+    if isinstance(value, str) and value.lower().startswith("0x"):
+        return str(int(value, 16)) if len(value) > 2 else "0"
+    return str(value) if value is not None else ""
 
 
 def main() -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument("--out", default="data/asdpendle_harvest_logs.csv")
+    parser.add_argument("--in", dest="in_path", default="-", help="Input JSON/NDJSON (default stdin; .gz ok)")
+    parser.add_argument("--batch-rows", type=int, default=5000, help="Rows buffered per CSV write")
+    parser.add_argument("--db", default="", help="Optional: also write new rows into this warehouse SQLite")
     args = parser.parse_args()
 
-    payload = json.load(sys.stdin)
-    logs = payload.get("logs", [])
-
-    out_path = args.out
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    write_header = not os.path.exists(out_path)
-
-    with open(out_path, "a", newline="") as f:
-        writer = csv.writer(f)
-        if write_header:
-            writer.writerow(
-                [
-                    "tx_hash",
-                    "block_number",
-                    "time_stamp",
-                    "caller",
-                    "receiver",
-                    "assets",
-                    "performance_fee",
-                    "harvester_bounty",
-                ]
-            )
+    logs = json_stream.iter_records(json_stream.open_input(args.in_path), "logs", record_field="tx_hash")
 
+    # Keyed by (tx_hash, log_index): one tx can emit several Harvest logs. A file from before the
+    # log_index column is migrated once by backfill_receipts.py (it reads the index from the receipts).
+    if "log_index" not in (append_store.read_header(args.out) or ["log_index"]):
+        raise SystemExit(f"{args.out} has no log_index column; run backfill_receipts.py once to migrate it")
+    on_flush = warehouse.sink(warehouse.connect(args.db), "harvest_logs") if args.db else None
+    with append_store.AppendStore(
+        args.out, LOG_FIELDS, ["tx_hash", "log_index"], batch_rows=args.batch_rows, on_flush=on_flush
+    ) as store:
         for log in logs:
+            log_index = _log_index(log)
+            if not log_index:
+                raise ValueError(f"log in {log.get('tx_hash')} has no logIndex")
             topics = log.get("topics", [])
-            caller = _topic_to_address(topics[1]) if len(topics) > 1 else ""
-            receiver = _topic_to_address(topics[2]) if len(topics) > 2 else ""
-            assets, performance_fee, harvester_bounty = _parse_u256_words(log["data"])
+            caller = harvester_abi.topic_to_address(topics[1]) if len(topics) > 1 else ""
+            receiver = harvester_abi.topic_to_address(topics[2]) if len(topics) > 2 else ""
+            assets, performance_fee, harvester_bounty = harvester_abi.u256_words(log["data"])
 
-            writer.writerow(
-                [
-                    log["tx_hash"].lower(),
-                    int(log["block_number"], 16),
-                    int(log["time_stamp"], 16),
-                    caller,
-                    receiver,
-                    assets,
-                    performance_fee,
-                    harvester_bounty,
-                ]
+            store.append(
+                {
+                    "tx_hash": log["tx_hash"].lower(),
+                    "block_number": int(log["block_number"], 16),
+                    "time_stamp": int(log["time_stamp"], 16),
+                    "caller": caller,
+                    "receiver": receiver,
+                    "assets": assets,
+                    "performance_fee": performance_fee,
+                    "harvester_bounty": harvester_bounty,
+                    "log_index": log_index,
+                }
             )
 
     return 0
 
 
 if __name__ == "__main__":
-    raise SystemExit(main())
+    raise SystemExit(instrument.run(main))
@@ -1,42 +1,13 @@
 import argparse
-import csv
-import json
-import os
-import sys
-from typing import Optional, Tuple
 
+import append_store
+import harvester_abi
+import instrument
+import json_stream
+import warehouse
 
-def _hex_to_address(word_hex: str) -> str:
-    word_hex = word_hex.lower()
-    if word_hex.startswith("0x"):
-        word_hex = word_hex[2:]
-    if len(word_hex) != 64:
-        raise ValueError(f"expected 32-byte word hex, got len={len(word_hex)}")
-    return "0x" + word_hex[-40:]
 
-
-def _decode_harvest_call_input(
-    input_hex: str, *, selector: str
-) -> Optional[Tuple[str, int]]:
-    if not isinstance(input_hex, str):
-        return None
-    input_hex = input_hex.lower()
-    selector = selector.lower()
-    if not selector.startswith("0x"):
-        selector = "0x" + selector
-    if not input_hex.startswith(selector):
-        return None
-    if input_hex.startswith("0x"):
-        input_hex = input_hex[2:]
-    selector_hex = selector[2:]
-    if not input_hex.startswith(selector_hex):
-        return None
-    payload = input_hex[len(selector_hex) :]
-    if len(payload) < 128:
-        return None
-    compounder = _hex_to_address(payload[0:64])
-    min_assets = int(payload[64:128], 16)
-    return compounder, min_assets
+TX_FIELDS = ["tx_hash", "timestamp", "from", "to", "block_number", "compounder", "min_assets"]
 
 
 def main() -> int:
@@ -51,60 +22,50 @@ def main() -> int:
         default="0x606462126e4bd5c4d153fe09967e4c46c9c7fecf",
     )
     parser.add_argument("--selector", default="0x04117561")
+    parser.add_argument("--in", dest="in_path", default="-", help="Input JSON/NDJSON (default stdin; .gz ok)")
+    parser.add_argument("--batch-rows", type=int, default=5000, help="Rows buffered per CSV write")
+    parser.add_argument("--db", default="", help="Optional: also write new rows into this warehouse SQLite")
     args = parser.parse_args()
 
     harvester = args.harvester.lower()
     compounder_target = args.compounder.lower()
+    selector_fn = harvester_abi.lookup(args.selector)
+    if selector_fn is None or selector_fn.selector not in harvester_abi.HARVESTER_SELECTORS:
+        raise SystemExit(f"unsupported harvester selector: {args.selector}")
 
-    payload = json.load(sys.stdin)
-    txs = payload.get("transactions", [])
-
-    out_path = args.out
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    write_header = not os.path.exists(out_path)
+    txs = json_stream.iter_records(json_stream.open_input(args.in_path), "transactions", record_field="hash")
 
     written = 0
-    with open(out_path, "a", newline="") as f:
-        writer = csv.writer(f)
-        if write_header:
-            writer.writerow(
-                [
-                    "tx_hash",
-                    "timestamp",
-                    "from",
-                    "to",
-                    "block_number",
-                    "compounder",
-                    "min_assets",
-                ]
-            )
-
+    on_flush = warehouse.sink(warehouse.connect(args.db), "harvest_txs") if args.db else None
+    with append_store.AppendStore(
+        args.out, TX_FIELDS, ["tx_hash"], batch_rows=args.batch_rows, on_flush=on_flush
+    ) as store:
         for tx in txs:
             to_addr = str(tx.get("to", "")).lower()
             if to_addr != harvester:
                 continue
-            decoded = _decode_harvest_call_input(tx.get("input", ""), selector=args.selector)
-            if decoded is None:
+            decoded = harvester_abi.decode_input(tx.get("input", "") or "")
+            if decoded is None or decoded[0] is not selector_fn:
                 continue
-            compounder, min_assets = decoded
+            compounder, min_assets = decoded[1][0], decoded[1][1]
             if compounder.lower() != compounder_target:
                 continue
 
-            writer.writerow(
-                [
-                    tx["hash"].lower(),
-                    int(tx["timestamp"]),
-                    str(tx.get("from", "")).lower(),
-                    to_addr,
-                    int(tx["block_number"]),
-                    compounder.lower(),
-                    min_assets,
-                ]
+            appended = store.append(
+                {
+                    "tx_hash": tx["hash"].lower(),
+                    "timestamp": int(tx["timestamp"]),
+                    "from": str(tx.get("from", "")).lower(),
+                    "to": to_addr,
+                    "block_number": int(tx["block_number"]),
+                    "compounder": compounder.lower(),
+                    "min_assets": min_assets,
+                }
             )
-            written += 1
+            written += int(appended)
 
     return 0
 
 
 if __name__ == "__main__":
-    raise SystemExit(main())
+    raise SystemExit(instrument.run(main))
@@ -1,9 +1,33 @@
 import argparse
-import csv
-import json
-import os
-import sys
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from typing import Any, List, Optional
+
+import append_store
+import harvester_abi
+import instrument
+import json_stream
+import run_index
+import warehouse
+
+
+MAX_INDEX_EXTEND_ROWS = 200_000
+
+CALL_FIELDS = [
+    "tx_hash",
+    "timestamp",
+    "block_number",
+    "from",
+    "to",
+    "gas",
+    "gas_price",
+    "selector",
+    "function",
+    "decoded",
+    "target",
+    "arg1",
+    "arg2",
+    "input_len",
+    "input",
+]
 
 
 def _normalize_hex(value: Any) -> str:
@@ -24,80 +48,6 @@ def _normalize_address(value: Any) -> str:
     return value
 
 
-def _decode_words(input_hex: str, selector: str) -> Optional[List[int]]:
-    input_hex = _normalize_hex(input_hex)
-    selector = _normalize_hex(selector)
-    if not input_hex.startswith(selector):
-        return None
-    payload = input_hex[2 + 8 :]
-    if len(payload) % 64 != 0:
-        return None
-    return [int(payload[i : i + 64], 16) for i in range(0, len(payload), 64)]
-
-
-def _word_to_address(word: int) -> str:
-    return "0x" + f"{word:064x}"[-40:]
-
-
-def _decode_harvester_call(
-    input_hex: str,
-) -> Tuple[str, str, str, str, str, bool]:
-    input_hex = _normalize_hex(input_hex)
-    if not input_hex.startswith("0x") or len(input_hex) < 10:
-        return "", "", "", "", "", False
-    selector = input_hex[0:10]
-
-    if selector == "0x04117561":
-        words = _decode_words(input_hex, selector)
-        if words is None or len(words) < 2:
-            return selector, "harvestConcentratorCompounder", "", "", "", False
-        target = _word_to_address(words[0])
-        min_assets = str(words[1])
-        return selector, "harvestConcentratorCompounder", target, min_assets, "", True
-
-    if selector == "0xc7f884c6":
-        words = _decode_words(input_hex, selector)
-        if words is None or len(words) < 3:
-            return selector, "harvestConcentratorVault", "", "", "", False
-        target = _word_to_address(words[0])
-        pid = str(words[1])
-        min_out = str(words[2])
-        return selector, "harvestConcentratorVault", target, pid, min_out, True
-
-    if selector == "0x78f26f5b":
-        words = _decode_words(input_hex, selector)
-        if words is None or len(words) < 3:
-            return selector, "harvestConcentratorCompounderFxUSD", "", "", "", False
-        target = _word_to_address(words[0])
-        min_base_out = str(words[1])
-        min_fxusd_out = str(words[2])
-        return (
-            selector,
-            "harvestConcentratorCompounderFxUSD",
-            target,
-            min_base_out,
-            min_fxusd_out,
-            True,
-        )
-
-    return selector, "", "", "", "", False
-
-
-def _load_seen_hashes(path: str) -> Set[str]:
-    if not os.path.exists(path):
-        return set()
-    seen: Set[str] = set()
-    with open(path, newline="") as f:
-        reader = csv.reader(f)
-        for i, row in enumerate(reader):
-            if i == 0:
-                continue
-            if not row:
-                continue
-            seen.add(row[0].strip().lower())
-    return seen
-
-
 def main() -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument("--out", default="data/f88e_harvester_calls_7d.csv")
@@ -111,48 +61,29 @@ def main() -> int:
         default="0",
         help="Only keep tx.timestamp >= this (unix seconds)",
     )
+    parser.add_argument("--in", dest="in_path", default="-", help="Input JSON/NDJSON (default stdin; .gz ok)")
+    parser.add_argument("--batch-rows", type=int, default=5000, help="Rows buffered per CSV write")
+    parser.add_argument("--db", default="", help="Optional: also write new rows into this warehouse SQLite")
     args = parser.parse_args()
 
     harvester = _normalize_address(args.harvester)
     min_ts = int(args.min_ts)
 
-    payload = json.load(sys.stdin)
-    txs: Sequence[Dict[str, Any]] = payload.get("transactions", [])
+    txs = json_stream.iter_records(json_stream.open_input(args.in_path), "transactions", record_field="hash")
 
     out_path = args.out
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    write_header = not os.path.exists(out_path)
-    seen_hashes = _load_seen_hashes(out_path)
+    on_flush = warehouse.sink(warehouse.connect(args.db), "calls") if args.db else None
+    store = append_store.AppendStore(out_path, CALL_FIELDS, ["tx_hash"], batch_rows=args.batch_rows, on_flush=on_flush)
 
     written = 0
-    with open(out_path, "a", newline="") as f:
-        writer = csv.writer(f)
-        if write_header:
-            writer.writerow(
-                [
-                    "tx_hash",
-                    "timestamp",
-                    "block_number",
-                    "from",
-                    "to",
-                    "gas",
-                    "gas_price",
-                    "selector",
-                    "function",
-                    "decoded",
-                    "target",
-                    "arg1",
-                    "arg2",
-                    "input_len",
-                    "input",
-                ]
-            )
-
+    # Keys for extending the persisted run index; past the cap the index is dropped and rebuilt lazily.
+    appended_keys: Optional[List[run_index.CallKey]] = []
+    with store:
         for tx in txs:
             tx_hash = _normalize_hex(tx.get("hash", ""))
             if not tx_hash:
                 continue
-            if tx_hash in seen_hashes:
+            if store.contains_key(tx_hash):
                 continue
 
             to_addr = _normalize_address(tx.get("to", ""))
@@ -164,34 +95,39 @@ def main() -> int:
                 continue
 
             input_hex = _normalize_hex(tx.get("input", ""))
-            selector, func, target, arg1, arg2, decoded = _decode_harvester_call(
-                input_hex
-            )
-
-            writer.writerow(
-                [
-                    tx_hash,
-                    ts,
-                    int(tx.get("block_number", "0") or "0"),
-                    _normalize_address(tx.get("from", "")),
-                    to_addr,
-                    str(tx.get("gas", "")),
-                    str(tx.get("gas_price", "")),
-                    selector,
-                    func,
-                    "1" if decoded else "0",
-                    target,
-                    arg1,
-                    arg2,
-                    len(input_hex) - 2 if input_hex.startswith("0x") else len(input_hex),
-                    input_hex,
-                ]
+            selector, func, target, arg1, arg2, decoded = harvester_abi.decode_harvester_call(input_hex)
+
+            store.append(
+                {
+                    "tx_hash": tx_hash,
+                    "timestamp": ts,
+                    "block_number": int(tx.get("block_number", "0") or "0"),
+                    "from": _normalize_address(tx.get("from", "")),
+                    "to": to_addr,
+                    "gas": str(tx.get("gas", "")),
+                    "gas_price": str(tx.get("gas_price", "")),
+                    "selector": selector,
+                    "function": func,
+                    "decoded": "1" if decoded else "0",
+                    "target": target,
+                    "arg1": arg1,
+                    "arg2": arg2,
+                    "input_len": len(input_hex) - 2 if input_hex.startswith("0x") else len(input_hex),
+                    "input": input_hex,
+                }
             )
-            seen_hashes.add(tx_hash)
+            if appended_keys is not None:
+                appended_keys.append(run_index.CallKey(ts, tx_hash, f"{selector}:{target}"))
+                if len(appended_keys) > MAX_INDEX_EXTEND_ROWS:
+                    appended_keys = None
             written += 1
 
+    if appended_keys is None:
+        run_index.invalidate(out_path)
+    else:
+        run_index.extend_existing(out_path, appended_keys)
     return 0
 
 
 if __name__ == "__main__":
-    raise SystemExit(main())
+    raise SystemExit(instrument.run(main))
@@ -0,0 +1,305 @@
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set
+
+import instrument
+
+
+# Crash-safe, idempotent CSV appends.
+#
+# Every data CSV keeps a sidecar SQLite key index (<csv>.keys.sqlite) so "have I written this row?"
+# is a point lookup instead of re-reading the whole CSV into a set. Rows are appended in batches:
+#   1. write <csv>.journal with the CSV size before the batch, fsync
+#   2. append the batch to the CSV, fsync
+#   3. insert the batch keys + new CSV size into the index in one SQLite transaction
+#   4. remove the journal
+# On open, a leftover journal means the last batch was interrupted: if the index already records the
+# new CSV size the batch is complete, otherwise the CSV is truncated back to the journal offset, so a
+# crash never leaves partial rows and the re-run appends them again exactly once.
+# The index is rebuilt from the CSV (one linear scan) only when it is missing or out of sync: the
+# index stores a fingerprint of the CSV (size, mtime_ns, inode, hash of the first/last 4 KiB), so a
+# rewrite in place is caught even when it keeps the size. Tools that rewrite a CSV also call
+# invalidate() on it.
+# An existing CSV must carry every key column: a key never narrows silently. Older files are brought
+# up to the current columns once with add_columns().
+
+
+def _fsync_dir(path: str) -> None:
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)) or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _norm_key_part(value: Any) -> str:
+    return str(value if value is not None else "").strip().lower()
+
+
+_EDGE_BYTES = 4096
+
+
+def fingerprint(path: str) -> str:
+    if not os.path.exists(path):
+        return ""
+    st = os.stat(path)
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        h.update(f.read(_EDGE_BYTES))
+        if st.st_size > _EDGE_BYTES:
+            f.seek(max(_EDGE_BYTES, st.st_size - _EDGE_BYTES))
+            h.update(f.read(_EDGE_BYTES))
+    return f"{st.st_size}:{st.st_mtime_ns}:{st.st_ino}:{h.hexdigest()}"
+
+
+def read_header(csv_path: str) -> Optional[List[str]]:
+    if not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0:
+        return None
+    with open(csv_path, newline="") as f:
+        return next(csv.reader(f), None)
+
+
+def invalidate(csv_path: str) -> None:
+    # Drop the key index of a CSV that was rewritten outside AppendStore; the next open rebuilds it.
+    try:
+        os.remove(csv_path + ".keys.sqlite")
+    except FileNotFoundError:
+        pass
+
+
+def add_columns(
+    csv_path: str, fieldnames: Sequence[str], fill: Optional[Callable[[Dict[str, str]], Dict[str, Any]]] = None
+) -> int:
+    # One-time rewrite of an older CSV to `fieldnames` (existing columns first, then the missing ones),
+    # with fill(row) supplying the new values. Returns the number of rows rewritten.
+    with open(csv_path, newline="") as f:
+        reader = csv.DictReader(f)
+        header = list(reader.fieldnames or [])
+        rows = list(reader)
+    header += [k for k in fieldnames if k not in header]
+    tmp = csv_path + ".migrate.tmp"
+    try:
+        with open(tmp, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=header)
+            writer.writeheader()
+            for row in rows:
+                if fill is not None:
+                    row.update(fill(row))
+                writer.writerow({k: row.get(k, "") for k in header})
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        # The original file is untouched until the rewrite is complete.
+        os.remove(tmp)
+        raise
+    os.replace(tmp, csv_path)
+    _fsync_dir(csv_path)
+    invalidate(csv_path)
+    return len(rows)
+
+
+class AppendStore:
+    def __init__(
+        self,
+        csv_path: str,
+        fieldnames: Sequence[str],
+        key_fields: Sequence[str],
+        *,
+        batch_rows: int = 5000,
+        on_flush: Optional[Callable[[List[str], List[List[Any]]], None]] = None,
+    ) -> None:
+        self.csv_path = csv_path
+        self.index_path = csv_path + ".keys.sqlite"
+        self.journal_path = csv_path + ".journal"
+        self.batch_rows = max(1, int(batch_rows))
+        self.on_flush = on_flush
+        os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
+
+        self._recover_journal()
+        existing = read_header(csv_path)
+        # An existing file keeps its own column set, but must have every key column.
+        self.fieldnames: List[str] = existing or list(fieldnames)
+        missing = [k for k in key_fields if k not in self.fieldnames]
+        if missing:
+            raise ValueError(f"{csv_path} has no {missing} column(s); migrate it with append_store.add_columns")
+        self.key_fields: List[str] = list(key_fields)
+        self._key_idx = [self.fieldnames.index(k) for k in self.key_fields]
+
+        self.db = sqlite3.connect(self.index_path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS keys (k TEXT PRIMARY KEY) WITHOUT ROWID")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self.db.commit()
+        self._size = os.path.getsize(csv_path) if os.path.exists(csv_path) else 0
+        if (
+            self._meta("csv_size") != str(self._size)
+            or self._meta("fingerprint") != fingerprint(csv_path)
+            or self._meta("key_fields") != ",".join(self.key_fields)
+        ):
+            self._rebuild_index()
+
+        self._pending: List[List[Any]] = []
+        self._pending_keys: Set[str] = set()
+        self.appended = 0
+
+    # ---- index ----
+
+    def _meta(self, name: str) -> Optional[str]:
+        row = self.db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return None if row is None else str(row[0])
+
+    def _set_meta(self, name: str, value: str) -> None:
+        self.db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def _row_key(self, row: Sequence[Any]) -> str:
+        return "|".join(_norm_key_part(row[i]) if i < len(row) else "" for i in self._key_idx)
+
+    def _rebuild_index(self) -> None:
+        with self.db:
+            self.db.execute("DELETE FROM keys")
+            if os.path.exists(self.csv_path):
+                with open(self.csv_path, newline="") as f:
+                    reader = csv.reader(f)
+                    next(reader, None)
+                    batch: List[tuple] = []
+                    for row in reader:
+                        if not row:
+                            continue
+                        batch.append((self._row_key(row),))
+                        if len(batch) >= 10000:
+                            self.db.executemany("INSERT OR IGNORE INTO keys (k) VALUES (?)", batch)
+                            batch = []
+                    self.db.executemany("INSERT OR IGNORE INTO keys (k) VALUES (?)", batch)
+            self._set_meta("csv_size", str(self._size))
+            self._set_meta("fingerprint", fingerprint(self.csv_path))
+            self._set_meta("key_fields", ",".join(self.key_fields))
+
+    def key_of(self, row: Dict[str, Any]) -> str:
+        return "|".join(_norm_key_part(row.get(k)) for k in self.key_fields)
+
+    def contains_key(self, key: str) -> bool:
+        if key in self._pending_keys:
+            return True
+        return self.db.execute("SELECT 1 FROM keys WHERE k = ?", (key,)).fetchone() is not None
+
+    def contains(self, row: Dict[str, Any]) -> bool:
+        return self.contains_key(self.key_of(row))
+
+    def filter_new_keys(self, keys: Iterable[str]) -> Set[str]:
+        # Batched membership test: returns the subset of `keys` (already in key_of() form) not yet stored.
+        todo = [k for k in dict.fromkeys(keys) if k not in self._pending_keys]
+        known: Set[str] = set()
+        for i in range(0, len(todo), 500):
+            chunk = todo[i : i + 500]
+            q = "SELECT k FROM keys WHERE k IN (" + ",".join("?" * len(chunk)) + ")"
+            known.update(r[0] for r in self.db.execute(q, chunk))
+        instrument.count("append_store.known", len(known))
+        return {k for k in todo if k not in known}
+
+    # ---- journal ----
+
+    def _recover_journal(self) -> None:
+        if not os.path.exists(self.journal_path):
+            return
+        try:
+            with open(self.journal_path) as f:
+                journal = json.load(f)
+            offset = int(journal["offset"])
+        except Exception:
+            # Unreadable journal: the batch never started writing (journal is fsync'd first).
+            os.remove(self.journal_path)
+            return
+        size = os.path.getsize(self.csv_path) if os.path.exists(self.csv_path) else 0
+        committed_size: Optional[str] = None
+        if os.path.exists(self.index_path):
+            db = sqlite3.connect(self.index_path)
+            try:
+                row = db.execute("SELECT value FROM meta WHERE name = 'csv_size'").fetchone()
+                committed_size = None if row is None else str(row[0])
+            except sqlite3.Error:
+                committed_size = None
+            finally:
+                db.close()
+        if committed_size != str(size) and size > offset:
+            with open(self.csv_path, "r+b") as f:
+                f.truncate(offset)
+                f.flush()
+                os.fsync(f.fileno())
+        os.remove(self.journal_path)
+        _fsync_dir(self.journal_path)
+
+    # ---- writes ----
+
+    def append(self, row: Dict[str, Any]) -> bool:
+        key = self.key_of(row)
+        if self.contains_key(key):
+            instrument.count("append_store.duplicates")
+            return False
+        self._pending.append([row.get(k, "") for k in self.fieldnames])
+        self._pending_keys.add(key)
+        if len(self._pending) >= self.batch_rows:
+            self.flush()
+        return True
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        with instrument.span("append_store.flush"):
+            rows = self._commit_pending()
+        if self.on_flush is not None:
+            # Downstream mirrors (e.g. warehouse.sink) only ever see committed batches.
+            self.on_flush(self.fieldnames, rows)
+
+    def _commit_pending(self) -> List[List[Any]]:
+        offset = self._size
+        with open(self.journal_path, "w") as j:
+            json.dump({"offset": offset, "rows": len(self._pending)}, j)
+            j.flush()
+            os.fsync(j.fileno())
+        _fsync_dir(self.journal_path)
+
+        with open(self.csv_path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if offset == 0:
+                writer.writerow(self.fieldnames)
+            writer.writerows(self._pending)
+            f.flush()
+            os.fsync(f.fileno())
+        new_size = os.path.getsize(self.csv_path)
+
+        with self.db:
+            self.db.executemany("INSERT OR IGNORE INTO keys (k) VALUES (?)", [(k,) for k in self._pending_keys])
+            self._set_meta("csv_size", str(new_size))
+            self._set_meta("fingerprint", fingerprint(self.csv_path))
+
+        os.remove(self.journal_path)
+        _fsync_dir(self.journal_path)
+        instrument.count("append_store.rows", len(self._pending))
+        instrument.count("append_store.bytes", new_size - offset)
+        self._size = new_size
+        self.appended += len(self._pending)
+        rows = self._pending
+        self._pending = []
+        self._pending_keys = set()
+        return rows
+
+    def close(self) -> None:
+        self.flush()
+        self.db.close()
+
+    def __enter__(self) -> "AppendStore":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        # Buffered rows are whole rows, so they are flushed even when the caller is interrupted.
+        try:
+            self.flush()
+        finally:
+            self.db.close()
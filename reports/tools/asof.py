@@ -0,0 +1,142 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# Sorted-merge as-of join: for every left timestamp pick one row of a time-sorted right column,
+#   backward  latest right_ts <= t
+#   forward   earliest right_ts >= t
+#   nearest   closest of the two (ties go to the earlier point; outside the range this clamps to
+#             the first/last point, which is what the old per-row _price_at binary searches did)
+# in a single pass over both columns. Left timestamps need not be sorted (they are ordered once
+# up front). Matches further than `tolerance` from t are dropped and counted as stale.
+
+BACKWARD = "backward"
+FORWARD = "forward"
+NEAREST = "nearest"
+DIRECTIONS = (BACKWARD, FORWARD, NEAREST)
+
+# Default for the reports' --max-price-staleness-s: 2x the hourly CoinGecko sampling interval.
+DEFAULT_MAX_PRICE_STALENESS_S = 7200
+
+
+@dataclass(frozen=True)
+class AsofMatch:
+    index: List[int]  # matched right row per left row, -1 if none or stale
+    lag: List[Optional[int]]  # left_ts - right_ts of the candidate (> 0: right is older); None if no candidate
+    n_stale: int  # rows whose candidate was beyond the tolerance
+    n_missing: int  # rows with no candidate in the requested direction (or empty right side)
+    max_lag: int  # largest |lag| among kept matches
+
+    def matched(self, i: int) -> bool:
+        return self.index[i] >= 0
+
+    def stale(self, i: int) -> bool:
+        return self.index[i] < 0 and self.lag[i] is not None
+
+
+def _is_sorted(xs: Sequence[int]) -> bool:
+    return all(xs[i] <= xs[i + 1] for i in range(len(xs) - 1))
+
+
+def asof_indices(
+    left_ts: Sequence[int],
+    right_ts: Sequence[int],
+    *,
+    direction: str = NEAREST,
+    tolerance: Optional[int] = None,
+) -> AsofMatch:
+    if direction not in DIRECTIONS:
+        raise ValueError(f"unknown as-of direction: {direction}")
+    n = len(left_ts)
+    m = len(right_ts)
+    index = [-1] * n
+    lag: List[Optional[int]] = [None] * n
+    if m == 0:
+        return AsofMatch(index=index, lag=lag, n_stale=0, n_missing=n, max_lag=0)
+
+    order = range(n) if _is_sorted(left_ts) else sorted(range(n), key=lambda i: left_ts[i])
+    n_stale = 0
+    n_missing = 0
+    max_lag = 0
+    j = -1  # last right row with right_ts <= t
+    for i in order:
+        t = left_ts[i]
+        while j + 1 < m and right_ts[j + 1] <= t:
+            j += 1
+        if direction == BACKWARD:
+            k = j
+        elif direction == FORWARD:
+            k = j if j >= 0 and right_ts[j] == t else j + 1
+            if k >= m:
+                k = -1
+        else:
+            if j < 0:
+                k = 0
+            elif j + 1 >= m or t - right_ts[j] <= right_ts[j + 1] - t:
+                k = j
+            else:
+                k = j + 1
+        if k < 0:
+            n_missing += 1
+            continue
+        d = t - right_ts[k]
+        lag[i] = d
+        if tolerance is not None and abs(d) > tolerance:
+            n_stale += 1
+            continue
+        index[i] = k
+        if abs(d) > max_lag:
+            max_lag = abs(d)
+    return AsofMatch(index=index, lag=lag, n_stale=n_stale, n_missing=n_missing, max_lag=max_lag)
+
+
+def price_join(
+    series: Sequence[Tuple[int, float]],
+    ts_s: Sequence[int],
+    *,
+    max_staleness_s: Optional[float] = None,
+    direction: str = NEAREST,
+) -> Tuple[List[Optional[float]], AsofMatch]:
+    # `series` is the loaders' [(ts_ms, usd)] sorted by ts_ms; `ts_s` are unix seconds.
+    tol = None if max_staleness_s is None or max_staleness_s <= 0 else int(max_staleness_s * 1000)
+    match = asof_indices([int(t) * 1000 for t in ts_s], [p[0] for p in series], direction=direction, tolerance=tol)
+    return [float(series[k][1]) if k >= 0 else None for k in match.index], match
+
+
+class PriceLookup:
+    # Per-series as-of prices for one fixed set of call timestamps, joined lazily on first use.
+    def __init__(
+        self,
+        prices: Dict[str, Sequence[Tuple[int, float]]],
+        ts_s: Sequence[int],
+        *,
+        max_staleness_s: Optional[float] = None,
+        direction: str = NEAREST,
+    ) -> None:
+        self.prices = prices
+        self.ts_s = list(ts_s)
+        self.max_staleness_s = max_staleness_s
+        self.direction = direction
+        self._joined: Dict[str, Tuple[List[Optional[float]], AsofMatch]] = {}
+        self._stale_hits: Dict[str, int] = {}
+
+    def column(self, key: str) -> List[Optional[float]]:
+        if key not in self._joined:
+            self._joined[key] = price_join(
+                self.prices.get(key, []), self.ts_s, max_staleness_s=self.max_staleness_s, direction=self.direction
+            )
+        return self._joined[key][0]
+
+    def at(self, key: str, i: int) -> Optional[float]:
+        # Stale drops are counted per lookup, so reports only see rows that actually needed a price.
+        value = self.column(key)[i]
+        if value is None and self._joined[key][1].stale(i):
+            self._stale_hits[key] = self._stale_hits.get(key, 0) + 1
+        return value
+
+    @property
+    def n_stale(self) -> int:
+        return sum(self._stale_hits.values())
+
+    def stale_by_series(self) -> List[Tuple[str, int]]:
+        return sorted(self._stale_hits.items())
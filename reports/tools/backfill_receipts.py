@@ -0,0 +1,453 @@
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+import append_store
+import harvester_abi
+import instrument
+import warehouse
+
+
+# Full receipt backfill: fetch the receipt of every harvester call (not a sample) with a small
+# thread pool under one shared request rate, and decode Harvest / DepositReward / Transfer logs in
+# the same pass. One run fills three append stores:
+#   receipts      (same columns as fetch_receipts_sample.py)  exact gas_used / fee for every call
+#   harvest logs  (same columns as append_asdpendle_harvest_logs.py), emitter == --harvest-emitter
+#   receipt logs  every decoded log: tx_hash, log_index, address, event, args (JSON)
+# Receipts are consumed in call order, so the CSVs are deterministic regardless of thread timing.
+# A harvest logs CSV from before the log_index column (one row per tx, keyed by tx_hash) is migrated
+# once first: each row's log_index is read from its tx receipt, so the (tx_hash, log_index) key holds.
+
+VAULT_SEL = "0xc7f884c6"
+ASDPENDLE_ADDR = "0x606462126e4bd5c4d153fe09967e4c46c9c7fecf"
+
+RECEIPT_FIELDS = [
+    "tx_hash",
+    "timestamp",
+    "selector",
+    "target",
+    "subkey",
+    "arg1",
+    "arg2",
+    "tx_gas_price",
+    "receipt_status",
+    "gas_used",
+    "effective_gas_price",
+    "fee_wei",
+]
+
+HARVEST_LOG_FIELDS = [
+    "tx_hash",
+    "block_number",
+    "time_stamp",
+    "caller",
+    "receiver",
+    "assets",
+    "performance_fee",
+    "harvester_bounty",
+    "log_index",
+]
+
+RECEIPT_LOG_FIELDS = ["tx_hash", "log_index", "block_number", "timestamp", "address", "event", "args"]
+
+
+@dataclass(frozen=True)
+class CallRow:
+    tx_hash: str
+    timestamp: int
+    selector: str
+    target: str
+    arg1: str
+    arg2: str
+    gas_price: int
+
+
+def _normalize_hex(value: Any) -> str:
+    if not isinstance(value, str):
+        return ""
+    value = value.strip().lower()
+    if not value:
+        return ""
+    if not value.startswith("0x"):
+        value = "0x" + value
+    return value
+
+
+def _hex_to_int(value: Any) -> Optional[int]:
+    if not isinstance(value, str):
+        return None
+    value = value.strip().lower()
+    if not value:
+        return None
+    if value.startswith("0x"):
+        return int(value, 16)
+    if value.isdigit():
+        return int(value, 10)
+    return None
+
+
+def _load_etherscan_api_key() -> str:
+    import tomllib
+
+    config_path = os.path.expanduser("~/.codex/config.toml")
+    with open(config_path, "rb") as f:
+        cfg = tomllib.load(f)
+
+    mcp_servers = cfg.get("mcp_servers", {})
+    if not isinstance(mcp_servers, dict):
+        raise RuntimeError("unexpected ~/.codex/config.toml schema (mcp_servers)")
+
+    server = mcp_servers.get("etherscan-mcp", {})
+    if not isinstance(server, dict):
+        raise RuntimeError("missing mcp_servers.etherscan-mcp in ~/.codex/config.toml")
+
+    env = server.get("env", {})
+    if not isinstance(env, dict):
+        raise RuntimeError("unexpected ~/.codex/config.toml schema (env)")
+
+    key = env.get("ETHERSCAN_API_KEY")
+    if not isinstance(key, str) or not key.strip():
+        raise RuntimeError(
+            "ETHERSCAN_API_KEY not found in ~/.codex/config.toml (mcp_servers.etherscan-mcp.env)"
+        )
+
+    return key.strip()
+
+
+def _is_rate_limited(payload: Any) -> bool:
+    if not isinstance(payload, dict):
+        return False
+    candidates: List[str] = []
+    for k in ("message", "result"):
+        v = payload.get(k)
+        if isinstance(v, str) and v:
+            candidates.append(v)
+    err = payload.get("error")
+    if isinstance(err, dict):
+        v = err.get("message")
+        if isinstance(v, str) and v:
+            candidates.append(v)
+    hay = " ".join(candidates).lower()
+    return (
+        "rate limit" in hay
+        or "max calls per sec" in hay
+        or "too many requests" in hay
+        or "request limit reached" in hay
+    )
+
+
+class _RateLimiter:
+    # Shared across worker threads: requests are spaced 1/rps apart globally.
+    def __init__(self, rps: float) -> None:
+        self.interval = 1.0 / rps if rps > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_at = 0.0
+
+    def wait(self) -> None:
+        if self.interval <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            at = max(now, self.next_at)
+            self.next_at = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+_local = threading.local()
+
+
+def _session(api_key: str) -> requests.Session:
+    # requests.Session is not shared between threads; one per worker.
+    s = getattr(_local, "session", None)
+    if s is None:
+        s = requests.Session()
+        s.headers.update({"X-API-Key": api_key})
+        _local.session = s
+    return s
+
+
+def _etherscan_request(
+    *,
+    limiter: _RateLimiter,
+    base_url: str,
+    api_key: str,
+    chain_id: str,
+    params: Dict[str, Any],
+    timeout_s: int = 20,
+    max_retries: int = 8,
+    backoff_s: float = 0.9,
+) -> Dict[str, Any]:
+    merged = dict(params)
+    merged["chainid"] = chain_id
+    merged["apikey"] = api_key
+
+    last_exc: Optional[Exception] = None
+    for attempt in range(1, max_retries + 1):
+        try:
+            limiter.wait()
+            with instrument.span("etherscan.get"):
+                resp = _session(api_key).get(base_url, params=merged, timeout=timeout_s)
+            instrument.count("etherscan.requests")
+            instrument.count("etherscan.bytes", len(resp.content or b""))
+            resp.raise_for_status()
+            payload = resp.json()
+            if _is_rate_limited(payload) and attempt < max_retries:
+                instrument.count("etherscan.rate_limited")
+                instrument.count("etherscan.retries")
+                time.sleep(backoff_s * attempt)
+                continue
+            if not isinstance(payload, dict):
+                raise RuntimeError("unexpected response type")
+            return payload
+        except Exception as exc:
+            last_exc = exc
+            if attempt < max_retries:
+                instrument.count("etherscan.retries")
+                time.sleep(backoff_s * attempt)
+                continue
+            raise RuntimeError("Etherscan request failed") from exc
+
+    raise RuntimeError("Etherscan request failed") from last_exc
+
+
+def _read_calls(path: str) -> List[CallRow]:
+    out: List[CallRow] = []
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            out.append(
+                CallRow(
+                    tx_hash=_normalize_hex(row.get("tx_hash", "")),
+                    timestamp=int(row.get("timestamp") or "0"),
+                    selector=str(row.get("selector", "")).lower(),
+                    target=str(row.get("target", "")).lower(),
+                    arg1=str(row.get("arg1", "")),
+                    arg2=str(row.get("arg2", "")),
+                    gas_price=int(row.get("gas_price") or "0"),
+                )
+            )
+    out.sort(key=lambda r: (r.timestamp, r.tx_hash))
+    return out
+
+
+def _json_arg(value: Any) -> Any:
+    # uint256 values overflow JSON number precision in most readers; keep them as decimal strings.
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, bytes):
+        return "0x" + value.hex()
+    return value
+
+
+def _decode_receipt(
+    call: CallRow,
+    receipt: Dict[str, Any],
+    harvest_emitter: str,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]]]:
+    gas_used = _hex_to_int(receipt.get("gasUsed"))
+    eff_gp = _hex_to_int(receipt.get("effectiveGasPrice"))
+    status = _hex_to_int(receipt.get("status"))
+    fee_wei = gas_used * eff_gp if gas_used is not None and eff_gp is not None else None
+    subkey = (call.arg1 or "") if call.selector == VAULT_SEL else ""
+    receipt_row = {
+        "tx_hash": call.tx_hash,
+        "timestamp": call.timestamp,
+        "selector": call.selector,
+        "target": call.target,
+        "subkey": subkey,
+        "arg1": call.arg1,
+        "arg2": call.arg2,
+        "tx_gas_price": call.gas_price,
+        "receipt_status": status if status is not None else "",
+        "gas_used": gas_used if gas_used is not None else "",
+        "effective_gas_price": eff_gp if eff_gp is not None else "",
+        "fee_wei": fee_wei if fee_wei is not None else "",
+    }
+
+    block_number = _hex_to_int(receipt.get("blockNumber")) or 0
+    harvest_rows: List[Dict[str, Any]] = []
+    log_rows: List[Dict[str, Any]] = []
+    for log in receipt.get("logs") or []:
+        if not isinstance(log, dict):
+            continue
+        decoded = harvester_abi.decode_log(log.get("topics") or [], log.get("data") or "0x")
+        if decoded is None:
+            continue
+        ev, args = decoded
+        address = _normalize_hex(log.get("address", ""))
+        log_index = _hex_to_int(log.get("logIndex"))
+        if log_index is None:
+            # (tx_hash, log_index) keys the log stores; a log without its index cannot be stored.
+            raise RuntimeError(f"receipt of {call.tx_hash} has a log without logIndex")
+        log_rows.append(
+            {
+                "tx_hash": call.tx_hash,
+                "log_index": log_index,
+                "block_number": block_number,
+                "timestamp": call.timestamp,
+                "address": address,
+                "event": ev.name,
+                "args": json.dumps({k: _json_arg(v) for k, v in args.items()}, sort_keys=True),
+            }
+        )
+        if ev is harvester_abi.HARVEST_EVENT and address == harvest_emitter:
+            harvest_rows.append(
+                {
+                    "tx_hash": call.tx_hash,
+                    "block_number": block_number,
+                    "time_stamp": call.timestamp,
+                    "caller": args["caller"],
+                    "receiver": args["receiver"],
+                    "assets": args["assets"],
+                    "performance_fee": args["performanceFee"],
+                    "harvester_bounty": args["harvesterBounty"],
+                    "log_index": log_index,
+                }
+            )
+    return receipt_row, harvest_rows, log_rows
+
+
+def _migrate_harvest_logs(
+    path: str, fetch: Callable[[str], Optional[Dict[str, Any]]], harvest_emitter: str
+) -> int:
+    def fill(row: Dict[str, str]) -> Dict[str, Any]:
+        tx_hash = _normalize_hex(row.get("tx_hash", ""))
+        receipt = fetch(tx_hash)
+        for log in (receipt or {}).get("logs") or []:
+            if not isinstance(log, dict) or _normalize_hex(log.get("address", "")) != harvest_emitter:
+                continue
+            decoded = harvester_abi.decode_log(log.get("topics") or [], log.get("data") or "0x")
+            if decoded is None or decoded[0] is not harvester_abi.HARVEST_EVENT:
+                continue
+            log_index = _hex_to_int(log.get("logIndex"))
+            if log_index is not None and str(decoded[1]["assets"]) == str(row.get("assets", "")).strip():
+                return {"log_index": log_index}
+        raise SystemExit(f"{path}: cannot backfill log_index for {tx_hash} (no matching Harvest log in its receipt)")
+
+    return append_store.add_columns(path, HARVEST_LOG_FIELDS, fill)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls-csv", default="data/f88e_harvester_calls_7d.csv")
+    parser.add_argument("--receipts-out", default="data/f88e_harvester_receipts_full.csv")
+    parser.add_argument("--harvest-logs-out", default="data/asdpendle_harvest_logs.csv")
+    parser.add_argument("--logs-out", default="data/f88e_harvester_receipt_logs.csv")
+    parser.add_argument("--harvest-emitter", default=ASDPENDLE_ADDR, help="Only Harvest logs from this contract")
+    parser.add_argument("--selector", default="", help="Optional: only calls with this selector")
+    parser.add_argument("--target", default="", help="Optional: only calls to this target")
+    parser.add_argument("--limit", type=int, default=0, help="Max receipts fetched this run (0 = all missing)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rps", type=float, default=4.0, help="Shared request rate across workers")
+    parser.add_argument("--chain-id", default="1")
+    parser.add_argument("--base-url", default="https://api.etherscan.io/v2/api")
+    parser.add_argument("--batch-rows", type=int, default=200, help="Rows buffered per CSV write")
+    parser.add_argument("--db", default="", help="Optional: also write new rows into this warehouse SQLite")
+    args = parser.parse_args()
+    instrument.phase("load")
+
+    api_key = _load_etherscan_api_key()
+    base_url = str(args.base_url).rstrip("/")
+    chain_id = str(args.chain_id)
+    harvest_emitter = _normalize_hex(args.harvest_emitter)
+    limiter = _RateLimiter(float(args.rps))
+
+    calls = _read_calls(args.calls_csv)
+    if args.selector:
+        calls = [c for c in calls if c.selector == _normalize_hex(args.selector)]
+    if args.target:
+        calls = [c for c in calls if c.target == _normalize_hex(args.target)]
+
+    def fetch_receipt(tx_hash: str) -> Optional[Dict[str, Any]]:
+        payload = _etherscan_request(
+            limiter=limiter,
+            base_url=base_url,
+            api_key=api_key,
+            chain_id=chain_id,
+            params={"module": "proxy", "action": "eth_getTransactionReceipt", "txhash": tx_hash},
+        )
+        receipt = payload.get("result")
+        return receipt if isinstance(receipt, dict) else None
+
+    if "log_index" not in (append_store.read_header(args.harvest_logs_out) or ["log_index"]):
+        n = _migrate_harvest_logs(args.harvest_logs_out, fetch_receipt, harvest_emitter)
+        print(f"{args.harvest_logs_out}: added log_index to {n} row(s)")
+
+    conn = warehouse.connect(args.db) if args.db else None
+    receipts = append_store.AppendStore(
+        args.receipts_out,
+        RECEIPT_FIELDS,
+        ["tx_hash"],
+        batch_rows=args.batch_rows,
+        on_flush=warehouse.sink(conn, "receipts") if conn else None,
+    )
+    harvest_logs = append_store.AppendStore(
+        args.harvest_logs_out,
+        HARVEST_LOG_FIELDS,
+        ["tx_hash", "log_index"],
+        batch_rows=args.batch_rows,
+        on_flush=warehouse.sink(conn, "harvest_logs") if conn else None,
+    )
+    receipt_logs = append_store.AppendStore(
+        args.logs_out,
+        RECEIPT_LOG_FIELDS,
+        ["tx_hash", "log_index"],
+        batch_rows=args.batch_rows,
+        on_flush=warehouse.sink(conn, "receipt_logs") if conn else None,
+    )
+
+    new_hashes = receipts.filter_new_keys(c.tx_hash for c in calls if c.tx_hash)
+    todo = [c for c in calls if c.tx_hash in new_hashes]
+    if args.limit and args.limit > 0:
+        todo = todo[: int(args.limit)]
+
+    def fetch(call: CallRow) -> Optional[Dict[str, Any]]:
+        return fetch_receipt(call.tx_hash)
+
+    fetched = 0
+    missing = 0
+    n_harvest = 0
+    n_logs = 0
+    chunk = max(1, int(args.workers)) * 16
+    instrument.phase("fetch")
+    with receipts, harvest_logs, receipt_logs, ThreadPoolExecutor(max_workers=max(1, int(args.workers))) as ex:
+        for start in range(0, len(todo), chunk):
+            part = todo[start : start + chunk]
+            # map() yields in submission order: rows land in call order whatever finishes first.
+            for call, receipt in zip(part, ex.map(fetch, part)):
+                if receipt is None:
+                    missing += 1
+                    continue
+                receipt_row, harvest_rows, log_rows = _decode_receipt(call, receipt, harvest_emitter)
+                # Logs first: a receipt row marks the tx as done for the next run.
+                for row in log_rows:
+                    n_logs += int(receipt_logs.append(row))
+                for row in harvest_rows:
+                    n_harvest += int(harvest_logs.append(row))
+                receipts.append(receipt_row)
+                fetched += 1
+            # Keep the three files in step at chunk boundaries.
+            receipt_logs.flush()
+            harvest_logs.flush()
+            receipts.flush()
+
+    print(
+        f"receipts: +{fetched} (missing={missing}, already stored={len(calls) - len(new_hashes)}), "
+        f"harvest logs: +{n_harvest}, decoded logs: +{n_logs}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(instrument.run(main))
@@ -5,7 +5,13 @@ import os
 from collections import deque
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+from functools import cached_property
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import asof
+import instrument
+import quantile_sketch
+import report_sections
 
 
 COMPOUNDER_SEL = "0x04117561"
@@ -17,6 +23,7 @@ SDPENDLE_ADDR = "0x5ea630e00d6ee438d3dea1556a110359acdc10a9"
 class CallRow:
     tx_hash: str
     timestamp: int
+    block_number: int
     selector: str
     target: str
     gas_price: int
@@ -31,6 +38,13 @@ class HarvestRow:
     bounty_wei: int
 
 
+@dataclass(frozen=True)
+class TriggerResult:
+    intervals: int
+    missed_intervals: int
+    delays_s: List[int]
+
+
 @dataclass(frozen=True)
 class ConfigRow:
     selector: str
@@ -38,6 +52,9 @@ class ConfigRow:
     gas_used_p50: int
     m_token_per_eth_p50: float
     k_token_per_wei_p50: float
+    k_fit_intercept_token: float = 0.0
+    k_fit_slope_token_per_wei: float = 0.0
+    k_fit_model: str = ""
 
 
 def _normalize_hex(value: Any) -> str:
@@ -51,23 +68,6 @@ def _normalize_hex(value: Any) -> str:
     return v
 
 
-def _pct(sorted_values: Sequence[float], p: float) -> float:
-    if not sorted_values:
-        raise ValueError("empty data")
-    if p <= 0:
-        return float(sorted_values[0])
-    if p >= 100:
-        return float(sorted_values[-1])
-    k = (len(sorted_values) - 1) * (p / 100.0)
-    f = int(k)
-    c = min(f + 1, len(sorted_values) - 1)
-    if f == c:
-        return float(sorted_values[f])
-    d0 = float(sorted_values[f]) * (c - k)
-    d1 = float(sorted_values[c]) * (k - f)
-    return d0 + d1
-
-
 def _load_calls(path: str) -> List[CallRow]:
     out: List[CallRow] = []
     with open(path, newline="") as f:
@@ -77,6 +77,7 @@ def _load_calls(path: str) -> List[CallRow]:
                 CallRow(
                     tx_hash=_normalize_hex(row.get("tx_hash", "")),
                     timestamp=int(row.get("timestamp") or "0"),
+                    block_number=int(row.get("block_number") or "0"),
                     selector=_normalize_hex(row.get("selector", "")),
                     target=_normalize_hex(row.get("target", "")),
                     gas_price=int(row.get("gas_price") or "0"),
@@ -112,22 +113,74 @@ def _load_harvest_logs(path: str) -> List[HarvestRow]:
     return out
 
 
+def _config_asdpendle_from_rows(rows: Iterable[Dict[str, Any]], source: str) -> ConfigRow:
+    for row in rows:
+        sel = _normalize_hex(row.get("selector", ""))
+        tgt = _normalize_hex(row.get("target", ""))
+        if sel != COMPOUNDER_SEL or tgt != ASDPENDLE_TARGET:
+            continue
+        return ConfigRow(
+            selector=sel,
+            target=tgt,
+            gas_used_p50=int(float(row.get("gas_used_p50") or "0")),
+            m_token_per_eth_p50=float(row.get("m_token_per_eth_p50") or "0"),
+            k_token_per_wei_p50=float(row.get("k_token_per_wei_p50") or "0"),
+            k_fit_intercept_token=float(row.get("k_fit_intercept_token") or "0"),
+            k_fit_slope_token_per_wei=float(row.get("k_fit_slope_token_per_wei") or "0"),
+            k_fit_model=(row.get("k_fit_model") or "").strip(),
+        )
+    raise RuntimeError(f"asdPENDLE row not found in config: {source}")
+
+
 def _load_config_asdpendle(path: str) -> ConfigRow:
     with open(path, newline="") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            sel = _normalize_hex(row.get("selector", ""))
-            tgt = _normalize_hex(row.get("target", ""))
-            if sel != COMPOUNDER_SEL or tgt != ASDPENDLE_TARGET:
-                continue
-            return ConfigRow(
-                selector=sel,
-                target=tgt,
-                gas_used_p50=int(float(row.get("gas_used_p50") or "0")),
-                m_token_per_eth_p50=float(row.get("m_token_per_eth_p50") or "0"),
-                k_token_per_wei_p50=float(row.get("k_token_per_wei_p50") or "0"),
-            )
-    raise RuntimeError(f"asdPENDLE row not found in config csv: {path}")
+        return _config_asdpendle_from_rows(csv.DictReader(f), path)
+
+
+def _load_from_warehouse(
+    db_path: str,
+) -> Tuple[List[CallRow], List[HarvestRow], ConfigRow, Dict[str, List[Tuple[int, float]]], List[HarvestRow]]:
+    # Same datasets as the CSV/JSON loaders, read from warehouse.py tables. The asdPENDLE
+    # call <-> Harvest log match runs as an indexed join instead of a tx_hash dict.
+    import warehouse
+
+    conn = warehouse.connect(db_path)
+    calls = [
+        CallRow(
+            tx_hash=_normalize_hex(r["tx_hash"] or ""),
+            timestamp=int(r["timestamp"] or 0),
+            block_number=int(r["block_number"] or 0),
+            selector=_normalize_hex(r["selector"] or ""),
+            target=_normalize_hex(r["target"] or ""),
+            gas_price=int(r["gas_price"] or 0),
+            arg1=str(r["arg1"] or ""),
+        )
+        for r in warehouse.calls(conn)
+    ]
+    harvest_logs = [
+        HarvestRow(
+            tx_hash=_normalize_hex(r["tx_hash"] or ""),
+            timestamp=int(r["time_stamp"] or 0),
+            assets_wei=int(r["assets"] or 0),
+            bounty_wei=int(r["harvester_bounty"] or 0),
+        )
+        for r in warehouse.harvest_logs(conn)
+    ]
+    matched: Dict[str, HarvestRow] = {}
+    for r in warehouse.calls_with_harvest_logs(conn, selector=COMPOUNDER_SEL, target=ASDPENDLE_TARGET):
+        if int(r["gas_price"] or 0) <= 0:
+            continue
+        matched[r["tx_hash"]] = HarvestRow(
+            tx_hash=r["tx_hash"],
+            timestamp=int(r["time_stamp"] or 0),
+            assets_wei=int(r["assets"] or 0),
+            bounty_wei=int(r["harvester_bounty"] or 0),
+        )
+    asd_harvests = sorted(matched.values(), key=lambda h: (h.timestamp, h.tx_hash))
+    cfg = _config_asdpendle_from_rows(warehouse.config_rows(conn), db_path)
+    prices = warehouse.price_series(conn)
+    conn.close()
+    return calls, harvest_logs, cfg, prices, asd_harvests
 
 
 def _load_prices(path: str) -> Dict[str, List[Tuple[int, float]]]:
@@ -177,27 +230,9 @@ def _load_prices(path: str) -> Dict[str, List[Tuple[int, float]]]:
     return out
 
 
-def _price_at(series: Sequence[Tuple[int, float]], ts_s: int) -> Optional[float]:
-    if not series:
-        return None
-    ts_ms = int(ts_s) * 1000
-    if ts_ms <= series[0][0]:
-        return float(series[0][1])
-    if ts_ms >= series[-1][0]:
-        return float(series[-1][1])
-    lo = 0
-    hi = len(series) - 1
-    while lo + 1 < hi:
-        mid = (lo + hi) // 2
-        if series[mid][0] == ts_ms:
-            return float(series[mid][1])
-        if series[mid][0] < ts_ms:
-            lo = mid
-        else:
-            hi = mid
-    if abs(series[lo][0] - ts_ms) <= abs(series[hi][0] - ts_ms):
-        return float(series[lo][1])
-    return float(series[hi][1])
+def _q(args: argparse.Namespace, xs: Iterable[float]) -> quantile_sketch.Quantiles:
+    # --quantiles: sorted samples (exact, the default) or a DDSketch.
+    return quantile_sketch.summarize(xs, args.sketch_accuracy if args.quantiles == "sketch" else None)
 
 
 def _fmt_ts(ts: int, tz: timezone) -> str:
@@ -211,6 +246,13 @@ def _pred_min_assets_wei(k_token_per_wei: float, gas_price_wei: int) -> int:
     return int(round(k_token_per_wei * float(gas_price_wei) * 1e18))
 
 
+def _pred_min_assets_wei_fit(intercept_token: float, slope_token_per_wei: float, gas_price_wei: int) -> int:
+    if slope_token_per_wei <= 0 or gas_price_wei <= 0:
+        return 0
+    # Robust fit from threshold_fit.py: minAssets ≈ a + b * gas_price.
+    return max(0, int(round((intercept_token + slope_token_per_wei * float(gas_price_wei)) * 1e18)))
+
+
 def _median(xs: Sequence[float]) -> float:
     if not xs:
         raise ValueError("empty data")
@@ -222,62 +264,21 @@ def _median(xs: Sequence[float]) -> float:
     return float(ys[mid - 1] + ys[mid]) / 2.0
 
 
-def main() -> int:
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--calls-csv", default="data/f88e_harvester_calls_7d.csv")
-    parser.add_argument("--harvest-logs", default="data/asdpendle_harvest_logs.csv")
-    parser.add_argument("--config-csv", default="data/f88e_harvester_bot_config_estimates.csv")
-    parser.add_argument("--prices-json", default="data/coingecko_prices_7d.json")
-    parser.add_argument("--out-md", default="asdpendle/harvester-bot-backtest.md")
-    parser.add_argument("--rate-window", type=int, default=5, help="Rolling median window for assets/sec")
-    parser.add_argument("--warmup-intervals", type=int, default=5, help="How many pre-window intervals to warm start")
-    args = parser.parse_args()
-
-    tz_bj = timezone(timedelta(hours=8))
-
-    calls = _load_calls(args.calls_csv)
-    if not calls:
-        raise SystemExit("empty calls csv")
-    cfg = _load_config_asdpendle(args.config_csv)
-    prices = _load_prices(args.prices_json)
-    harvest_logs = _load_harvest_logs(args.harvest_logs)
-
-    start_ts = min(c.timestamp for c in calls)
-    end_ts = max(c.timestamp for c in calls)
-
-    # asdPENDLE calls (ground truth of actual executions)
-    asd_calls = [
-        c for c in calls if c.selector == COMPOUNDER_SEL and c.target == ASDPENDLE_TARGET and c.gas_price > 0
-    ]
-    if not asd_calls:
-        raise SystemExit("no asdPENDLE calls found in calls csv")
-
-    harvest_by_tx: Dict[str, HarvestRow] = {h.tx_hash: h for h in harvest_logs}
-    asd_harvests: List[HarvestRow] = []
-    for c in asd_calls:
-        h = harvest_by_tx.get(c.tx_hash)
-        if h:
-            asd_harvests.append(h)
-    asd_harvests.sort(key=lambda r: (r.timestamp, r.tx_hash))
-
-    # ---- 1) Replay minAssets formula using config k ----
-    min_assets_err_abs: List[float] = []
-    min_assets_err_bps: List[float] = []
-    matched_min_assets = 0
-    for c in asd_calls:
-        try:
-            min_assets = int(c.arg1)
-        except ValueError:
-            continue
-        pred = _pred_min_assets_wei(cfg.k_token_per_wei_p50, c.gas_price)
-        if pred <= 0 or min_assets <= 0:
-            continue
-        matched_min_assets += 1
-        diff = float(abs(pred - min_assets)) / 1e18
-        min_assets_err_abs.append(diff)
-        min_assets_err_bps.append(float(abs(pred - min_assets)) / float(min_assets) * 10000.0)
-
-    # ---- 2) Trigger backtest (approx): rolling assets/sec + scan at bot tx timestamps ----
+def _trigger_backtest(
+    calls: Sequence[CallRow],
+    gas_prices: Sequence[int],
+    *,
+    asd_calls: Sequence[CallRow],
+    asd_harvests: Sequence[HarvestRow],
+    harvest_logs: Sequence[HarvestRow],
+    k_token_per_wei: float,
+    intercept_token: float = 0.0,
+    start_ts: int,
+    end_ts: int,
+    rate_window_n: int,
+    warmup_intervals: int,
+) -> TriggerResult:
+    # `gas_prices` is aligned with `calls`: observed tx gas, or one synthetic gas path sampled at the call blocks.
     # Warm start rates using pre-window harvest intervals.
     pre_harvests = [h for h in harvest_logs if h.timestamp < start_ts]
     pre_harvests.sort(key=lambda r: (r.timestamp, r.tx_hash))
@@ -287,37 +288,42 @@ def main() -> int:
         if dt <= 0:
             continue
         warm_rates.append(float(pre_harvests[i].assets_wei) / 1e18 / float(dt))
-    warm_rates = warm_rates[-max(0, int(args.warmup_intervals)) :]
+    warm_rates = warm_rates[-max(0, warmup_intervals) :]
 
-    rate_window: Deque[float] = deque(warm_rates, maxlen=max(1, int(args.rate_window)))
+    rate_window: Deque[float] = deque(warm_rates, maxlen=max(1, rate_window_n))
 
     # Iterate scan points (all bot txs) and find, for each actual interval, the first time condition becomes true.
     asd_call_set = {c.tx_hash for c in asd_calls}
-    asd_harvest_by_ts: Dict[int, HarvestRow] = {h.timestamp: h for h in asd_harvests}
     last_harvest_ts: Optional[int] = None
-    last_harvest_assets_wei: Optional[int] = None
     predicted_trigger_ts: Optional[int] = None
     delays_s: List[int] = []
     missed_intervals = 0
     intervals = 0
 
-    for c in calls:
+    harvest_by_tx: Dict[str, HarvestRow] = {h.tx_hash: h for h in harvest_logs}
+    # Most recent actual harvest <= each scan time, one merge pass (asd_harvests is time-sorted).
+    prev_harvest = asof.asof_indices(
+        [c.timestamp for c in calls], [h.timestamp for h in asd_harvests], direction=asof.BACKWARD
+    )
+    for i, (c, gas_price) in enumerate(zip(calls, gas_prices)):
         ts = c.timestamp
         if ts < start_ts or ts > end_ts:
             continue
         if last_harvest_ts is None:
             # Initialize last_harvest_ts to the most recent actual harvest <= current scan time, if any.
             # This avoids inventing a "reset to 0" before we have a known harvest.
-            candidates = [h.timestamp for h in asd_harvests if h.timestamp <= ts]
-            if candidates:
-                last_harvest_ts = max(candidates)
-                last_harvest_assets_wei = asd_harvest_by_ts.get(last_harvest_ts).assets_wei  # type: ignore[union-attr]
+            k = prev_harvest.index[i]
+            if k >= 0:
+                last_harvest_ts = asd_harvests[k].timestamp
                 predicted_trigger_ts = None
             else:
                 continue
 
-        # Current threshold based on gas price (k * gas_price).
-        threshold_wei = _pred_min_assets_wei(cfg.k_token_per_wei_p50, c.gas_price)
+        # Current threshold based on gas price (k * gas_price, or a + b * gas_price for the fitted model).
+        if intercept_token:
+            threshold_wei = _pred_min_assets_wei_fit(intercept_token, k_token_per_wei, gas_price)
+        else:
+            threshold_wei = _pred_min_assets_wei(k_token_per_wei, gas_price)
         dt_since = ts - last_harvest_ts
         rate_est = _median(list(rate_window)) if rate_window else 0.0
         expected_wei_est = int(round(rate_est * float(max(0, dt_since)) * 1e18))
@@ -340,10 +346,408 @@ def main() -> int:
                 if dt > 0:
                     rate_window.append(float(h.assets_wei) / 1e18 / float(dt))
                 last_harvest_ts = ts
-                last_harvest_assets_wei = h.assets_wei
                 predicted_trigger_ts = None
 
+    return TriggerResult(intervals=intervals, missed_intervals=missed_intervals, delays_s=delays_s)
+
+
+class _Inputs:
+    # Datasets the sections read, loaded on first use (from the files, or from --db).
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+
+    @cached_property
+    def loaded(
+        self,
+    ) -> Tuple[List[CallRow], List[HarvestRow], ConfigRow, Dict[str, List[Tuple[int, float]]], Optional[List[HarvestRow]]]:
+        args = self.args
+        if args.db:
+            calls, harvest_logs, cfg, prices, db_harvests = _load_from_warehouse(args.db)
+        else:
+            calls = _load_calls(args.calls_csv)
+            cfg = _load_config_asdpendle(args.config_csv)
+            prices = _load_prices(args.prices_json)
+            harvest_logs = _load_harvest_logs(args.harvest_logs)
+            db_harvests = None
+        if not calls:
+            raise SystemExit("empty calls csv")
+        return calls, harvest_logs, cfg, prices, db_harvests
+
+    @property
+    def calls(self) -> List[CallRow]:
+        return self.loaded[0]
+
+    @property
+    def harvest_logs(self) -> List[HarvestRow]:
+        return self.loaded[1]
+
+    @property
+    def cfg(self) -> ConfigRow:
+        return self.loaded[2]
+
+    @property
+    def prices(self) -> Dict[str, List[Tuple[int, float]]]:
+        return self.loaded[3]
+
+    @cached_property
+    def window(self) -> Tuple[int, int]:
+        return min(c.timestamp for c in self.calls), max(c.timestamp for c in self.calls)
+
+    @cached_property
+    def trigger_threshold(self) -> Tuple[float, float]:
+        # (k or slope, intercept) for the trigger threshold model.
+        cfg = self.cfg
+        if self.args.threshold_model == "fit" and not cfg.k_fit_model:
+            raise SystemExit("config csv has no k_fit_* columns; rerun build_harvester_bot_config.py")
+        # The builder keeps p50 for a job whose fit did not beat it.
+        if self.args.threshold_model == "fit" and cfg.k_fit_model == "fit":
+            return cfg.k_fit_slope_token_per_wei, cfg.k_fit_intercept_token
+        return cfg.k_token_per_wei_p50, 0.0
+
+    @cached_property
+    def asd_calls(self) -> List[CallRow]:
+        # asdPENDLE calls (ground truth of actual executions)
+        asd_calls = [
+            c for c in self.calls if c.selector == COMPOUNDER_SEL and c.target == ASDPENDLE_TARGET and c.gas_price > 0
+        ]
+        if not asd_calls:
+            raise SystemExit("no asdPENDLE calls found in calls csv")
+        return asd_calls
+
+    @cached_property
+    def harvest_by_tx(self) -> Dict[str, HarvestRow]:
+        return {h.tx_hash: h for h in self.harvest_logs}
+
+    @cached_property
+    def asd_harvests(self) -> List[HarvestRow]:
+        db_harvests = self.loaded[4]
+        if db_harvests is not None:
+            return db_harvests
+        asd_harvests = []
+        for c in self.asd_calls:
+            h = self.harvest_by_tx.get(c.tx_hash)
+            if h:
+                asd_harvests.append(h)
+        asd_harvests.sort(key=lambda r: (r.timestamp, r.tx_hash))
+        return asd_harvests
+
+    def trigger_backtest(self, gas_prices: Sequence[int]) -> TriggerResult:
+        trig_k, trig_a = self.trigger_threshold
+        start_ts, end_ts = self.window
+        return _trigger_backtest(
+            self.calls,
+            gas_prices,
+            asd_calls=self.asd_calls,
+            asd_harvests=self.asd_harvests,
+            harvest_logs=self.harvest_logs,
+            k_token_per_wei=trig_k,
+            intercept_token=trig_a,
+            start_ts=start_ts,
+            end_ts=end_ts,
+            rate_window_n=int(self.args.rate_window),
+            warmup_intervals=int(self.args.warmup_intervals),
+        )
+
+
+_ALL_FILES = ("calls_csv", "harvest_logs", "config_csv", "prices_json", "db")
+_QUANTILE_PARAMS = ("quantiles", "sketch_accuracy")
+
+
+# ---- header ----
+
+_T_HEADER = (
+    "# asdPENDLE harvester bot：配置回测（7 天）\n\n"
+    "数据源：\n"
+    "- calls：`{calls_csv}`\n"
+    "- harvest logs：`{harvest_logs}`\n"
+    "- config：`{config_csv}`\n"
+)
+_T_HEADER_DB = "- warehouse：`{db}`（以上数据均从该 SQLite 读取）\n"
+_T_HEADER_PRICES = "- prices：`{prices_json}`（sdPENDLE 已用链上 TWAP 填充）\n"
+_T_HEADER_SKETCH = "- 分位数：DDSketch 近似（相对误差 ≤ {sketch_accuracy:.2%}）\n"
+_T_WINDOW = "\n窗口：\n- start：`{start}` (UTC+8)\n- end：`{end}` (UTC+8)\n"
+
+
+def _compute_header(inp: _Inputs) -> Dict[str, Any]:
+    tz_bj = timezone(timedelta(hours=8))
+    start_ts, end_ts = inp.window
+    args = inp.args
+    return {
+        "calls_csv": args.calls_csv,
+        "harvest_logs": args.harvest_logs,
+        "config_csv": args.config_csv,
+        "db": args.db,
+        "prices_json": args.prices_json,
+        "has_prices": bool(inp.prices),
+        "sketch_accuracy": args.sketch_accuracy if args.quantiles == "sketch" else None,
+        "start": _fmt_ts(start_ts, tz_bj),
+        "end": _fmt_ts(end_ts, tz_bj),
+    }
+
+
+def _render_header(r: Dict[str, Any]) -> str:
+    out = report_sections.fill(_T_HEADER, r)
+    if r["db"]:
+        out += report_sections.fill(_T_HEADER_DB, r)
+    if r["has_prices"]:
+        out += report_sections.fill(_T_HEADER_PRICES, r)
+    if r["sketch_accuracy"] is not None:
+        out += report_sections.fill(_T_HEADER_SKETCH, r)
+    return out + report_sections.fill(_T_WINDOW, r)
+
+
+# ---- 1) config ----
+
+_T_CONFIG = (
+    "\n## 1) 使用的配置参数（asdPENDLE job）\n\n"
+    "- selector：`{selector}`\n"
+    "- target：`{target}`\n"
+    "- gas_used_p50：`{gas_used_p50}`\n"
+    "- m_token_per_eth_p50：`{m_token_per_eth_p50:.6g}`\n"
+    "- k_token_per_wei_p50：`{k_token_per_wei_p50:.6g}`\n"
+)
+
+
+def _compute_config(inp: _Inputs) -> Dict[str, Any]:
+    cfg = inp.cfg
+    return {
+        "selector": cfg.selector,
+        "target": cfg.target,
+        "gas_used_p50": cfg.gas_used_p50,
+        "m_token_per_eth_p50": cfg.m_token_per_eth_p50,
+        "k_token_per_wei_p50": cfg.k_token_per_wei_p50,
+    }
+
+
+def _render_config(r: Dict[str, Any]) -> str:
+    return report_sections.fill(_T_CONFIG, r)
+
+
+# ---- 2) minAssets replay ----
+
+_T_REPLAY = (
+    "\n## 2) 回放：minAssets ≈ k * gas_price（用配置 k 预测 tx 输入）\n\n"
+    "- asdPENDLE calls：{n_asd_calls}\n"
+    "- 可解析 minAssets 且可预测：{matched}\n"
+)
+_T_REPLAY_ERR = (
+    "- |pred-minAssets|（token）：p50≈{abs_p50:.4g}，p90≈{abs_p90:.4g}，max≈{abs_max:.4g}\n"
+    "- |pred-minAssets|/minAssets（bps）：p50≈{bps_p50:.3g}，p90≈{bps_p90:.3g}，max≈{bps_max:.3g}\n"
+)
+_T_REPLAY_NO_ERR = "- 无法计算误差（minAssets 缺失或 gas_price=0）。\n"
+_T_REPLAY_FIT = (
+    "- 对照：稳健回归 a + b*gas_price（a={a:.4g}，b={b:.4g}）"
+    "误差（bps）：p50≈{p50:.3g}，p90≈{p90:.3g}，max≈{max:.3g}\n"
+)
+_T_REPLAY_FIT_P50 = "- 对照：稳健回归未采用（样本不足或误差不优于 k），阈值仍用 k。\n"
+
+
+def _compute_replay(inp: _Inputs) -> Dict[str, Any]:
+    # ---- 1) Replay minAssets formula using config k ----
+    cfg = inp.cfg
+    asd_calls = inp.asd_calls
+    min_assets_err_abs: List[float] = []
+    min_assets_err_bps: List[float] = []
+    matched_min_assets = 0
+    for c in asd_calls:
+        try:
+            min_assets = int(c.arg1)
+        except ValueError:
+            continue
+        pred = _pred_min_assets_wei(cfg.k_token_per_wei_p50, c.gas_price)
+        if pred <= 0 or min_assets <= 0:
+            continue
+        matched_min_assets += 1
+        diff = float(abs(pred - min_assets)) / 1e18
+        min_assets_err_abs.append(diff)
+        min_assets_err_bps.append(float(abs(pred - min_assets)) / float(min_assets) * 10000.0)
+
+    # Same replay with the robust intercept+slope fit, when the config csv carries it.
+    fit_err_bps: List[float] = []
+    if cfg.k_fit_slope_token_per_wei > 0:
+        for c in asd_calls:
+            try:
+                min_assets = int(c.arg1)
+            except ValueError:
+                continue
+            pred = _pred_min_assets_wei_fit(cfg.k_fit_intercept_token, cfg.k_fit_slope_token_per_wei, c.gas_price)
+            if pred <= 0 or min_assets <= 0:
+                continue
+            fit_err_bps.append(float(abs(pred - min_assets)) / float(min_assets) * 10000.0)
+
+    out: Dict[str, Any] = {
+        "n_asd_calls": len(asd_calls),
+        "matched": matched_min_assets,
+        "err": None,
+        "fit": None,
+        "fit_model": cfg.k_fit_model,
+    }
+    if min_assets_err_abs:
+        xs = _q(inp.args, min_assets_err_abs)
+        ys = _q(inp.args, min_assets_err_bps)
+        out["err"] = {
+            "abs_p50": xs.pct(50),
+            "abs_p90": xs.pct(90),
+            "abs_max": xs.pct(100),
+            "bps_p50": ys.pct(50),
+            "bps_p90": ys.pct(90),
+            "bps_max": ys.pct(100),
+        }
+    if fit_err_bps:
+        zs = _q(inp.args, fit_err_bps)
+        out["fit"] = {
+            "a": cfg.k_fit_intercept_token,
+            "b": cfg.k_fit_slope_token_per_wei,
+            "p50": zs.pct(50),
+            "p90": zs.pct(90),
+            "max": zs.pct(100),
+        }
+    return out
+
+
+def _render_replay(r: Dict[str, Any]) -> str:
+    out = report_sections.fill(_T_REPLAY, r)
+    out += report_sections.fill(_T_REPLAY_ERR, r["err"]) if r["err"] else _T_REPLAY_NO_ERR
+    if r["fit"]:
+        out += report_sections.fill(_T_REPLAY_FIT, r["fit"])
+    elif r.get("fit_model") == "p50":
+        out += _T_REPLAY_FIT_P50
+    return out
+
+
+# ---- 3) trigger backtest ----
+
+_T_TRIGGER = (
+    "\n## 3) 触发回测（近似）：滚动估计 assets/sec + 扫描点=bot 每笔 tx 时间\n\n"
+    "定义：\n"
+    "- `expected(t)`：用历史 harvest 间隔估计的可 harvest `assets`（线性随时间增长）\n"
+    "- `threshold(t)`：用配置 `k` 与当下 `gas_price` 推出的 `minAssets`\n"
+    "- 认为当某个扫描点首次满足 `expected(t) >= threshold(t)` 时，bot 应该会触发 harvest。\n\n"
+    "- warmup_intervals：{warmup_intervals}（用窗口前的历史间隔初始化）\n"
+    "- rate_window：{rate_window}（滚动中位数）\n"
+    "- intervals（按相邻 asdPENDLE harvest 划分）：{intervals}\n"
+    "- missed_intervals：{missed_intervals}\n"
+)
+_T_TRIGGER_DELAY = (
+    "- delay = actual_harvest_ts - first_trigger_ts（秒）：p50≈{p50:.0f}，p90≈{p90:.0f}，max≈{max:.0f}\n"
+)
+_T_TRIGGER_NO_DELAY = "- delay：无（未捕获到触发点，或 harvest 数不足）。\n"
+
+
+def _compute_trigger(inp: _Inputs) -> Dict[str, Any]:
+    # ---- 2) Trigger backtest (approx): rolling assets/sec + scan at bot tx timestamps ----
+    trig = inp.trigger_backtest([c.gas_price for c in inp.calls])
+    out: Dict[str, Any] = {
+        "warmup_intervals": int(inp.args.warmup_intervals),
+        "rate_window": int(inp.args.rate_window),
+        "intervals": trig.intervals,
+        "missed_intervals": trig.missed_intervals,
+        "delay": None,
+    }
+    if trig.delays_s:
+        ds = _q(inp.args, (float(x) for x in trig.delays_s))
+        out["delay"] = {"p50": ds.pct(50), "p90": ds.pct(90), "max": ds.pct(100)}
+    return out
+
+
+def _render_trigger(r: Dict[str, Any]) -> str:
+    out = report_sections.fill(_T_TRIGGER, r)
+    return out + (report_sections.fill(_T_TRIGGER_DELAY, r["delay"]) if r["delay"] else _T_TRIGGER_NO_DELAY)
+
+
+# ---- 3b) trigger backtest under synthetic gas paths ----
+
+_T_PATHS = "\n### 3b) 合成 gas 路径下的触发回测（同一扫描点，只替换 gas_price）\n\n- gas 路径：{info}\n"
+_T_PATHS_MISSED = "- missed_intervals/intervals：p10≈{p10:.3f}，p50≈{p50:.3f}，p90≈{p90:.3f}\n"
+_T_PATHS_DELAY = "- 每条路径的 delay p50（秒）：p10≈{p10:.0f}，p50≈{p50:.0f}，p90≈{p90:.0f}\n"
+_T_PATHS_COST = "- 每条路径的 est tx_cost_usd p50：p10≈{p10:.4g}，p50≈{p50:.4g}，p90≈{p90:.4g}\n"
+
+
+def _bands(args: argparse.Namespace, xs: List[float]) -> Optional[Dict[str, float]]:
+    if not xs:
+        return None
+    ys = _q(args, xs)
+    return {"p10": ys.pct(10), "p50": ys.pct(50), "p90": ys.pct(90)}
+
+
+def _compute_gas_paths(inp: _Inputs) -> Dict[str, Any]:
+    # ---- 2b) Same trigger backtest under synthetic gas paths (gas_paths.py), one replay per path ----
+    args = inp.args
+    if not args.gas_paths:
+        return {"info": ""}
+    import gas_paths
+
+    calls = inp.calls
+    cfg = inp.cfg
+    path_missed_rates: List[float] = []
+    path_delay_p50s: List[float] = []
+    path_cost_p50s: List[float] = []
+    loaded = gas_paths.load_paths(args.gas_paths)
+    n_paths = min(loaded.n_paths, int(args.max_gas_paths)) if int(args.max_gas_paths) > 0 else loaded.n_paths
+    call_gas = loaded.at_blocks([c.block_number for c in calls])
+    asd_tx = {a.tx_hash for a in inp.asd_calls}
+    asd_idx = [i for i, c in enumerate(calls) if c.tx_hash in asd_tx]
+    eth_series_bt = inp.prices.get("eth", [])
+    eth_at_asd = (
+        asof.price_join(eth_series_bt, [calls[i].timestamp for i in asd_idx], max_staleness_s=args.max_price_staleness_s)[0]
+        if eth_series_bt
+        else []
+    )
+    for p in range(n_paths):
+        gas_row = [int(x) for x in call_gas[p]]
+        res = inp.trigger_backtest(gas_row)
+        if res.intervals:
+            path_missed_rates.append(res.missed_intervals / res.intervals)
+        if res.delays_s:
+            path_delay_p50s.append(_q(args, (float(x) for x in res.delays_s)).pct(50))
+        costs = [
+            gas_row[i] * cfg.gas_used_p50 / 1e18 * float(px)
+            for i, px in zip(asd_idx, eth_at_asd)
+            if px is not None and px > 0
+        ]
+        if costs:
+            path_cost_p50s.append(_q(args, costs).pct(50))
+    return {
+        "info": f"`{args.gas_paths}`（{loaded.meta.get('model', 'preset')}，paths={n_paths}）",
+        "missed": _bands(args, path_missed_rates),
+        "delay": _bands(args, path_delay_p50s),
+        "cost": _bands(args, path_cost_p50s),
+    }
+
+
+def _render_gas_paths(r: Dict[str, Any]) -> str:
+    if not r["info"]:
+        return ""
+    out = report_sections.fill(_T_PATHS, r)
+    if r["missed"]:
+        out += report_sections.fill(_T_PATHS_MISSED, r["missed"])
+    if r["delay"]:
+        out += report_sections.fill(_T_PATHS_DELAY, r["delay"])
+    if r["cost"]:
+        out += report_sections.fill(_T_PATHS_COST, r["cost"])
+    return out
+
+
+# ---- 4) USD view ----
+
+_T_USD = "\n## 4) USD 口径（更贴近 bot 收益）：harvester_bounty vs 估算 gas cost\n\n"
+_T_USD_BOUNTY = "- bounty_rate=bounty/assets：p50≈{p50:.6g}，p90≈{p90:.6g}\n"
+_T_USD_ROI = (
+    "- est tx_cost_usd：p50≈{cost_p50:.4g}，p90≈{cost_p90:.4g}\n"
+    "- harvest assets_usd：p50≈{assets_p50:.4g}，p90≈{assets_p90:.4g}\n"
+    "- harvester bounty_usd：p50≈{bounty_p50:.4g}，p90≈{bounty_p90:.4g}\n"
+    "- ROI_assets_usd=assets/cost：p50≈{roi_assets_p50:.4g}，p90≈{roi_assets_p90:.4g}\n"
+    "- ROI_bounty_usd=bounty/cost：p50≈{roi_bounty_p50:.4g}，p90≈{roi_bounty_p90:.4g}\n"
+)
+_T_USD_MISSING = "- 缺少价格序列或 Harvest logs（无法计算 USD 口径）。\n"
+_T_USD_STALE = "- 价格过期：最近价格点距调用 > {max_staleness_s:.0f}s 的样本已丢弃（{stale}）\n"
+
+
+def _compute_usd(inp: _Inputs) -> Dict[str, Any]:
     # ---- 3) USD sanity (bounty vs est gas cost), using TWAP-filled sdPENDLE price ----
+    cfg = inp.cfg
+    prices = inp.prices
+    asd_calls = inp.asd_calls
     bounty_rates: List[float] = []
     roi_assets: List[float] = []
     roi_bounty: List[float] = []
@@ -353,16 +757,17 @@ def main() -> int:
 
     eth_series = prices.get("eth", [])
     sd_series = prices.get(_normalize_hex(SDPENDLE_ADDR), [])
-    for c in asd_calls:
-        h = harvest_by_tx.get(c.tx_hash)
+    px = asof.PriceLookup(prices, [c.timestamp for c in asd_calls], max_staleness_s=inp.args.max_price_staleness_s)
+    for i, c in enumerate(asd_calls):
+        h = inp.harvest_by_tx.get(c.tx_hash)
         if not h:
             continue
         if h.assets_wei > 0:
             bounty_rates.append(float(h.bounty_wei) / float(h.assets_wei))
         if not eth_series or not sd_series:
             continue
-        eth_usd = _price_at(eth_series, c.timestamp)
-        sd_usd = _price_at(sd_series, c.timestamp)
+        eth_usd = px.at("eth", i)
+        sd_usd = px.at(_normalize_hex(SDPENDLE_ADDR), i)
         if eth_usd is None or sd_usd is None or eth_usd <= 0 or sd_usd <= 0:
             continue
         fee_wei_est = int(c.gas_price) * int(cfg.gas_used_p50)
@@ -377,86 +782,155 @@ def main() -> int:
         roi_assets.append(assets_usd / cost_usd)
         roi_bounty.append(bounty_usd / cost_usd)
 
-    os.makedirs(os.path.dirname(args.out_md), exist_ok=True)
-    with open(args.out_md, "w") as f:
-        f.write("# asdPENDLE harvester bot：配置回测（7 天）\n\n")
-        f.write("数据源：\n")
-        f.write(f"- calls：`{args.calls_csv}`\n")
-        f.write(f"- harvest logs：`{args.harvest_logs}`\n")
-        f.write(f"- config：`{args.config_csv}`\n")
-        if prices:
-            f.write(f"- prices：`{args.prices_json}`（sdPENDLE 已用链上 TWAP 填充）\n")
-        f.write("\n窗口：\n")
-        f.write(f"- start：`{_fmt_ts(start_ts, tz_bj)}` (UTC+8)\n")
-        f.write(f"- end：`{_fmt_ts(end_ts, tz_bj)}` (UTC+8)\n")
-
-        f.write("\n## 1) 使用的配置参数（asdPENDLE job）\n\n")
-        f.write(f"- selector：`{cfg.selector}`\n")
-        f.write(f"- target：`{cfg.target}`\n")
-        f.write(f"- gas_used_p50：`{cfg.gas_used_p50}`\n")
-        f.write(f"- m_token_per_eth_p50：`{cfg.m_token_per_eth_p50:.6g}`\n")
-        f.write(f"- k_token_per_wei_p50：`{cfg.k_token_per_wei_p50:.6g}`\n")
-
-        f.write("\n## 2) 回放：minAssets ≈ k * gas_price（用配置 k 预测 tx 输入）\n\n")
-        f.write(f"- asdPENDLE calls：{len(asd_calls)}\n")
-        f.write(f"- 可解析 minAssets 且可预测：{matched_min_assets}\n")
-        if min_assets_err_abs:
-            xs = sorted(min_assets_err_abs)
-            ys = sorted(min_assets_err_bps)
-            f.write(
-                f"- |pred-minAssets|（token）：p50≈{_pct(xs, 50):.4g}，p90≈{_pct(xs, 90):.4g}，max≈{xs[-1]:.4g}\n"
-            )
-            f.write(
-                f"- |pred-minAssets|/minAssets（bps）：p50≈{_pct(ys, 50):.3g}，p90≈{_pct(ys, 90):.3g}，max≈{ys[-1]:.3g}\n"
-            )
-        else:
-            f.write("- 无法计算误差（minAssets 缺失或 gas_price=0）。\n")
-
-        f.write("\n## 3) 触发回测（近似）：滚动估计 assets/sec + 扫描点=bot 每笔 tx 时间\n\n")
-        f.write("定义：\n")
-        f.write("- `expected(t)`：用历史 harvest 间隔估计的可 harvest `assets`（线性随时间增长）\n")
-        f.write("- `threshold(t)`：用配置 `k` 与当下 `gas_price` 推出的 `minAssets`\n")
-        f.write("- 认为当某个扫描点首次满足 `expected(t) >= threshold(t)` 时，bot 应该会触发 harvest。\n\n")
-        f.write(f"- warmup_intervals：{int(args.warmup_intervals)}（用窗口前的历史间隔初始化）\n")
-        f.write(f"- rate_window：{int(args.rate_window)}（滚动中位数）\n")
-        f.write(f"- intervals（按相邻 asdPENDLE harvest 划分）：{intervals}\n")
-        f.write(f"- missed_intervals：{missed_intervals}\n")
-        if delays_s:
-            ds = sorted(float(x) for x in delays_s)
-            f.write(
-                f"- delay = actual_harvest_ts - first_trigger_ts（秒）：p50≈{_pct(ds, 50):.0f}，p90≈{_pct(ds, 90):.0f}，max≈{ds[-1]:.0f}\n"
-            )
-        else:
-            f.write("- delay：无（未捕获到触发点，或 harvest 数不足）。\n")
+    out: Dict[str, Any] = {
+        "bounty": None,
+        "roi": None,
+        "n_stale": px.n_stale,
+        "stale": ", ".join(f"`{k}`={n}" for k, n in px.stale_by_series()),
+        "max_staleness_s": inp.args.max_price_staleness_s,
+    }
+    if bounty_rates:
+        br = _q(inp.args, bounty_rates)
+        out["bounty"] = {"p50": br.pct(50), "p90": br.pct(90)}
+    if roi_assets and roi_bounty and cost_usd_list and bounty_usd_list:
+        roi: Dict[str, float] = {}
+        for name, xs in (
+            ("cost", cost_usd_list),
+            ("assets", assets_usd_list),
+            ("bounty", bounty_usd_list),
+            ("roi_assets", roi_assets),
+            ("roi_bounty", roi_bounty),
+        ):
+            ys = _q(inp.args, xs)
+            roi[f"{name}_p50"] = ys.pct(50)
+            roi[f"{name}_p90"] = ys.pct(90)
+        out["roi"] = roi
+    return out
 
-        f.write("\n## 4) USD 口径（更贴近 bot 收益）：harvester_bounty vs 估算 gas cost\n\n")
-        if bounty_rates:
-            br = sorted(bounty_rates)
-            f.write(
-                f"- bounty_rate=bounty/assets：p50≈{_pct(br, 50):.6g}，p90≈{_pct(br, 90):.6g}\n"
-            )
-        if roi_assets and roi_bounty and cost_usd_list and bounty_usd_list:
-            ra = sorted(roi_assets)
-            rb = sorted(roi_bounty)
-            cu = sorted(cost_usd_list)
-            bu = sorted(bounty_usd_list)
-            au = sorted(assets_usd_list)
-            f.write(f"- est tx_cost_usd：p50≈{_pct(cu, 50):.4g}，p90≈{_pct(cu, 90):.4g}\n")
-            f.write(f"- harvest assets_usd：p50≈{_pct(au, 50):.4g}，p90≈{_pct(au, 90):.4g}\n")
-            f.write(f"- harvester bounty_usd：p50≈{_pct(bu, 50):.4g}，p90≈{_pct(bu, 90):.4g}\n")
-            f.write(f"- ROI_assets_usd=assets/cost：p50≈{_pct(ra, 50):.4g}，p90≈{_pct(ra, 90):.4g}\n")
-            f.write(f"- ROI_bounty_usd=bounty/cost：p50≈{_pct(rb, 50):.4g}，p90≈{_pct(rb, 90):.4g}\n")
-        else:
-            f.write("- 缺少价格序列或 Harvest logs（无法计算 USD 口径）。\n")
 
-        f.write("\n## 5) 结论（这份配置“回测支持”的边界）\n\n")
-        f.write("- ✅ 支持“回放型回测”：用 `k/m/gas_used` 预测 tx 的 `minAssets`，误差很小，说明配置可复现机器人出价逻辑。\n")
-        f.write("- ⚠️ 触发时刻回测依赖 `expected(t)` 的估计：本脚本用“历史 assets/sec 线性增长”近似，能给出一个可对齐的触发延迟分布，但不是严格链上真值。\n")
-        f.write("- 若要做严格回测（不靠线性假设），需要能在历史区块 `eth_call` 得到 `simulate_harvest()` 的 `expected assets`（或可替代的 view/preview）。\n")
+def _render_usd(r: Dict[str, Any]) -> str:
+    out = _T_USD
+    if r["bounty"]:
+        out += report_sections.fill(_T_USD_BOUNTY, r["bounty"])
+    out += report_sections.fill(_T_USD_ROI, r["roi"]) if r["roi"] else _T_USD_MISSING
+    if r["n_stale"]:
+        out += report_sections.fill(_T_USD_STALE, r)
+    return out
+
+
+# ---- 5) conclusion ----
+
+_T_CONCLUSION = (
+    "\n## 5) 结论（这份配置“回测支持”的边界）\n\n"
+    "- ✅ 支持“回放型回测”：用 `k/m/gas_used` 预测 tx 的 `minAssets`，误差很小，说明配置可复现机器人出价逻辑。\n"
+    "- ⚠️ 触发时刻回测依赖 `expected(t)` 的估计：本脚本用“历史 assets/sec 线性增长”近似，能给出一个可对齐的触发延迟分布，但不是严格链上真值。\n"
+    "- 若要做严格回测（不靠线性假设），需要能在历史区块 `eth_call` 得到 `simulate_harvest()` 的 `expected assets`（或可替代的 view/preview）。\n"
+)
+
+
+def _compute_conclusion(inp: _Inputs) -> Dict[str, Any]:
+    return {}
+
+
+def _render_conclusion(r: Dict[str, Any]) -> str:
+    return _T_CONCLUSION
+
+
+SECTIONS: List[report_sections.Section] = [
+    report_sections.Section(
+        "header",
+        _compute_header,
+        _render_header,
+        _ALL_FILES,
+        ("calls_csv", "harvest_logs", "config_csv", "db", "prices_json") + _QUANTILE_PARAMS,
+    ),
+    report_sections.Section("1_config", _compute_config, _render_config, ("config_csv", "db")),
+    report_sections.Section(
+        "2_replay", _compute_replay, _render_replay, ("calls_csv", "config_csv", "db"), _QUANTILE_PARAMS
+    ),
+    report_sections.Section(
+        "3_trigger",
+        _compute_trigger,
+        _render_trigger,
+        _ALL_FILES,
+        ("rate_window", "warmup_intervals", "threshold_model") + _QUANTILE_PARAMS,
+    ),
+    report_sections.Section(
+        "3b_gas_paths",
+        _compute_gas_paths,
+        _render_gas_paths,
+        _ALL_FILES + ("gas_paths",),
+        ("rate_window", "warmup_intervals", "threshold_model", "gas_paths", "max_gas_paths", "max_price_staleness_s")
+        + _QUANTILE_PARAMS,
+    ),
+    report_sections.Section(
+        "4_usd", _compute_usd, _render_usd, _ALL_FILES, ("max_price_staleness_s",) + _QUANTILE_PARAMS
+    ),
+    report_sections.Section("5_conclusion", _compute_conclusion, _render_conclusion),
+]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls-csv", default="data/f88e_harvester_calls_7d.csv")
+    parser.add_argument("--harvest-logs", default="data/asdpendle_harvest_logs.csv")
+    parser.add_argument("--config-csv", default="data/f88e_harvester_bot_config_estimates.csv")
+    parser.add_argument("--prices-json", default="data/coingecko_prices_7d.json")
+    parser.add_argument(
+        "--db",
+        default="",
+        help="Optional: read calls/harvest logs/config/prices from this warehouse SQLite instead of the files",
+    )
+    parser.add_argument("--out-md", default="asdpendle/harvester-bot-backtest.md")
+    parser.add_argument("--rate-window", type=int, default=5, help="Rolling median window for assets/sec")
+    parser.add_argument(
+        "--max-price-staleness-s",
+        type=float,
+        default=asof.DEFAULT_MAX_PRICE_STALENESS_S,
+        help="Drop a call's USD price if the nearest price point is further than this (0 = accept any)",
+    )
+    parser.add_argument("--warmup-intervals", type=int, default=5, help="How many pre-window intervals to warm start")
+    parser.add_argument("--gas-paths", default="", help="Optional: synthetic gas paths from gas_paths.py (.npz/.npy)")
+    parser.add_argument("--max-gas-paths", type=int, default=0, help="0 = use every path in --gas-paths")
+    parser.add_argument(
+        "--threshold-model",
+        choices=["p50", "fit"],
+        default="p50",
+        help="Trigger threshold: k_p50 * gas_price, or the robust a + b * gas_price fit from the config csv",
+    )
+    parser.add_argument(
+        "--quantiles",
+        choices=["exact", "sketch"],
+        default="exact",
+        help="Percentiles from the sorted samples, or from mergeable DDSketches (quantile_sketch.py)",
+    )
+    parser.add_argument(
+        "--sketch-accuracy",
+        type=float,
+        default=quantile_sketch.DEFAULT_RELATIVE_ACCURACY,
+        help="DDSketch relative accuracy for --quantiles sketch",
+    )
+    parser.add_argument(
+        "--sections-cache",
+        default="",
+        help="Section result cache (default: data/<out-md stem>.sections.json); 'none' disables it",
+    )
+    parser.add_argument("--refresh-sections", action="store_true", help="Recompute every section")
+    args = parser.parse_args()
+
+    instrument.phase("compute")
+    cache = args.sections_cache or report_sections.cache_path(args.out_md)
+    text = report_sections.render_report(
+        SECTIONS, _Inputs(args), args, None if cache == "none" else cache, refresh=bool(args.refresh_sections)
+    )
+
+    instrument.phase("write")
+    os.makedirs(os.path.dirname(args.out_md), exist_ok=True)
+    with open(args.out_md, "w") as f:
+        f.write(text)
 
     return 0
 
 
 if __name__ == "__main__":
-    raise SystemExit(main())
-
+    raise SystemExit(instrument.run(main))
@@ -0,0 +1,361 @@
+import argparse
+import csv
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import analyze_harvester_bot_strategy as analyze
+import asof
+import backtest_asdpendle_bot as backtest
+import generate_pendle_pricing_figures as figures
+import instrument
+import run_index
+
+
+# Standalone benchmarks for the hot paths of the report tools, on synthetic data scaled to
+# --sizes rows (calls CSV, harvest logs, price points). Results are written as JSON so runs can be
+# compared over time: `bench.py --out a.json`, later `bench.py --compare a.json` flags any case whose
+# best time grew by more than --tolerance and exits 1.
+# Functions that moved since the backlog was written are benchmarked under their replacements:
+# `_cluster_runs` is run_index.build, and the per-row `_price_at` loop is the asof price join.
+
+CALL_FIELDS = [
+    "tx_hash",
+    "timestamp",
+    "block_number",
+    "from",
+    "to",
+    "gas",
+    "gas_price",
+    "selector",
+    "function",
+    "decoded",
+    "target",
+    "arg1",
+    "arg2",
+    "input_len",
+    "input",
+]
+HARVEST_LOG_FIELDS = [
+    "tx_hash",
+    "block_number",
+    "time_stamp",
+    "caller",
+    "receiver",
+    "assets",
+    "performance_fee",
+    "harvester_bounty",
+]
+
+BOT = "0xf88e4e3db8ca35ebfd41076ec4bad483c9c4f805"
+HARVESTER = "0xfa86aa141e45da5183b42792d99dede3d26ec515"
+T0 = 1766203547
+
+# (selector, function, target); vault jobs get a pid in arg1
+JOBS: List[Tuple[str, str, str]] = [
+    (analyze.COMPOUNDER_SEL, "harvestConcentratorCompounder", t)
+    for t in (
+        "0x00bac667a4ccf9089ab1db978238c555c4349545",
+        "0x2b95a1dcc3d405535f9ed33c219ab38e8d7e0884",
+        "0xb0903ab70a7467ee5756074b31ac88aebb8fb777",
+        "0x43e54c2e7b3e294de3a155785f52ab49d87b9922",
+        "0x606462126e4bd5c4d153fe09967e4c46c9c7fecf",
+        "0xdec800c2b17c9673570fdf54450dc1bd79c8e359",
+    )
+] + [
+    (analyze.FX_SEL, "harvestConcentratorCompounderFxUSD", "0x549716f858aeff9cb845d4c78c67a7599b0df240"),
+    (analyze.VAULT_SEL, "harvestConcentratorVault", "0x3cf54f3a1969be9916dad548f3c084331c4450b5"),
+    (analyze.VAULT_SEL, "harvestConcentratorVault", "0x59866ec5650e9ba00c51f6d681762b48b0ada3de"),
+]
+PRICE_SERIES = ["eth"] + sorted({m["base_addr"] for m in analyze.TARGET_META.values() if "base_addr" in m})
+
+
+# ---- synthetic data ----
+
+
+def _tx_hash(rng: random.Random) -> str:
+    return "0x" + "%064x" % rng.getrandbits(256)
+
+
+def gen_calls_csv(path: str, n: int, seed: int = 1) -> List[int]:
+    # Calls arrive in runs of 1-8 jobs a few seconds apart, runs ~10 minutes apart; gas price is
+    # log-normal around 0.3 gwei like the 7d sample. Returns the timestamps (sorted).
+    rng = random.Random(seed)
+    ts = T0
+    bn = 24_000_000
+    out_ts: List[int] = []
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(CALL_FIELDS)
+        left = 0
+        for _ in range(n):
+            if left == 0:
+                left = rng.randint(1, 8)
+                ts += int(rng.expovariate(1 / 600.0)) + 13
+            else:
+                ts += rng.choice((0, 0, 12, 24))
+            left -= 1
+            bn = max(bn + 1, 24_000_000 + (ts - T0) // 12)
+            sel, fn, target = rng.choice(JOBS)
+            arg1 = str(rng.randint(0, 40)) if sel == analyze.VAULT_SEL else str(rng.getrandbits(70))
+            arg2 = str(rng.getrandbits(70)) if sel == analyze.VAULT_SEL else ""
+            w.writerow(
+                [
+                    _tx_hash(rng),
+                    ts,
+                    bn,
+                    BOT,
+                    HARVESTER,
+                    5_000_000,
+                    int(3e8 * math.exp(rng.gauss(0.0, 0.6))),
+                    sel,
+                    fn,
+                    1,
+                    target,
+                    arg1,
+                    arg2,
+                    136,
+                    "0x" + sel[2:] + "00" * 64,
+                ]
+            )
+            out_ts.append(ts)
+    return out_ts
+
+
+def gen_harvest_logs_csv(path: str, n: int, seed: int = 2) -> None:
+    rng = random.Random(seed)
+    ts = T0
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(HARVEST_LOG_FIELDS)
+        for i in range(n):
+            ts += int(rng.expovariate(1 / 7200.0)) + 1
+            assets = rng.getrandbits(68)
+            w.writerow([_tx_hash(rng), 24_000_000 + i, ts, HARVESTER, BOT, assets, assets // 10, assets // 1000])
+
+
+def gen_prices_json(path: str, n_points: int, seed: int = 3) -> Dict[str, List[Tuple[int, float]]]:
+    # n_points per series, hourly with a little jitter, random-walk prices.
+    rng = random.Random(seed)
+    series: Dict[str, List[Tuple[int, float]]] = {}
+    for key in PRICE_SERIES:
+        px = 3000.0 if key == "eth" else rng.uniform(0.5, 5.0)
+        pts: List[Tuple[int, float]] = []
+        for i in range(n_points):
+            px *= math.exp(rng.gauss(0.0, 0.004))
+            pts.append(((T0 + i * 3600) * 1000 + rng.randint(0, 5000), px))
+        series[key] = pts
+    payload = {
+        "meta": {"source": "synthetic"},
+        "eth": {"prices": [list(p) for p in series["eth"]]},
+        "tokens": {k: {"address": k, "prices": [list(p) for p in v]} for k, v in series.items() if k != "eth"},
+    }
+    with open(path, "w") as f:
+        json.dump(payload, f)
+    return series
+
+
+# ---- harness ----
+
+
+@dataclass(frozen=True)
+class Result:
+    name: str
+    size: int
+    repeat: int
+    best_s: float
+    median_s: float
+    per_row_us: float
+
+
+def _time(fn: Callable[[], Any], repeat: int) -> List[float]:
+    times: List[float] = []
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def _cases(tmp: str, size: int) -> List[Tuple[str, int, Callable[[], Any]]]:
+    calls_csv = os.path.join(tmp, f"calls_{size}.csv")
+    logs_csv = os.path.join(tmp, f"logs_{size}.csv")
+    prices_json = os.path.join(tmp, f"prices_{size}.json")
+    ts = gen_calls_csv(calls_csv, size)
+    gen_harvest_logs_csv(logs_csv, size)
+    # one price point per series per hour of the call span, but at least `size // 10`
+    n_points = max(size // 10, (ts[-1] - ts[0]) // 3600 + 2)
+    series = gen_prices_json(prices_json, n_points)
+
+    calls = analyze._load_calls(calls_csv)
+    keys = [run_index.CallKey(c.ts, c.tx_hash, f"{c.selector}:{c.target}") for c in calls]
+    call_ts = [c.ts for c in calls]
+    eth = series["eth"]
+
+    def price_lookup_loop() -> None:
+        px = asof.PriceLookup(series, call_ts, max_staleness_s=asof.DEFAULT_MAX_PRICE_STALENESS_S)
+        for i in range(len(call_ts)):
+            px.at("eth", i)
+
+    step = max(1, len(eth) // size)
+    points = [((p[0] - eth[0][0]) / 3.6e6, p[1]) for p in eth[::step]][:size]
+    y_lo = min(p[1] for p in points)
+    y_hi = max(p[1] for p in points)
+
+    def render_panel() -> str:
+        return figures._render_panel(
+            width=920,
+            height=420,
+            margin_left=70,
+            margin_right=20,
+            margin_top=50,
+            margin_bottom=65,
+            title="bench",
+            x_label="hours",
+            y_label="usd",
+            x_range=(points[0][0], points[-1][0] or 1.0),
+            y_range=(y_lo, y_hi if y_hi > y_lo else y_lo + 1.0),
+            series_list=[figures.Series(name="eth", points=points, color="#2563EB")],
+        )
+
+    return [
+        ("load_calls", size, lambda: analyze._load_calls(calls_csv)),
+        ("load_harvest_logs", size, lambda: backtest._load_harvest_logs(logs_csv)),
+        ("load_coingecko_prices", n_points * len(PRICE_SERIES), lambda: analyze._load_coingecko_prices(prices_json)),
+        ("cluster_runs", size, lambda: run_index.build(keys, 120)),
+        ("run_gap_sweep", size, lambda: run_index.gap_sweep(call_ts, run_index.gap_thresholds(30, 3600, 64))),
+        ("price_join", size, lambda: asof.price_join(eth, call_ts, max_staleness_s=7200)),
+        ("price_lookup_loop", size, price_lookup_loop),
+        ("render_panel", len(points), render_panel),
+    ]
+
+
+def _sim_cases(size: int) -> List[Tuple[str, int, Callable[[], Any]]]:
+    # Figure 4's pool; `size` round trips spread over 0.1%..50% of totalPt, 10 splits each.
+    total_pt = 168_324.7732
+    total_asset = 282_260.1990 * 1.1590929262
+    n = max(1, size // 100)
+
+    def run() -> None:
+        for i in range(n):
+            frac = 0.001 + (0.499 * i) / max(1, n - 1)
+            figures._simulate_roundtrip_loss_bps(
+                total_pt=total_pt,
+                total_asset=total_asset,
+                last_ln_implied_rate=0.2103754602,
+                scalar_root=10.7165715974,
+                time_to_expiry_seconds=95.3786 * 86400,
+                trade_pt=total_pt * frac,
+                splits=10,
+            )
+
+    return [("simulate_roundtrip_loss_bps", n, run)]
+
+
+def _git_rev() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return ""
+    return out.stdout.strip()
+
+
+def _compare(results: Sequence[Result], baseline_path: str, tolerance: float) -> int:
+    with open(baseline_path) as f:
+        base = {(r["name"], int(r["size"])): r for r in json.load(f).get("results", [])}
+    regressions = 0
+    print(f"\nvs {baseline_path} (tolerance x{tolerance:.2f})")
+    for r in results:
+        b = base.get((r.name, r.size))
+        if not b or float(b["best_s"]) <= 0:
+            continue
+        ratio = r.best_s / float(b["best_s"])
+        flag = "REGRESSION" if ratio > tolerance else ""
+        regressions += 1 if flag else 0
+        print(f"  {r.name:28s} {r.size:>9d}  x{ratio:5.2f}  {flag}")
+    return regressions
+
+
+def _parse_size(text: str) -> int:
+    # "10000", "10k", "1M" (k = 1e3, M = 1e6)
+    text = text.strip()
+    mult = {"k": 1000, "K": 1000, "m": 1000000, "M": 1000000}.get(text[-1:], 1)
+    try:
+        n = int(float(text[:-1] if mult > 1 else text) * mult)
+    except (ValueError, OverflowError):
+        raise SystemExit(f"--sizes: bad row count {text!r} (expected e.g. 10000, 10k or 1M)")
+    if n <= 0:
+        raise SystemExit(f"--sizes: row count must be > 0, got {text!r}")
+    return n
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes", default="10k,100k,1M", help="Comma-separated synthetic row counts; k/M suffixes allowed (10k, 1M)"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", default="", help="Comma-separated case names (default: all)")
+    parser.add_argument("--out", default="", help="Write results JSON here")
+    parser.add_argument("--compare", default="", help="Baseline results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Best-time ratio that counts as a regression")
+    args = parser.parse_args()
+
+    sizes = [_parse_size(s) for s in str(args.sizes).split(",") if s.strip()]
+    only = {s.strip() for s in str(args.only).split(",") if s.strip()}
+    results: List[Result] = []
+    print(f"{'case':28s} {'size':>9s} {'best_s':>9s} {'median_s':>9s} {'us/row':>8s}")
+    with tempfile.TemporaryDirectory(prefix="harvester-bench-") as tmp:
+        for size in sizes:
+            cases = _sim_cases(size)
+            if not only or (only - {c[0] for c in cases}):
+                cases = _cases(tmp, size) + cases
+            for name, rows, fn in cases:
+                if only and name not in only:
+                    continue
+                times = _time(fn, args.repeat)
+                best = min(times)
+                r = Result(
+                    name=name,
+                    size=size,
+                    repeat=len(times),
+                    best_s=best,
+                    median_s=statistics.median(times),
+                    per_row_us=best / max(1, rows) * 1e6,
+                )
+                results.append(r)
+                print(f"{name:28s} {size:>9d} {r.best_s:>9.4f} {r.median_s:>9.4f} {r.per_row_us:>8.2f}", flush=True)
+
+    payload: Dict[str, Any] = {
+        "meta": {
+            "generated_at": int(time.time()),
+            "git_rev": _git_rev(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "sizes": sizes,
+            "repeat": int(args.repeat),
+        },
+        "results": [asdict(r) for r in results],
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(payload, f, indent=1)
+
+    regressions: Optional[int] = None
+    if args.compare:
+        regressions = _compare(results, args.compare, float(args.tolerance))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(instrument.run(main))
@@ -0,0 +1,200 @@
+import math
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import quantile_sketch
+
+
+# Pre-aggregated time buckets per job key, so window stats do not rescan raw rows.
+#
+# add(key, ts, values) updates one bucket per resolution (1m, 1h and 1d by default). A bucket
+# holds an event count and, per named metric, count/sum/min/max plus a DDSketch for quantiles.
+# Buckets merge by adding these up, so a window query merges the coarsest buckets that fit inside it
+# and only uses finer ones at the edges: "last 30d" touches about 30 daily, 2 * 23 hourly and
+# 2 * 59 minute buckets, whatever the row count. Windows are rounded out to whole finest buckets.
+# prune(now) drops fine buckets past their retention; a window edge older than that rounds out to
+# the next coarser bucket.
+# Stores with the same resolutions merge too (shards, or one store per day of data).
+
+RESOLUTIONS: Tuple[Tuple[str, int], ...] = (("1d", 86400), ("1h", 3600), ("1m", 60))
+DEFAULT_RETENTION_S: Dict[str, Optional[int]] = {"1d": None, "1h": 90 * 86400, "1m": 2 * 86400}
+
+
+class Agg:
+    # One metric inside one bucket.
+    def __init__(self, relative_accuracy: float = quantile_sketch.DEFAULT_RELATIVE_ACCURACY) -> None:
+        self.sketch = quantile_sketch.DDSketch(relative_accuracy)
+
+    def add(self, value: float) -> None:
+        self.sketch.add(value)
+
+    def merge(self, other: "Agg") -> "Agg":
+        self.sketch.merge(other.sketch)
+        return self
+
+    @property
+    def count(self) -> int:
+        return int(self.sketch.count)
+
+    @property
+    def sum(self) -> float:
+        return self.sketch.sum
+
+    @property
+    def min(self) -> Optional[float]:
+        return self.sketch.min if self.sketch.count else None
+
+    @property
+    def max(self) -> Optional[float]:
+        return self.sketch.max if self.sketch.count else None
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sketch.mean
+
+    def pct(self, p: float) -> Optional[float]:
+        return self.sketch.pct(p)
+
+
+class Bucket:
+    def __init__(self, relative_accuracy: float = quantile_sketch.DEFAULT_RELATIVE_ACCURACY) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.n = 0
+        self.metrics: Dict[str, Agg] = {}
+
+    def add(self, values: Dict[str, Optional[float]], events: int = 1) -> None:
+        self.n += events
+        for name, v in values.items():
+            if v is None or (isinstance(v, float) and math.isnan(v)):
+                continue
+            agg = self.metrics.get(name)
+            if agg is None:
+                agg = self.metrics[name] = Agg(self.relative_accuracy)
+            agg.add(v)
+
+    def merge(self, other: "Bucket") -> "Bucket":
+        self.n += other.n
+        for name, agg in other.metrics.items():
+            mine = self.metrics.get(name)
+            if mine is None:
+                mine = self.metrics[name] = Agg(self.relative_accuracy)
+            mine.merge(agg)
+        return self
+
+    def metric(self, name: str) -> Agg:
+        # Empty Agg for a metric this bucket never saw.
+        return self.metrics.get(name) or Agg(self.relative_accuracy)
+
+
+class BucketStore:
+    def __init__(
+        self,
+        resolutions: Sequence[Tuple[str, int]] = RESOLUTIONS,
+        relative_accuracy: float = quantile_sketch.DEFAULT_RELATIVE_ACCURACY,
+        retention_s: Optional[Dict[str, Optional[int]]] = None,
+    ) -> None:
+        sizes = [int(s) for _, s in resolutions]
+        if sizes != sorted(sizes, reverse=True) or any(a % b for a, b in zip(sizes, sizes[1:])):
+            raise ValueError("resolutions must go coarse to fine, each dividing the previous one")
+        self.resolutions = [(str(n), int(s)) for n, s in resolutions]
+        self.relative_accuracy = relative_accuracy
+        self.retention_s = dict(DEFAULT_RETENTION_S if retention_s is None else retention_s)
+        # per resolution: key -> bucket index -> Bucket
+        self.levels: List[Dict[str, Dict[int, Bucket]]] = [{} for _ in self.resolutions]
+        # per resolution: buckets starting before this ts were pruned
+        self.horizon: List[int] = [0 for _ in self.resolutions]
+        self.start_ts: Optional[int] = None
+        self.end_ts: Optional[int] = None
+
+    @property
+    def finest_s(self) -> int:
+        return self.resolutions[-1][1]
+
+    def keys(self) -> List[str]:
+        return sorted(self.levels[-1].keys() | self.levels[0].keys())
+
+    def add(self, key: str, ts: int, values: Dict[str, Optional[float]], events: int = 1) -> None:
+        ts = int(ts)
+        for level, (_, size) in enumerate(self.resolutions):
+            per_key = self.levels[level].setdefault(key, {})
+            b = per_key.get(ts // size)
+            if b is None:
+                b = per_key[ts // size] = Bucket(self.relative_accuracy)
+            b.add(values, events)
+        self.start_ts = ts if self.start_ts is None else min(self.start_ts, ts)
+        self.end_ts = ts if self.end_ts is None else max(self.end_ts, ts)
+
+    def merge(self, other: "BucketStore") -> "BucketStore":
+        if other.resolutions != self.resolutions or other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("cannot merge bucket stores with different resolutions or accuracy")
+        for mine, theirs in zip(self.levels, other.levels):
+            for key, buckets in theirs.items():
+                per_key = mine.setdefault(key, {})
+                for i, b in buckets.items():
+                    if i in per_key:
+                        per_key[i].merge(b)
+                    else:
+                        per_key[i] = Bucket(self.relative_accuracy).merge(b)
+        self.horizon = [max(a, b) for a, b in zip(self.horizon, other.horizon)]
+        for ts in (other.start_ts, other.end_ts):
+            if ts is not None:
+                self.start_ts = ts if self.start_ts is None else min(self.start_ts, ts)
+                self.end_ts = ts if self.end_ts is None else max(self.end_ts, ts)
+        return self
+
+    def prune(self, now_ts: int) -> int:
+        # Drop buckets older than their resolution's retention; returns how many were dropped.
+        dropped = 0
+        for level, (name, size) in enumerate(self.resolutions):
+            keep = self.retention_s.get(name)
+            if keep is None or level == 0:
+                continue
+            first = (int(now_ts) - int(keep)) // size
+            for buckets in self.levels[level].values():
+                for i in [i for i in buckets if i < first]:
+                    del buckets[i]
+                    dropped += 1
+            self.horizon[level] = max(self.horizon[level], first * size)
+        return dropped
+
+    def _cover(self, lo: int, hi: int, level: int, out: List[Tuple[int, int]]) -> None:
+        # (level, bucket index) pieces covering [lo, hi): whole coarse buckets inside, finer ones at the edges.
+        if lo >= hi:
+            return
+        size = self.resolutions[level][1]
+        if level == len(self.resolutions) - 1:
+            out.extend((level, i) for i in range(lo // size, -(-hi // size)))
+            return
+        a = -(-lo // size) * size
+        b = hi // size * size
+        edges = [(lo, hi)]
+        if a < b:
+            out.extend((level, i) for i in range(a // size, b // size))
+            edges = [(lo, a), (b, hi)]
+        for x, y in edges:
+            if x < y and x < self.horizon[level + 1]:
+                # the finer buckets here were pruned: round out to this resolution
+                out.extend((level, i) for i in range(x // size, -(-y // size)))
+            else:
+                self._cover(x, y, level + 1, out)
+
+    def cover(self, start_ts: int, end_ts: int) -> List[Tuple[int, int]]:
+        out: List[Tuple[int, int]] = []
+        self._cover(int(start_ts), int(end_ts), 0, out)
+        return out
+
+    def query(self, key: str, start_ts: int, end_ts: int) -> Bucket:
+        # Merged bucket for events with start_ts <= ts < end_ts (rounded out to whole finest buckets).
+        total = Bucket(self.relative_accuracy)
+        for level, i in self.cover(start_ts, end_ts):
+            b = self.levels[level].get(key, {}).get(i)
+            if b is not None:
+                total.merge(b)
+        return total
+
+    def series(self, key: str, start_ts: int, end_ts: int, step_s: int) -> Iterator[Tuple[int, Bucket]]:
+        # One merged bucket per step, steps aligned to multiples of step_s.
+        step_s = max(self.finest_s, int(step_s) - int(step_s) % self.finest_s)
+        t = int(start_ts) - int(start_ts) % step_s
+        while t < end_ts:
+            yield t, self.query(key, max(t, int(start_ts)), min(t + step_s, int(end_ts)))
+            t += step_s
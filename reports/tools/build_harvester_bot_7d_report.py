@@ -9,6 +9,11 @@ from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import requests
 
+import append_store
+import harvester_abi
+import instrument
+import run_index
+
 
 def _normalize_hex(value: Any) -> str:
     if not isinstance(value, str):
@@ -74,7 +79,10 @@ def _etherscan_request(
     last_exc: Optional[Exception] = None
     for attempt in range(1, max_retries + 1):
         try:
-            resp = session.get(base_url, params=merged, timeout=timeout_s)
+            with instrument.span("etherscan.get"):
+                resp = session.get(base_url, params=merged, timeout=timeout_s)
+            instrument.count("etherscan.requests")
+            instrument.count("etherscan.bytes", len(resp.content or b""))
             resp.raise_for_status()
             payload = resp.json()
             if not isinstance(payload, dict):
@@ -83,6 +91,7 @@ def _etherscan_request(
         except Exception as exc:
             last_exc = exc
             if attempt < max_retries:
+                instrument.count("etherscan.retries")
                 time.sleep(backoff_s * attempt)
                 continue
             raise RuntimeError("Etherscan request failed") from exc
@@ -152,63 +161,6 @@ def _fetch_txlist_page(
     return out
 
 
-def _decode_words(input_hex: str, selector: str) -> Optional[List[int]]:
-    input_hex = _normalize_hex(input_hex)
-    selector = _normalize_hex(selector)
-    if not input_hex.startswith(selector):
-        return None
-    payload = input_hex[2 + 8 :]
-    if len(payload) % 64 != 0:
-        return None
-    return [int(payload[i : i + 64], 16) for i in range(0, len(payload), 64)]
-
-
-def _word_to_address(word: int) -> str:
-    return "0x" + f"{word:064x}"[-40:]
-
-
-def _decode_harvester_call(input_hex: str) -> Tuple[str, str, str, str, str, bool]:
-    input_hex = _normalize_hex(input_hex)
-    if not input_hex.startswith("0x") or len(input_hex) < 10:
-        return "", "", "", "", "", False
-    selector = input_hex[0:10]
-
-    if selector == "0x04117561":
-        words = _decode_words(input_hex, selector)
-        if words is None or len(words) < 2:
-            return selector, "harvestConcentratorCompounder", "", "", "", False
-        target = _word_to_address(words[0])
-        min_assets = str(words[1])
-        return selector, "harvestConcentratorCompounder", target, min_assets, "", True
-
-    if selector == "0xc7f884c6":
-        words = _decode_words(input_hex, selector)
-        if words is None or len(words) < 3:
-            return selector, "harvestConcentratorVault", "", "", "", False
-        target = _word_to_address(words[0])
-        pid = str(words[1])
-        min_out = str(words[2])
-        return selector, "harvestConcentratorVault", target, pid, min_out, True
-
-    if selector == "0x78f26f5b":
-        words = _decode_words(input_hex, selector)
-        if words is None or len(words) < 3:
-            return selector, "harvestConcentratorCompounderFxUSD", "", "", "", False
-        target = _word_to_address(words[0])
-        min_base_out = str(words[1])
-        min_fxusd_out = str(words[2])
-        return (
-            selector,
-            "harvestConcentratorCompounderFxUSD",
-            target,
-            min_base_out,
-            min_fxusd_out,
-            True,
-        )
-
-    return selector, "", "", "", "", False
-
-
 def _percentile(sorted_values: Sequence[float], p: float) -> float:
     if not sorted_values:
         raise ValueError("empty data")
@@ -226,28 +178,6 @@ def _percentile(sorted_values: Sequence[float], p: float) -> float:
     return d0 + d1
 
 
-def _cluster_runs(calls_sorted: Sequence["CallRow"], gap_s: int) -> List[List["CallRow"]]:
-    runs: List[List[CallRow]] = []
-    current: List[CallRow] = []
-    last_ts: Optional[int] = None
-
-    for call in calls_sorted:
-        if last_ts is None:
-            current = [call]
-            last_ts = call.timestamp
-            continue
-        if call.timestamp - last_ts > gap_s:
-            runs.append(current)
-            current = [call]
-        else:
-            current.append(call)
-        last_ts = call.timestamp
-
-    if current:
-        runs.append(current)
-    return runs
-
-
 def _corr(xs: Sequence[float], ys: Sequence[float]) -> Optional[float]:
     n = len(xs)
     if n != len(ys) or n < 2:
@@ -388,7 +318,7 @@ def run() -> None:
             continue
 
         input_hex = _normalize_hex(tx.get("input"))
-        selector, func, target, arg1, arg2, decoded = _decode_harvester_call(input_hex)
+        selector, func, target, arg1, arg2, decoded = harvester_abi.decode_harvester_call(input_hex)
         calls.append(
             CallRow(
                 tx_hash=_normalize_hex(tx.get("hash")),
@@ -453,6 +383,9 @@ def run() -> None:
                     r.input_hex,
                 ]
             )
+    # Rewritten in place: the append tools' key index and the run indexes no longer describe the file.
+    append_store.invalidate(args.out_csv)
+    run_index.invalidate(args.out_csv)
 
     deltas: List[float] = []
     for i in range(1, len(calls)):
@@ -468,12 +401,16 @@ def run() -> None:
     top_targets = sorted(target_counts.items(), key=lambda kv: kv[1], reverse=True)[:15]
 
     gap_s = int(args.run_gap_s)
-    runs = _cluster_runs(calls, gap_s=gap_s)
-    run_sizes = sorted([len(run) for run in runs])
-    run_start_gaps: List[float] = []
-    for i in range(1, len(runs)):
-        run_start_gaps.append(float(runs[i][0].timestamp - runs[i - 1][0].timestamp))
-    run_start_gaps_sorted = sorted(run_start_gaps)
+    # The calls CSV was just rewritten from scratch, so the persisted run index is rebuilt too.
+    runs = run_index.build(
+        [run_index.CallKey(r.timestamp, r.tx_hash, f"{r.selector}:{r.target}") for r in calls],
+        gap_s=gap_s,
+    )
+    run_index.save(run_index.index_path(args.out_csv, gap_s), runs)
+    run_sizes = runs.sizes_sorted()
+    run_start_gaps_sorted = sorted(
+        float(b - a) for a, b in zip(runs.run_start_ts, runs.run_start_ts[1:])
+    )
 
     # asdPENDLE join
     asd_compounder = "0x606462126e4bd5c4d153fe09967e4c46c9c7fecf"
@@ -552,9 +489,9 @@ def run() -> None:
         )
 
         if run_sizes:
-            run_p50 = _percentile([float(x) for x in run_sizes], 50)
-            run_p90 = _percentile([float(x) for x in run_sizes], 90)
-            run_max = max(run_sizes)
+            run_p50 = _percentile(run_sizes, 50)
+            run_p90 = _percentile(run_sizes, 90)
+            run_max = int(run_sizes[-1])
         else:
             run_p50 = run_p90 = 0.0
             run_max = 0
@@ -567,7 +504,7 @@ def run() -> None:
             run_gap_p50 = run_gap_p75 = run_gap_p90 = 0.0
 
         f.write(
-            f"- 以 gap>{gap_s}s 切 run：runs={len(runs)}, run_size p50={run_p50:.0f}, p90={run_p90:.0f}, max={run_max}; "
+            f"- 以 gap>{gap_s}s 切 run：runs={runs.n_runs}, run_size p50={run_p50:.0f}, p90={run_p90:.0f}, max={run_max}; "
             f"run_start_gap p50={run_gap_p50:.0f}, p75={run_gap_p75:.0f}, p90={run_gap_p90:.0f}\n\n"
         )
 
@@ -638,4 +575,4 @@ def main() -> int:
 
 
 if __name__ == "__main__":
-    raise SystemExit(main())
+    raise SystemExit(instrument.run(main))
@@ -5,8 +5,16 @@ import os
 from collections import Counter, defaultdict
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from functools import cached_property
 from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+import asof
+import instrument
+import quantile_sketch
+import report_sections
+import threshold_fit
+import warehouse
+
 
 COMPOUNDER_SEL = "0x04117561"
 VAULT_SEL = "0xc7f884c6"
@@ -100,33 +108,6 @@ class ReceiptRow:
     gas_used: int
 
 
-def _pct(sorted_values: Sequence[float], p: float) -> float:
-    if not sorted_values:
-        raise ValueError("empty data")
-    if p <= 0:
-        return float(sorted_values[0])
-    if p >= 100:
-        return float(sorted_values[-1])
-    k = (len(sorted_values) - 1) * (p / 100.0)
-    f = int(k)
-    c = min(f + 1, len(sorted_values) - 1)
-    if f == c:
-        return float(sorted_values[f])
-    d0 = float(sorted_values[f]) * (c - k)
-    d1 = float(sorted_values[c]) * (k - f)
-    return d0 + d1
-
-
-def _cv(xs: Sequence[float]) -> Optional[float]:
-    if not xs:
-        return None
-    m = sum(xs) / len(xs)
-    if m == 0:
-        return None
-    var = sum((x - m) ** 2 for x in xs) / len(xs)
-    return (var**0.5) / m
-
-
 def _try_int(value: Any) -> Optional[int]:
     try:
         if value is None:
@@ -319,283 +300,630 @@ def _load_prices(path: str) -> Dict[str, List[Tuple[int, float]]]:
     return out
 
 
-def _price_at(series: Sequence[Tuple[int, float]], ts_s: int) -> Optional[float]:
-    if not series:
-        return None
-    ts_ms = int(ts_s) * 1000
-    if ts_ms <= series[0][0]:
-        return float(series[0][1])
-    if ts_ms >= series[-1][0]:
-        return float(series[-1][1])
-    lo = 0
-    hi = len(series) - 1
-    while lo + 1 < hi:
-        mid = (lo + hi) // 2
-        if series[mid][0] == ts_ms:
-            return float(series[mid][1])
-        if series[mid][0] < ts_ms:
-            lo = mid
-        else:
-            hi = mid
-    if abs(series[lo][0] - ts_ms) <= abs(series[hi][0] - ts_ms):
-        return float(series[lo][1])
-    return float(series[hi][1])
-
-
 def _fmt_ts(ts: int, tz: timezone) -> str:
     return datetime.fromtimestamp(ts, tz=timezone.utc).astimezone(tz).strftime("%Y-%m-%d %H:%M:%S")
 
 
-def main() -> int:
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--calls-csv", default="data/f88e_harvester_calls_7d.csv")
-    parser.add_argument("--receipts-sample", default="data/f88e_harvester_receipts_sample.csv")
-    parser.add_argument("--prices-json", default="data/coingecko_prices_7d.json")
-    parser.add_argument("--out-md", default="asdpendle/harvester-bot-config.md")
-    parser.add_argument("--out-csv", default="data/f88e_harvester_bot_config_estimates.csv")
-    args = parser.parse_args()
+def _q(args: argparse.Namespace, xs: Sequence[float]) -> quantile_sketch.Quantiles:
+    # Exact percentiles by default; --quantiles sketch answers them from a DDSketch instead.
+    return quantile_sketch.summarize(xs, args.sketch_accuracy if args.quantiles == "sketch" else None)
+
+
+def _key_str(key: Tuple[str, str, str]) -> str:
+    return "|".join(key)
 
-    calls = _load_calls(args.calls_csv)
-    receipts = _load_receipts(args.receipts_sample)
-    prices = _load_prices(args.prices_json)
 
+class _Inputs:
+    # Datasets and per-job samples the sections read, computed on first use.
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+
+    @cached_property
+    def calls(self) -> List[CallRow]:
+        return _load_calls(self.args.calls_csv)
+
+    @cached_property
+    def receipts(self) -> List[ReceiptRow]:
+        return _load_receipts(warehouse.receipts_source(self.args.receipts_full, self.args.receipts_sample))
+
+    @cached_property
+    def prices(self) -> Dict[str, List[Tuple[int, float]]]:
+        return _load_prices(self.args.prices_json)
+
+    @cached_property
+    def call_keys(self) -> List[Tuple[str, str, str]]:
+        return [_job_key(c.selector, c.target, _job_subkey_from_call(c)) for c in self.calls]
+
+    @cached_property
+    def k_token_per_wei_by_job(self) -> Dict[Tuple[str, str, str], List[float]]:
+        # Call-level k := out_token/gas_price (token/wei), using tx arg as proxy.
+        out: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
+        for c, key in zip(self.calls, self.call_keys):
+            out_wei = _call_out_wei(c)
+            if out_wei is None or c.gas_price <= 0:
+                continue
+            out[key].append((out_wei / 1e18) / float(c.gas_price))
+        return out
+
+    @cached_property
+    def receipt_samples(
+        self,
+    ) -> Tuple[Dict[Tuple[str, str, str], List[float]], Dict[Tuple[str, str, str], List[float]]]:
+        # Receipt-level gas_used + m := out_wei/fee_wei (token/ETH)
+        gas_used_by_job: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
+        m_token_per_eth_by_job: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
+        for r in self.receipts:
+            fee_wei = int(r.gas_used) * int(r.effective_gas_price or r.tx_gas_price)
+            if fee_wei <= 0:
+                continue
+            out_wei = _receipt_out_wei(r)
+            if out_wei is None or out_wei <= 0:
+                continue
+            key = _job_key(r.selector, r.target, _job_subkey_from_receipt(r))
+            gas_used_by_job[key].append(float(r.gas_used))
+            m_token_per_eth_by_job[key].append(float(out_wei) / float(fee_wei))
+        return gas_used_by_job, m_token_per_eth_by_job
+
+    @cached_property
+    def gas_used_p50(self) -> Dict[Tuple[str, str, str], int]:
+        out: Dict[Tuple[str, str, str], int] = {}
+        for key, xs in self.receipt_samples[0].items():
+            if xs:
+                out[key] = int(round(_q(self.args, xs).pct(50) or 0.0))
+        return out
+
+    @cached_property
+    def roi_samples(self) -> Dict[str, Any]:
+        # USD ROI (call-level), cost_usd uses gas_used_p50 as estimate.
+        calls = self.calls
+        prices = self.prices
+        gas_used_p50 = self.gas_used_p50
+        roi_by_job: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
+        yield_usd_by_job: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
+        cost_usd_by_job: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
+        price_alias_used: Counter[Tuple[str, str]] = Counter()
+        # Per-call ROI inputs kept for the synthetic gas replay: (block_number, out_usd, eth_usd, gas_used).
+        roi_inputs_by_job: Dict[Tuple[str, str, str], List[Tuple[int, float, float, int]]] = defaultdict(list)
+
+        px = asof.PriceLookup(prices, [c.timestamp for c in calls], max_staleness_s=self.args.max_price_staleness_s)
+        if prices and "eth" in prices:
+            sdpendle_addr = TARGET_META.get("0x606462126e4bd5c4d153fe09967e4c46c9c7fecf", {}).get("base_addr", "")
+            alias_map: Dict[str, str] = {}
+            if sdpendle_addr:
+                alias_map[sdpendle_addr.lower()] = PENDLE_ADDR.lower()
+
+            for i, (c, key) in enumerate(zip(calls, self.call_keys)):
+                gu = gas_used_p50.get(key)
+                if not gu or gu <= 0 or c.gas_price <= 0:
+                    continue
+                out_wei = _call_out_wei(c)
+                if out_wei is None or out_wei <= 0:
+                    continue
+                token = _job_out_token(c.selector, c.target)
+                if not token:
+                    continue
+                _sym, addr = token
+                addr = addr.lower()
+                series_key = addr
+                if series_key not in prices:
+                    alias = alias_map.get(series_key)
+                    if alias and alias in prices:
+                        price_alias_used[(series_key, alias)] += 1
+                        series_key = alias
+                    else:
+                        continue
+                eth_px = px.at("eth", i)
+                tok_px = px.at(series_key, i)
+                if eth_px is None or tok_px is None or eth_px <= 0 or tok_px <= 0:
+                    continue
+                fee_wei = int(c.gas_price) * int(gu)
+                cost_usd = (fee_wei / 1e18) * float(eth_px)
+                out_usd = (out_wei / 1e18) * float(tok_px)
+                if cost_usd <= 0:
+                    continue
+                roi_by_job[key].append(float(out_usd / cost_usd))
+                roi_inputs_by_job[key].append((c.block_number, float(out_usd), float(eth_px), int(gu)))
+                yield_usd_by_job[key].append(float(out_usd))
+                cost_usd_by_job[key].append(float(cost_usd))
+        return {
+            "roi": roi_by_job,
+            "yield_usd": yield_usd_by_job,
+            "cost_usd": cost_usd_by_job,
+            "inputs": roi_inputs_by_job,
+            "alias_used": price_alias_used,
+            "px": px,
+        }
+
+
+def _compute_window(inp: _Inputs) -> Dict[str, Any]:
     tz_bj = timezone(timedelta(hours=8))
+    calls = inp.calls
     start_ts = min(c.timestamp for c in calls) if calls else 0
     end_ts = max(c.timestamp for c in calls) if calls else 0
+    if not (start_ts and end_ts):
+        return {"start": None, "end": None}
+    return {"start": _fmt_ts(start_ts, tz_bj), "end": _fmt_ts(end_ts, tz_bj)}
+
 
+def _compute_jobs(inp: _Inputs) -> List[Dict[str, Any]]:
+    # Call- and receipt-derived columns per job, in config-table order (7d calls, descending).
     job_counts: Counter[Tuple[str, str, str]] = Counter()
     job_ts: Dict[Tuple[str, str, str], List[int]] = defaultdict(list)
-    for c in calls:
-        key = _job_key(c.selector, c.target, _job_subkey_from_call(c))
+    for c, key in zip(inp.calls, inp.call_keys):
         job_counts[key] += 1
         job_ts[key].append(c.timestamp)
+    gas_used_by_job, m_token_per_eth_by_job = inp.receipt_samples
 
-    # Call-level k := out_token/gas_price (token/wei), using tx arg as proxy.
-    k_token_per_wei_by_job: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
-    for c in calls:
-        out_wei = _call_out_wei(c)
-        if out_wei is None or c.gas_price <= 0:
-            continue
-        key = _job_key(c.selector, c.target, _job_subkey_from_call(c))
-        k_token_per_wei_by_job[key].append((out_wei / 1e18) / float(c.gas_price))
-
-    # Receipt-level gas_used + m := out_wei/fee_wei (token/ETH)
-    gas_used_by_job: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
-    m_token_per_eth_by_job: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
-    for r in receipts:
-        fee_wei = int(r.gas_used) * int(r.effective_gas_price or r.tx_gas_price)
-        if fee_wei <= 0:
-            continue
-        out_wei = _receipt_out_wei(r)
-        if out_wei is None or out_wei <= 0:
-            continue
-        key = _job_key(r.selector, r.target, _job_subkey_from_receipt(r))
-        gas_used_by_job[key].append(float(r.gas_used))
-        m_token_per_eth_by_job[key].append(float(out_wei) / float(fee_wei))
-
-    gas_used_p50: Dict[Tuple[str, str, str], int] = {}
-    for key, xs in gas_used_by_job.items():
-        if xs:
-            gas_used_p50[key] = int(round(_pct(sorted(xs), 50)))
-
-    # USD ROI (call-level), cost_usd uses gas_used_p50 as estimate.
-    roi_by_job: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
-    yield_usd_by_job: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
-    cost_usd_by_job: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
-    price_alias_used: Counter[Tuple[str, str]] = Counter()
-
-    if prices and "eth" in prices:
-        sdpendle_addr = TARGET_META.get("0x606462126e4bd5c4d153fe09967e4c46c9c7fecf", {}).get("base_addr", "")
-        alias_map: Dict[str, str] = {}
-        if sdpendle_addr:
-            alias_map[sdpendle_addr.lower()] = PENDLE_ADDR.lower()
-
-        for c in calls:
-            key = _job_key(c.selector, c.target, _job_subkey_from_call(c))
-            gu = gas_used_p50.get(key)
-            if not gu or gu <= 0 or c.gas_price <= 0:
-                continue
-            out_wei = _call_out_wei(c)
-            if out_wei is None or out_wei <= 0:
-                continue
-            token = _job_out_token(c.selector, c.target)
-            if not token:
-                continue
-            _sym, addr = token
-            addr = addr.lower()
-            series_key = addr
-            if series_key not in prices:
-                alias = alias_map.get(series_key)
-                if alias and alias in prices:
-                    price_alias_used[(series_key, alias)] += 1
-                    series_key = alias
-                else:
-                    continue
-            eth_px = _price_at(prices["eth"], c.timestamp)
-            tok_px = _price_at(prices[series_key], c.timestamp)
-            if eth_px is None or tok_px is None or eth_px <= 0 or tok_px <= 0:
-                continue
-            fee_wei = int(c.gas_price) * int(gu)
-            cost_usd = (fee_wei / 1e18) * float(eth_px)
-            out_usd = (out_wei / 1e18) * float(tok_px)
-            if cost_usd <= 0:
-                continue
-            roi_by_job[key].append(float(out_usd / cost_usd))
-            yield_usd_by_job[key].append(float(out_usd))
-            cost_usd_by_job[key].append(float(cost_usd))
-
-    # Build config rows
-    rows: List[Dict[str, Any]] = []
+    out: List[Dict[str, Any]] = []
     for key, cnt in sorted(job_counts.items(), key=lambda kv: kv[1], reverse=True):
         sel, tgt, sub = key
-        label = _job_label(sel, tgt, sub)
         token = _job_out_token(sel, tgt)
-        token_sym = token[0] if token else ""
-        token_addr = token[1] if token else ""
 
         # gaps
         ts_list = sorted(job_ts.get(key, []))
-        gaps = [float(ts_list[i] - ts_list[i - 1]) for i in range(1, len(ts_list))]
+        gaps = _q(inp.args, [float(ts_list[i] - ts_list[i - 1]) for i in range(1, len(ts_list))])
 
         # receipt-derived
-        gu_list = sorted(gas_used_by_job.get(key, []))
-        m_list = sorted(m_token_per_eth_by_job.get(key, []))
-        gu_p50 = float(_pct(gu_list, 50)) if gu_list else 0.0
-        m_p50 = float(_pct(m_list, 50)) if m_list else 0.0
+        gu = _q(inp.args, gas_used_by_job.get(key, []))
+        m = _q(inp.args, m_token_per_eth_by_job.get(key, []))
+        gu_p50 = float(gu.pct(50) or 0.0)
+        m_p50 = float(m.pct(50) or 0.0)
         k_from_receipt = (gu_p50 * m_p50 / 1e18) if gu_p50 and m_p50 else 0.0
 
         # call-derived
-        k_list = sorted(k_token_per_wei_by_job.get(key, []))
-        k_call_p50 = float(_pct(k_list, 50)) if k_list else 0.0
+        k_call_p50 = float(_q(inp.args, inp.k_token_per_wei_by_job.get(key, [])).pct(50) or 0.0)
 
-        roi_list = sorted(roi_by_job.get(key, []))
-        y_list = sorted(yield_usd_by_job.get(key, []))
-        c_list = sorted(cost_usd_by_job.get(key, []))
-
-        roi_p50 = float(_pct(roi_list, 50)) if roi_list else 0.0
-        roi_cv = float(_cv(roi_list) or 0.0) if roi_list else 0.0
-
-        rows.append(
+        out.append(
             {
-                "job": label,
+                "job": _job_label(sel, tgt, sub),
                 "type": _job_type(sel),
                 "selector": sel,
                 "target": tgt,
                 "subkey": sub,
-                "out_token": token_sym,
-                "out_token_addr": token_addr,
+                "out_token": token[0] if token else "",
+                "out_token_addr": token[1] if token else "",
                 "calls_7d": int(cnt),
-                "gap_s_p50": float(_pct(sorted(gaps), 50)) if gaps else 0.0,
+                "gap_s_p50": float(gaps.pct(50) or 0.0),
                 "gas_used_p50": int(round(gu_p50)) if gu_p50 else 0,
-                "gas_used_cv": float(_cv(gu_list) or 0.0) if gu_list else 0.0,
+                "gas_used_cv": float(gu.cv() or 0.0),
                 "m_token_per_eth_p50": float(m_p50),
-                "m_token_per_eth_cv": float(_cv(m_list) or 0.0) if m_list else 0.0,
+                "m_token_per_eth_cv": float(m.cv() or 0.0),
                 "k_token_per_wei_p50": float(k_call_p50),
                 "k_token_per_wei_p50_from_receipt": float(k_from_receipt),
-                "roi_usd_p50": float(roi_p50),
-                "roi_usd_cv": float(roi_cv),
-                "yield_usd_p50": float(_pct(y_list, 50)) if y_list else 0.0,
-                "tx_cost_usd_p50": float(_pct(c_list, 50)) if c_list else 0.0,
             }
         )
+    return out
+
+
+def _compute_fit(inp: _Inputs) -> Dict[str, Dict[str, Any]]:
+    # Robust (Huber) minOut ~ intercept + slope * gas_price per job, vs. the p50 ratio model.
+    fit_points_by_job: Dict[Tuple[str, str, str], List[Tuple[int, str, float, float]]] = defaultdict(list)
+    for c, key in zip(inp.calls, inp.call_keys):
+        out_wei = _call_out_wei(c)
+        if out_wei is None or c.gas_price <= 0 or out_wei <= 0:
+            continue
+        fit_points_by_job[key].append((c.timestamp, c.tx_hash, float(c.gas_price), out_wei / 1e18))
+
+    fits = threshold_fit.fit_incremental(
+        inp.args.fit_state,
+        fit_points_by_job,
+        refit=bool(inp.args.refit),
+        refit_after=int(inp.args.refit_after),
+    )
+    out: Dict[str, Dict[str, Any]] = {}
+    for key, jf in fits.items():
+        out[_key_str(key)] = {
+            "n": int(jf.n),
+            "intercept_token": float(jf.intercept_token),
+            "slope_token_per_wei": float(jf.slope_token_per_wei),
+            "resid_rel_p10": float(jf.resid_rel_p10),
+            "resid_rel_p90": float(jf.resid_rel_p90),
+        }
+    for key, pts in fit_points_by_job.items():
+        jf = fits.get(key)
+        k_p50 = _q(inp.args, inp.k_token_per_wei_by_job.get(key, [])).pct(50)
+        if jf is None or k_p50 is None:
+            continue
+        actual = [p[3] for p in pts]
+        err_fit = threshold_fit.abs_rel_errors([jf.predict_token(p[2]) for p in pts], actual)
+        err_p50 = threshold_fit.abs_rel_errors([k_p50 * p[2] for p in pts], actual)
+        if err_fit and err_p50:
+            out[_key_str(key)]["err"] = [_q(inp.args, err_fit).pct(50), _q(inp.args, err_p50).pct(50)]
+    # Per job, the fit is only used when it has enough calls and beats p50 on the replay; else p50.
+    for jf in out.values():
+        err = jf.get("err")
+        ok = jf["n"] >= inp.args.fit_min_n and err is not None and err[0] < err[1]
+        jf["model"] = "fit" if ok else "p50"
+    return out
 
+
+def _compute_roi(inp: _Inputs) -> Dict[str, Any]:
+    samples = inp.roi_samples
+    jobs: Dict[str, Dict[str, float]] = {}
+    for key, roi in samples["roi"].items():
+        roi_q = _q(inp.args, roi)
+        jobs[_key_str(key)] = {
+            "roi_usd_p50": float(roi_q.pct(50) or 0.0),
+            "roi_usd_cv": float(roi_q.cv() or 0.0),
+            "yield_usd_p50": float(_q(inp.args, samples["yield_usd"].get(key, [])).pct(50) or 0.0),
+            "tx_cost_usd_p50": float(_q(inp.args, samples["cost_usd"].get(key, [])).pct(50) or 0.0),
+        }
+    px = samples["px"]
+    return {
+        "jobs": jobs,
+        "aliases": [{"src": src, "dst": dst, "cnt": cnt} for (src, dst), cnt in samples["alias_used"].most_common()],
+        "n_stale": px.n_stale,
+        "stale": ", ".join(f"`{k}`={n}" for k, n in px.stale_by_series()),
+        "max_staleness_s": inp.args.max_price_staleness_s,
+    }
+
+
+def _compute_gas_paths(inp: _Inputs) -> Dict[str, Any]:
+    # ROI p50 per job under synthetic gas paths (gas_paths.py): same calls/out/prices, gas_price swapped per path.
+    if not inp.args.gas_paths:
+        return {"info": "", "bands": {}}
+    import numpy as np
+
+    import gas_paths
+
+    loaded = gas_paths.load_paths(inp.args.gas_paths)
+    bands: Dict[str, List[float]] = {}
+    for key, items in inp.roi_samples["inputs"].items():
+        if not items:
+            continue
+        blocks = [it[0] for it in items]
+        out_usd_arr = np.array([it[1] for it in items])
+        usd_per_wei_gas = np.array([it[3] * it[2] / 1e18 for it in items])
+        gas = loaded.at_blocks(blocks)
+        roi = out_usd_arr[None, :] / (gas * usd_per_wei_gas[None, :])
+        per_path = np.median(roi, axis=1)
+        p10, p50, p90 = np.percentile(per_path, [10, 50, 90])
+        bands[_key_str(key)] = [float(p10), float(p50), float(p90)]
+    return {
+        "info": f"`{inp.args.gas_paths}`（{loaded.meta.get('model', 'preset')}，paths={loaded.n_paths}）",
+        "bands": bands,
+    }
+
+
+def _compute_sketches(inp: _Inputs) -> Dict[str, Dict[str, Any]]:
+    # Per-job DDSketches of the sampled distributions for --sketches-out (merge shards with
+    # quantile_sketch.merge_sketch_files).
+    if not inp.args.sketches_out:
+        return {}
+    gas_used_by_job, m_token_per_eth_by_job = inp.receipt_samples
+    samples = inp.roi_samples
+    metrics = {
+        "gas_used": gas_used_by_job,
+        "m_token_per_eth": m_token_per_eth_by_job,
+        "k_token_per_wei": inp.k_token_per_wei_by_job,
+        "roi_usd": samples["roi"],
+        "yield_usd": samples["yield_usd"],
+        "tx_cost_usd": samples["cost_usd"],
+    }
+    out: Dict[str, Dict[str, Any]] = defaultdict(dict)
+    for name, by_job in metrics.items():
+        for key, xs in by_job.items():
+            if xs:
+                out[_key_str(key)][name] = quantile_sketch.DDSketch(inp.args.sketch_accuracy).extend(xs).to_dict()
+    return dict(out)
+
+
+SECTIONS: List[report_sections.Section] = [
+    report_sections.Section("window", _compute_window, None, ("calls_csv",)),
+    report_sections.Section(
+        "jobs", _compute_jobs, None, ("calls_csv", "receipts_full", "receipts_sample"), ("quantiles", "sketch_accuracy")
+    ),
+    report_sections.Section(
+        "fit",
+        _compute_fit,
+        None,
+        ("calls_csv", "fit_state"),
+        ("fit_state", "refit", "refit_after", "fit_min_n", "quantiles", "sketch_accuracy"),
+    ),
+    report_sections.Section(
+        "roi",
+        _compute_roi,
+        None,
+        ("calls_csv", "receipts_full", "receipts_sample", "prices_json"),
+        ("max_price_staleness_s", "quantiles", "sketch_accuracy"),
+    ),
+    report_sections.Section(
+        "gas_paths",
+        _compute_gas_paths,
+        None,
+        ("calls_csv", "receipts_full", "receipts_sample", "prices_json", "gas_paths"),
+        ("gas_paths", "max_price_staleness_s", "quantiles", "sketch_accuracy"),
+    ),
+    report_sections.Section(
+        "sketches",
+        _compute_sketches,
+        None,
+        ("calls_csv", "receipts_full", "receipts_sample", "prices_json"),
+        ("sketches_out", "max_price_staleness_s", "quantiles", "sketch_accuracy"),
+    ),
+]
+
+CSV_FIELDS = [
+    "job",
+    "type",
+    "selector",
+    "target",
+    "subkey",
+    "out_token",
+    "out_token_addr",
+    "calls_7d",
+    "gap_s_p50",
+    "gas_used_p50",
+    "gas_used_cv",
+    "m_token_per_eth_p50",
+    "m_token_per_eth_cv",
+    "k_token_per_wei_p50",
+    "k_token_per_wei_p50_from_receipt",
+    "roi_usd_p50",
+    "roi_usd_cv",
+    "yield_usd_p50",
+    "tx_cost_usd_p50",
+    "tier_usd_roi",
+    "k_fit_model",
+    "k_fit_intercept_token",
+    "k_fit_slope_token_per_wei",
+    "k_fit_resid_rel_p10",
+    "k_fit_resid_rel_p90",
+    "k_fit_abs_rel_err_p50",
+    "k_p50_abs_rel_err_p50",
+]
+
+
+def _tier(roi_p50: float) -> str:
     # Tiering (USD ROI)
-    def tier(roi_p50: float) -> str:
-        if roi_p50 >= 1000:
-            return "T4 (>=1000)"
-        if roi_p50 >= 150:
-            return "T3 (150-1000)"
-        if roi_p50 >= 70:
-            return "T2 (70-150)"
-        if roi_p50 > 0:
-            return "T1 (<70)"
-        return "NA"
+    if roi_p50 >= 1000:
+        return "T4 (>=1000)"
+    if roi_p50 >= 150:
+        return "T3 (150-1000)"
+    if roi_p50 >= 70:
+        return "T2 (70-150)"
+    if roi_p50 > 0:
+        return "T1 (<70)"
+    return "NA"
+
+
+def _config_rows(results: Dict[str, Any], fit_min_n: int) -> List[Dict[str, Any]]:
+    # Build config rows
+    no_roi = {"roi_usd_p50": 0.0, "roi_usd_cv": 0.0, "yield_usd_p50": 0.0, "tx_cost_usd_p50": 0.0}
+    rows: List[Dict[str, Any]] = []
+    for job in results["jobs"]:
+        key = _key_str(_job_key(job["selector"], job["target"], job["subkey"]))
+        jf = results["fit"].get(key)
+        use_fit = bool(jf) and jf["model"] == "fit"
+        fit_err = jf.get("err") if jf and jf["n"] >= fit_min_n else None
+        row = dict(job)
+        row.update(results["roi"]["jobs"].get(key, no_roi))
+        # Fit columns stay empty unless the fit is used for this job (consumers then fall back to k).
+        row.update(
+            {
+                "k_fit_model": jf["model"] if jf else "p50",
+                "k_fit_intercept_token": jf["intercept_token"] if use_fit else "",
+                "k_fit_slope_token_per_wei": jf["slope_token_per_wei"] if use_fit else "",
+                "k_fit_resid_rel_p10": jf["resid_rel_p10"] if use_fit else "",
+                "k_fit_resid_rel_p90": jf["resid_rel_p90"] if use_fit else "",
+                "k_fit_abs_rel_err_p50": float(fit_err[0]) if fit_err else "",
+                "k_p50_abs_rel_err_p50": float(fit_err[1]) if fit_err else "",
+            }
+        )
+        row["tier_usd_roi"] = _tier(float(row.get("roi_usd_p50") or 0.0))
+        rows.append(row)
+    return rows
+
+
+_T_HEADER = (
+    "# harvester bot 配置表（推测 / 7d 反推）\n\n"
+    "- calls：`{calls_csv}`\n"
+    "- receipts：`{receipts_csv}`（用于 gas_used 与 m_token_per_eth；全量 receipts 为空时回退到 sample）\n"
+    "- prices：`{prices_json}`（USD 口径 ROI）\n"
+)
+_T_WINDOW = "- 时间窗口：`{start}` → `{end}` (UTC+8)\n"
+_T_SKETCH = "- 分位数：DDSketch 近似（相对误差 ≤ {sketch_accuracy:.2%}），非全量排序\n"
+_T_NOTES = (
+    "\n## 说明（关键口径）\n\n"
+    "- `k_token_per_wei_p50`：p50(minOut/gas_price)，单位 `token/wei`（最贴近链上入参特征）。\n"
+    "- `m_token_per_eth_p50`：p50(minOut/tx_fee)，单位 `token/ETH`（tx_fee=gas_used*gas_price）。\n"
+    "- `roi_usd_p50`：p50(yield_usd/tx_cost_usd)，其中 yield_usd≈minOut*token_usd，tx_cost_usd≈tx_fee*ETH_usd。\n"
+    "- 注意：这里用 minOut 近似 expected_out（bot 可能会留少量 buffer），因此这些阈值偏保守。\n\n"
+)
+_T_ALIAS = "- 价格回退：`{src}` 无有效价格点，使用 `{dst}` 价格近似（hits={cnt}）\n"
+_T_STALE = "- 价格过期：最近价格点距调用 > {max_staleness_s:.0f}s 的调用未计入 ROI（{stale}）\n\n"
+_T_TIERS = "## ROI 档位（p50）\n\n"
+_T_TIER_ROW = "- {tier}: {jobs}\n"
+_T_TABLE = (
+    "## 配置表（按 7d 调用次数排序）\n\n"
+    "| job | type | selector | target | subkey | out_token | calls_7d | gap_s(p50) | gas_used(p50) | "
+    "m_token/ETH(p50) | k_token/wei(p50) | ROI_usd(p50) | tier |\n"
+    "|---|---|---|---|---:|---|---:|---:|---:|---:|---:|---:|---|\n"
+)
+_T_TABLE_ROW = (
+    "| {job} | {type} | `{selector}` | `{target}` | {subkey} | "
+    "{out_token} | {calls_7d} | {gap_s_p50:.0f} | {gas_used_p50} | "
+    "{m_token_per_eth_p50:.4g} | {k_token_per_wei_p50:.4g} | {roi_usd_p50:.4g} | "
+    "{tier_usd_roi} |\n"
+)
+_T_FIT = (
+    "\n## 稳健回归阈值：minOut ≈ a + b·gas_price（Huber，按 job）\n\n"
+    "- 与 `k_token_per_wei_p50`（过原点的比值中位数）对照；误差为回放 minOut 的 |pred-minOut|/minOut 中位数。\n"
+    "- 残差带：(minOut-pred)/pred 的 p10/p90。\n"
+    "- 样本数 < {fit_min_n} 的 job 不报告回归（n/a）；回归误差不低于比值模型的 job 仍用 p50（采用列）。\n\n"
+    "| job | n | a (token) | b (token/wei) | 残差带 p10 / p90 | 误差(p50) 回归 | 误差(p50) 比值 | 采用 |\n"
+    "|---|---:|---:|---:|---:|---:|---:|---|\n"
+)
+_T_FIT_ROW = "| {job} | {n} | {a} | {b} | {band} | {err_fit} | {err_p50} | {model} |\n"
+_T_GAS = (
+    "\n## 合成 gas 路径下的 ROI_usd(p50)\n\n"
+    "- gas 路径：{info}；每条路径对同一批调用取 ROI p50，再看路径间分布。\n\n"
+    "| job | ROI_usd(p50, 观测 gas) | 路径 p10 | 路径 p50 | 路径 p90 |\n"
+    "|---|---:|---:|---:|---:|\n"
+)
+_T_GAS_ROW = "| {job} | {roi_usd_p50:.4g} | {p10:.4g} | {p50:.4g} | {p90:.4g} |\n"
+
+
+def _render_md(args: argparse.Namespace, results: Dict[str, Any], rows: List[Dict[str, Any]]) -> str:
+    fill, each = report_sections.fill, report_sections.rows
+    roi = results["roi"]
+    receipts_csv = warehouse.receipts_source(args.receipts_full, args.receipts_sample)
+    out = [fill(_T_HEADER, {**vars(args), "receipts_csv": receipts_csv})]
+    if results["window"]["start"]:
+        out.append(fill(_T_WINDOW, results["window"]))
+    if args.quantiles == "sketch":
+        out.append(fill(_T_SKETCH, vars(args)))
+    out.append(_T_NOTES)
+
+    if roi["aliases"]:
+        out.append(each(_T_ALIAS, roi["aliases"]) + "\n")
+    if roi["n_stale"]:
+        out.append(fill(_T_STALE, roi))
+
+    tier_order = ["T4 (>=1000)", "T3 (150-1000)", "T2 (70-150)", "T1 (<70)", "NA"]
+    by_tier: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for r in rows:
+        by_tier[str(r.get("tier_usd_roi") or "NA")].append(r)
+    tiers = []
+    for t in tier_order:
+        items = by_tier.get(t, [])
+        if not items:
+            continue
+        items_sorted = sorted(items, key=lambda x: float(x.get("roi_usd_p50") or 0.0), reverse=True)
+        parts = [f"{it['job']}({float(it.get('roi_usd_p50') or 0.0):.3g})" for it in items_sorted]
+        tiers.append({"tier": t, "jobs": ", ".join(parts)})
+    out.append(_T_TIERS + each(_T_TIER_ROW, tiers) + "\n")
+
+    out.append(_T_TABLE + each(_T_TABLE_ROW, ({**r, "subkey": r["subkey"] or ""} for r in rows)))
 
+    fit_rows = []
     for r in rows:
-        r["tier_usd_roi"] = tier(float(r.get("roi_usd_p50") or 0.0))
+        jf = results["fit"].get(_key_str(_job_key(r["selector"], r["target"], r["subkey"])))
+        if not jf:
+            continue
+        row = dict.fromkeys(("a", "b", "band", "err_fit", "err_p50"), "n/a")
+        row.update({"job": r["job"], "n": jf["n"], "model": jf["model"]})
+        if jf["n"] >= args.fit_min_n:
+            row["a"] = f"{jf['intercept_token']:.4g}"
+            row["b"] = f"{jf['slope_token_per_wei']:.4g}"
+            row["band"] = f"{jf['resid_rel_p10'] * 100:.2f}% / {jf['resid_rel_p90'] * 100:.2f}%"
+            if jf.get("err"):
+                row["err_fit"] = f"{jf['err'][0] * 1e4:.3g} bps"
+                row["err_p50"] = f"{jf['err'][1] * 1e4:.3g} bps"
+        fit_rows.append(row)
+    out.append(fill(_T_FIT, vars(args)) + each(_T_FIT_ROW, fit_rows))
+
+    bands = results["gas_paths"]["bands"]
+    if bands:
+        gas_rows = []
+        for r in rows:
+            band = bands.get(_key_str(_job_key(r["selector"], r["target"], r["subkey"])))
+            if not band:
+                continue
+            gas_rows.append({**r, "p10": band[0], "p50": band[1], "p90": band[2]})
+        out.append(fill(_T_GAS, results["gas_paths"]) + each(_T_GAS_ROW, gas_rows))
+    return "".join(out)
 
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls-csv", default="data/f88e_harvester_calls_7d.csv")
+    parser.add_argument(
+        "--receipts-full",
+        default="data/f88e_harvester_receipts_full.csv",
+        help="Output of backfill_receipts.py; preferred over --receipts-sample once it has rows",
+    )
+    parser.add_argument("--receipts-sample", default="data/f88e_harvester_receipts_sample.csv")
+    parser.add_argument("--prices-json", default="data/coingecko_prices_7d.json")
+    parser.add_argument("--out-md", default="asdpendle/harvester-bot-config.md")
+    parser.add_argument("--out-csv", default="data/f88e_harvester_bot_config_estimates.csv")
+    parser.add_argument("--gas-paths", default="", help="Optional: synthetic gas paths from gas_paths.py (.npz/.npy)")
+    parser.add_argument(
+        "--fit-state",
+        default="",
+        help="Optional: persisted threshold_fit state (JSON); only calls after the stored tail are folded in",
+    )
+    parser.add_argument("--refit", action="store_true", help="Ignore --fit-state contents and refit every job")
+    parser.add_argument(
+        "--refit-after",
+        type=int,
+        default=0,
+        help="Full refit of a job once this many calls were folded in incrementally (0 = never)",
+    )
+    parser.add_argument(
+        "--fit-min-n",
+        type=int,
+        default=threshold_fit.MIN_FIT_N,
+        help="Jobs with fewer calls than this keep the p50 model and report the fit as n/a",
+    )
+    parser.add_argument(
+        "--max-price-staleness-s",
+        type=float,
+        default=asof.DEFAULT_MAX_PRICE_STALENESS_S,
+        help="Drop a call's USD ROI if the nearest price point is further than this (0 = accept any)",
+    )
+    parser.add_argument("--db", default="", help="Optional: also load the estimates csv into this warehouse SQLite")
+    parser.add_argument(
+        "--quantiles",
+        choices=["exact", "sketch"],
+        default="exact",
+        help="Percentiles from the sorted samples, or from mergeable DDSketches (quantile_sketch.py)",
+    )
+    parser.add_argument(
+        "--sketch-accuracy",
+        type=float,
+        default=quantile_sketch.DEFAULT_RELATIVE_ACCURACY,
+        help="DDSketch relative accuracy for --quantiles sketch and --sketches-out",
+    )
+    parser.add_argument(
+        "--sketches-out",
+        default="",
+        help="Optional: write the per-job sketches (gas_used, m, k, ROI, yield, cost) as JSON for merging",
+    )
+    parser.add_argument(
+        "--sections-cache",
+        default="",
+        help="Section result cache (default: data/<out-md stem>.sections.json); 'none' disables it",
+    )
+    parser.add_argument("--refresh-sections", action="store_true", help="Recompute every section")
+    args = parser.parse_args()
+
+    instrument.phase("compute")
+    cache = args.sections_cache or report_sections.cache_path(args.out_md)
+    results = report_sections.compute_sections(
+        SECTIONS,
+        _Inputs(args),
+        args,
+        None if cache == "none" else cache,
+        refresh=bool(args.refresh_sections),
+    )
+    rows = _config_rows(results, args.fit_min_n)
+
+    instrument.phase("write")
     os.makedirs(os.path.dirname(args.out_csv), exist_ok=True)
     with open(args.out_csv, "w", newline="") as f:
-        fields = [
-            "job",
-            "type",
-            "selector",
-            "target",
-            "subkey",
-            "out_token",
-            "out_token_addr",
-            "calls_7d",
-            "gap_s_p50",
-            "gas_used_p50",
-            "gas_used_cv",
-            "m_token_per_eth_p50",
-            "m_token_per_eth_cv",
-            "k_token_per_wei_p50",
-            "k_token_per_wei_p50_from_receipt",
-            "roi_usd_p50",
-            "roi_usd_cv",
-            "yield_usd_p50",
-            "tx_cost_usd_p50",
-            "tier_usd_roi",
-        ]
-        w = csv.DictWriter(f, fieldnames=fields)
+        w = csv.DictWriter(f, fieldnames=CSV_FIELDS)
         w.writeheader()
         for r in rows:
-            w.writerow({k: r.get(k, "") for k in fields})
+            w.writerow({k: r.get(k, "") for k in CSV_FIELDS})
+    if args.db:
+        import warehouse
 
-    os.makedirs(os.path.dirname(args.out_md), exist_ok=True)
-    with open(args.out_md, "w") as f:
-        f.write("# harvester bot 配置表（推测 / 7d 反推）\n\n")
-        f.write(f"- calls：`{args.calls_csv}`\n")
-        f.write(f"- receipts sample：`{args.receipts_sample}`（用于 gas_used 与 m_token_per_eth）\n")
-        f.write(f"- prices：`{args.prices_json}`（USD 口径 ROI）\n")
-        if start_ts and end_ts:
-            f.write(f"- 时间窗口：`{_fmt_ts(start_ts, tz_bj)}` → `{_fmt_ts(end_ts, tz_bj)}` (UTC+8)\n")
-        f.write("\n")
-
-        f.write("## 说明（关键口径）\n\n")
-        f.write(
-            "- `k_token_per_wei_p50`：p50(minOut/gas_price)，单位 `token/wei`（最贴近链上入参特征）。\n"
-            "- `m_token_per_eth_p50`：p50(minOut/tx_fee)，单位 `token/ETH`（tx_fee=gas_used*gas_price）。\n"
-            "- `roi_usd_p50`：p50(yield_usd/tx_cost_usd)，其中 yield_usd≈minOut*token_usd，tx_cost_usd≈tx_fee*ETH_usd。\n"
-            "- 注意：这里用 minOut 近似 expected_out（bot 可能会留少量 buffer），因此这些阈值偏保守。\n\n"
-        )
+        conn = warehouse.connect(args.db)
+        warehouse.import_csv(conn, "config_estimates", args.out_csv)
+        conn.close()
 
-        if price_alias_used:
-            for (src, dst), cnt in price_alias_used.most_common():
-                f.write(f"- 价格回退：`{src}` 无有效价格点，使用 `{dst}` 价格近似（hits={cnt}）\n")
-            f.write("\n")
+    if args.sketches_out:
+        os.makedirs(os.path.dirname(args.sketches_out) or ".", exist_ok=True)
+        with open(args.sketches_out, "w") as f:
+            json.dump({"window": results["window"], "sketches": results["sketches"]}, f, separators=(",", ":"))
 
-        f.write("## ROI 档位（p50）\n\n")
-        tier_order = ["T4 (>=1000)", "T3 (150-1000)", "T2 (70-150)", "T1 (<70)", "NA"]
-        by_tier: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
-        for r in rows:
-            by_tier[str(r.get("tier_usd_roi") or "NA")].append(r)
-        for t in tier_order:
-            items = by_tier.get(t, [])
-            if not items:
-                continue
-            items_sorted = sorted(items, key=lambda x: float(x.get("roi_usd_p50") or 0.0), reverse=True)
-            parts = [f"{it['job']}({float(it.get('roi_usd_p50') or 0.0):.3g})" for it in items_sorted]
-            f.write(f"- {t}: " + ", ".join(parts) + "\n")
-        f.write("\n")
-
-        f.write("## 配置表（按 7d 调用次数排序）\n\n")
-        f.write(
-            "| job | type | selector | target | subkey | out_token | calls_7d | gap_s(p50) | gas_used(p50) | "
-            "m_token/ETH(p50) | k_token/wei(p50) | ROI_usd(p50) | tier |\n"
-        )
-        f.write("|---|---|---|---|---:|---|---:|---:|---:|---:|---:|---:|---|\n")
-        for r in rows:
-            f.write(
-                f"| {r['job']} | {r['type']} | `{r['selector']}` | `{r['target']}` | {r['subkey'] or ''} | "
-                f"{r['out_token']} | {r['calls_7d']} | {r['gap_s_p50']:.0f} | {r['gas_used_p50']} | "
-                f"{r['m_token_per_eth_p50']:.4g} | {r['k_token_per_wei_p50']:.4g} | {r['roi_usd_p50']:.4g} | "
-                f"{r['tier_usd_roi']} |\n"
-            )
+    os.makedirs(os.path.dirname(args.out_md), exist_ok=True)
+    with open(args.out_md, "w") as f:
+        f.write(_render_md(args, results, rows))
 
     return 0
 
 
 if __name__ == "__main__":
-    raise SystemExit(main())
+    raise SystemExit(instrument.run(main))
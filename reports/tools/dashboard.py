@@ -0,0 +1,601 @@
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import asof
+import bucket_store
+import instrument
+import warehouse
+from analyze_harvester_bot_strategy import (
+    COMPOUNDER_SEL,
+    FX_SEL,
+    TARGET_META,
+    VAULT_SEL,
+    Call,
+    _call_subkey,
+    _job_label,
+    _job_out_token,
+    _load_coingecko_prices,
+    _pct,
+    _try_int,
+)
+
+
+# Local live view of the harvester bot (run from the repo root):
+#   python reports/tools/dashboard.py [--port 8765]
+# The calls, asdPENDLE harvest logs, receipts sample and prices stay in memory. A poller thread
+# follows the append-only CSVs by byte offset, so rows written by the append_* tools are folded in
+# without re-reading the file. A file that shrinks or is replaced is re-read from the start. The
+# receipts sample and prices JSON are rewritten as a whole; a change there re-derives the ROI of the
+# retained calls.
+#
+# Every call and harvest goes into a bucket_store.BucketStore (1m/1h/1d buckets with sketches) under
+# its job key and the "*" key for all jobs; runs and harvests have their own keys. A query merges
+# the buckets covering its window, so it costs O(buckets) and reads no raw rows.
+# Windows end at the newest data point, not the wall clock, so the 7d snapshot in data/ can be
+# browsed too.
+#   /                   HTML page with the panels and the per-job table
+#   /api/status         rows loaded, file offsets, data span
+#   /api/jobs           per-job aggregates over ?window= (e.g. 30m, 24h, 7d, all)
+#   /api/series         ?metric=calls|k|roi|run_size&job=<sel|tgt|sub>&window=&step=&stat=mean|p50|p90|max
+#   /panel/<metric>.svg the same series for the busiest jobs, drawn with _render_panel
+
+ALL_JOBS = "*"
+RUNS_KEY = "runs"
+HARVESTS_PREFIX = "harvests|"
+METRICS = ("calls", "k", "roi", "run_size")
+STATS = ("mean", "p50", "p90", "max")
+MAX_PANEL_JOBS = 8
+PANEL_COLORS = ["#2563EB", "#059669", "#D97706", "#DC2626", "#7C3AED", "#0891B2", "#DB2777", "#4B5563"]
+
+ASDPENDLE_TARGET = "0x606462126e4bd5c4d153fe09967e4c46c9c7fecf"
+PENDLE_ADDR = "0x808507121b80c02388fad14726482e061b8da827"
+
+
+def _job_key(call: Call) -> str:
+    return f"{call.selector}|{call.target}|{_call_subkey(call)}"
+
+
+def _min_out_wei(call: Call) -> Optional[int]:
+    # The bot's minOut argument for the job (same fields as the strategy report's ROI section).
+    if call.selector in (COMPOUNDER_SEL, FX_SEL):
+        return _try_int(call.arg1)
+    if call.selector == VAULT_SEL:
+        return _try_int(call.arg2)
+    return None
+
+
+def _call_from_row(row: Dict[str, str]) -> Call:
+    return Call(
+        tx_hash=str(row.get("tx_hash", "")).lower(),
+        ts=int(row.get("timestamp") or "0"),
+        block_number=int(row.get("block_number") or "0"),
+        selector=str(row.get("selector", "")).lower(),
+        target=str(row.get("target", "")).lower(),
+        gas_price=int(row.get("gas_price") or "0"),
+        arg1=str(row.get("arg1", "")),
+        arg2=str(row.get("arg2", "")),
+    )
+
+
+def _parse_duration(text: str, default_s: int) -> int:
+    text = (text or "").strip().lower()
+    if not text:
+        return default_s
+    if text == "all":
+        return 0
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    try:
+        if text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(text)
+    except (ValueError, OverflowError):  # 1e400d / infd overflow int()
+        raise ValueError(f"bad duration: {text!r}")
+
+
+_EDGE_BYTES = 4096
+
+
+def _edges(f: Any, size: int) -> bytes:
+    # Digest of the first and the last 4 KiB of the first `size` bytes of an open file.
+    h = hashlib.blake2b(digest_size=16)
+    f.seek(0)
+    h.update(f.read(min(size, _EDGE_BYTES)))
+    if size > _EDGE_BYTES:
+        f.seek(max(_EDGE_BYTES, size - _EDGE_BYTES))
+        h.update(f.read(size - max(_EDGE_BYTES, size - _EDGE_BYTES)))
+    return h.digest()
+
+
+class _CsvTail:
+    # Follows an append-only CSV: poll() returns the rows added since the last call.
+    # The bytes already read are fingerprinted (first and last 4 KiB before the offset), so a rewrite
+    # in place (same inode, usually a larger file) is a reset too, not just a replace or a truncation.
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.offset = 0
+        self.header: Optional[List[str]] = None
+        self.ident: Optional[Tuple[int, int]] = None
+        self.mtime_ns = 0
+        self.edges = b""
+
+    def poll(self) -> Tuple[bool, List[Dict[str, str]]]:
+        # (reset, rows): reset means the file was replaced or rewritten and rows restart from the top.
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False, []
+        ident = (st.st_dev, st.st_ino)
+        reset = self.ident is not None and (ident != self.ident or st.st_size < self.offset)
+        if self.offset and not reset and (st.st_mtime_ns, st.st_size) != (self.mtime_ns, self.offset):
+            with open(self.path, "rb") as f:
+                reset = _edges(f, self.offset) != self.edges
+        if reset or self.ident is None:
+            self.offset = 0
+            self.header = None
+            self.ident = ident
+        self.mtime_ns = st.st_mtime_ns
+        if st.st_size == self.offset:
+            return reset, []
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(st.st_size - self.offset)
+            # Only whole lines: a batch that is still being written is picked up on the next poll.
+            end = data.rfind(b"\n")
+            if end < 0:
+                return reset, []
+            data = data[: end + 1]
+            self.offset += len(data)
+            self.edges = _edges(f, self.offset)
+        rows: List[Dict[str, str]] = []
+        for rec in csv.reader(io.StringIO(data.decode("utf-8"), newline="")):
+            if not rec:
+                continue
+            if self.header is None:
+                self.header = rec
+                continue
+            rows.append(dict(zip(self.header, rec)))
+        return reset, rows
+
+
+class _Live:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.lock = threading.Lock()
+        self.calls_tail = _CsvTail(args.calls_csv)
+        self.harvests_tail = _CsvTail(args.harvest_logs)
+        self.receipts_stat: Optional[Tuple[str, Optional[Tuple[int, int]]]] = None
+        self.prices_stat: Optional[Tuple[int, int]] = None
+        self.prices: Dict[str, List[Tuple[int, float]]] = {}
+        self.gas_used_by_job: Dict[str, int] = {}
+        self.calls: List[Call] = []
+        self.n_harvests = 0
+        self.store = bucket_store.BucketStore()
+        self.labels: Dict[str, str] = {ALL_JOBS: "all jobs"}
+        self.last_poll = 0.0
+        self.polls = 0
+        self._reset_runs()
+
+    # ---- ingest ----
+
+    def _reset_runs(self) -> None:
+        self.run_start = 0
+        self.run_last = 0
+        self.run_size = 0
+
+    def _reset_store(self) -> None:
+        self.store = bucket_store.BucketStore()
+        self.n_harvests = 0
+        self._reset_runs()
+        self.harvests_tail = _CsvTail(self.args.harvest_logs)
+
+    @property
+    def start_ts(self) -> int:
+        return self.store.start_ts or 0
+
+    @property
+    def end_ts(self) -> int:
+        return self.store.end_ts or 0
+
+    def _close_run(self) -> None:
+        if self.run_size:
+            self.store.add(RUNS_KEY, self.run_start, {"size": float(self.run_size)})
+        self._reset_runs()
+
+    def _roi(self, call: Call, px: asof.PriceLookup, i: int) -> Optional[float]:
+        tok = _job_out_token(call.selector, call.target)
+        gas_used = self.gas_used_by_job.get(_job_key(call))
+        out_wei = _min_out_wei(call)
+        if not tok or not gas_used or not out_wei or call.gas_price <= 0:
+            return None
+        series_key = tok[1]
+        if series_key not in self.prices and series_key == TARGET_META[ASDPENDLE_TARGET]["base_addr"]:
+            series_key = PENDLE_ADDR  # same fallback as the strategy report
+        eth_px = px.at("eth", i)
+        tok_px = px.at(series_key, i)
+        if not eth_px or not tok_px or eth_px <= 0 or tok_px <= 0:
+            return None
+        cost_usd = call.gas_price * gas_used / 1e18 * float(eth_px)
+        return (out_wei / 1e18) * float(tok_px) / cost_usd if cost_usd > 0 else None
+
+    def _ingest_calls(self, calls: List[Call]) -> None:
+        calls = sorted(calls, key=lambda c: (c.ts, c.tx_hash))
+        px = asof.PriceLookup(self.prices, [c.ts for c in calls], max_staleness_s=self.args.max_price_staleness_s)
+        gap = int(self.args.run_gap_s)
+        for i, c in enumerate(calls):
+            job = _job_key(c)
+            if job not in self.labels:
+                self.labels[job] = _job_label(c.selector, c.target, _call_subkey(c))
+            out_wei = _min_out_wei(c)
+            values = {
+                "gas_price_gwei": c.gas_price / 1e9,
+                "roi": self._roi(c, px, i),
+                "k": (out_wei / 1e18) / float(c.gas_price) if out_wei and c.gas_price > 0 else None,
+            }
+            self.store.add(job, c.ts, values)
+            # k is per output token, so it only makes sense per job
+            self.store.add(ALL_JOBS, c.ts, {**values, "k": None})
+            # Runs (waves of calls no more than --run-gap-s apart); rows arrive in chain order.
+            if self.run_size and c.ts - self.run_last > gap:
+                self._close_run()
+            if not self.run_size:
+                self.run_start = c.ts
+            self.run_size += 1
+            self.run_last = max(self.run_last, c.ts)
+        self.calls.extend(calls)
+
+    def _ingest_harvests(self, rows: List[Dict[str, str]]) -> None:
+        job = f"{COMPOUNDER_SEL}|{ASDPENDLE_TARGET}|"
+        for row in rows:
+            ts = _try_int(row.get("time_stamp"))
+            assets = _try_int(row.get("assets"))
+            if ts is None or assets is None:
+                continue
+            self.store.add(HARVESTS_PREFIX + job, ts, {"assets": assets / 1e18})
+            self.n_harvests += 1
+
+    def _rebuild(self) -> None:
+        # Prices or gas_used changed: re-derive every bucket from the retained rows.
+        calls = self.calls
+        self.calls = []
+        self._reset_store()
+        self._ingest_calls(calls)
+        self._ingest_harvests(self.harvests_tail.poll()[1])
+
+    def _stat(self, path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def poll(self) -> None:
+        with instrument.span("dashboard.poll"), self.lock:
+            rebuild = False
+            stat = self._stat(self.args.prices_json)
+            if stat != self.prices_stat:
+                self.prices_stat = stat
+                self.prices = _load_coingecko_prices(self.args.prices_json)
+                rebuild = True
+            receipts_csv = warehouse.receipts_source(self.args.receipts_full, self.args.receipts_sample)
+            receipts_stat = (receipts_csv, self._stat(receipts_csv))
+            if receipts_stat != self.receipts_stat:
+                self.receipts_stat = receipts_stat
+                self.gas_used_by_job = self._load_gas_used(receipts_csv)
+                rebuild = True
+            if rebuild and self.calls:
+                self._rebuild()
+
+            reset, rows = self.calls_tail.poll()
+            if reset:
+                self.calls = []
+                self._reset_store()
+            if rows:
+                self._ingest_calls([_call_from_row(r) for r in rows])
+                instrument.count("dashboard.calls", len(rows))
+            reset, rows = self.harvests_tail.poll()
+            if reset:
+                self._rebuild()
+            elif rows:
+                self._ingest_harvests(rows)
+            self.store.prune(self.end_ts)
+            self.last_poll = time.time()
+            self.polls += 1
+
+    def _load_gas_used(self, path: str) -> Dict[str, int]:
+        # Per-job gas_used p50 from the receipts (as the strategy report does).
+        by_job: Dict[str, List[float]] = {}
+        if not os.path.exists(path):
+            return {}
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                gu = _try_int(row.get("gas_used"))
+                sel = str(row.get("selector", "")).lower()
+                tgt = str(row.get("target", "")).lower()
+                if gu is None or gu <= 0 or not sel or not tgt:
+                    continue
+                by_job.setdefault(f"{sel}|{tgt}|{row.get('subkey', '')}", []).append(float(gu))
+        return {k: int(round(_pct(sorted(v), 50))) for k, v in by_job.items()}
+
+    # ---- queries ----
+
+    def _window(self, query: Dict[str, str]) -> Tuple[int, int, int]:
+        # (start_ts, end_ts, step_s), end exclusive: the window ends just after the newest data point.
+        end = self.end_ts + 1
+        span = _parse_duration(query.get("window", ""), 86400)
+        start = self.start_ts if span <= 0 else max(self.start_ts, end - span)
+        finest = self.store.finest_s
+        step = _parse_duration(query.get("step", ""), 0)
+        if step <= 0:
+            step = (end - start) // 60
+        step = max(finest, step - step % finest)
+        return start, end, step
+
+    def _query(self, key: str, start: int, end: int) -> bucket_store.Bucket:
+        b = self.store.query(key, start, end)
+        if key == RUNS_KEY and self.run_size and start <= self.run_start < end:
+            # The open run counts as it stands.
+            b.add({"size": float(self.run_size)})
+        return b
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "calls": len(self.calls),
+            "harvests": self.n_harvests,
+            "jobs": len(self.labels) - 1,
+            "buckets": {
+                name: sum(len(v) for v in level.values())
+                for (name, _), level in zip(self.store.resolutions, self.store.levels)
+            },
+            "start_ts": self.start_ts,
+            "end_ts": self.end_ts,
+            "calls_offset": self.calls_tail.offset,
+            "harvests_offset": self.harvests_tail.offset,
+            "price_series": len(self.prices),
+            "polls": self.polls,
+            "last_poll": self.last_poll,
+        }
+
+    def jobs(self, query: Dict[str, str]) -> Dict[str, Any]:
+        start, end, _ = self._window(query)
+        hours = max(end - start, self.store.finest_s) / 3600.0
+        rows = []
+        for job in self.labels:
+            b = self._query(job, start, end)
+            h = self._query(HARVESTS_PREFIX + job, start, end)
+            if not b.n and not h.n:
+                continue
+            k, roi, gp = b.metric("k"), b.metric("roi"), b.metric("gas_price_gwei")
+            row: Dict[str, Any] = {
+                "job": job,
+                "label": self.labels[job],
+                "calls": b.n,
+                "calls_per_h": b.n / hours,
+                "gas_price_gwei_p50": gp.pct(50),
+                "k_mean": k.mean,
+                "k_p50": k.pct(50),
+                "roi_mean": roi.mean,
+                "roi_p50": roi.pct(50),
+                "roi_p90": roi.pct(90),
+                "harvests": h.n,
+                "harvest_assets": h.metric("assets").sum,
+            }
+            if job == ALL_JOBS:
+                size = self._query(RUNS_KEY, start, end).metric("size")
+                row.update(runs=size.count, run_size_mean=size.mean, run_size_p90=size.pct(90), run_size_max=size.max)
+            rows.append(row)
+        rows.sort(key=lambda r: -r["calls"])
+        return {"start_ts": start, "end_ts": end, "jobs": rows}
+
+    def series(self, job: str, metric: str, query: Dict[str, str]) -> Dict[str, Any]:
+        # One point per step: calls/h, k relative to its window value (k drift), ROI, run size;
+        # ?stat= picks mean (default), p50, p90 or max for the last three.
+        if metric not in METRICS:
+            raise ValueError(f"unknown metric: {metric!r}")
+        stat = query.get("stat", "mean")
+        if stat not in STATS:
+            raise ValueError(f"unknown stat: {stat!r}")
+        start, end, step = self._window(query)
+        key, name = {"run_size": (RUNS_KEY, "size")}.get(metric, (job, metric))
+
+        def value_of(agg: bucket_store.Agg) -> Optional[float]:
+            if stat == "mean":
+                return agg.mean
+            return agg.max if stat == "max" else agg.pct(float(stat[1:]))
+
+        base = value_of(self._query(key, start, end).metric(name)) if metric == "k" else None
+        points: List[Tuple[int, float]] = []
+        t0 = start - start % step
+        while t0 < end:
+            b = self._query(key, max(t0, start), min(t0 + step, end))
+            value = b.n * 3600.0 / step if metric == "calls" else value_of(b.metric(name))
+            if metric == "k" and value is not None:
+                value = value / base if base else None
+            if value is not None:
+                points.append((t0, value))
+            t0 += step
+        return {
+            "job": job,
+            "label": self.labels.get(job, job),
+            "metric": metric,
+            "stat": stat,
+            "step_s": step,
+            "points": points,
+        }
+
+    def panel(self, metric: str, query: Dict[str, str]) -> str:
+        from generate_pendle_pricing_figures import Series, _render_panel, _render_svg_document
+
+        start, end, _ = self._window(query)
+        if metric == "run_size":
+            jobs = [ALL_JOBS]
+        else:
+            jobs = [r["job"] for r in self.jobs(query)["jobs"] if r["job"] != ALL_JOBS][:MAX_PANEL_JOBS]
+        series_list = []
+        y_max = 0.0
+        for i, job in enumerate(jobs):
+            s = self.series(job, metric, query)
+            # x axis in hours before the window end
+            pts = [((t - end) / 3600.0, v) for t, v in s["points"]]
+            if not pts:
+                continue
+            y_max = max(y_max, max(v for _, v in pts))
+            series_list.append(Series(name=s["label"], points=pts, color=PANEL_COLORS[i % len(PANEL_COLORS)]))
+        titles = {
+            "calls": ("calls per hour by job", "calls/h"),
+            "k": ("k drift: minOut/gas_price relative to its window value", "k / k(window)"),
+            "roi": ("ROI = minOut_usd / est tx_cost_usd", "ROI"),
+            "run_size": ("run size (calls per wave)", "calls"),
+        }
+        title, y_label = titles[metric]
+        width, height = 920, 320
+        x_lo = (start - end) / 3600.0
+        body = _render_panel(
+            width=width,
+            height=height,
+            margin_left=70,
+            margin_right=30,
+            margin_top=50,
+            margin_bottom=60,
+            title=title,
+            x_label="hours before latest data",
+            y_label=y_label,
+            x_range=(x_lo if x_lo < 0 else -1.0, 0.0),
+            y_range=(0.0, y_max * 1.1 if y_max > 0 else 1.0),
+            series_list=series_list,
+        )
+        return _render_svg_document(width=width, height=height, body=body)
+
+    def index_html(self, query: Dict[str, str]) -> str:
+        window = query.get("window", "24h")
+        rows = []
+        for r in self.jobs(query)["jobs"]:
+            rows.append(
+                "<tr><td>{label}</td><td>{calls}</td><td>{cph:.2f}</td><td>{k}</td><td>{roi}</td><td>{harvests}</td></tr>".format(
+                    label=r["label"],
+                    calls=r["calls"],
+                    cph=r["calls_per_h"],
+                    k="" if r["k_mean"] is None else f"{r['k_mean']:.4g}",
+                    roi="" if r["roi_mean"] is None else f"{r['roi_mean']:.3g}",
+                    harvests=r["harvests"],
+                )
+            )
+        panels = "".join(f'<p><img src="/panel/{m}.svg?window={window}"></p>' for m in METRICS)
+        return (
+            "<!doctype html><html><head><meta charset='utf-8'>"
+            f"<meta http-equiv='refresh' content='{max(int(self.args.poll_s), 5)}'>"
+            "<title>harvester bot</title></head><body>"
+            f"<h1>harvester bot · window {window}</h1>"
+            "<table border='1' cellpadding='4'><tr><th>job</th><th>calls</th><th>calls/h</th>"
+            "<th>k (token/wei)</th><th>ROI</th><th>harvests</th></tr>"
+            + "".join(rows)
+            + f"</table>{panels}</body></html>"
+        )
+
+
+def _handler(live: _Live, verbose: bool) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code: int, ctype: str, body: str, t0: float) -> None:
+            data = body.encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("X-Query-Ms", f"{(time.perf_counter() - t0) * 1000:.2f}")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            t0 = time.perf_counter()
+            url = urlparse(self.path)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                with live.lock:
+                    if url.path == "/":
+                        return self._send(200, "text/html; charset=utf-8", live.index_html(query), t0)
+                    if url.path.startswith("/panel/") and url.path.endswith(".svg"):
+                        metric = url.path[len("/panel/") : -len(".svg")]
+                        if metric not in METRICS:
+                            return self._send(404, "text/plain", f"unknown metric: {metric}\n", t0)
+                        return self._send(200, "image/svg+xml", live.panel(metric, query), t0)
+                    if url.path == "/api/status":
+                        payload: Dict[str, Any] = live.status()
+                    elif url.path == "/api/jobs":
+                        payload = live.jobs(query)
+                    elif url.path == "/api/series":
+                        payload = live.series(query.get("job", ALL_JOBS), query.get("metric", "calls"), query)
+                    else:
+                        return self._send(404, "text/plain", "not found\n", t0)
+                payload["query_ms"] = (time.perf_counter() - t0) * 1000
+                return self._send(200, "application/json", json.dumps(payload), t0)
+            except ValueError as exc:
+                return self._send(400, "text/plain", f"{exc}\n", t0)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            if verbose:
+                super().log_message(format, *args)
+
+    return Handler
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls-csv", default="data/f88e_harvester_calls_7d.csv")
+    parser.add_argument("--harvest-logs", default="data/asdpendle_harvest_logs.csv")
+    parser.add_argument("--receipts-full", default="data/f88e_harvester_receipts_full.csv")
+    parser.add_argument("--receipts-sample", default="data/f88e_harvester_receipts_sample.csv")
+    parser.add_argument("--prices-json", default="data/coingecko_prices_7d.json")
+    parser.add_argument(
+        "--max-price-staleness-s",
+        type=float,
+        default=asof.DEFAULT_MAX_PRICE_STALENESS_S,
+        help="Drop a call's USD price if the nearest price point is further than this (0 = accept any)",
+    )
+    parser.add_argument("--run-gap-s", type=int, default=120)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--poll-s", type=float, default=5.0, help="How often to check the data files for new rows")
+    parser.add_argument("--once", action="store_true", help="Load once, print /api/status and /api/jobs, and exit")
+    parser.add_argument("--window", default="24h", help="Window for --once")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    instrument.phase("load")
+    live = _Live(args)
+    live.poll()
+    if args.once:
+        print(json.dumps({"status": live.status(), **live.jobs({"window": args.window})}, indent=2))
+        return 0
+
+    stop = threading.Event()
+
+    def poller() -> None:
+        while not stop.wait(float(args.poll_s)):
+            try:
+                live.poll()
+            except Exception as exc:  # keep serving the last good state
+                print(f"poll failed: {exc}")
+
+    instrument.phase("serve")
+    threading.Thread(target=poller, daemon=True).start()
+    server = ThreadingHTTPServer((args.host, int(args.port)), _handler(live, bool(args.verbose)))
+    print(f"serving http://{args.host}:{server.server_address[1]}/ ({len(live.calls)} calls loaded)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(instrument.run(main))
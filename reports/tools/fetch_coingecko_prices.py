@@ -2,12 +2,18 @@ import argparse
 import csv
 import json
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import requests
 
+import instrument
+import warehouse
+
 
 def _load_time_range_from_calls(path: str) -> Tuple[int, int]:
     ts_min: Optional[int] = None
@@ -34,22 +40,77 @@ def _sleep_s(seconds: float) -> None:
     time.sleep(seconds)
 
 
+class _RateBudget:
+    # One request slot every `min_interval_s` shared by all workers. A 429 pushes the next slot out
+    # for everyone (Retry-After when given), so parallel workers back off together.
+    def __init__(self, min_interval_s: float) -> None:
+        self.min_interval_s = max(0.0, float(min_interval_s))
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.min_interval_s
+        _sleep_s(slot - now)
+
+    def penalize(self, delay_s: float) -> None:
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + max(0.0, float(delay_s)))
+
+
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update({"User-Agent": "etherscan-mcp-use/0.1"})
+        _local.session = session
+    return session
+
+
+def _retry_after_s(value: Optional[str]) -> Optional[float]:
+    if not value or not value.strip():
+        return None
+    v = value.strip()
+    try:
+        return max(0.0, float(v))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(v)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(tz=timezone.utc)).total_seconds())
+
+
 def _request_json(
     *,
-    session: requests.Session,
     url: str,
+    budget: _RateBudget,
     timeout_s: int = 30,
     max_retries: int = 10,
     backoff_s: float = 5.0,
 ) -> Dict[str, Any]:
     last_exc: Optional[Exception] = None
     for attempt in range(1, max_retries + 1):
+        budget.wait()
         try:
-            resp = session.get(url, timeout=timeout_s)
+            with instrument.span("coingecko.get"):
+                resp = _session().get(url, timeout=timeout_s)
+            instrument.count("coingecko.requests")
+            instrument.count("coingecko.bytes", len(resp.content or b""))
             if resp.status_code == 429:
-                retry_after = resp.headers.get("Retry-After")
-                delay = float(retry_after) if retry_after and retry_after.strip().isdigit() else backoff_s * attempt
-                _sleep_s(delay)
+                instrument.count("coingecko.rate_limited")
+                instrument.count("coingecko.retries")
+                delay = _retry_after_s(resp.headers.get("Retry-After"))
+                budget.penalize(delay if delay is not None else backoff_s * attempt)
+                last_exc = RuntimeError("429 Too Many Requests")
                 continue
             resp.raise_for_status()
             payload = resp.json()
@@ -59,12 +120,104 @@ def _request_json(
         except Exception as exc:
             last_exc = exc
             if attempt < max_retries:
-                _sleep_s(backoff_s * attempt)
+                instrument.count("coingecko.retries")
+                budget.penalize(backoff_s * attempt)
                 continue
             raise RuntimeError(f"request failed: {url}") from exc
     raise RuntimeError(f"request failed: {url}") from last_exc
 
 
+# ---- coverage ----
+# Each series records the [from_ts, to_ts] ranges already fetched ("coverage"), so a wider or rolled
+# range only fetches what is missing. Files written before coverage existed are read as covering
+# their meta from/to range minus any gap between points wider than --gap-s.
+
+
+Range = Tuple[int, int]
+
+
+def _normalize_ranges(ranges: Sequence[Range]) -> List[Range]:
+    out: List[Range] = []
+    for lo, hi in sorted((int(a), int(b)) for a, b in ranges if int(b) > int(a)):
+        if out and lo <= out[-1][1]:
+            out[-1] = (out[-1][0], max(out[-1][1], hi))
+        else:
+            out.append((lo, hi))
+    return out
+
+
+def _subtract_ranges(want: Range, have: Sequence[Range]) -> List[Range]:
+    out: List[Range] = []
+    cur = want[0]
+    for lo, hi in _normalize_ranges(have):
+        if hi <= cur:
+            continue
+        if lo >= want[1]:
+            break
+        if lo > cur:
+            out.append((cur, lo))
+        cur = max(cur, hi)
+    if cur < want[1]:
+        out.append((cur, want[1]))
+    return out
+
+
+def _coverage_from_points(points: Sequence[Sequence[float]], lo: int, hi: int, gap_s: int) -> List[Range]:
+    ts = sorted(int(p[0]) // 1000 for p in points if isinstance(p, (list, tuple)) and len(p) >= 2)
+    ts = [t for t in ts if lo <= t <= hi]
+    if not ts:
+        return []
+    edges = [lo] + ts + [hi]
+    out: List[Range] = []
+    seg_lo = lo
+    for a, b in zip(edges, edges[1:]):
+        if b - a > gap_s:
+            out.append((seg_lo, a))
+            seg_lo = b
+    out.append((seg_lo, hi))
+    return _normalize_ranges(out)
+
+
+def _entry_coverage(entry: Dict[str, Any], meta: Dict[str, Any], gap_s: int) -> List[Range]:
+    cov = entry.get("coverage")
+    if isinstance(cov, list):
+        return _normalize_ranges([(int(r[0]), int(r[1])) for r in cov if isinstance(r, (list, tuple)) and len(r) >= 2])
+    points = entry.get("prices", [])
+    if not isinstance(points, list) or not points:
+        return []
+    try:
+        lo, hi = int(meta.get("from_ts") or 0), int(meta.get("to_ts") or 0)
+    except (TypeError, ValueError):
+        lo, hi = 0, 0
+    if lo <= 0 or hi <= lo:
+        lo, hi = min(int(p[0]) // 1000 for p in points), max(int(p[0]) // 1000 for p in points)
+    return _coverage_from_points(points, lo, hi, gap_s)
+
+
+def _chunk_range(r: Range, chunk_s: int) -> List[Range]:
+    out: List[Range] = []
+    lo = r[0]
+    while lo < r[1]:
+        hi = min(r[1], lo + chunk_s)
+        out.append((lo, hi))
+        lo = hi
+    return out
+
+
+def _merge_points(existing: Any, new_points: Any) -> List[List[float]]:
+    merged: Dict[int, float] = {}
+    for source in (existing, new_points):
+        if not isinstance(source, list):
+            continue
+        for item in source:
+            if isinstance(item, (list, tuple)) and len(item) >= 2:
+                try:
+                    merged[int(item[0])] = float(item[1])
+                except (TypeError, ValueError):
+                    continue
+    return [[ms, px] for ms, px in sorted(merged.items())]
+
+
 def _market_chart_range_eth_url(*, vs: str, from_ts: int, to_ts: int) -> str:
     return (
         "https://api.coingecko.com/api/v3/coins/ethereum/market_chart/range"
@@ -90,8 +243,18 @@ def main() -> int:
     parser.add_argument("--from-ts", type=int, default=0)
     parser.add_argument("--to-ts", type=int, default=0)
     parser.add_argument("--pad-s", type=int, default=6 * 3600, help="pad seconds around inferred range")
-    parser.add_argument("--min-sleep-s", type=float, default=2.0, help="sleep between successful requests")
+    parser.add_argument("--min-sleep-s", type=float, default=2.0, help="min seconds between requests (all workers)")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent requests under the shared rate budget")
+    parser.add_argument(
+        "--chunk-days",
+        type=float,
+        default=90.0,
+        help="max days per range request (CoinGecko returns hourly points up to 90 days, daily beyond)",
+    )
+    parser.add_argument("--gap-s", type=int, default=3 * 3600, help="a hole between points wider than this is refetched")
+    parser.add_argument("--db", default="", help="Optional: also load the price series into this warehouse SQLite")
     args = parser.parse_args()
+    instrument.phase("load")
 
     from_ts = int(args.from_ts)
     to_ts = int(args.to_ts)
@@ -122,60 +285,101 @@ def main() -> int:
     if not isinstance(existing, dict):
         existing = {}
 
-    session = requests.Session()
-    session.headers.update({"User-Agent": "etherscan-mcp-use/0.1"})
-
     out: Dict[str, Any] = dict(existing)
-    out.setdefault("meta", {})
-    meta = out["meta"]
-    if isinstance(meta, dict):
-        meta.update(
-            {
-                "source": "coingecko",
-                "vs_currency": vs,
-                "from_ts": from_ts,
-                "to_ts": to_ts,
-                "generated_at": int(datetime.now(tz=timezone.utc).timestamp()),
-            }
-        )
-
-    # ETH
-    if "eth" not in out:
-        url = _market_chart_range_eth_url(vs=vs, from_ts=from_ts, to_ts=to_ts)
-        payload = _request_json(session=session, url=url)
-        out["eth"] = {
-            "type": "coingecko_id",
-            "id": "ethereum",
-            "prices": payload.get("prices", []),
-        }
-        _sleep_s(float(args.min_sleep_s))
-
-    # Tokens by contract
+    prev_meta = out.get("meta") if isinstance(out.get("meta"), dict) else {}
     out.setdefault("tokens", {})
     out_tokens = out["tokens"]
     if not isinstance(out_tokens, dict):
         out_tokens = {}
         out["tokens"] = out_tokens
 
+    # series key -> entry: "eth" plus tokens by contract
+    entries: Dict[str, Dict[str, Any]] = {}
+    eth_entry = out.get("eth") if isinstance(out.get("eth"), dict) else {}
+    eth_entry.update({"type": "coingecko_id", "id": "ethereum"})
+    out["eth"] = eth_entry
+    entries["eth"] = eth_entry
     for sym, info in tokens.items():
         addr = str(info["address"]).lower()
-        if addr in out_tokens:
+        entry = out_tokens.get(addr) if isinstance(out_tokens.get(addr), dict) else {}
+        if isinstance(entry.get("source"), dict):
+            # Overridden by another pipeline (e.g. the sdPENDLE Uniswap TWAP): leave it alone.
+            print(f"{sym}: keeps its {entry['source'].get('type', 'custom')} series, not refreshed")
             continue
-        url = _market_chart_range_contract_url(contract_addr=addr, vs=vs, from_ts=from_ts, to_ts=to_ts)
-        payload = _request_json(session=session, url=url)
-        out_tokens[addr] = {
-            "symbol": sym,
-            "address": addr,
-            "prices": payload.get("prices", []),
-        }
-        _sleep_s(float(args.min_sleep_s))
+        entry.update({"symbol": sym, "address": addr})
+        out_tokens[addr] = entry
+        entries[addr] = entry
+
+    gap_s = int(args.gap_s)
+    chunk_s = max(3600, int(float(args.chunk_days) * 86400))
+    now = int(datetime.now(tz=timezone.utc).timestamp())
+    tasks: List[Tuple[str, Range]] = []
+    coverage: Dict[str, List[Range]] = {}
+    for key, entry in entries.items():
+        coverage[key] = _entry_coverage(entry, prev_meta, gap_s)
+        missing = _subtract_ranges((from_ts, to_ts), coverage[key])
+        tasks.extend((key, chunk) for r in missing for chunk in _chunk_range(r, chunk_s))
+
+    def _url(key: str, r: Range) -> str:
+        if key == "eth":
+            return _market_chart_range_eth_url(vs=vs, from_ts=r[0], to_ts=r[1])
+        return _market_chart_range_contract_url(contract_addr=key, vs=vs, from_ts=r[0], to_ts=r[1])
+
+    instrument.phase("fetch")
+    budget = _RateBudget(float(args.min_sleep_s))
+    fetched: Dict[str, int] = {key: 0 for key in entries}
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, int(args.workers))) as ex:
+        futures = {ex.submit(_request_json, url=_url(key, r), budget=budget): (key, r) for key, r in tasks}
+        for fut in as_completed(futures):
+            key, r = futures[fut]
+            try:
+                points = fut.result().get("prices", [])
+            except RuntimeError as exc:
+                # Left out of coverage, so the next run retries just this chunk.
+                print(f"{key}: {r[0]}..{r[1]} failed: {exc}")
+                failed += 1
+                continue
+            entry = entries[key]
+            entry["prices"] = _merge_points(entry.get("prices"), points)
+            # The newest hour may not be published yet: only mark it covered up to the last point.
+            covered_hi = r[1]
+            if r[1] > now - gap_s:
+                last = max((int(p[0]) // 1000 for p in points if isinstance(p, (list, tuple)) and p), default=r[0])
+                covered_hi = max(r[0], min(r[1], last))
+            coverage[key] = _normalize_ranges(coverage[key] + [(r[0], covered_hi)])
+            fetched[key] += 1
+
+    for key, entry in entries.items():
+        entry.setdefault("prices", [])
+        entry["coverage"] = [[lo, hi] for lo, hi in coverage[key]]
+        label = "ETH" if key == "eth" else str(entry.get("symbol") or key)
+        print(f"{label}: {fetched[key]} request(s), {len(entry['prices'])} points")
+
+    out.setdefault("meta", {})
+    meta = out["meta"]
+    if isinstance(meta, dict):
+        meta.update(
+            {
+                "source": "coingecko",
+                "vs_currency": vs,
+                "from_ts": min([from_ts] + [int(prev_meta.get("from_ts") or from_ts)]),
+                "to_ts": max([to_ts] + [int(prev_meta.get("to_ts") or to_ts)]),
+                "generated_at": now,
+            }
+        )
 
+    instrument.phase("write")
     os.makedirs(os.path.dirname(args.out), exist_ok=True)
     with open(args.out, "w") as f:
         json.dump(out, f)
+    if args.db:
+        conn = warehouse.connect(args.db)
+        warehouse.import_prices_payload(conn, out)
+        conn.close()
 
-    return 0
+    return 1 if failed else 0
 
 
 if __name__ == "__main__":
-    raise SystemExit(main())
+    raise SystemExit(instrument.run(main))
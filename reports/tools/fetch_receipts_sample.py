@@ -3,11 +3,31 @@ import csv
 import os
 import time
 from dataclasses import dataclass
-from math import floor
+from math import ceil, floor, sqrt
 from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
 import requests
 
+import append_store
+import instrument
+import warehouse
+
+
+RECEIPT_FIELDS = [
+    "tx_hash",
+    "timestamp",
+    "selector",
+    "target",
+    "subkey",
+    "arg1",
+    "arg2",
+    "tx_gas_price",
+    "receipt_status",
+    "gas_used",
+    "effective_gas_price",
+    "fee_wei",
+]
+
 
 def _normalize_hex(value: Any) -> str:
     if not isinstance(value, str):
@@ -88,10 +108,15 @@ def _etherscan_request(
     last_exc: Optional[Exception] = None
     for attempt in range(1, max_retries + 1):
         try:
-            resp = session.get(base_url, params=merged, timeout=timeout_s)
+            with instrument.span("etherscan.get"):
+                resp = session.get(base_url, params=merged, timeout=timeout_s)
+            instrument.count("etherscan.requests")
+            instrument.count("etherscan.bytes", len(resp.content or b""))
             resp.raise_for_status()
             payload = resp.json()
             if _is_rate_limited(payload) and attempt < max_retries:
+                instrument.count("etherscan.rate_limited")
+                instrument.count("etherscan.retries")
                 time.sleep(backoff_s * attempt)
                 continue
             if not isinstance(payload, dict):
@@ -100,6 +125,7 @@ def _etherscan_request(
         except Exception as exc:
             last_exc = exc
             if attempt < max_retries:
+                instrument.count("etherscan.retries")
                 time.sleep(backoff_s * attempt)
                 continue
             raise RuntimeError("Etherscan request failed") from exc
@@ -120,19 +146,6 @@ def _hex_to_int(value: Any) -> Optional[int]:
     return None
 
 
-def _load_seen_hashes(path: str) -> Set[str]:
-    if not os.path.exists(path):
-        return set()
-    seen: Set[str] = set()
-    with open(path, newline="") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            tx = _normalize_hex(row.get("tx_hash", ""))
-            if tx:
-                seen.add(tx)
-    return seen
-
-
 @dataclass(frozen=True)
 class CallRow:
     tx_hash: str
@@ -212,15 +225,176 @@ def _sample_calls(calls: Sequence[CallRow], max_samples: int) -> List[CallRow]:
     return out
 
 
+JobKey = Tuple[str, str, str]
+
+COMPOUNDER_SEL = "0x04117561"
+VAULT_SEL = "0xc7f884c6"
+FX_SEL = "0x78f26f5b"
+
+
+def _job_key(r: CallRow) -> JobKey:
+    # key = (selector, target, subkey); vault: arg1 is pid
+    subkey = (r.arg1 or "") if r.selector == VAULT_SEL else ""
+    return (r.selector, r.target, subkey)
+
+
+def _out_wei(selector: str, arg1: str, arg2: str) -> Optional[int]:
+    try:
+        if selector in (COMPOUNDER_SEL, FX_SEL):
+            return int(arg1)
+        if selector == VAULT_SEL:
+            return int(arg2)
+    except ValueError:
+        return None
+    return None
+
+
+def _median_ci_rel(values: Sequence[float], z: float) -> float:
+    # Distribution-free CI for the median from order statistics (normal approx. to the binomial):
+    # ranks n/2 ∓ z*sqrt(n)/2. Returned as half-width relative to the median; inf if undefined.
+    n = len(values)
+    if n < 2:
+        return float("inf")
+    xs = sorted(values)
+    lo = max(1, int(floor((n - z * sqrt(n)) / 2.0)))
+    hi = min(n, int(ceil((n + z * sqrt(n)) / 2.0)) + 1)
+    med = xs[n // 2] if n % 2 == 1 else 0.5 * (xs[n // 2 - 1] + xs[n // 2])
+    if med <= 0:
+        return float("inf")
+    return (xs[hi - 1] - xs[lo - 1]) / 2.0 / med
+
+
+def _stratified_order(calls: Sequence[CallRow], strata: int) -> List[CallRow]:
+    # Gas-price strata visited round-robin; inside a stratum, time-spread (bit-reversed) order.
+    # Every prefix of the result is therefore spread over both gas regimes and the whole window.
+    by_gas = sorted(calls, key=lambda r: (r.gas_price, r.timestamp, r.tx_hash))
+    k = max(1, min(strata, len(by_gas)))
+    bins = [by_gas[i * len(by_gas) // k : (i + 1) * len(by_gas) // k] for i in range(k)]
+    queues: List[List[CallRow]] = []
+    for b in bins:
+        b = sorted(b, key=lambda r: (r.timestamp, r.tx_hash))
+        bits = max(1, (len(b) - 1).bit_length())
+        order = sorted(range(len(b)), key=lambda i: int(format(i, f"0{bits}b")[::-1], 2))
+        queues.append([b[i] for i in order])
+    out: List[CallRow] = []
+    pos = 0
+    while len(out) < len(by_gas):
+        for q in queues:
+            if pos < len(q):
+                out.append(q[pos])
+        pos += 1
+    return out
+
+
+@dataclass
+class JobSampling:
+    queue: List[CallRow]
+    gas_used: List[float]
+    out_per_fee: List[float]
+    fetched: int = 0
+
+    def ci_rel(self, z: float) -> float:
+        return max(_median_ci_rel(self.gas_used, z), _median_ci_rel(self.out_per_fee, z))
+
+    def observe(self, row: Dict[str, Any]) -> None:
+        if str(row.get("receipt_status", "")) != "1":
+            return
+        try:
+            gas_used = int(row.get("gas_used") or "0")
+            fee_wei = int(row.get("fee_wei") or "0")
+        except ValueError:
+            return
+        if gas_used > 0:
+            self.gas_used.append(float(gas_used))
+        out_wei = _out_wei(str(row.get("selector", "")), str(row.get("arg1", "")), str(row.get("arg2", "")))
+        if out_wei and fee_wei > 0:
+            self.out_per_fee.append(float(out_wei) / float(fee_wei))
+
+
+def _load_existing_receipts(path: str) -> List[Dict[str, str]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def _fetch_receipt_row(
+    session: requests.Session,
+    base_url: str,
+    api_key: str,
+    chain_id: str,
+    key: JobKey,
+    r: CallRow,
+) -> Optional[Dict[str, Any]]:
+    selector, target, subkey = key
+    payload = _etherscan_request(
+        session=session,
+        base_url=base_url,
+        api_key=api_key,
+        chain_id=chain_id,
+        params={
+            "module": "proxy",
+            "action": "eth_getTransactionReceipt",
+            "txhash": r.tx_hash,
+        },
+    )
+    receipt = payload.get("result")
+    if not isinstance(receipt, dict):
+        # Skip if missing (shouldn't happen for confirmed txs).
+        return None
+
+    gas_used = _hex_to_int(receipt.get("gasUsed"))
+    eff_gp = _hex_to_int(receipt.get("effectiveGasPrice"))
+    status = _hex_to_int(receipt.get("status"))
+    fee_wei = None
+    if gas_used is not None and eff_gp is not None:
+        fee_wei = gas_used * eff_gp
+
+    return {
+        "tx_hash": r.tx_hash,
+        "timestamp": r.timestamp,
+        "selector": selector,
+        "target": target,
+        "subkey": subkey,
+        "arg1": r.arg1,
+        "arg2": r.arg2,
+        "tx_gas_price": r.gas_price,
+        "receipt_status": status if status is not None else "",
+        "gas_used": gas_used if gas_used is not None else "",
+        "effective_gas_price": eff_gp if eff_gp is not None else "",
+        "fee_wei": fee_wei if fee_wei is not None else "",
+    }
+
+
 def main() -> int:
     parser = argparse.ArgumentParser()
     parser.add_argument("--calls-csv", default="data/f88e_harvester_calls_7d.csv")
     parser.add_argument("--out", default="data/f88e_harvester_receipts_sample.csv")
     parser.add_argument("--chain-id", default="1")
     parser.add_argument("--base-url", default="https://api.etherscan.io/v2/api")
-    parser.add_argument("--max-samples-per-group", type=int, default=10)
+    parser.add_argument(
+        "--mode",
+        choices=["adaptive", "fixed"],
+        default="adaptive",
+        help="adaptive: sample each job until its p50 CIs are tight; fixed: gas quantiles + time fill per job",
+    )
+    parser.add_argument("--max-samples-per-group", type=int, default=10, help="fixed mode: receipts per job")
+    parser.add_argument("--min-samples-per-group", type=int, default=5, help="adaptive mode: receipts before testing the CI")
+    parser.add_argument("--max-per-group", type=int, default=60, help="adaptive mode: cap per job")
+    parser.add_argument(
+        "--ci-rel-target",
+        type=float,
+        default=0.02,
+        help="adaptive mode: stop a job once the CI half-width of p50(gas_used) and p50(out/fee) is below this x p50",
+    )
+    parser.add_argument("--ci-z", type=float, default=1.96, help="adaptive mode: z of the median CI (1.96 = 95%%)")
+    parser.add_argument("--strata", type=int, default=4, help="adaptive mode: gas-price strata per job")
+    parser.add_argument("--budget", type=int, default=0, help="adaptive mode: max receipts fetched this run (0 = no cap)")
     parser.add_argument("--sleep-ms", type=int, default=250)
+    parser.add_argument("--batch-rows", type=int, default=20, help="Receipts buffered per CSV write")
+    parser.add_argument("--db", default="", help="Optional: also write new rows into this warehouse SQLite")
     args = parser.parse_args()
+    instrument.phase("load")
 
     api_key = _load_etherscan_api_key()
     base_url = str(args.base_url).rstrip("/")
@@ -230,103 +404,98 @@ def main() -> int:
     if not calls:
         raise RuntimeError("no calls found")
 
-    seen = _load_seen_hashes(args.out)
+    on_flush = warehouse.sink(warehouse.connect(args.db), "receipts") if args.db else None
+    store = append_store.AppendStore(
+        args.out, RECEIPT_FIELDS, ["tx_hash"], batch_rows=args.batch_rows, on_flush=on_flush
+    )
 
     # Group calls by job key.
-    groups: Dict[Tuple[str, str, str], List[CallRow]] = {}
+    groups: Dict[JobKey, List[CallRow]] = {}
     for r in calls:
-        # key = (selector, target, subkey)
-        if r.selector == "0xc7f884c6":
-            # vault: arg1 is pid
-            subkey = r.arg1 or ""
-        else:
-            subkey = ""
-        key = (r.selector, r.target, subkey)
-        groups.setdefault(key, []).append(r)
-
-    # Sample within each group; prioritize largest groups first.
-    group_items = sorted(groups.items(), key=lambda kv: len(kv[1]), reverse=True)
-    samples: List[Tuple[Tuple[str, str, str], CallRow]] = []
-    for key, items in group_items:
-        picked = _sample_calls(items, max_samples=int(args.max_samples_per_group))
-        for r in picked:
-            if r.tx_hash and r.tx_hash not in seen:
-                samples.append((key, r))
-
-    os.makedirs(os.path.dirname(args.out), exist_ok=True)
-    write_header = not os.path.exists(args.out)
+        groups.setdefault(_job_key(r), []).append(r)
+
     session = requests.Session()
     session.headers.update({"X-API-Key": api_key})
-
-    with open(args.out, "a", newline="") as f:
-        fieldnames = [
-            "tx_hash",
-            "timestamp",
-            "selector",
-            "target",
-            "subkey",
-            "arg1",
-            "arg2",
-            "tx_gas_price",
-            "receipt_status",
-            "gas_used",
-            "effective_gas_price",
-            "fee_wei",
-        ]
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        if write_header:
-            writer.writeheader()
-
-        for (selector, target, subkey), r in samples:
-            tx_hash = r.tx_hash
-            payload = _etherscan_request(
-                session=session,
-                base_url=base_url,
-                api_key=api_key,
-                chain_id=chain_id,
-                params={
-                    "module": "proxy",
-                    "action": "eth_getTransactionReceipt",
-                    "txhash": tx_hash,
-                },
-            )
-            receipt = payload.get("result")
-            if not isinstance(receipt, dict):
-                # Skip if missing (shouldn't happen for confirmed txs).
-                continue
-
-            gas_used = _hex_to_int(receipt.get("gasUsed"))
-            eff_gp = _hex_to_int(receipt.get("effectiveGasPrice"))
-            status = _hex_to_int(receipt.get("status"))
-            fee_wei = None
-            if gas_used is not None and eff_gp is not None:
-                fee_wei = gas_used * eff_gp
-
-            writer.writerow(
-                {
-                    "tx_hash": tx_hash,
-                    "timestamp": r.timestamp,
-                    "selector": selector,
-                    "target": target,
-                    "subkey": subkey,
-                    "arg1": r.arg1,
-                    "arg2": r.arg2,
-                    "tx_gas_price": r.gas_price,
-                    "receipt_status": status if status is not None else "",
-                    "gas_used": gas_used if gas_used is not None else "",
-                    "effective_gas_price": eff_gp if eff_gp is not None else "",
-                    "fee_wei": fee_wei if fee_wei is not None else "",
-                }
-            )
-            seen.add(tx_hash)
-
-            sleep_s = max(0.0, float(args.sleep_ms) / 1000.0)
+    sleep_s = max(0.0, float(args.sleep_ms) / 1000.0)
+
+    if args.mode == "fixed":
+        # Sample within each group; prioritize largest groups first.
+        group_items = sorted(groups.items(), key=lambda kv: len(kv[1]), reverse=True)
+        samples: List[Tuple[JobKey, CallRow]] = []
+        for key, items in group_items:
+            picked = _sample_calls(items, max_samples=int(args.max_samples_per_group))
+            samples.extend((key, r) for r in picked if r.tx_hash)
+        new_hashes = store.filter_new_keys(r.tx_hash for _, r in samples)
+        samples = [(key, r) for key, r in samples if r.tx_hash in new_hashes]
+
+        instrument.phase("fetch")
+        with store:
+            for key, r in samples:
+                row = _fetch_receipt_row(session, base_url, api_key, chain_id, key, r)
+                if row is not None:
+                    store.append(row)
+                if sleep_s:
+                    time.sleep(sleep_s)
+        return 0
+
+    # Adaptive: receipts already on disk count towards each job's estimate; each step fetches the next
+    # stratified candidate of the job whose p50 CI is currently widest, until every job meets the target,
+    # hits --max-per-group, runs out of calls, or the run budget is spent.
+    z = float(args.ci_z)
+    target = float(args.ci_rel_target)
+    existing = _load_existing_receipts(args.out)
+    jobs: Dict[JobKey, JobSampling] = {}
+    for key, items in groups.items():
+        new_hashes = store.filter_new_keys(r.tx_hash for r in items if r.tx_hash)
+        queue = [r for r in _stratified_order(items, int(args.strata)) if r.tx_hash in new_hashes]
+        jobs[key] = JobSampling(queue=queue, gas_used=[], out_per_fee=[])
+    for row in existing:
+        key = (str(row.get("selector", "")).lower(), str(row.get("target", "")).lower(), str(row.get("subkey", "")))
+        if key in jobs:
+            jobs[key].observe(row)
+            jobs[key].fetched += 1
+
+    def _priority(js: JobSampling) -> Optional[float]:
+        if not js.queue or js.fetched >= int(args.max_per_group):
+            return None
+        if js.fetched < int(args.min_samples_per_group):
+            return float("inf")
+        ci = js.ci_rel(z)
+        return ci if ci > target else None
+
+    fetched_run = 0
+    instrument.phase("fetch")
+    with store:
+        while not args.budget or fetched_run < int(args.budget):
+            ranked = [(p, key) for key, js in jobs.items() for p in [_priority(js)] if p is not None]
+            if not ranked:
+                break
+            _p, key = max(ranked, key=lambda x: (x[0], len(groups[x[1]])))
+            js = jobs[key]
+            r = js.queue.pop(0)
+            row = _fetch_receipt_row(session, base_url, api_key, chain_id, key, r)
+            fetched_run += 1
+            if row is not None:
+                store.append(row)
+                js.observe(row)
+                js.fetched += 1
             if sleep_s:
                 time.sleep(sleep_s)
 
+    print("job\tcalls\treceipts\tci_rel_gas_used\tci_rel_out_per_fee\tdone")
+    for key, js in sorted(jobs.items(), key=lambda kv: len(groups[kv[0]]), reverse=True):
+        ci_g = _median_ci_rel(js.gas_used, z)
+        ci_m = _median_ci_rel(js.out_per_fee, z)
+        if max(ci_g, ci_m) <= target:
+            done = "ci"
+        elif js.fetched >= int(args.max_per_group):
+            done = "cap"
+        else:
+            done = "exhausted" if not js.queue else "budget"
+        print(f"{':'.join(k for k in key if k)}\t{len(groups[key])}\t{js.fetched}\t{ci_g:.4f}\t{ci_m:.4f}\t{done}")
+    print(f"fetched this run: {fetched_run}")
     return 0
 
 
 if __name__ == "__main__":
-    raise SystemExit(main())
-
+    raise SystemExit(instrument.run(main))
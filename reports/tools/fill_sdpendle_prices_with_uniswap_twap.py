@@ -9,6 +9,12 @@ from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import requests
 
+import asof
+import harvester_abi
+import instrument
+import price_oracle
+import warehouse
+
 
 SDPENDLE_ADDR = "0x5ea630e00d6ee438d3dea1556a110359acdc10a9"
 PENDLE_ADDR = "0x808507121b80c02388fad14726482e061b8da827"
@@ -20,10 +26,6 @@ UNI_V3_POOL_PENDLE_WETH_3000 = "0x57af956d3e2cca3b86f3d8c6772c03ddca3eaacb"
 # Chainlink ETH/USD
 CHAINLINK_ETH_USD = "0x5f4eC3Df9cbd43714FE2740f5E3616155c5b8419"
 CHAINLINK_ETH_USD_DECIMALS = 8
-CHAINLINK_LATEST_ROUND_DATA = "0xfeaf968c"
-
-# observe(uint32[]) selector = 0x883bdbfd
-OBSERVE_SELECTOR = bytes.fromhex("883bdbfd")
 
 LN_1_0001 = math.log(1.0001)
 
@@ -107,10 +109,15 @@ def _etherscan_request(
     last_exc: Optional[Exception] = None
     for attempt in range(1, max_retries + 1):
         try:
-            resp = session.get(base_url, params=merged, timeout=timeout_s)
+            with instrument.span("etherscan.get"):
+                resp = session.get(base_url, params=merged, timeout=timeout_s)
+            instrument.count("etherscan.requests")
+            instrument.count("etherscan.bytes", len(resp.content or b""))
             resp.raise_for_status()
             payload = resp.json()
             if _is_rate_limited(payload) and attempt < max_retries:
+                instrument.count("etherscan.rate_limited")
+                instrument.count("etherscan.retries")
                 time.sleep(backoff_s * attempt)
                 continue
             if not isinstance(payload, dict):
@@ -119,6 +126,7 @@ def _etherscan_request(
         except Exception as exc:
             last_exc = exc
             if attempt < max_retries:
+                instrument.count("etherscan.retries")
                 time.sleep(backoff_s * attempt)
                 continue
             raise RuntimeError("Etherscan request failed") from exc
@@ -145,71 +153,6 @@ def _to_hex_quantity(value: int) -> str:
     return hex(int(value))
 
 
-def _encode_observe(seconds_ago: int) -> str:
-    if seconds_ago < 0:
-        raise ValueError("seconds_ago must be >= 0")
-    # observe(uint32[]) with [secondsAgo, 0]
-    # ABI encoding:
-    # 0: selector
-    # 4..: offset=0x20
-    # at offset: length=2, elem0=secondsAgo, elem1=0
-    head = OBSERVE_SELECTOR + (32).to_bytes(32, "big")
-    body = (2).to_bytes(32, "big") + int(seconds_ago).to_bytes(32, "big") + (0).to_bytes(32, "big")
-    return "0x" + (head + body).hex()
-
-
-def _decode_observe_return(data_hex: str) -> Tuple[List[int], List[int]]:
-    data = _normalize_hex(data_hex)
-    if not data.startswith("0x"):
-        raise ValueError("invalid hex")
-    raw = bytes.fromhex(data[2:])
-    if len(raw) < 64:
-        raise ValueError("short return data")
-
-    def word(i: int) -> bytes:
-        start = i * 32
-        end = start + 32
-        return raw[start:end]
-
-    tick_off = int.from_bytes(word(0), "big")
-    spl_off = int.from_bytes(word(1), "big")
-
-    def decode_int256_at(offset: int) -> int:
-        w = raw[offset : offset + 32]
-        if len(w) != 32:
-            raise ValueError("short word")
-        x = int.from_bytes(w, "big")
-        if x >= 2**255:
-            x -= 2**256
-        return x
-
-    def decode_uint256_at(offset: int) -> int:
-        w = raw[offset : offset + 32]
-        if len(w) != 32:
-            raise ValueError("short word")
-        return int.from_bytes(w, "big")
-
-    def decode_int_array(offset: int) -> List[int]:
-        ln = decode_uint256_at(offset)
-        out: List[int] = []
-        base = offset + 32
-        for i in range(ln):
-            out.append(decode_int256_at(base + 32 * i))
-        return out
-
-    def decode_uint_array(offset: int) -> List[int]:
-        ln = decode_uint256_at(offset)
-        out: List[int] = []
-        base = offset + 32
-        for i in range(ln):
-            out.append(decode_uint256_at(base + 32 * i))
-        return out
-
-    ticks = decode_int_array(tick_off)
-    spls = decode_uint_array(spl_off)
-    return ticks, spls
-
-
 def _arithmetic_mean_tick(tick_cumulatives: Sequence[int], seconds_ago: int) -> int:
     if len(tick_cumulatives) < 2:
         raise ValueError("need 2 tick cumulatives")
@@ -228,6 +171,87 @@ def _pendle_eth_from_tick(mean_tick: int) -> float:
     return math.exp(float(mean_tick) * LN_1_0001)
 
 
+def _observe_call(
+    *,
+    session: requests.Session,
+    base_url: str,
+    api_key: str,
+    chain_id: str,
+    bn: int,
+    seconds_agos: Sequence[int],
+) -> Optional[List[int]]:
+    # Returns the tick cumulatives for `seconds_agos` at block `bn`, or None when the call reverts
+    # (observe() reverts with "OLD" when an offset is older than the pool's oldest observation).
+    # Other failures raise price_oracle.TransientCallError.
+    payload = _etherscan_request(
+        session=session,
+        base_url=base_url,
+        api_key=api_key,
+        chain_id=chain_id,
+        params={
+            "module": "proxy",
+            "action": "eth_call",
+            "to": UNI_V3_POOL_PENDLE_WETH_3000,
+            "data": harvester_abi.UNIV3_OBSERVE.encode_call_hex(list(seconds_agos)),
+            "tag": _to_hex_quantity(bn),
+        },
+    )
+    result = price_oracle.eth_call_result(payload)
+    if result is None:
+        return None
+    ticks, _spl = harvester_abi.UNIV3_OBSERVE.decode_output(result)
+    if len(ticks) != len(seconds_agos):
+        raise price_oracle.TransientCallError(f"observe returned {len(ticks)} values at block {bn}")
+    return [int(t) for t in ticks]
+
+
+def _twap_pendle_eth_per_block(
+    *,
+    session: requests.Session,
+    base_url: str,
+    api_key: str,
+    chain_id: str,
+    bn: int,
+    twap_s: int,
+) -> float:
+    # observe([secondsAgo, 0])
+    ticks = _observe_call(
+        session=session, base_url=base_url, api_key=api_key, chain_id=chain_id, bn=bn, seconds_agos=[twap_s, 0]
+    )
+    if ticks is None:
+        raise RuntimeError(f"unexpected eth_call result at block {bn}")
+    return _pendle_eth_from_tick(_arithmetic_mean_tick(ticks, twap_s))
+
+
+def _twap_pendle_eth_batched(
+    *,
+    session: requests.Session,
+    base_url: str,
+    api_key: str,
+    chain_id: str,
+    blocks: Sequence[Tuple[int, int]],
+    twap_s: int,
+    max_targets: int,
+    max_span_s: int,
+    sleep_s: float,
+) -> Tuple[List[float], int]:
+    # Grouped observe() calls, see price_oracle.univ3_mean_ticks.
+    def observe(bn: int, seconds_agos: Sequence[int]) -> Optional[List[int]]:
+        ticks = _observe_call(
+            session=session, base_url=base_url, api_key=api_key, chain_id=chain_id, bn=bn, seconds_agos=seconds_agos
+        )
+        time.sleep(sleep_s)
+        return ticks
+
+    mean_ticks, n_calls = price_oracle.univ3_mean_ticks(
+        observe, blocks, twap_s, max_targets=max_targets, max_span_s=max_span_s
+    )
+    missing = [bn for bn, _ts in blocks if bn not in mean_ticks]
+    if missing:
+        raise RuntimeError(f"unexpected eth_call result at block {missing[0]}")
+    return [_pendle_eth_from_tick(mean_ticks[bn]) for bn, _ts in blocks], n_calls
+
+
 def _load_eth_prices_from_prices_json(path: str) -> List[Tuple[int, float]]:
     with open(path) as f:
         payload = json.load(f)
@@ -246,29 +270,6 @@ def _load_eth_prices_from_prices_json(path: str) -> List[Tuple[int, float]]:
     return out
 
 
-def _price_at(series: Sequence[Tuple[int, float]], ts_s: int) -> Optional[float]:
-    if not series:
-        return None
-    ts_ms = int(ts_s) * 1000
-    if ts_ms <= series[0][0]:
-        return float(series[0][1])
-    if ts_ms >= series[-1][0]:
-        return float(series[-1][1])
-    lo = 0
-    hi = len(series) - 1
-    while lo + 1 < hi:
-        mid = (lo + hi) // 2
-        if series[mid][0] == ts_ms:
-            return float(series[mid][1])
-        if series[mid][0] < ts_ms:
-            lo = mid
-        else:
-            hi = mid
-    if abs(series[lo][0] - ts_ms) <= abs(series[hi][0] - ts_ms):
-        return float(series[lo][1])
-    return float(series[hi][1])
-
-
 def _load_sdpendle_call_blocks(path: str) -> List[Tuple[int, int]]:
     out: List[Tuple[int, int]] = []
     with open(path, newline="") as f:
@@ -311,7 +312,28 @@ def main() -> int:
     parser.add_argument("--chain-id", default="1")
     parser.add_argument("--base-url", default="https://api.etherscan.io/v2/api")
     parser.add_argument("--sleep-ms", type=int, default=350)
+    parser.add_argument(
+        "--observe-mode",
+        default="batched",
+        choices=["batched", "per-block"],
+        help="batched: one observe() over many secondsAgo per eth_call; per-block: observe([twap, 0]) at every block",
+    )
+    parser.add_argument("--observe-batch", type=int, default=32, help="Max target blocks per batched observe() call")
+    parser.add_argument(
+        "--observe-max-span-s",
+        type=int,
+        default=86400,
+        help="Max seconds between a batch's anchor block and its oldest TWAP start (shrinks on OLD reverts)",
+    )
+    parser.add_argument(
+        "--max-price-staleness-s",
+        type=float,
+        default=asof.DEFAULT_MAX_PRICE_STALENESS_S,
+        help="With --eth-usd-source coingecko: fail if the nearest ETH price is further than this (0 = accept any)",
+    )
+    parser.add_argument("--db", default="", help="Optional: also load the price series into this warehouse SQLite")
     args = parser.parse_args()
+    instrument.phase("load")
 
     twap_s = int(args.twap_seconds)
     if twap_s <= 0:
@@ -342,8 +364,40 @@ def main() -> int:
     session = requests.Session()
     session.headers.update({"X-API-Key": api_key, "User-Agent": "etherscan-mcp-use/0.1"})
 
+    instrument.phase("fetch")
+    eth_at_block: List[Optional[float]] = []
+    if eth_prices:
+        eth_at_block = asof.price_join(
+            eth_prices, [ts for _bn, ts in blocks], max_staleness_s=args.max_price_staleness_s
+        )[0]
+
+    if args.observe_mode == "batched":
+        pendle_eth_at_block, n_observe = _twap_pendle_eth_batched(
+            session=session,
+            base_url=base_url,
+            api_key=api_key,
+            chain_id=chain_id,
+            blocks=blocks,
+            twap_s=twap_s,
+            max_targets=int(args.observe_batch),
+            max_span_s=int(args.observe_max_span_s),
+            sleep_s=max(0.0, float(args.sleep_ms) / 1000.0),
+        )
+    else:
+        pendle_eth_at_block = []
+        n_observe = 0
+        for bn, ts in blocks:
+            pendle_eth_at_block.append(
+                _twap_pendle_eth_per_block(
+                    session=session, base_url=base_url, api_key=api_key, chain_id=chain_id, bn=bn, twap_s=twap_s
+                )
+            )
+            n_observe += 1
+            time.sleep(max(0.0, float(args.sleep_ms) / 1000.0))
+    print(f"observe: {n_observe} eth_call(s) for {len(blocks)} block(s) (mode={args.observe_mode})")
+
     series_out: List[List[float]] = []
-    for bn, ts in blocks:
+    for i, (bn, ts) in enumerate(blocks):
         eth_usd: Optional[float] = None
         if args.eth_usd_source == "chainlink":
             px_payload = _etherscan_request(
@@ -355,50 +409,27 @@ def main() -> int:
                     "module": "proxy",
                     "action": "eth_call",
                     "to": CHAINLINK_ETH_USD,
-                    "data": CHAINLINK_LATEST_ROUND_DATA,
+                    "data": harvester_abi.CHAINLINK_LATEST_ROUND_DATA.encode_call_hex(),
                     "tag": _to_hex_quantity(bn),
                 },
             )
             px_hex = px_payload.get("result")
             if not isinstance(px_hex, str) or not px_hex.startswith("0x") or len(px_hex) < 2 + 32 * 5 * 2:
                 raise RuntimeError(f"unexpected chainlink eth_call result at block {bn}")
-            raw = bytes.fromhex(px_hex[2:])
             # latestRoundData() returns (uint80, int256 answer, uint256, uint256, uint80)
-            answer = int.from_bytes(raw[32:64], "big", signed=True)
+            answer = harvester_abi.CHAINLINK_LATEST_ROUND_DATA.decode_output(px_hex)[1]
             if answer <= 0:
                 raise RuntimeError(f"invalid chainlink eth_usd={answer} at block {bn}")
             eth_usd = float(answer) / float(10**CHAINLINK_ETH_USD_DECIMALS)
             time.sleep(max(0.0, float(args.sleep_ms) / 1000.0))
 
-        data = _encode_observe(twap_s)
-        payload = _etherscan_request(
-            session=session,
-            base_url=base_url,
-            api_key=api_key,
-            chain_id=chain_id,
-            params={
-                "module": "proxy",
-                "action": "eth_call",
-                "to": UNI_V3_POOL_PENDLE_WETH_3000,
-                "data": data,
-                "tag": _to_hex_quantity(bn),
-            },
-        )
-        result = payload.get("result")
-        if not isinstance(result, str) or not result.startswith("0x"):
-            raise RuntimeError(f"unexpected eth_call result at block {bn}")
-        ticks, _spl = _decode_observe_return(result)
-        if len(ticks) < 2:
-            raise RuntimeError(f"observe returned insufficient ticks at block {bn}")
-        mean_tick = _arithmetic_mean_tick(ticks[:2], twap_s)
-        pendle_eth = _pendle_eth_from_tick(mean_tick)  # ETH per PENDLE
+        pendle_eth = pendle_eth_at_block[i]  # ETH per PENDLE
         if args.eth_usd_source == "coingecko":
-            eth_usd = _price_at(eth_prices, ts)
+            eth_usd = eth_at_block[i]
         if eth_usd is None or eth_usd <= 0:
             raise RuntimeError(f"missing eth_usd at ts={ts} (source={args.eth_usd_source})")
         sdpendle_usd = float(pendle_eth) * float(eth_usd)  # assume sdPENDLE ~ PENDLE
         series_out.append([float(ts) * 1000.0, float(sdpendle_usd)])
-        time.sleep(max(0.0, float(args.sleep_ms) / 1000.0))
 
     # De-dup timestamps (keep last)
     uniq: Dict[int, float] = {}
@@ -418,6 +449,7 @@ def main() -> int:
             "pair": f"{PENDLE_ADDR}/{WETH_ADDR}",
             "twap_seconds": twap_s,
             "eth_usd_source": str(args.eth_usd_source),
+            "observe_mode": str(args.observe_mode),
             "note": "Compute PENDLE/ETH TWAP from UniswapV3 pool and convert to USD; assumes sdPENDLE ~= PENDLE.",
         }
 
@@ -428,12 +460,17 @@ def main() -> int:
             "method": "uniswap_v3_twap_pendle_weth * eth_usd_series",
         }
 
+    instrument.phase("write")
     os.makedirs(os.path.dirname(args.out), exist_ok=True)
     with open(args.out, "w") as f:
         json.dump(prices_payload, f)
+    if args.db:
+        conn = warehouse.connect(args.db)
+        warehouse.import_prices_payload(conn, prices_payload)
+        conn.close()
 
     return 0
 
 
 if __name__ == "__main__":
-    raise SystemExit(main())
+    raise SystemExit(instrument.run(main))
@@ -0,0 +1,317 @@
+import argparse
+import csv
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+import instrument
+
+
+@dataclass(frozen=True)
+class GasPaths:
+    paths: np.ndarray  # (n_paths, n_blocks), wei
+    first_block: int
+    block_s: float
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def n_paths(self) -> int:
+        return int(self.paths.shape[0])
+
+    @property
+    def n_blocks(self) -> int:
+        return int(self.paths.shape[1])
+
+    def block_index(self, block_numbers: Sequence[int], clamp: bool = False) -> np.ndarray:
+        # Blocks outside [first_block, first_block + n_blocks) raise: the paths were generated for
+        # another window. clamp=True maps them to the nearest end of the horizon instead.
+        idx = np.asarray(block_numbers, dtype=np.int64) - int(self.first_block)
+        outside = (idx < 0) | (idx >= self.n_blocks)
+        if outside.any() and not clamp:
+            bad = np.asarray(block_numbers, dtype=np.int64)[outside]
+            raise ValueError(
+                f"{int(outside.sum())} block(s) in [{int(bad.min())}, {int(bad.max())}] are outside the gas path "
+                f"horizon [{self.first_block}, {self.first_block + self.n_blocks - 1}]; regenerate the paths "
+                "for this window"
+            )
+        return np.clip(idx, 0, self.n_blocks - 1)
+
+    def at_blocks(self, block_numbers: Sequence[int], clamp: bool = False) -> np.ndarray:
+        # (n_paths, len(block_numbers)) gas prices; see block_index for blocks outside the horizon.
+        return self.paths[:, self.block_index(block_numbers, clamp)]
+
+
+def observed_gas_by_block(
+    block_numbers: Sequence[int], gas_prices: Sequence[int]
+) -> Tuple[int, np.ndarray]:
+    # Forward-fill per-tx gas_price onto a contiguous block clock starting at the first block.
+    pairs = [(int(b), float(g)) for b, g in zip(block_numbers, gas_prices) if int(b) > 0 and int(g) > 0]
+    if not pairs:
+        raise ValueError("no gas_price observations")
+    first_block = min(b for b, _ in pairs)
+    n_blocks = max(b for b, _ in pairs) - first_block + 1
+    gas = np.full(n_blocks, np.nan, dtype=np.float64)
+    for b, g in pairs:
+        gas[b - first_block] = g
+    valid = ~np.isnan(gas)
+    idx = np.where(valid, np.arange(n_blocks), 0)
+    np.maximum.accumulate(idx, out=idx)
+    return first_block, gas[idx]
+
+
+def load_observed_from_calls(path: str) -> Tuple[int, np.ndarray]:
+    blocks: List[int] = []
+    gas: List[int] = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                blocks.append(int(row.get("block_number") or "0"))
+                gas.append(int(row.get("gas_price") or "0"))
+            except ValueError:
+                continue
+    return observed_gas_by_block(blocks, gas)
+
+
+@dataclass(frozen=True)
+class BlockBootstrapModel:
+    observed: np.ndarray
+    block_len: int
+
+    def sample(self, n_paths: int, n_blocks: int, rng: np.random.Generator) -> np.ndarray:
+        # Circular block bootstrap: each path concatenates random `block_len` windows of the observed series.
+        n = self.observed.shape[0]
+        n_chunks = -(-n_blocks // self.block_len)
+        starts = rng.integers(0, n, size=(n_paths, n_chunks))
+        offsets = np.arange(self.block_len)
+        idx = (starts[:, :, None] + offsets[None, None, :]).reshape(n_paths, -1)[:, :n_blocks] % n
+        return self.observed[idx]
+
+    def stream(
+        self, n_paths: int, n_blocks: int, chunk_blocks: int, rng: np.random.Generator
+    ) -> Iterator[np.ndarray]:
+        # Window boundaries are aligned to `block_len`, so chunks are statistically identical to `sample`.
+        chunk_blocks = max(self.block_len, chunk_blocks - chunk_blocks % self.block_len)
+        done = 0
+        while done < n_blocks:
+            m = min(chunk_blocks, n_blocks - done)
+            yield self.sample(n_paths, m, rng)
+            done += m
+
+
+@dataclass(frozen=True)
+class RegimeSwitchingModel:
+    # Markov-switching AR(1) on log gas, simulated every `step_blocks` and held constant in between
+    # (gas observations are piecewise constant on the block clock).
+    step_blocks: int
+    transition: np.ndarray  # (R, R) row-stochastic
+    mu: np.ndarray  # (R,)
+    phi: np.ndarray  # (R,)
+    sigma: np.ndarray  # (R,)
+    stationary: np.ndarray  # (R,)
+    log_floor: float
+    log_cap: float
+
+    def _steps(
+        self, n_paths: int, n_steps: int, rng: np.random.Generator, state: Optional[Tuple[np.ndarray, np.ndarray]]
+    ) -> Tuple[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+        n_reg = self.mu.shape[0]
+        if state is None:
+            reg = rng.choice(n_reg, size=n_paths, p=self.stationary)
+            x = self.mu[reg].copy()
+        else:
+            reg, x = state
+            reg = reg.copy()
+            x = x.copy()
+        cum = np.cumsum(self.transition, axis=1)
+        u = rng.random((n_steps, n_paths))
+        eps = rng.standard_normal((n_steps, n_paths))
+        out = np.empty((n_paths, n_steps), dtype=np.float64)
+        for t in range(n_steps):
+            reg = np.minimum((u[t][:, None] > cum[reg]).sum(axis=1), n_reg - 1)
+            m = self.mu[reg]
+            x = m + self.phi[reg] * (x - m) + self.sigma[reg] * eps[t]
+            np.clip(x, self.log_floor, self.log_cap, out=x)
+            out[:, t] = x
+        return out, (reg, x)
+
+    def sample(self, n_paths: int, n_blocks: int, rng: np.random.Generator) -> np.ndarray:
+        n_steps = -(-n_blocks // self.step_blocks)
+        logs, _ = self._steps(n_paths, n_steps, rng, None)
+        return np.exp(np.repeat(logs, self.step_blocks, axis=1)[:, :n_blocks])
+
+    def stream(
+        self, n_paths: int, n_blocks: int, chunk_blocks: int, rng: np.random.Generator
+    ) -> Iterator[np.ndarray]:
+        chunk_blocks = max(self.step_blocks, chunk_blocks - chunk_blocks % self.step_blocks)
+        state: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        done = 0
+        while done < n_blocks:
+            m = min(chunk_blocks, n_blocks - done)
+            logs, state = self._steps(n_paths, -(-m // self.step_blocks), rng, state)
+            yield np.exp(np.repeat(logs, self.step_blocks, axis=1)[:, :m])
+            done += m
+
+
+def fit_block_bootstrap(observed: np.ndarray, block_len: int = 300) -> BlockBootstrapModel:
+    if observed.ndim != 1 or observed.shape[0] == 0:
+        raise ValueError("observed must be a non-empty 1-d series")
+    return BlockBootstrapModel(observed=np.asarray(observed, dtype=np.float64), block_len=max(1, int(block_len)))
+
+
+def fit_regime_switching(
+    observed: np.ndarray, *, n_regimes: int = 2, step_blocks: int = 25
+) -> RegimeSwitchingModel:
+    if n_regimes < 1:
+        raise ValueError("n_regimes must be >= 1")
+    step_blocks = max(1, int(step_blocks))
+    x = np.log(np.asarray(observed, dtype=np.float64)[::step_blocks])
+    if x.shape[0] < 2 * n_regimes + 1:
+        raise ValueError("observed series too short for the requested regimes")
+
+    # Regimes by log-gas quantile bands; fit transitions and a per-regime AR(1) on x[t] | regime[t].
+    edges = np.quantile(x, np.linspace(0, 1, n_regimes + 1)[1:-1])
+    reg = np.searchsorted(edges, x, side="right")
+    trans = np.ones((n_regimes, n_regimes))  # Laplace smoothing
+    np.add.at(trans, (reg[:-1], reg[1:]), 1.0)
+    trans /= trans.sum(axis=1, keepdims=True)
+
+    mu = np.empty(n_regimes)
+    phi = np.empty(n_regimes)
+    sigma = np.empty(n_regimes)
+    for r in range(n_regimes):
+        sel = np.flatnonzero(reg[1:] == r) + 1
+        xr = x[reg == r]
+        mu[r] = float(xr.mean()) if xr.size else float(x.mean())
+        if sel.size >= 3:
+            prev = x[sel - 1] - mu[r]
+            cur = x[sel] - mu[r]
+            denom = float(prev @ prev)
+            phi[r] = float(np.clip(prev @ cur / denom, 0.0, 0.999)) if denom > 0 else 0.0
+            resid = cur - phi[r] * prev
+            sigma[r] = float(resid.std()) or 1e-6
+        else:
+            phi[r] = 0.0
+            sigma[r] = float(xr.std()) if xr.size > 1 else 1e-6
+
+    # Stationary distribution of the regime chain (left eigenvector for eigenvalue 1).
+    w, v = np.linalg.eig(trans.T)
+    pi = np.real(v[:, int(np.argmin(np.abs(w - 1.0)))])
+    pi = np.abs(pi) / np.abs(pi).sum()
+
+    spread = float(x.max() - x.min())
+    return RegimeSwitchingModel(
+        step_blocks=step_blocks,
+        transition=trans,
+        mu=mu,
+        phi=phi,
+        sigma=sigma,
+        stationary=pi,
+        log_floor=float(x.min()) - 0.5 * spread,
+        log_cap=float(x.max()) + 0.5 * spread,
+    )
+
+
+GasPathModel = Union[BlockBootstrapModel, RegimeSwitchingModel]
+
+
+def fit_model(
+    observed: np.ndarray, kind: str, *, block_len: int = 300, step_blocks: int = 25, n_regimes: int = 2
+) -> GasPathModel:
+    if kind == "bootstrap":
+        return fit_block_bootstrap(observed, block_len=block_len)
+    if kind == "regime":
+        return fit_regime_switching(observed, n_regimes=n_regimes, step_blocks=step_blocks)
+    raise ValueError(f"unknown gas model {kind!r}")
+
+
+def save_paths(path: str, paths: GasPaths) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez(
+        path,
+        paths=paths.paths,
+        first_block=np.int64(paths.first_block),
+        block_s=np.float64(paths.block_s),
+        meta=np.array(json.dumps(paths.meta)),
+    )
+
+
+def load_paths(path: str) -> GasPaths:
+    # `.npz` from save_paths, or a streamed `.npy` (memory-mapped) with a `<path>.meta.json` sidecar.
+    if path.endswith(".npy"):
+        with open(path + ".meta.json") as f:
+            meta = json.load(f)
+        arr = np.load(path, mmap_mode="r")
+        return GasPaths(
+            paths=arr,
+            first_block=int(meta.get("first_block", 0)),
+            block_s=float(meta.get("block_s", 12.0)),
+            meta=meta,
+        )
+    with np.load(path) as z:
+        return GasPaths(
+            paths=np.asarray(z["paths"], dtype=np.float64),
+            first_block=int(z["first_block"]),
+            block_s=float(z["block_s"]),
+            meta=json.loads(str(z["meta"])) if "meta" in z else {},
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls-csv", default="data/f88e_harvester_calls_7d.csv")
+    parser.add_argument("--out", default="data/gas_paths.npz", help=".npz (batch) or .npy (streamed, memory-mapped)")
+    parser.add_argument("--model", default="bootstrap", choices=["bootstrap", "regime"])
+    parser.add_argument("--paths", type=int, default=1000)
+    parser.add_argument("--blocks", type=int, default=0, help="horizon in blocks (0 = observed span)")
+    parser.add_argument("--block-len", type=int, default=300, help="bootstrap window (blocks)")
+    parser.add_argument("--step-blocks", type=int, default=25, help="regime model step (blocks)")
+    parser.add_argument("--regimes", type=int, default=2)
+    parser.add_argument("--chunk-blocks", type=int, default=50000, help="streaming chunk size (.npy output)")
+    parser.add_argument("--block-s", type=float, default=12.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    first_block, observed = load_observed_from_calls(args.calls_csv)
+    model = fit_model(
+        observed,
+        args.model,
+        block_len=int(args.block_len),
+        step_blocks=int(args.step_blocks),
+        n_regimes=int(args.regimes),
+    )
+    n_paths = max(1, int(args.paths))
+    n_blocks = int(args.blocks) or int(observed.shape[0])
+    rng = np.random.default_rng(int(args.seed))
+    meta = {
+        "model": args.model,
+        "seed": int(args.seed),
+        "calls_csv": args.calls_csv,
+        "first_block": first_block,
+        "block_s": float(args.block_s),
+        "observed_blocks": int(observed.shape[0]),
+    }
+
+    if args.out.endswith(".npy"):
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        out = np.lib.format.open_memmap(args.out, mode="w+", dtype=np.float64, shape=(n_paths, n_blocks))
+        pos = 0
+        for chunk in model.stream(n_paths, n_blocks, int(args.chunk_blocks), rng):
+            out[:, pos : pos + chunk.shape[1]] = chunk
+            pos += chunk.shape[1]
+        out.flush()
+        del out
+        with open(args.out + ".meta.json", "w") as f:
+            json.dump(meta, f)
+    else:
+        paths = model.sample(n_paths, n_blocks, rng)
+        save_paths(args.out, GasPaths(paths=paths, first_block=first_block, block_s=float(args.block_s), meta=meta))
+
+    print(f"wrote {n_paths} x {n_blocks} gas paths ({args.model}) to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(instrument.run(main))
@@ -0,0 +1,411 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import instrument
+import quantile_sketch
+
+
+# Live harvest-threshold alerts: for every job, on every new block, is the accrued amount worth the gas?
+#
+#   expected_token(t) = accrued_token + rate_token_per_s * (t - as_of_ts)
+#   threshold_token(g) = k * g                 (k_token_per_wei_p50 from the config estimates CSV)
+#                      = a + b * g             (--threshold fit, for jobs whose k_fit_model is "fit")
+#   ready = expected >= threshold > 0          (same condition as the backtest trigger)
+#
+# Everything that does not depend on the block is folded into per-job arrays when the inputs load:
+# base = accrued - rate * as_of - a, so a block costs one fused numpy comparison across all jobs,
+# base + rate * t >= b * g. Events are edge-triggered: "ready" when a job crosses up, "cleared" when
+# a gas spike (or a lower accrual estimate) pushes it back under. Each event carries latency_ms, the
+# time from seeing the block to writing the event.
+#
+# Accruals come from --accruals-csv (job,accrued_token,rate_token_per_s,as_of_ts), required on a live
+# chain and re-read whenever the file changes, so whatever tracks balances/harvests can rewrite it while
+# the daemon runs. Only rows that changed since the last read replace a job's accrual; the others keep
+# their state, including a reset from harvested(). On a live chain, jobs not in the file never fire.
+# With --mock they are seeded at zero from the first block with rate = threshold(ref gas) / gap_s_p50,
+# i.e. the pace at which the observed bots harvest them.
+#
+# Chains: the Etherscan proxy (default, same API key as the other tools), a JSON-RPC node (--rpc-url),
+# or --mock: a local chain replaying a gas series (observed gas from the calls CSV, or one path of a
+# gas_paths.py file) with no network. --mock-harvest resets a job's accrual when it turns ready, so the
+# mock cycles through ready/harvested like a running bot. Both are polled; neither endpoint pushes blocks.
+
+
+@dataclass(frozen=True)
+class Block:
+    number: int
+    timestamp: int
+    gas_price_wei: int
+    seen_at: float  # time.monotonic() when fetched
+
+
+@dataclass(frozen=True)
+class JobConfig:
+    job: str
+    intercept_token: float
+    slope_token_per_wei: float
+    gap_s_p50: float
+
+
+@dataclass(frozen=True)
+class Accrual:
+    accrued_token: float
+    rate_token_per_s: float
+    as_of_ts: int
+
+
+def _float(value: Any) -> float:
+    try:
+        return float(value or "0")
+    except ValueError:
+        return 0.0
+
+
+def _load_config_jobs(path: str, threshold: str) -> List[JobConfig]:
+    out: List[JobConfig] = []
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        if threshold == "fit" and "k_fit_model" not in (reader.fieldnames or []):
+            raise SystemExit(f"--threshold fit: {path} has no k_fit_* columns (rebuild the config with the fit)")
+        for row in reader:
+            job = (row.get("job") or "").strip()
+            if not job:
+                continue
+            a = 0.0
+            b = _float(row.get("k_token_per_wei_p50"))
+            # The builder keeps p50 for a job whose fit did not beat it.
+            if threshold == "fit" and (row.get("k_fit_model") or "").strip() == "fit":
+                a = _float(row.get("k_fit_intercept_token"))
+                b = _float(row.get("k_fit_slope_token_per_wei"))
+            gap = _float(row.get("gap_s_p50"))
+            out.append(JobConfig(job=job, intercept_token=a, slope_token_per_wei=b, gap_s_p50=gap))
+    return out
+
+
+def _load_accruals(path: str) -> Dict[str, Accrual]:
+    out: Dict[str, Accrual] = {}
+    if not path or not os.path.exists(path):
+        return out
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            job = (row.get("job") or "").strip()
+            if not job:
+                continue
+            out[job] = Accrual(
+                accrued_token=_float(row.get("accrued_token")),
+                rate_token_per_s=_float(row.get("rate_token_per_s")),
+                as_of_ts=int(_float(row.get("as_of_ts"))),
+            )
+    return out
+
+
+class JobTable:
+    # Per-job constants as arrays; evaluate() is the only per-block work.
+    def __init__(
+        self,
+        jobs: Sequence[JobConfig],
+        accruals: Dict[str, Accrual],
+        seed_ts: int,
+        ref_gas_wei: float,
+        seed: bool = True,
+    ) -> None:
+        self.names = [j.job for j in jobs]
+        self.a = np.array([j.intercept_token for j in jobs], dtype=np.float64)
+        self.b = np.array([j.slope_token_per_wei for j in jobs], dtype=np.float64)
+        self.rate = np.zeros(len(jobs), dtype=np.float64)
+        # -inf: no accrual known for the job, so it never turns ready.
+        self.base = np.full(len(jobs), -np.inf, dtype=np.float64)
+        self.seeded = np.zeros(len(jobs), dtype=bool)
+        self.accruals: Dict[str, Accrual] = {}
+        for i, j in enumerate(jobs):
+            if j.job in accruals or not seed:
+                continue
+            # Seed: zero at seed_ts, accruing at the pace the observed bots harvest this job.
+            threshold = j.intercept_token + j.slope_token_per_wei * ref_gas_wei
+            self._set(i, Accrual(0.0, threshold / j.gap_s_p50 if j.gap_s_p50 > 0 else 0.0, seed_ts))
+            self.seeded[i] = True
+        self.merge(accruals)
+
+    def _set(self, i: int, acc: Accrual) -> None:
+        self.rate[i] = acc.rate_token_per_s
+        self.base[i] = acc.accrued_token - acc.rate_token_per_s * float(acc.as_of_ts) - self.a[i]
+
+    def merge(self, accruals: Dict[str, Accrual]) -> None:
+        # Apply only the rows that changed since the last merge; other jobs keep their current state.
+        for i, name in enumerate(self.names):
+            acc = accruals.get(name)
+            if acc is None or self.accruals.get(name) == acc:
+                continue
+            self._set(i, acc)
+            self.seeded[i] = False
+            self.accruals[name] = acc
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def evaluate(self, ts: int, gas_price_wei: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # (expected_token, threshold_token, ready) for every job at one block.
+        t = float(ts)
+        g = float(gas_price_wei)
+        lhs = self.base + self.rate * t
+        rhs = self.b * g
+        ready = (lhs >= rhs) & (rhs + self.a > 0)
+        return lhs + self.a, rhs + self.a, ready
+
+    def harvested(self, mask: np.ndarray, ts: int) -> None:
+        # Accrual restarts from zero at ts for the masked jobs.
+        self.base[mask] = -self.rate[mask] * float(ts) - self.a[mask]
+
+
+class EtherscanChain:
+    def __init__(self, base_url: str, chain_id: str) -> None:
+        import requests
+
+        from build_harvester_bot_7d_report import _load_etherscan_api_key
+
+        self.api_key = _load_etherscan_api_key()
+        self.session = requests.Session()
+        self.session.headers.update({"X-API-Key": self.api_key, "User-Agent": "etherscan-mcp-use/0.1"})
+        self.base_url = base_url.rstrip("/")
+        self.chain_id = chain_id
+
+    def latest_block(self) -> Dict[str, Any]:
+        from build_harvester_bot_7d_report import _etherscan_request
+
+        payload = _etherscan_request(
+            session=self.session,
+            base_url=self.base_url,
+            api_key=self.api_key,
+            chain_id=self.chain_id,
+            params={"module": "proxy", "action": "eth_getBlockByNumber", "tag": "latest", "boolean": "false"},
+            max_retries=2,
+        )
+        result = payload.get("result")
+        if not isinstance(result, dict):
+            raise RuntimeError(f"unexpected eth_getBlockByNumber result: {result!r}")
+        return result
+
+
+class RpcChain:
+    def __init__(self, url: str) -> None:
+        import requests
+
+        self.session = requests.Session()
+        self.url = url
+
+    def latest_block(self) -> Dict[str, Any]:
+        body = {"jsonrpc": "2.0", "id": 1, "method": "eth_getBlockByNumber", "params": ["latest", False]}
+        with instrument.span("rpc.post"):
+            resp = self.session.post(self.url, json=body, timeout=5)
+        instrument.count("rpc.requests")
+        resp.raise_for_status()
+        result = resp.json().get("result")
+        if not isinstance(result, dict):
+            raise RuntimeError(f"unexpected eth_getBlockByNumber result: {result!r}")
+        return result
+
+
+class PolledChain:
+    # New blocks from a latest_block() source; gas price = baseFeePerGas + tip.
+    def __init__(self, source: Any, tip_wei: int) -> None:
+        self.source = source
+        self.tip_wei = tip_wei
+        self.last_number = -1
+
+    def next_block(self) -> Optional[Block]:
+        raw = self.source.latest_block()
+        seen_at = time.monotonic()
+        number = int(raw["number"], 16)
+        if number <= self.last_number:
+            return None
+        self.last_number = number
+        base_fee = int(raw.get("baseFeePerGas") or "0x0", 16)
+        return Block(
+            number=number, timestamp=int(raw["timestamp"], 16), gas_price_wei=base_fee + self.tip_wei, seen_at=seen_at
+        )
+
+
+class MockChain:
+    # Replays a gas series one block at a time; speed=0 runs as fast as the daemon consumes blocks.
+    def __init__(self, gas: np.ndarray, first_block: int, start_ts: int, block_s: float, speed: float) -> None:
+        self.gas = gas
+        self.first_block = first_block
+        self.start_ts = start_ts
+        self.block_s = block_s
+        self.speed = speed
+        self.i = 0
+        self.started = time.monotonic()
+
+    def next_block(self) -> Optional[Block]:
+        if self.i >= self.gas.shape[0]:
+            raise StopIteration
+        if self.speed > 0:
+            due = self.started + self.i * self.block_s / self.speed
+            now = time.monotonic()
+            if now < due:
+                return None
+        i = self.i
+        self.i += 1
+        return Block(
+            number=self.first_block + i,
+            timestamp=self.start_ts + int(round(i * self.block_s)),
+            gas_price_wei=int(self.gas[i]),
+            seen_at=time.monotonic(),
+        )
+
+
+def _mock_chain(args: argparse.Namespace) -> MockChain:
+    import gas_paths
+
+    if args.mock_gas_paths:
+        paths = gas_paths.load_paths(args.mock_gas_paths)
+        gas = np.asarray(paths.paths[int(args.mock_path) % paths.n_paths], dtype=np.float64)
+        first_block, block_s = paths.first_block, paths.block_s
+    else:
+        first_block, gas = gas_paths.load_observed_from_calls(args.calls_csv)
+        block_s = 12.0
+    start_ts = int(args.mock_start_ts) if args.mock_start_ts else int(time.time())
+    return MockChain(gas, first_block, start_ts, block_s, float(args.mock_speed))
+
+
+class AlertEngine:
+    def __init__(self, table: JobTable) -> None:
+        self.table = table
+        self.ready = np.zeros(len(table), dtype=bool)
+
+    def step(self, block: Block) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        with instrument.span("alerts.evaluate"):
+            expected, threshold, ready = self.table.evaluate(block.timestamp, block.gas_price_wei)
+            up = ready & ~self.ready
+            down = self.ready & ~ready
+            self.ready = ready
+        events: List[Dict[str, Any]] = []
+        for kind, idx in (("ready", np.flatnonzero(up)), ("cleared", np.flatnonzero(down))):
+            for i in idx:
+                events.append(
+                    {
+                        "event": kind,
+                        "job": self.table.names[i],
+                        "block": block.number,
+                        "ts": block.timestamp,
+                        "gas_gwei": block.gas_price_wei / 1e9,
+                        "expected_token": float(expected[i]),
+                        "threshold_token": float(threshold[i]),
+                        "ratio": float(expected[i] / threshold[i]) if threshold[i] > 0 else None,
+                        "seeded": bool(self.table.seeded[i]),
+                    }
+                )
+        return events, up
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config-csv", default="data/f88e_harvester_bot_config_estimates.csv")
+    parser.add_argument("--threshold", default="k", choices=["k", "fit"], help="k * gas, or the fitted a + b * gas")
+    parser.add_argument(
+        "--accruals-csv",
+        default="",
+        help="job,accrued_token,rate_token_per_s,as_of_ts (re-read on change); required unless --mock",
+    )
+    parser.add_argument("--ref-gas-gwei", type=float, default=0.0, help="Gas for seeded rates (0 = first block's gas)")
+    parser.add_argument("--tip-gwei", type=float, default=0.0, help="Priority fee added to baseFeePerGas")
+    parser.add_argument("--out-jsonl", default="", help="Append events here (default: stdout)")
+    parser.add_argument("--poll-s", type=float, default=1.0)
+    parser.add_argument("--max-blocks", type=int, default=0, help="Stop after this many blocks (0 = run forever)")
+    parser.add_argument("--rpc-url", default="", help="JSON-RPC endpoint instead of the Etherscan proxy")
+    parser.add_argument("--chain-id", default="1")
+    parser.add_argument("--base-url", default="https://api.etherscan.io/v2/api")
+    parser.add_argument("--mock", action="store_true", help="Local mock chain, no network")
+    parser.add_argument("--calls-csv", default="data/f88e_harvester_calls_7d.csv", help="--mock gas (observed)")
+    parser.add_argument("--mock-gas-paths", default="", help="--mock gas from a gas_paths.py file instead")
+    parser.add_argument("--mock-path", type=int, default=0)
+    parser.add_argument("--mock-start-ts", type=int, default=0, help="Timestamp of the first mock block (0 = now)")
+    parser.add_argument("--mock-speed", type=float, default=0.0, help="Mock blocks per block_s (0 = no waiting)")
+    parser.add_argument("--mock-harvest", action="store_true", help="Reset a job's accrual when it turns ready")
+    args = parser.parse_args()
+
+    jobs = _load_config_jobs(args.config_csv, args.threshold)
+    if not jobs:
+        raise SystemExit(f"no jobs in {args.config_csv}")
+    if not args.mock and not (args.accruals_csv and os.path.exists(args.accruals_csv)):
+        raise SystemExit("--accruals-csv is required on a live chain (seeded accruals are only for --mock)")
+
+    if args.mock:
+        chain: Any = _mock_chain(args)
+    elif args.rpc_url:
+        chain = PolledChain(RpcChain(args.rpc_url), int(round(args.tip_gwei * 1e9)))
+    else:
+        chain = PolledChain(EtherscanChain(args.base_url, args.chain_id), int(round(args.tip_gwei * 1e9)))
+
+    out = open(args.out_jsonl, "a") if args.out_jsonl else sys.stdout
+    engine: Optional[AlertEngine] = None
+    accruals_stat: Optional[Tuple[int, int]] = None
+    ref_gas_wei = args.ref_gas_gwei * 1e9
+    latencies_ms: List[float] = []
+    n_blocks = 0
+    n_events = 0
+    try:
+        while not args.max_blocks or n_blocks < args.max_blocks:
+            try:
+                block = chain.next_block()
+            except StopIteration:
+                break
+            except Exception as exc:
+                instrument.count("alerts.poll_errors")
+                print(f"poll failed: {exc}", file=sys.stderr)
+                block = None
+            if block is None:
+                time.sleep(max(0.0, args.poll_s) if not args.mock else 0.001)
+                continue
+
+            stat = None
+            if args.accruals_csv and os.path.exists(args.accruals_csv):
+                st = os.stat(args.accruals_csv)
+                stat = (st.st_size, st.st_mtime_ns)
+            if engine is None:
+                ref_gas_wei = ref_gas_wei or float(block.gas_price_wei)
+                table = JobTable(jobs, _load_accruals(args.accruals_csv), block.timestamp, ref_gas_wei, args.mock)
+                engine = AlertEngine(table)
+                accruals_stat = stat
+            elif stat != accruals_stat:
+                engine.table.merge(_load_accruals(args.accruals_csv))
+                accruals_stat = stat
+
+            events, up = engine.step(block)
+            for e in events:
+                e["latency_ms"] = round((time.monotonic() - block.seen_at) * 1000.0, 3)
+                out.write(json.dumps(e, sort_keys=True) + "\n")
+                latencies_ms.append(e["latency_ms"])
+            if events:
+                out.flush()
+            if args.mock_harvest and up.any():
+                engine.table.harvested(up, block.timestamp)
+                engine.ready &= ~up
+            n_blocks += 1
+            n_events += len(events)
+            instrument.count("alerts.blocks")
+            instrument.count("alerts.events", len(events))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    summary = f"{n_blocks} blocks, {n_events} events"
+    if latencies_ms:
+        q = quantile_sketch.summarize(latencies_ms)
+        summary += f", latency_ms p50={q.pct(50):.3f} max={q.pct(100):.3f}"
+    print(summary, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(instrument.run(main))
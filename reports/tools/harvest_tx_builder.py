@@ -0,0 +1,324 @@
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import harvester_abi
+import instrument
+
+
+# Unsigned harvest transactions for a wave of ready jobs (offline: no RPC, no keys).
+#
+# Each job in the config estimates CSV becomes one harvester call, with the same arguments the observed
+# bot sends: harvestConcentratorCompounder(compounder, minAssets), harvestConcentratorVault(vault, pid,
+# minOut) and harvestConcentratorCompounderFxUSD(compounder, minBaseOut, 1). The min-out argument is the
+# gas-scaled threshold, k * gas (or a + b * gas with --threshold fit), in token wei. The call reverts
+# when the harvest is not worth the gas at that price.
+#
+# Gas per job is gas_used_p50 from the receipts sample (via the config CSV). A separate tx costs that.
+# Inside an aggregate3 batch the job costs only its execution part,
+# gas_used_p50 - 21000 - calldata gas, plus a per-call overhead. The batch pays the 21000 base,
+# the calldata of the whole aggregate3 payload and a fixed overhead once. Jobs are packed greedily up
+# to --max-batch-gas. A batch is only emitted when its estimate is below the separate txs it replaces
+# (--batch auto).
+#
+# The overhead defaults are not measured: the tree has no receipts of batched harvests. They come from
+# the EIP-2929 schedule plus slack for aggregate3's ABI decoding and memory copies:
+#   - per batch, 5000: 2600 for the cold first CALL to the harvester (a plain tx pre-warms its `to`)
+#     plus about 2400 to decode the Call3[] argument and allocate the results;
+#   - per call, 3000: 100 for a warm CALL plus about 2900 to copy callData/returnData and write the
+#     Result.
+# Replace them with numbers from a fork trace of the aggregator you deploy.
+#
+# Batching is off unless asked for (--batch auto|always), and it needs --multicall naming the
+# operator's own aggregate3 contract. Inside a batch the harvester sees msg.sender = that contract,
+# not the bot. Anything it pays or checks against msg.sender (bounty recipient, caller allowlists)
+# applies to it. With the public Multicall3 a bounty paid to msg.sender can be swept by anyone, so
+# that address is refused. Sub-calls revert the whole batch unless --allow-failure is given. A job
+# that cannot run from the aggregator then fails visibly instead of burning gas inside a
+# "successful" tx.
+
+MULTICALL3 = "0xca11bde05977b3631167028862be2a173976ca11"
+HARVESTER = "0xfa86aa141e45da5183b42792d99dede3d26ec515"
+TX_BASE_GAS = 21000
+
+
+@dataclass(frozen=True)
+class Job:
+    job: str
+    selector: str
+    target: str
+    subkey: str
+    gas_used_p50: int
+    intercept_token: float
+    slope_token_per_wei: float
+
+
+@dataclass(frozen=True)
+class Planned:
+    job: Job
+    calldata: bytes
+    min_out_wei: int
+    exec_gas: int
+
+
+def _float(value: Any) -> float:
+    try:
+        return float(value or "0")
+    except ValueError:
+        return 0.0
+
+
+def _load_jobs(path: str, threshold: str) -> Dict[str, Job]:
+    out: Dict[str, Job] = {}
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        if threshold == "fit" and "k_fit_slope_token_per_wei" not in (reader.fieldnames or []):
+            raise SystemExit(f"--threshold fit: {path} has no k_fit_* columns (rebuild the config with the fit)")
+        for row in reader:
+            job = (row.get("job") or "").strip()
+            if not job:
+                continue
+            a = 0.0
+            b = _float(row.get("k_token_per_wei_p50"))
+            # An empty fit means the builder kept p50 for this job (the fit did not beat it).
+            if threshold == "fit" and _float(row.get("k_fit_slope_token_per_wei")) > 0:
+                a = _float(row.get("k_fit_intercept_token"))
+                b = _float(row.get("k_fit_slope_token_per_wei"))
+            out[job] = Job(
+                job=job,
+                selector=(row.get("selector") or "").strip().lower(),
+                target=(row.get("target") or "").strip().lower(),
+                subkey=(row.get("subkey") or "").strip(),
+                gas_used_p50=int(_float(row.get("gas_used_p50"))),
+                intercept_token=a,
+                slope_token_per_wei=b,
+            )
+    return out
+
+
+def _ready_from_events(path: str) -> Tuple[List[str], Optional[float]]:
+    # Jobs whose latest harvest_alerts.py event is "ready", and the gas at the newest event.
+    state: Dict[str, str] = {}
+    gas_gwei: Optional[float] = None
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            e = json.loads(line)
+            state[str(e.get("job"))] = str(e.get("event"))
+            if e.get("gas_gwei") is not None:
+                gas_gwei = float(e["gas_gwei"])
+    return [j for j, ev in state.items() if ev == "ready"], gas_gwei
+
+
+def calldata_gas(data: bytes) -> int:
+    # EIP-2028 intrinsic calldata cost.
+    zeros = data.count(0)
+    return 4 * zeros + 16 * (len(data) - zeros)
+
+
+def encode_harvest(job: Job, min_out_wei: int) -> bytes:
+    if job.selector == harvester_abi.HARVEST_CONCENTRATOR_COMPOUNDER.selector_hex:
+        return harvester_abi.HARVEST_CONCENTRATOR_COMPOUNDER.encode_call(job.target, min_out_wei)
+    if job.selector == harvester_abi.HARVEST_CONCENTRATOR_VAULT.selector_hex:
+        return harvester_abi.HARVEST_CONCENTRATOR_VAULT.encode_call(job.target, int(job.subkey or "0"), min_out_wei)
+    if job.selector == harvester_abi.HARVEST_CONCENTRATOR_COMPOUNDER_FXUSD.selector_hex:
+        # minFxUSDOut: the observed bot always sends 1.
+        return harvester_abi.HARVEST_CONCENTRATOR_COMPOUNDER_FXUSD.encode_call(job.target, min_out_wei, 1)
+    raise harvester_abi.AbiError(f"no harvest encoder for selector {job.selector} ({job.job})")
+
+
+def plan_job(job: Job, gas_price_wei: int) -> Planned:
+    min_out_wei = max(0, int(round((job.intercept_token + job.slope_token_per_wei * float(gas_price_wei)) * 1e18)))
+    data = encode_harvest(job, min_out_wei)
+    exec_gas = max(0, job.gas_used_p50 - TX_BASE_GAS - calldata_gas(data))
+    return Planned(job=job, calldata=data, min_out_wei=min_out_wei, exec_gas=exec_gas)
+
+
+def _batch_calldata(harvester: str, items: Sequence[Planned], allow_failure: bool = False) -> bytes:
+    return harvester_abi.MULTICALL3_AGGREGATE3.encode_call([(harvester, allow_failure, p.calldata) for p in items])
+
+
+def _batch_gas(data: bytes, items: Sequence[Planned], batch_overhead: int, call_overhead: int) -> int:
+    return TX_BASE_GAS + calldata_gas(data) + batch_overhead + sum(p.exec_gas + call_overhead for p in items)
+
+
+def pack(
+    planned: Sequence[Planned],
+    *,
+    harvester: str,
+    allow_failure: bool,
+    mode: str,
+    max_batch_gas: int,
+    batch_overhead: int,
+    call_overhead: int,
+) -> List[List[Planned]]:
+    # Greedy packing, largest jobs first; singletons go out as plain txs.
+    if mode == "never":
+        return [[p] for p in planned]
+    groups: List[List[Planned]] = []
+    cur: List[Planned] = []
+    for p in sorted(planned, key=lambda p: (-p.job.gas_used_p50, p.job.job)):
+        trial = cur + [p]
+        data = _batch_calldata(harvester, trial, allow_failure)
+        if cur and _batch_gas(data, trial, batch_overhead, call_overhead) > max_batch_gas:
+            groups.append(cur)
+            cur = [p]
+        else:
+            cur = trial
+    if cur:
+        groups.append(cur)
+    out: List[List[Planned]] = []
+    for g in groups:
+        batched = _batch_gas(_batch_calldata(harvester, g, allow_failure), g, batch_overhead, call_overhead)
+        if len(g) > 1 and (mode == "always" or batched < sum(p.job.gas_used_p50 for p in g)):
+            out.append(g)
+        else:
+            out.extend([p] for p in g)
+    return out
+
+
+def _tx(
+    to: str, data: bytes, gas: int, args: argparse.Namespace, gas_price_wei: int, tip_wei: int
+) -> Dict[str, Any]:
+    tx: Dict[str, Any] = {
+        "type": "0x2",
+        "chainId": hex(int(args.chain_id)),
+        "to": to,
+        "value": "0x0",
+        "data": "0x" + data.hex(),
+        "gas": hex(int(math.ceil(gas * float(args.gas_limit_mult)))),
+        "maxFeePerGas": hex(gas_price_wei + tip_wei),
+        "maxPriorityFeePerGas": hex(tip_wei),
+    }
+    if args.sender:
+        tx["from"] = args.sender
+    return tx
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config-csv", default="data/f88e_harvester_bot_config_estimates.csv")
+    parser.add_argument("--threshold", default="k", choices=["k", "fit"], help="min-out = k * gas, or a + b * gas")
+    parser.add_argument("--jobs", default="", help="Comma-separated job labels (as in the config CSV)")
+    parser.add_argument("--events-jsonl", default="", help="harvest_alerts.py output: take the jobs currently ready")
+    parser.add_argument(
+        "--gas-gwei", type=float, default=0.0, help="Gas price the min-out is scaled to (0 = newest event's gas)"
+    )
+    parser.add_argument(
+        "--priority-fee-gwei",
+        "--tip-gwei",
+        dest="priority_fee_gwei",
+        type=float,
+        default=0.001,
+        help="maxPriorityFeePerGas; maxFeePerGas = gas + this",
+    )
+    parser.add_argument("--batch", default="never", choices=["auto", "always", "never"])
+    parser.add_argument("--harvester", default=HARVESTER)
+    parser.add_argument("--multicall", default="", help="Your own aggregate3 contract (required to batch)")
+    parser.add_argument("--allow-failure", action="store_true", help="Let batched sub-calls fail independently")
+    parser.add_argument("--max-batch-gas", type=int, default=10_000_000)
+    parser.add_argument(
+        "--batch-overhead-gas", type=int, default=5000, help="Per batch (estimate, see the header comment)"
+    )
+    parser.add_argument("--call-overhead-gas", type=int, default=3000, help="Per sub-call (estimate, ditto)")
+    parser.add_argument("--gas-limit-mult", type=float, default=1.3)
+    parser.add_argument("--chain-id", default="1")
+    parser.add_argument("--sender", default="", help="Optional from address to put in the payloads")
+    parser.add_argument("--out", default="", help="Write the payload JSON here (default: stdout)")
+    args = parser.parse_args()
+
+    jobs = _load_jobs(args.config_csv, args.threshold)
+    names = [s.strip() for s in str(args.jobs).split(",") if s.strip()]
+    gas_gwei = float(args.gas_gwei)
+    if args.events_jsonl:
+        ready, event_gas = _ready_from_events(args.events_jsonl)
+        names += [j for j in ready if j not in names]
+        gas_gwei = gas_gwei or (event_gas or 0.0)
+    unknown = [n for n in names if n not in jobs]
+    if unknown:
+        raise SystemExit(f"jobs not in {args.config_csv}: {', '.join(unknown)}")
+    if not names:
+        raise SystemExit("no jobs (use --jobs or --events-jsonl)")
+    if gas_gwei <= 0:
+        raise SystemExit("gas price unknown (use --gas-gwei)")
+    gas_price_wei = int(round(gas_gwei * 1e9))
+    tip_wei = int(round(float(args.priority_fee_gwei) * 1e9))
+    harvester = str(args.harvester).lower()
+    multicall = str(args.multicall).lower()
+    if args.batch != "never":
+        if not multicall:
+            raise SystemExit("--batch needs --multicall: the operator's own aggregate3 contract")
+        if multicall == MULTICALL3:
+            raise SystemExit(
+                "refusing to batch through the public Multicall3: it becomes the harvester's msg.sender, "
+                "so bounties paid to msg.sender would be sweepable and allowlisted calls would revert"
+            )
+
+    planned = [plan_job(jobs[n], gas_price_wei) for n in names]
+    groups = pack(
+        planned,
+        harvester=harvester,
+        allow_failure=bool(args.allow_failure),
+        mode=args.batch,
+        max_batch_gas=int(args.max_batch_gas),
+        batch_overhead=int(args.batch_overhead_gas),
+        call_overhead=int(args.call_overhead_gas),
+    )
+
+    txs: List[Dict[str, Any]] = []
+    separate_gas = 0
+    planned_gas = 0
+    for g in groups:
+        single_gas = sum(p.job.gas_used_p50 for p in g)
+        separate_gas += single_gas
+        if len(g) == 1:
+            p = g[0]
+            entry = _tx(harvester, p.calldata, p.job.gas_used_p50, args, gas_price_wei, tip_wei)
+            est = p.job.gas_used_p50
+        else:
+            data = _batch_calldata(harvester, g, bool(args.allow_failure))
+            est = _batch_gas(data, g, int(args.batch_overhead_gas), int(args.call_overhead_gas))
+            entry = _tx(multicall, data, est, args, gas_price_wei, tip_wei)
+        planned_gas += est
+        entry["jobs"] = [
+            {"job": p.job.job, "function": harvester_abi.lookup(p.calldata).name, "min_out_wei": str(p.min_out_wei)}
+            for p in g
+        ]
+        entry["est_gas_used"] = est
+        entry["separate_gas_used"] = single_gas
+        txs.append(entry)
+
+    payload = {
+        "gas_price_gwei": gas_gwei,
+        "n_jobs": len(planned),
+        "n_txs": len(txs),
+        "est_gas_used": planned_gas,
+        "separate_gas_used": separate_gas,
+        "est_saving_gas": separate_gas - planned_gas,
+        "est_saving_eth": (separate_gas - planned_gas) * gas_price_wei / 1e18,
+        "txs": txs,
+    }
+    text = json.dumps(payload, indent=2) + "\n"
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            f.write(text)
+        print(
+            f"wrote {len(txs)} tx(s) for {len(planned)} job(s) to {args.out}, "
+            f"est gas {planned_gas} vs {separate_gas} separate",
+            file=sys.stderr,
+        )
+    else:
+        sys.stdout.write(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(instrument.run(main))
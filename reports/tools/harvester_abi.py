@@ -0,0 +1,473 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+
+# Minimal ABI codec for the handful of calls/events the reports touch.
+# Types are parsed once into decoder closures that read straight from bytes/memoryview
+# (int.from_bytes on 32-byte slices), and functions are dispatched by their 4-byte selector.
+# Selectors/topics are pinned constants (stdlib has no keccak256); see asdpendle/*.md for provenance.
+
+HexOrBytes = Union[str, bytes, bytearray, memoryview]
+
+
+class AbiError(ValueError):
+    pass
+
+
+def to_bytes(value: HexOrBytes) -> bytes:
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    s = str(value).strip()
+    if s[:2].lower() == "0x":
+        s = s[2:]
+    try:
+        return bytes.fromhex(s)
+    except ValueError as exc:
+        raise AbiError(f"invalid hex ({len(s)} chars)") from exc
+
+
+# ---- type compiler ----
+
+@dataclass(frozen=True)
+class _Codec:
+    dynamic: bool
+    head_size: int
+    decode: Callable[[memoryview, int], Any]  # (buf, start) -> value
+    encode: Callable[[Any], bytes]
+
+
+def _split_components(inner: str) -> List[str]:
+    parts: List[str] = []
+    depth = 0
+    cur = ""
+    for ch in inner:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append(cur)
+            cur = ""
+        else:
+            cur += ch
+    if cur:
+        parts.append(cur)
+    return [p.strip() for p in parts]
+
+
+def _word(buf: memoryview, start: int) -> memoryview:
+    w = buf[start : start + 32]
+    if len(w) != 32:
+        raise AbiError(f"short word at offset {start}")
+    return w
+
+
+def _uint_at(buf: memoryview, start: int) -> int:
+    return int.from_bytes(_word(buf, start), "big")
+
+
+def _enc_uint(value: int) -> bytes:
+    return int(value).to_bytes(32, "big")
+
+
+def _compile(typ: str) -> _Codec:
+    typ = typ.strip()
+    if typ.endswith("[]"):
+        return _compile_array(_compile(typ[:-2]))
+    if typ.startswith("(") and typ.endswith(")"):
+        return _compile_tuple([_compile(t) for t in _split_components(typ[1:-1])])
+    if typ == "address":
+        return _Codec(
+            False,
+            32,
+            lambda buf, s: "0x" + _word(buf, s)[12:].hex(),
+            lambda v: bytes(12) + to_bytes(v).rjust(20, b"\0"),
+        )
+    if typ == "bool":
+        return _Codec(False, 32, lambda buf, s: _uint_at(buf, s) != 0, lambda v: _enc_uint(1 if v else 0))
+    if typ.startswith("uint"):
+        return _Codec(False, 32, _uint_at, _enc_uint)
+    if typ.startswith("int"):
+        return _Codec(
+            False,
+            32,
+            lambda buf, s: int.from_bytes(_word(buf, s), "big", signed=True),
+            lambda v: int(v).to_bytes(32, "big", signed=True),
+        )
+    if typ.startswith("bytes") and typ != "bytes":
+        n = int(typ[5:])
+        return _Codec(
+            False,
+            32,
+            lambda buf, s: "0x" + _word(buf, s)[:n].hex(),
+            lambda v: to_bytes(v)[:n].ljust(32, b"\0"),
+        )
+    if typ in ("bytes", "string"):
+        def dec_bytes(buf: memoryview, s: int) -> bytes:
+            ln = _uint_at(buf, s)
+            raw = buf[s + 32 : s + 32 + ln]
+            if len(raw) != ln:
+                raise AbiError("short bytes payload")
+            return raw.tobytes()
+
+        def enc_bytes(v: Any) -> bytes:
+            raw = v.encode() if isinstance(v, str) and typ == "string" else to_bytes(v)
+            pad = (-len(raw)) % 32
+            return _enc_uint(len(raw)) + raw + bytes(pad)
+
+        return _Codec(True, 32, dec_bytes, enc_bytes)
+    raise AbiError(f"unsupported abi type: {typ}")
+
+
+def _decode_seq(codecs: Sequence[_Codec], buf: memoryview, start: int) -> Tuple[Any, ...]:
+    out: List[Any] = []
+    pos = start
+    for c in codecs:
+        if c.dynamic:
+            out.append(c.decode(buf, start + _uint_at(buf, pos)))
+            pos += 32
+        else:
+            out.append(c.decode(buf, pos))
+            pos += c.head_size
+    return tuple(out)
+
+
+def _encode_seq(codecs: Sequence[_Codec], values: Sequence[Any]) -> bytes:
+    if len(codecs) != len(values):
+        raise AbiError(f"expected {len(codecs)} values, got {len(values)}")
+    head_len = sum(c.head_size for c in codecs)
+    heads: List[bytes] = []
+    tails: List[bytes] = []
+    tail_len = 0
+    for c, v in zip(codecs, values):
+        if c.dynamic:
+            enc = c.encode(v)
+            heads.append(_enc_uint(head_len + tail_len))
+            tails.append(enc)
+            tail_len += len(enc)
+        else:
+            heads.append(c.encode(v))
+    return b"".join(heads) + b"".join(tails)
+
+
+def _compile_tuple(codecs: List[_Codec]) -> _Codec:
+    dynamic = any(c.dynamic for c in codecs)
+    head = 32 if dynamic else sum(c.head_size for c in codecs)
+    return _Codec(
+        dynamic,
+        head,
+        lambda buf, s: _decode_seq(codecs, buf, s),
+        lambda v: _encode_seq(codecs, v),
+    )
+
+
+def _compile_array(elem: _Codec) -> _Codec:
+    def dec(buf: memoryview, s: int) -> List[Any]:
+        n = _uint_at(buf, s)
+        if not elem.dynamic and s + 32 + n * elem.head_size > len(buf):
+            raise AbiError("short array payload")
+        return list(_decode_seq([elem] * n, buf, s + 32))
+
+    def enc(v: Sequence[Any]) -> bytes:
+        return _enc_uint(len(v)) + _encode_seq([elem] * len(v), list(v))
+
+    return _Codec(True, 32, dec, enc)
+
+
+# ---- functions ----
+
+@dataclass(frozen=True)
+class AbiFunction:
+    name: str
+    selector: bytes
+    inputs: str  # tuple type, e.g. "(address,uint256)"
+    arg_names: Tuple[str, ...]
+    outputs: str = "()"
+    _in: _Codec = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "_in", _compile(self.inputs))
+
+    @property
+    def selector_hex(self) -> str:
+        return "0x" + self.selector.hex()
+
+    @property
+    def signature(self) -> str:
+        return self.name + self.inputs
+
+    @property
+    def static_size(self) -> int:
+        # Calldata bytes needed after the selector when every argument is static; 0 otherwise.
+        return 0 if self._in.dynamic else self._in.head_size
+
+    def decode_args(self, data: HexOrBytes) -> Tuple[Any, ...]:
+        buf = memoryview(to_bytes(data) if not isinstance(data, memoryview) else data)
+        if buf[:4].tobytes() != self.selector:
+            raise AbiError(f"selector mismatch for {self.name}")
+        return _decode_seq(self._arg_codecs, buf[4:], 0)
+
+    def decode_output(self, data: HexOrBytes) -> Tuple[Any, ...]:
+        buf = memoryview(to_bytes(data) if not isinstance(data, memoryview) else data)
+        return _decode_seq(self._out_codecs, buf, 0)
+
+    def encode_call(self, *args: Any) -> bytes:
+        return self.selector + _encode_seq(self._arg_codecs, args)
+
+    def encode_call_hex(self, *args: Any) -> str:
+        return "0x" + self.encode_call(*args).hex()
+
+    @property
+    def _arg_codecs(self) -> List[_Codec]:
+        return _component_codecs(self.inputs)
+
+    @property
+    def _out_codecs(self) -> List[_Codec]:
+        return _component_codecs(self.outputs)
+
+
+_COMPONENTS_CACHE: Dict[str, List[_Codec]] = {}
+
+
+def _component_codecs(tuple_type: str) -> List[_Codec]:
+    codecs = _COMPONENTS_CACHE.get(tuple_type)
+    if codecs is None:
+        inner = tuple_type.strip()[1:-1]
+        codecs = [_compile(t) for t in _split_components(inner)] if inner else []
+        _COMPONENTS_CACHE[tuple_type] = codecs
+    return codecs
+
+
+HARVEST_CONCENTRATOR_COMPOUNDER = AbiFunction(
+    "harvestConcentratorCompounder",
+    bytes.fromhex("04117561"),
+    "(address,uint256)",
+    ("compounder", "minAssets"),
+)
+HARVEST_CONCENTRATOR_VAULT = AbiFunction(
+    "harvestConcentratorVault",
+    bytes.fromhex("c7f884c6"),
+    "(address,uint256,uint256)",
+    ("vault", "pid", "minOut"),
+)
+# Selector taken from observed calldata (three static words); the canonical signature is unverified.
+HARVEST_CONCENTRATOR_COMPOUNDER_FXUSD = AbiFunction(
+    "harvestConcentratorCompounderFxUSD",
+    bytes.fromhex("78f26f5b"),
+    "(address,uint256,uint256)",
+    ("compounder", "minBaseOut", "minFxUSDOut"),
+)
+HARVEST_BRIBE = AbiFunction(
+    "harvestBribe",
+    bytes.fromhex("417e3310"),
+    "((address,uint256,uint256,bytes32[]))",
+    ("claim",),  # (token, index, amount, merkleProof)
+)
+BRIBE_BURNER_BURN = AbiFunction(
+    "burn",
+    bytes.fromhex("27084a41"),
+    "((address,bytes,uint256))",
+    ("params",),
+)
+UNIV3_OBSERVE = AbiFunction(
+    "observe",
+    bytes.fromhex("883bdbfd"),
+    "(uint32[])",
+    ("secondsAgos",),
+    outputs="(int56[],uint160[])",
+)
+CHAINLINK_LATEST_ROUND_DATA = AbiFunction(
+    "latestRoundData",
+    bytes.fromhex("feaf968c"),
+    "()",
+    (),
+    outputs="(uint80,int256,uint256,uint256,uint80)",
+)
+CHAINLINK_GET_ROUND_DATA = AbiFunction(
+    "getRoundData",
+    bytes.fromhex("9a6fc8f5"),
+    "(uint80)",
+    ("roundId",),
+    outputs="(uint80,int256,uint256,uint256,uint80)",
+)
+MULTICALL3_AGGREGATE3 = AbiFunction(
+    "aggregate3",
+    bytes.fromhex("82ad56cb"),
+    "((address,bool,bytes)[])",
+    ("calls",),  # (target, allowFailure, callData)
+    outputs="((bool,bytes)[])",
+)
+
+FUNCTIONS: Dict[bytes, AbiFunction] = {
+    f.selector: f
+    for f in [
+        HARVEST_CONCENTRATOR_COMPOUNDER,
+        HARVEST_CONCENTRATOR_VAULT,
+        HARVEST_CONCENTRATOR_COMPOUNDER_FXUSD,
+        HARVEST_BRIBE,
+        BRIBE_BURNER_BURN,
+        UNIV3_OBSERVE,
+        CHAINLINK_LATEST_ROUND_DATA,
+        CHAINLINK_GET_ROUND_DATA,
+        MULTICALL3_AGGREGATE3,
+    ]
+}
+
+HARVESTER_SELECTORS = (
+    HARVEST_CONCENTRATOR_COMPOUNDER.selector,
+    HARVEST_CONCENTRATOR_VAULT.selector,
+    HARVEST_CONCENTRATOR_COMPOUNDER_FXUSD.selector,
+)
+
+
+def lookup(selector: HexOrBytes) -> Optional[AbiFunction]:
+    return FUNCTIONS.get(to_bytes(selector)[:4])
+
+
+def decode_input(data: HexOrBytes) -> Optional[Tuple[AbiFunction, Tuple[Any, ...]]]:
+    raw = to_bytes(data)
+    fn = FUNCTIONS.get(raw[:4])
+    if fn is None:
+        return None
+    try:
+        return fn, fn.decode_args(memoryview(raw))
+    except AbiError:
+        return None
+
+
+# ---- harvester calls (legacy CSV row shape) ----
+
+HarvesterCall = Tuple[str, str, str, str, str, bool]  # selector, function, target, arg1, arg2, decoded
+
+
+def _decode_harvester_raw(selector_hex: str, raw: Optional[bytes]) -> HarvesterCall:
+    fn = FUNCTIONS.get(bytes.fromhex(selector_hex[2:])) if len(selector_hex) == 10 else None
+    if fn is None or fn.selector not in HARVESTER_SELECTORS:
+        return selector_hex, "", "", "", "", False
+    # Same acceptance rule as the CSV has always used: word-aligned payload with all static args present.
+    if raw is None or (len(raw) - 4) % 32 != 0 or len(raw) - 4 < fn.static_size:
+        return selector_hex, fn.name, "", "", "", False
+    buf = memoryview(raw)
+    target = "0x" + buf[16:36].hex()
+    arg1 = str(int.from_bytes(buf[36:68], "big"))
+    arg2 = str(int.from_bytes(buf[68:100], "big")) if fn.static_size >= 96 else ""
+    return selector_hex, fn.name, target, arg1, arg2, True
+
+
+def decode_harvester_call(input_data: HexOrBytes) -> HarvesterCall:
+    if isinstance(input_data, str):
+        s = input_data.strip().lower()
+        if s and not s.startswith("0x"):
+            s = "0x" + s
+        if len(s) < 10:
+            return "", "", "", "", "", False
+        try:
+            raw: Optional[bytes] = bytes.fromhex(s[2:])
+        except ValueError:
+            raw = None
+        return _decode_harvester_raw(s[:10], raw)
+    raw = to_bytes(input_data)
+    if len(raw) < 4:
+        return "", "", "", "", "", False
+    return _decode_harvester_raw("0x" + raw[:4].hex(), raw)
+
+
+def decode_harvester_calls(inputs: Iterable[HexOrBytes]) -> List[HarvesterCall]:
+    # Column form: one pass, one dict dispatch per row, no per-word hex slicing.
+    return [decode_harvester_call(x) for x in inputs]
+
+
+def decode_column(inputs: Iterable[HexOrBytes]) -> Dict[str, List[Any]]:
+    # Generic column decode for any registered selector: {"selector", "function", "args"} lists;
+    # args is None for unknown selectors or malformed calldata.
+    selectors: List[str] = []
+    names: List[str] = []
+    args: List[Optional[Tuple[Any, ...]]] = []
+    for x in inputs:
+        try:
+            raw = to_bytes(x)
+        except AbiError:
+            raw = b""
+        fn = FUNCTIONS.get(raw[:4])
+        selectors.append("0x" + raw[:4].hex() if len(raw) >= 4 else "")
+        names.append(fn.name if fn else "")
+        if fn is None:
+            args.append(None)
+            continue
+        try:
+            args.append(fn.decode_args(memoryview(raw)))
+        except AbiError:
+            args.append(None)
+    return {"selector": selectors, "function": names, "args": args}
+
+
+# ---- events ----
+
+@dataclass(frozen=True)
+class AbiEvent:
+    name: str
+    topic0: bytes
+    indexed: Tuple[Tuple[str, str], ...]  # (name, type) in topic order
+    data: Tuple[Tuple[str, str], ...]  # (name, type) in data order
+
+    @property
+    def topic0_hex(self) -> str:
+        return "0x" + self.topic0.hex()
+
+    def decode(self, topics: Sequence[HexOrBytes], data: HexOrBytes) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        topic_codecs = _component_codecs("(" + ",".join(t for _, t in self.indexed) + ")")
+        for (name, _typ), codec, topic in zip(self.indexed, topic_codecs, topics[1:]):
+            out[name] = codec.decode(memoryview(to_bytes(topic)), 0)
+        values = _decode_seq(_component_codecs("(" + ",".join(t for _, t in self.data) + ")"), memoryview(to_bytes(data)), 0)
+        for (name, _typ), v in zip(self.data, values):
+            out[name] = v
+        return out
+
+
+HARVEST_EVENT = AbiEvent(
+    "Harvest",
+    bytes.fromhex("d25759d838eb0a46600f8f327cce144e61d7caefbef27010fe31e2aab091704f"),
+    (("caller", "address"), ("receiver", "address")),
+    (("assets", "uint256"), ("performanceFee", "uint256"), ("harvesterBounty", "uint256")),
+)
+DEPOSIT_REWARD_EVENT = AbiEvent(
+    "DepositReward",
+    bytes.fromhex("19d619b124479c2d70fdcdb33644246ae36f947e11b9612f998df529be9e54b6"),
+    (),
+    (("amount", "uint256"),),
+)
+TRANSFER_EVENT = AbiEvent(
+    "Transfer",
+    bytes.fromhex("ddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"),
+    (("from", "address"), ("to", "address")),
+    (("value", "uint256"),),
+)
+
+EVENTS: Dict[bytes, AbiEvent] = {e.topic0: e for e in [HARVEST_EVENT, DEPOSIT_REWARD_EVENT, TRANSFER_EVENT]}
+
+
+def decode_log(topics: Sequence[HexOrBytes], data: HexOrBytes) -> Optional[Tuple[AbiEvent, Dict[str, Any]]]:
+    if not topics:
+        return None
+    ev = EVENTS.get(to_bytes(topics[0]))
+    if ev is None or len(topics) - 1 < len(ev.indexed):
+        return None
+    try:
+        return ev, ev.decode(topics, data)
+    except AbiError:
+        return None
+
+
+def u256_words(data: HexOrBytes) -> List[int]:
+    raw = memoryview(to_bytes(data))
+    if len(raw) % 32 != 0:
+        raise AbiError(f"unexpected data length {len(raw)}")
+    return [int.from_bytes(raw[i : i + 32], "big") for i in range(0, len(raw), 32)]
+
+
+def topic_to_address(topic: HexOrBytes) -> str:
+    raw = to_bytes(topic)
+    return "0x" + raw[-20:].hex()
@@ -0,0 +1,177 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+# Opt-in run instrumentation for the tools: timed spans, counters and an optional cProfile dump.
+#
+# Enable with an env var or a flag (flags are stripped from argv before the tool parses it):
+#   HARVESTER_INSTRUMENT=<path.jsonl>   or  --instrument[=<path.jsonl>]   append one JSON summary line per run
+#                                                                         (no path / "1": summary on stderr)
+#   HARVESTER_PROFILE=<path.prof>       or  --profile=<path.prof>         cProfile dump of the whole run
+# Spans nest per thread ("main/etherscan.get") and aggregate count/total/max seconds by path; phase()
+# marks consecutive stretches of a main without a with-block. Counters are plain sums (requests, retries, rate-limit hits, cache hits, bytes). When disabled,
+# span() returns a shared null context and count() returns immediately.
+
+ENV_SUMMARY = "HARVESTER_INSTRUMENT"
+ENV_PROFILE = "HARVESTER_PROFILE"
+
+_enabled = False
+_lock = threading.Lock()
+_local = threading.local()
+_spans: Dict[str, List[float]] = {}  # path -> [count, total_s, max_s]
+_counters: Dict[str, float] = {}
+_NULL = nullcontext()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def count(name: str, n: float = 1) -> None:
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def _record(path: str, dt: float) -> None:
+    with _lock:
+        agg = _spans.setdefault(path, [0, 0.0, 0.0])
+        agg[0] += 1
+        agg[1] += dt
+        agg[2] = max(agg[2], dt)
+
+
+@contextmanager
+def _timed(name: str) -> Iterator[None]:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(name)
+    path = "/".join(stack)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        stack.pop()
+        _record(path, time.perf_counter() - t0)
+
+
+def span(name: str):
+    return _timed(name) if _enabled else _NULL
+
+
+def _end_phase() -> None:
+    cur = getattr(_local, "phase", None)
+    if cur is not None:
+        _local.phase = None
+        _record(cur[0], time.perf_counter() - cur[1])
+
+
+def phase(name: str) -> None:
+    # Sequential phases of a tool's main ("load", "fetch", "write"): ends the previous phase and
+    # starts `name`, so long straight-line mains need no re-indenting. Recorded like spans.
+    if not _enabled:
+        return
+    _end_phase()
+    stack = getattr(_local, "stack", None) or []
+    _local.phase = ("/".join(stack + [name]), time.perf_counter())
+
+
+def snapshot() -> Dict[str, Any]:
+    with _lock:
+        spans = {
+            k: {"count": int(v[0]), "total_s": round(v[1], 6), "max_s": round(v[2], 6)} for k, v in sorted(_spans.items())
+        }
+        counters = {k: (int(v) if float(v).is_integer() else v) for k, v in sorted(_counters.items())}
+    return {"spans": spans, "counters": counters}
+
+
+def reset() -> None:
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+
+
+def _take_flag(argv: List[str], flag: str) -> Optional[str]:
+    # Removes --flag / --flag=value and returns the value ("" when given bare), or None when absent.
+    # The next token is never taken as the value: it may be the tool's own subcommand or argument.
+    for i, arg in enumerate(argv):
+        if arg == flag:
+            del argv[i]
+            return ""
+        if arg.startswith(flag + "="):
+            del argv[i]
+            return arg.split("=", 1)[1]
+    return None
+
+
+def _write_summary(dest: str, record: Dict[str, Any]) -> None:
+    line = json.dumps(record, sort_keys=True)
+    if not dest or dest == "1":
+        print(line, file=sys.stderr)
+        return
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    with open(dest, "a") as f:
+        f.write(line + "\n")
+
+
+def run(main: Callable[[], int], tool: str = "") -> int:
+    # Entry-point wrapper: `raise SystemExit(instrument.run(main))`.
+    global _enabled
+    summary = _take_flag(sys.argv, "--instrument")
+    profile = _take_flag(sys.argv, "--profile")
+    if profile == "":
+        raise SystemExit("--profile needs a path: --profile=<path.prof>")
+    if summary is None:
+        summary = os.environ.get(ENV_SUMMARY)
+    if profile is None:
+        profile = os.environ.get(ENV_PROFILE) or None
+    if summary is None and not profile:
+        return main()
+
+    _enabled = True
+    reset()
+    tool = tool or os.path.basename(sys.argv[0])
+    profiler = None
+    if profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+    started = time.time()
+    t0 = time.perf_counter()
+    rc: Any = 1
+    try:
+        with span("main"):
+            if profiler is not None:
+                profiler.enable()
+            try:
+                rc = main()
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                _end_phase()
+    except SystemExit as exc:
+        rc = exc.code
+        raise
+    finally:
+        if profiler is not None:
+            profiler.dump_stats(profile)
+        if summary is not None:
+            record: Dict[str, Any] = {
+                "tool": tool,
+                "argv": sys.argv[1:],
+                "started_at": int(started),
+                "wall_s": round(time.perf_counter() - t0, 6),
+                "exit": rc if isinstance(rc, int) or rc is None else str(rc),
+            }
+            if profile:
+                record["profile"] = profile
+            record.update(snapshot())
+            _write_summary(summary, record)
+    return rc
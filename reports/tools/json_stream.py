@@ -0,0 +1,168 @@
+import json
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+
+
+# Incremental reader for the stdin payloads of the append tools. Accepts, without loading the
+# whole document:
+#   - a wrapper object   {"transactions": [ {...}, {...} ], ...}   (records streamed from `key`)
+#   - a bare array       [ {...}, {...} ]
+#   - NDJSON / concatenated objects, one record per value
+# Each record is parsed with json.JSONDecoder.raw_decode on a sliding text buffer, so memory is
+# bounded by the largest single record plus one read chunk.
+# A first object without a `key` array is only taken as a record when it has `record_field`; anything
+# else (e.g. an Etherscan {"status": "0", "message": "NOTOK", ...} error payload) raises ValueError.
+
+_WS = " \t\r\n"
+
+
+class _Buffer:
+    def __init__(self, fp: TextIO, chunk_size: int) -> None:
+        self.fp = fp
+        self.chunk_size = max(1024, int(chunk_size))
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, min_extra: int) -> bool:
+        if self.eof:
+            return False
+        if self.pos > self.chunk_size:
+            self.buf = self.buf[self.pos :]
+            self.pos = 0
+        want = max(self.chunk_size, min_extra)
+        got = 0
+        while got < want:
+            data = self.fp.read(want - got)
+            if not data:
+                self.eof = True
+                break
+            self.buf += data
+            got += len(data)
+        return got > 0
+
+    def peek(self) -> str:
+        # Next non-whitespace char ("" at EOF), without consuming it.
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill(0):
+                return ""
+
+    def expect(self, ch: str) -> None:
+        got = self.peek()
+        if got != ch:
+            raise ValueError(f"invalid JSON stream: expected {ch!r}, got {got!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        extra = self.chunk_size
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill(extra):
+                    raise
+                extra *= 2  # grow geometrically so a huge record is not re-parsed O(n) times
+                continue
+            # A number/literal that ends exactly at the buffer edge may continue in the next chunk.
+            if end == len(self.buf) and not self.eof and not isinstance(obj, (dict, list, str)):
+                self._fill(extra)
+                continue
+            self.pos = end
+            return obj
+
+
+def _stream_array(b: _Buffer) -> Iterator[Any]:
+    b.expect("[")
+    if b.peek() == "]":
+        b.pos += 1
+        return
+    while True:
+        yield b.value()
+        ch = b.peek()
+        b.pos += 1
+        if ch == "]":
+            return
+        if ch != ",":
+            raise ValueError(f"invalid JSON array: unexpected {ch!r}")
+
+
+def iter_records(
+    fp: TextIO, key: str, *, record_field: str = "", chunk_size: int = 1 << 16
+) -> Iterator[Dict[str, Any]]:
+    b = _Buffer(fp, chunk_size)
+    first = b.peek()
+    if first == "":
+        return
+    if first == "[":
+        for item in _stream_array(b):
+            if isinstance(item, dict):
+                yield item
+        return
+    if first != "{":
+        raise ValueError(f"invalid JSON input: starts with {first!r}")
+
+    # Walk the first top-level object key by key. If it holds `key` as an array it is the wrapper
+    # and the array is streamed; otherwise it was itself a record (NDJSON) and is yielded whole.
+    b.expect("{")
+    head: Dict[str, Any] = {}
+    wrapper = False
+    if b.peek() != "}":
+        while True:
+            k = b.value()
+            if not isinstance(k, str):
+                raise ValueError("invalid JSON object key")
+            b.expect(":")
+            if k == key and b.peek() == "[":
+                wrapper = True
+                for item in _stream_array(b):
+                    if isinstance(item, dict):
+                        yield item
+            else:
+                head[k] = b.value()
+            ch = b.peek()
+            b.pos += 1
+            if ch == "}":
+                break
+            if ch != ",":
+                raise ValueError(f"invalid JSON object: unexpected {ch!r}")
+    if wrapper:
+        return
+    if key in head or (record_field and record_field not in head):
+        summary = {k: head[k] for k in ("status", "message", "result", "error") if k in head}
+        raise ValueError(
+            f"JSON object has no {key!r} array and is not a record: keys={sorted(head)[:8]} {summary or ''}".rstrip()
+        )
+    yield head
+
+    while b.peek():
+        item = b.value()
+        if isinstance(item, dict):
+            yield item
+
+
+def batched(items: Iterator[Any], size: int) -> Iterator[List[Any]]:
+    batch: List[Any] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def open_input(path: Optional[str]) -> TextIO:
+    import sys
+
+    if not path or path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        import gzip
+
+        return gzip.open(path, "rt")
+    return open(path)
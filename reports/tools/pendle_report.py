@@ -0,0 +1,201 @@
+import argparse
+import functools
+import importlib
+import io
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import instrument
+
+
+# Single entry point for the report tools (run from the repo root, like the tools themselves):
+#   python reports/tools/pendle_report.py <command> [tool args...]
+#   python reports/tools/pendle_report.py all [pipeline args...]
+# Only this file and instrument are imported at startup. A command imports its tool module when it
+# is invoked, so `backtest` loads neither requests nor numpy unless it needs them. Each tool still
+# parses its own flags, so `pendle_report.py config --help` shows the config builder's options.
+#
+# `all` runs the pipeline (same stage graph, skip logic and state file) inside this interpreter.
+# Stages run one at a time. Dataset loaders are memoized by (path, size, mtime_ns), so the prices
+# JSON is parsed once for config, strategy and backtest. A file rewritten by an earlier stage gets a
+# new mtime and is read again.
+
+COMMANDS: Dict[str, Tuple[str, str]] = {
+    "calls": ("build_harvester_bot_7d_report", "Fetch the 7d harvester calls and write the 7d report"),
+    "receipts": ("fetch_receipts_sample", "Fetch a receipts sample for the 7d calls"),
+    "backfill": ("backfill_receipts", "Backfill receipts for every call"),
+    "prices": ("fetch_coingecko_prices", "Fetch CoinGecko prices for the call window"),
+    "sdpendle-twap": ("fill_sdpendle_prices_with_uniswap_twap", "Fill sdPENDLE prices from the Uniswap TWAP"),
+    "oracle": ("price_oracle", "Block-accurate on-chain prices with a local cache"),
+    "config": ("build_harvester_bot_config", "Build the bot config estimates"),
+    "strategy": ("analyze_harvester_bot_strategy", "Write the strategy analysis"),
+    "backtest": ("backtest_asdpendle_bot", "Backtest the asdPENDLE bot"),
+    "simulate": ("simulate_bot_competition", "Simulate bot competition"),
+    "gas-paths": ("gas_paths", "Gas price path statistics"),
+    "warehouse": ("warehouse", "Build or query the sqlite warehouse"),
+    "append-calls": ("append_harvester_calls", "Append new harvester calls"),
+    "append-harvest-logs": ("append_asdpendle_harvest_logs", "Append new asdPENDLE harvest logs"),
+    "append-harvest-txs": ("append_asdpendle_harvest_txs", "Append new asdPENDLE harvest txs"),
+    "figures": ("generate_pendle_pricing_figures", "Render the pricing figures"),
+    "dashboard": ("dashboard", "Serve live rolling-window metrics over HTTP"),
+    "alerts": ("harvest_alerts", "Per-block harvest-threshold alerts (live chain or --mock)"),
+    "harvest-txs": ("harvest_tx_builder", "Unsigned harvest txs for ready jobs, batched when cheaper"),
+    "pipeline": ("pipeline", "Dependency-aware run of the report stages (one process per stage)"),
+    "bench": ("bench", "Benchmarks over synthetic data"),
+}
+
+# Loaders whose results are shared within one process. A kind names results that are equal across
+# modules (same parsed structure); None keeps the entry per module.
+SHARED_LOADERS: Dict[str, Dict[str, Optional[str]]] = {
+    "analyze_harvester_bot_strategy": {
+        "_load_calls": None,
+        "_load_asdpendle_harvest_assets": None,
+        "_load_receipts_sample": None,
+        "_load_coingecko_prices": "prices",
+    },
+    "build_harvester_bot_config": {
+        "_load_calls": None,
+        "_load_receipts": None,
+        "_load_prices": "prices",
+    },
+    "backtest_asdpendle_bot": {
+        "_load_calls": None,
+        "_load_harvest_logs": None,
+        "_load_config_asdpendle": None,
+        "_load_prices": "prices",
+    },
+}
+
+
+class DatasetCache:
+    def __init__(self) -> None:
+        self.entries: Dict[Tuple[str, str, int, int], Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def wrap(self, kind: str, load: Callable[[str], Any]) -> Callable[[str], Any]:
+        @functools.wraps(load)
+        def cached(path: str) -> Any:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return load(path)
+            key = (kind, os.path.abspath(path), st.st_size, st.st_mtime_ns)
+            if key in self.entries:
+                self.hits += 1
+                instrument.count("datasets.hits")
+                return self.entries[key]
+            self.misses += 1
+            instrument.count("datasets.misses")
+            with instrument.span(f"load.{kind}"):
+                value = load(path)
+            self.entries[key] = value
+            return value
+
+        return cached
+
+
+def _import_tool(module_name: str, datasets: Optional[DatasetCache] = None) -> Any:
+    module = importlib.import_module(module_name)
+    if datasets is not None and not getattr(module, "_pendle_report_shared", False):
+        for func, kind in SHARED_LOADERS.get(module_name, {}).items():
+            setattr(module, func, datasets.wrap(kind or f"{module_name}.{func}", getattr(module, func)))
+        module._pendle_report_shared = True
+    return module
+
+
+def _call_main(entry: Callable[[], int], argv: List[str]) -> int:
+    saved = sys.argv
+    sys.argv = argv
+    try:
+        rc = entry()
+    except SystemExit as exc:
+        if exc.code is None or isinstance(exc.code, int):
+            rc = exc.code or 0
+        else:
+            print(exc.code, file=sys.stderr)
+            rc = 1
+    finally:
+        sys.argv = saved
+    return int(rc or 0)
+
+
+class _StageOutput(io.TextIOBase):
+    # Routes writes from a thread that is running a stage into that stage's buffer; everything else
+    # (the pipeline's own progress lines) goes to the real stream.
+    def __init__(self, real: Any, local: threading.local) -> None:
+        self.real = real
+        self.local = local
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        buf = getattr(self.local, "buf", None)
+        return (buf if buf is not None else self.real).write(s)
+
+    def flush(self) -> None:
+        if getattr(self.local, "buf", None) is None:
+            self.real.flush()
+
+
+def _run_all(rest: List[str]) -> int:
+    import pipeline
+
+    datasets = DatasetCache()
+    lock = threading.Lock()
+    local = threading.local()
+
+    def run_in_process(st: "pipeline.Stage") -> Tuple[int, str, float]:
+        with lock:
+            t0 = time.monotonic()
+            local.buf = io.StringIO()
+            try:
+                with instrument.span(f"stage.{st.name}"):
+                    module = _import_tool(st.tool[: -len(".py")], datasets)
+                    rc = _call_main(module.main, [st.tool, *st.args])
+            except Exception:
+                traceback.print_exc(file=local.buf)
+                rc = 1
+            finally:
+                out = local.buf.getvalue()
+                local.buf = None
+            return rc, out, time.monotonic() - t0
+
+    saved = sys.stdout, sys.stderr
+    sys.stdout = _StageOutput(saved[0], local)
+    sys.stderr = _StageOutput(saved[1], local)
+    try:
+        rc = _call_main(lambda: pipeline.main(run_tool=run_in_process), ["pipeline.py", *rest])
+    finally:
+        sys.stdout, sys.stderr = saved
+    if datasets.hits or datasets.misses:
+        print(f"datasets: {datasets.misses} loaded, {datasets.hits} shared")
+    return rc
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="pendle_report.py",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n"
+        + "\n".join(f"  {name:20s} {desc}" for name, (_, desc) in COMMANDS.items())
+        + f"\n  {'all':20s} Run the pipeline in this process, sharing loaded datasets between stages",
+    )
+    parser.add_argument("command", choices=[*COMMANDS, "all"], metavar="command")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Passed through to the tool")
+    args = parser.parse_args()
+
+    if args.command == "all":
+        return _run_all(list(args.args))
+    module_name = COMMANDS[args.command][0]
+    module = _import_tool(module_name)
+    return _call_main(module.main, [module_name + ".py", *args.args])
+
+
+if __name__ == "__main__":
+    raise SystemExit(instrument.run(main))
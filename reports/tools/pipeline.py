@@ -0,0 +1,334 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import instrument
+
+
+# Dependency-aware runner for the report tools (run from the repo root, like the tools themselves).
+#
+# Each stage declares the files it reads and writes. A stage depends on the latest earlier stage that
+# writes one of its inputs, so an in-place rewrite (the sdPENDLE TWAP filler on the prices JSON) slots
+# in between the CoinGecko fetch and its consumers. A stage is skipped when:
+#   - its key (tool + local imports + inputs) matches the last successful run, and
+#   - every output still has the fingerprint the pipeline last wrote.
+# For a file the stage rewrites in place, the key uses the version its upstream stage produced.
+# Fingerprints are content hashes cached by (size, mtime_ns), so an unchanged tree costs one stat per
+# file, and an upstream re-run that reproduces identical bytes does not cascade.
+# Stages with no file inputs fetch from the network (the 7d calls pull) and only run when forced with
+# --refresh or when an output is missing.
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STATE = "data/pipeline.state.json"
+STATE_VERSION = 1
+
+CALLS_CSV = "data/f88e_harvester_calls_7d.csv"
+RECEIPTS_CSV = "data/f88e_harvester_receipts_sample.csv"
+RECEIPTS_FULL_CSV = "data/f88e_harvester_receipts_full.csv"  # backfill_receipts.py, run by hand (long RPC pull)
+PRICES_JSON = "data/coingecko_prices_7d.json"
+CONFIG_CSV = "data/f88e_harvester_bot_config_estimates.csv"
+HARVEST_LOGS_CSV = "data/asdpendle_harvest_logs.csv"
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    tool: str
+    inputs: Tuple[str, ...]
+    outputs: Tuple[str, ...]
+    args: Tuple[str, ...] = ()
+
+
+STAGES: List[Stage] = [
+    Stage("calls", "build_harvester_bot_7d_report.py", (), (CALLS_CSV, "asdpendle/harvester-bot-7d.md")),
+    Stage("receipts", "fetch_receipts_sample.py", (CALLS_CSV,), (RECEIPTS_CSV,)),
+    Stage("prices", "fetch_coingecko_prices.py", (CALLS_CSV,), (PRICES_JSON,)),
+    Stage("sdpendle_twap", "fill_sdpendle_prices_with_uniswap_twap.py", (CALLS_CSV, PRICES_JSON), (PRICES_JSON,)),
+    Stage(
+        "config",
+        "build_harvester_bot_config.py",
+        (CALLS_CSV, RECEIPTS_FULL_CSV, RECEIPTS_CSV, PRICES_JSON),
+        (CONFIG_CSV, "asdpendle/harvester-bot-config.md"),
+    ),
+    Stage(
+        "strategy",
+        "analyze_harvester_bot_strategy.py",
+        (CALLS_CSV, HARVEST_LOGS_CSV, RECEIPTS_FULL_CSV, RECEIPTS_CSV, PRICES_JSON),
+        ("asdpendle/harvester-bot-strategy.md",),
+    ),
+    Stage(
+        "backtest",
+        "backtest_asdpendle_bot.py",
+        (CALLS_CSV, HARVEST_LOGS_CSV, CONFIG_CSV, PRICES_JSON),
+        ("asdpendle/harvester-bot-backtest.md",),
+    ),
+]
+
+
+_DATA_DEFAULT_RE = re.compile(r"""default=["'](data/[^"']+)["']""")
+
+
+def undeclared_inputs(stages: Sequence[Stage]) -> Dict[str, List[str]]:
+    # stage -> data/ paths its tool defaults to but the stage declares neither as input nor output.
+    # A missing input means the stage is skipped as up to date while a file it reads has changed.
+    out: Dict[str, List[str]] = {}
+    for st in stages:
+        with open(os.path.join(TOOLS_DIR, st.tool)) as f:
+            defaults = set(_DATA_DEFAULT_RE.findall(f.read()))
+        missing = sorted(defaults - set(st.inputs) - set(st.outputs))
+        if missing:
+            out[st.name] = missing
+    return out
+
+
+def stage_deps(stages: Sequence[Stage]) -> Dict[str, Dict[str, str]]:
+    # stage -> {input path: producing stage}; files nobody produces are external inputs.
+    out: Dict[str, Dict[str, str]] = {}
+    for i, st in enumerate(stages):
+        deps: Dict[str, str] = {}
+        for path in st.inputs:
+            for prev in reversed(stages[:i]):
+                if path in prev.outputs:
+                    deps[path] = prev.name
+                    break
+        out[st.name] = deps
+    return out
+
+
+class Fingerprints:
+    # sha256 per file, reused while (size, mtime_ns) is unchanged.
+    def __init__(self, cache: Dict[str, List]) -> None:
+        self.cache = cache
+
+    def of(self, path: str) -> Optional[str]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        hit = self.cache.get(path)
+        if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+            return str(hit[2])
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        self.cache[path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+
+_IMPORT_RE = re.compile(r"^(?:from\s+(\w+)\s+import|import\s+(\w+))", re.M)
+
+
+def _local_modules(tool: str) -> List[str]:
+    # The tool plus the sibling modules it imports at top level, transitively.
+    seen: Set[str] = set()
+    todo = [os.path.join(TOOLS_DIR, tool)]
+    while todo:
+        path = todo.pop()
+        if path in seen or not os.path.exists(path):
+            continue
+        seen.add(path)
+        with open(path) as f:
+            src = f.read()
+        for m in _IMPORT_RE.finditer(src):
+            name = m.group(1) or m.group(2)
+            todo.append(os.path.join(TOOLS_DIR, name + ".py"))
+    return sorted(seen)
+
+
+def _stage_key(
+    st: Stage, deps: Dict[str, str], fp: Fingerprints, state: Dict, produced: Dict[str, Dict[str, Optional[str]]]
+) -> str:
+    parts: List[str] = [st.tool, json.dumps(list(st.args))]
+    for path in _local_modules(st.tool):
+        parts.append(f"code:{os.path.basename(path)}={fp.of(path)}")
+    for path in st.inputs:
+        if path in st.outputs and path in deps:
+            # In-place rewrite: key on what the upstream stage handed over, not on our own output.
+            upstream = deps[path]
+            version = produced.get(upstream, {}).get(path)
+            if version is None:
+                version = state.get("stages", {}).get(upstream, {}).get("outputs", {}).get(path)
+        else:
+            version = fp.of(path)
+        parts.append(f"in:{path}={version}")
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def _load_state(path: str) -> Dict:
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {"version": STATE_VERSION, "stages": {}, "files": {}, "hashes": {}}
+    if not isinstance(state, dict) or state.get("version") != STATE_VERSION:
+        return {"version": STATE_VERSION, "stages": {}, "files": {}, "hashes": {}}
+    for k in ("stages", "files", "hashes"):
+        if not isinstance(state.get(k), dict):
+            state[k] = {}
+    return state
+
+
+def _save_state(path: str, state: Dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _up_to_date(st: Stage, key: str, fp: Fingerprints, state: Dict) -> Tuple[bool, str]:
+    prev = state["stages"].get(st.name)
+    if not prev:
+        return False, "never run"
+    if prev.get("key") != key:
+        return False, "inputs/code changed"
+    for path in st.outputs:
+        cur = fp.of(path)
+        if cur is None:
+            return False, f"missing {path}"
+        if cur != state["files"].get(path):
+            return False, f"{path} modified outside the pipeline"
+    return True, "up to date"
+
+
+def _run_tool(st: Stage) -> Tuple[int, str, float]:
+    t0 = time.monotonic()
+    proc = subprocess.run(
+        [sys.executable, os.path.join(TOOLS_DIR, st.tool), *st.args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    return proc.returncode, proc.stdout, time.monotonic() - t0
+
+
+def main(run_tool: Callable[[Stage], Tuple[int, str, float]] = _run_tool) -> int:
+    # run_tool: (stage) -> (exit code, combined output, seconds); pendle_report swaps in an in-process runner.
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--state", default=DEFAULT_STATE)
+    parser.add_argument("--jobs", type=int, default=2, help="Stages run in parallel when independent")
+    parser.add_argument("--refresh", default="", help="Comma-separated stages to run regardless (e.g. calls)")
+    parser.add_argument("--only", default="", help="Comma-separated stages to consider (default: all)")
+    parser.add_argument("--dry-run", action="store_true", help="Print what would run and why, then exit")
+    parser.add_argument("--list", action="store_true", help="Print the stage graph and exit")
+    args = parser.parse_args()
+
+    names = [st.name for st in STAGES]
+    refresh = {s.strip() for s in str(args.refresh).split(",") if s.strip()}
+    only = {s.strip() for s in str(args.only).split(",") if s.strip()} or set(names)
+    unknown = sorted((refresh | only) - set(names))
+    if unknown:
+        raise SystemExit(f"unknown stage(s): {', '.join(unknown)} (have: {', '.join(names)})")
+
+    undeclared = undeclared_inputs(STAGES)
+    if undeclared:
+        raise SystemExit(
+            "stage inputs miss tool defaults: "
+            + "; ".join(f"{name}: {', '.join(paths)}" for name, paths in sorted(undeclared.items()))
+        )
+    deps = stage_deps(STAGES)
+    if args.list:
+        for st in STAGES:
+            after = sorted(set(deps[st.name].values()))
+            print(f"{st.name:14s} {st.tool:42s} after: {', '.join(after) or '-'}")
+        return 0
+
+    t0 = time.monotonic()
+    state = _load_state(args.state)
+    fp = Fingerprints(state["hashes"])
+    by_name = {st.name: st for st in STAGES}
+    produced: Dict[str, Dict[str, Optional[str]]] = {}
+    status: Dict[str, str] = {}  # skipped | ran | planned (dry run) | failed | blocked
+
+    def _ready(name: str) -> bool:
+        return all(status.get(d) in ("skipped", "ran", "planned") or d not in only for d in deps[name].values())
+
+    def _blocked(name: str) -> bool:
+        return any(status.get(d) in ("failed", "blocked") for d in deps[name].values())
+
+    pending = [n for n in names if n in only]
+    running: Dict[Future, str] = {}
+    keys: Dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=max(1, int(args.jobs))) as ex:
+        while pending or running:
+            for name in list(pending):
+                if _blocked(name):
+                    status[name] = "blocked"
+                    pending.remove(name)
+                    print(f"[{name}] blocked by a failed upstream stage")
+                    continue
+                if not _ready(name):
+                    continue
+                st = by_name[name]
+                pending.remove(name)
+                key = _stage_key(st, deps[name], fp, state, produced)
+                keys[name] = key
+                ok, why = _up_to_date(st, key, fp, state)
+                if name in refresh:
+                    ok, why = False, "forced by --refresh"
+                elif not ok and not st.inputs and name in state["stages"] and why == "inputs/code changed":
+                    # Network sources re-run on demand only; a tool edit alone does not refetch.
+                    ok, why = True, "source stage (use --refresh to refetch)"
+                if ok and args.dry_run and any(status.get(d) == "planned" for d in deps[name].values()):
+                    ok, why = False, "upstream will run"
+                if ok:
+                    status[name] = "skipped"
+                    # What this stage handed over last time (a later in-place stage may have rewritten it since).
+                    produced[name] = dict(state["stages"][name].get("outputs", {})) if name in state["stages"] else {}
+                    print(f"[{name}] skip: {why}")
+                    continue
+                if args.dry_run:
+                    status[name] = "planned"
+                    produced[name] = {p: None for p in st.outputs}
+                    print(f"[{name}] would run: {why}")
+                    continue
+                print(f"[{name}] run: {why}", flush=True)
+                running[ex.submit(run_tool, st)] = name
+            if not running:
+                if pending and not any(_ready(n) or _blocked(n) for n in pending):
+                    raise RuntimeError(f"stage graph stuck on: {', '.join(pending)}")
+                continue
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                st = by_name[name]
+                rc, out, dt = fut.result()
+                text = out.rstrip()
+                if text:
+                    print("\n".join(f"[{name}] {line}" for line in text.splitlines()))
+                if rc != 0:
+                    status[name] = "failed"
+                    print(f"[{name}] failed (exit {rc}) after {dt:.1f}s")
+                    continue
+                status[name] = "ran"
+                outs = {p: fp.of(p) for p in st.outputs}
+                produced[name] = outs
+                for p, v in outs.items():
+                    state["files"][p] = v
+                state["stages"][name] = {"key": keys[name], "outputs": outs, "finished_at": int(time.time())}
+                _save_state(args.state, state)
+                print(f"[{name}] done in {dt:.1f}s")
+
+    if not args.dry_run:
+        _save_state(args.state, state)
+    n_ran = sum(1 for s in status.values() if s in ("ran", "planned"))
+    n_failed = sum(1 for s in status.values() if s in ("failed", "blocked"))
+    print(
+        f"pipeline: {n_ran} {'would run' if args.dry_run else 'ran'}, {sum(1 for s in status.values() if s == 'skipped')} skipped, "
+        f"{n_failed} failed/blocked in {time.monotonic() - t0:.2f}s"
+    )
+    return 1 if n_failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(instrument.run(main))
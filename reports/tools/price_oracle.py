@@ -0,0 +1,649 @@
+import argparse
+import csv
+import json
+import math
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import harvester_abi
+import instrument
+import warehouse
+
+
+# Block-accurate on-chain prices for the harvest out-tokens.
+#
+# A registry maps each price series ("eth" or a lowercase token address, the same keys as
+# coingecko_prices_7d.json) to one or more sources, tried in order per block:
+#   {"type": "chainlink", "feed": addr, "decimals": 8, "quote": "eth"?}
+#       answer of latestRoundData() at the block
+#   {"type": "univ3_twap", "pool": addr, "base_is_token0": true, "decimals0": 18, "decimals1": 18,
+#    "twap_seconds": 1800, "quote": "eth"?}
+#       price of the base token in the other pool token from the TWAP ending at the block
+#   {"type": "alias", "of": series}
+#       reuse another series (e.g. sdPENDLE ~= PENDLE)
+# "quote" multiplies by that series at the same block (a PENDLE/WETH pool quoted in ETH -> USD).
+# Only the pool/feed already used by fill_sdpendle_prices_with_uniswap_twap.py are built in; other
+# tokens (cvxFXN, cvxCRV, CVX, sdCRV, weETH) are added with --oracles <json> in the same format:
+#   {"0x62b9...0aa7": [{"type": "univ3_twap", "pool": "0x...", ...}], ...}
+# Per-block results (mean tick / feed answer) are cached in SQLite, so re-runs only query new blocks.
+# Uniswap reads are batched: one observe([t_n ... t_0]) per group of nearby blocks (univ3_mean_ticks,
+# shared with fill_sdpendle_prices_with_uniswap_twap.py).
+
+ETH = "eth"
+PENDLE_ADDR = "0x808507121b80c02388fad14726482e061b8da827"
+SDPENDLE_ADDR = "0x5ea630e00d6ee438d3dea1556a110359acdc10a9"
+CVXCRV_ADDR = "0x62b9c7356a2dc64a1969e19c23e4f579f9810aa7"
+
+# Uniswap V3: PENDLE/WETH fee=3000 (token0=PENDLE, token1=WETH)
+UNI_V3_POOL_PENDLE_WETH_3000 = "0x57af956d3e2cca3b86f3d8c6772c03ddca3eaacb"
+# Chainlink ETH/USD
+CHAINLINK_ETH_USD = "0x5f4ec3df9cbd43714fe2740f5e3616155c5b8419"
+
+DEFAULT_ORACLES: Dict[str, List[Dict[str, Any]]] = {
+    ETH: [{"type": "chainlink", "symbol": "ETH", "feed": CHAINLINK_ETH_USD, "decimals": 8}],
+    PENDLE_ADDR: [
+        {
+            "type": "univ3_twap",
+            "symbol": "PENDLE",
+            "pool": UNI_V3_POOL_PENDLE_WETH_3000,
+            "base_is_token0": True,
+            "decimals0": 18,
+            "decimals1": 18,
+            "twap_seconds": 1800,
+            "quote": ETH,
+        }
+    ],
+    SDPENDLE_ADDR: [{"type": "alias", "symbol": "sdPENDLE", "of": PENDLE_ADDR}],
+}
+
+# Harvest out-token per job (see TARGET_META in the report scripts); vault harvests pay cvxCRV.
+COMPOUNDER_SEL = "0x04117561"
+VAULT_SEL = "0xc7f884c6"
+FX_SEL = "0x78f26f5b"
+OUT_TOKEN_BY_TARGET: Dict[str, str] = {
+    "0x00bac667a4ccf9089ab1db978238c555c4349545": "0x183395dbd0b5e93323a7286d1973150697fffcb3",  # aFXN -> cvxFXN
+    "0x2b95a1dcc3d405535f9ed33c219ab38e8d7e0884": CVXCRV_ADDR,  # aCRV -> cvxCRV
+    "0xb0903ab70a7467ee5756074b31ac88aebb8fb777": "0x4e3fbd56cd56c3e72c1403e103b45db9da5b9d2b",  # aCVX -> CVX
+    "0x43e54c2e7b3e294de3a155785f52ab49d87b9922": "0xd1b5651e55d4ceed36251c61c50c889b36f6abb5",  # asdCRV -> sdCRV
+    "0x606462126e4bd5c4d153fe09967e4c46c9c7fecf": SDPENDLE_ADDR,  # asdPENDLE -> sdPENDLE
+    "0xdec800c2b17c9673570fdf54450dc1bd79c8e359": "0x4e3fbd56cd56c3e72c1403e103b45db9da5b9d2b",  # abcCVX -> CVX
+    "0x549716f858aeff9cb845d4c78c67a7599b0df240": "0xcd5fe23c85820f7b72d0926fc9b05b43e359b7ee",  # arUSD -> weETH
+}
+
+DEFAULT_CACHE = "data/oracle_cache.sqlite"
+SOURCE_TYPES = ("chainlink", "univ3_twap", "alias")
+LN_1_0001 = math.log(1.0001)
+
+
+def _normalize_hex(value: Any) -> str:
+    if not isinstance(value, str):
+        return ""
+    v = value.strip().lower()
+    if not v:
+        return ""
+    if not v.startswith("0x"):
+        v = "0x" + v
+    return v
+
+
+def _load_etherscan_api_key() -> str:
+    import tomllib
+
+    config_path = os.path.expanduser("~/.codex/config.toml")
+    with open(config_path, "rb") as f:
+        cfg = tomllib.load(f)
+
+    mcp_servers = cfg.get("mcp_servers", {})
+    if not isinstance(mcp_servers, dict):
+        raise RuntimeError("unexpected ~/.codex/config.toml schema (mcp_servers)")
+
+    server = mcp_servers.get("etherscan-mcp", {})
+    if not isinstance(server, dict):
+        raise RuntimeError("missing mcp_servers.etherscan-mcp in ~/.codex/config.toml")
+
+    env = server.get("env", {})
+    if not isinstance(env, dict):
+        raise RuntimeError("unexpected ~/.codex/config.toml schema (env)")
+
+    key = env.get("ETHERSCAN_API_KEY")
+    if not isinstance(key, str) or not key.strip():
+        raise RuntimeError(
+            "ETHERSCAN_API_KEY not found in ~/.codex/config.toml (mcp_servers.etherscan-mcp.env)"
+        )
+
+    return key.strip()
+
+
+def _is_rate_limited(payload: Any) -> bool:
+    if not isinstance(payload, dict):
+        return False
+    candidates: List[str] = []
+    for k in ("message", "result"):
+        v = payload.get(k)
+        if isinstance(v, str) and v:
+            candidates.append(v)
+    err = payload.get("error")
+    if isinstance(err, dict):
+        v = err.get("message")
+        if isinstance(v, str) and v:
+            candidates.append(v)
+    hay = " ".join(candidates).lower()
+    return (
+        "rate limit" in hay
+        or "max calls per sec" in hay
+        or "too many requests" in hay
+        or "request limit reached" in hay
+    )
+
+
+def _etherscan_request(
+    *,
+    session: Any,
+    base_url: str,
+    api_key: str,
+    chain_id: str,
+    params: Dict[str, Any],
+    timeout_s: int = 20,
+    max_retries: int = 10,
+    backoff_s: float = 0.9,
+) -> Dict[str, Any]:
+    merged = dict(params)
+    merged["chainid"] = chain_id
+    merged["apikey"] = api_key
+
+    last_exc: Optional[Exception] = None
+    for attempt in range(1, max_retries + 1):
+        try:
+            with instrument.span("etherscan.get"):
+                resp = session.get(base_url, params=merged, timeout=timeout_s)
+            instrument.count("etherscan.requests")
+            instrument.count("etherscan.bytes", len(resp.content or b""))
+            resp.raise_for_status()
+            payload = resp.json()
+            if _is_rate_limited(payload) and attempt < max_retries:
+                instrument.count("etherscan.rate_limited")
+                instrument.count("etherscan.retries")
+                time.sleep(backoff_s * attempt)
+                continue
+            if not isinstance(payload, dict):
+                raise RuntimeError("unexpected response type")
+            return payload
+        except Exception as exc:
+            last_exc = exc
+            if attempt < max_retries:
+                instrument.count("etherscan.retries")
+                time.sleep(backoff_s * attempt)
+                continue
+            raise RuntimeError("Etherscan request failed") from exc
+
+    raise RuntimeError("Etherscan request failed") from last_exc
+
+
+class TransientCallError(RuntimeError):
+    # eth_call failed for a reason other than the call itself (rate limit, node error, bad reply).
+    pass
+
+
+def eth_call_result(payload: Dict[str, Any]) -> Optional[str]:
+    # Result hex of a proxy eth_call reply; None when the call reverted or returned nothing.
+    error = payload.get("error")
+    if error is not None:
+        message = str(error.get("message", "") if isinstance(error, dict) else error)
+        if "revert" in message.lower():
+            return None
+        raise TransientCallError(f"eth_call failed: {message[:200]}")
+    result = payload.get("result")
+    if not isinstance(result, str) or not result.startswith("0x"):
+        raise TransientCallError(f"eth_call failed: {str(result)[:200]}")
+    return result if len(result) > 2 else None
+
+
+# ---- registry ----
+
+
+def _validate_source(series: str, spec: Any) -> Dict[str, Any]:
+    if not isinstance(spec, dict):
+        raise ValueError(f"oracle for {series}: source must be an object")
+    typ = spec.get("type")
+    if typ not in SOURCE_TYPES:
+        raise ValueError(f"oracle for {series}: unknown source type {typ!r} (expected one of {SOURCE_TYPES})")
+    out = dict(spec)
+    if typ == "chainlink":
+        out["feed"] = _normalize_hex(spec.get("feed"))
+        out["decimals"] = int(spec.get("decimals", 8))
+        if len(out["feed"]) != 42:
+            raise ValueError(f"oracle for {series}: chainlink source needs a feed address")
+    elif typ == "univ3_twap":
+        out["pool"] = _normalize_hex(spec.get("pool"))
+        out["base_is_token0"] = bool(spec.get("base_is_token0", True))
+        out["decimals0"] = int(spec.get("decimals0", 18))
+        out["decimals1"] = int(spec.get("decimals1", 18))
+        out["twap_seconds"] = int(spec.get("twap_seconds", 1800))
+        if len(out["pool"]) != 42:
+            raise ValueError(f"oracle for {series}: univ3_twap source needs a pool address")
+        if out["twap_seconds"] <= 0:
+            raise ValueError(f"oracle for {series}: twap_seconds must be > 0")
+    else:
+        out["of"] = str(spec.get("of") or "").strip().lower()
+        if not out["of"]:
+            raise ValueError(f"oracle for {series}: alias source needs 'of'")
+    if out.get("quote") is not None:
+        out["quote"] = str(out["quote"]).strip().lower()
+    return out
+
+
+def load_registry(path: str = "") -> Dict[str, List[Dict[str, Any]]]:
+    # Built-in sources, then the JSON file on top (a series listed there replaces the built-in list).
+    raw: Dict[str, Any] = dict(DEFAULT_ORACLES)
+    if path:
+        with open(path) as f:
+            user = json.load(f)
+        if not isinstance(user, dict):
+            raise ValueError(f"{path}: expected an object of series -> source(s)")
+        raw.update(user)
+    registry: Dict[str, List[Dict[str, Any]]] = {}
+    for series, specs in raw.items():
+        key = str(series).strip().lower()
+        specs = specs if isinstance(specs, list) else [specs]
+        registry[key] = [_validate_source(key, s) for s in specs]
+    for key, specs in registry.items():
+        for spec in specs:
+            for dep in (spec.get("of"), spec.get("quote")):
+                if dep and dep not in registry:
+                    raise ValueError(f"oracle for {key}: depends on unknown series {dep}")
+    # OracleService.prices() resolves aliases and quotes recursively, so a cycle would never end.
+    done: Set[str] = set()
+    for key in registry:
+        path: List[str] = []
+        stack = [(key, False)]
+        while stack:
+            series, leaving = stack.pop()
+            if leaving:
+                path.pop()
+                done.add(series)
+                continue
+            if series in path:
+                cycle = " -> ".join(path[path.index(series) :] + [series])
+                raise ValueError(f"oracle registry: alias/quote cycle {cycle}")
+            if series in done:
+                continue
+            path.append(series)
+            stack.append((series, True))
+            for spec in registry[series]:
+                stack.extend((dep, False) for dep in (spec.get("of"), spec.get("quote")) if dep)
+    return registry
+
+
+# ---- observation cache ----
+
+
+class ObservationCache:
+    # (source id, block) -> raw observation: the TWAP mean tick or the feed answer.
+    def __init__(self, path: str = DEFAULT_CACHE) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS obs (source TEXT NOT NULL, block INTEGER NOT NULL, value REAL NOT NULL, "
+            "PRIMARY KEY (source, block)) WITHOUT ROWID"
+        )
+        self.db.commit()
+
+    def get_many(self, source: str, blocks: Sequence[int]) -> Dict[int, float]:
+        out: Dict[int, float] = {}
+        todo = list(dict.fromkeys(int(b) for b in blocks))
+        for i in range(0, len(todo), 500):
+            chunk = todo[i : i + 500]
+            q = "SELECT block, value FROM obs WHERE source = ? AND block IN (" + ",".join("?" * len(chunk)) + ")"
+            out.update((int(b), float(v)) for b, v in self.db.execute(q, [source] + chunk))
+        instrument.count("oracle_cache.hits", len(out))
+        instrument.count("oracle_cache.misses", len(todo) - len(out))
+        return out
+
+    def put_many(self, source: str, values: Dict[int, float]) -> None:
+        if not values:
+            return
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO obs (source, block, value) VALUES (?, ?, ?)",
+                [(source, int(b), float(v)) for b, v in values.items()],
+            )
+
+    def close(self) -> None:
+        self.db.close()
+
+
+# ---- on-chain reads ----
+
+
+@dataclass(frozen=True)
+class Rpc:
+    session: Any  # requests.Session
+    base_url: str
+    api_key: str
+    chain_id: str
+    sleep_s: float = 0.35
+
+    def eth_call(self, to: str, data: str, block: int) -> Optional[str]:
+        # Result hex, or None when the call reverted / returned nothing; TransientCallError otherwise.
+        payload = _etherscan_request(
+            session=self.session,
+            base_url=self.base_url,
+            api_key=self.api_key,
+            chain_id=self.chain_id,
+            params={"module": "proxy", "action": "eth_call", "to": to, "data": data, "tag": hex(int(block))},
+        )
+        time.sleep(max(0.0, self.sleep_s))
+        return eth_call_result(payload)
+
+
+def _arithmetic_mean_tick(tick_cumulatives: Sequence[int], seconds_ago: int) -> int:
+    delta = tick_cumulatives[1] - tick_cumulatives[0]
+    mean = int(delta / seconds_ago)  # toward zero
+    if delta < 0 and (delta % seconds_ago) != 0:
+        mean -= 1  # round toward negative infinity (Uniswap OracleLibrary)
+    return mean
+
+
+def _chainlink_answers(rpc: Rpc, spec: Dict[str, Any], blocks: Sequence[Tuple[int, int]]) -> Dict[int, float]:
+    out: Dict[int, float] = {}
+    data = harvester_abi.CHAINLINK_LATEST_ROUND_DATA.encode_call_hex()
+    for bn, _ts in blocks:
+        try:
+            result = rpc.eth_call(spec["feed"], data, bn)
+        except TransientCallError:
+            continue  # not cached, so the next run asks again
+        if result is None or len(result) < 2 + 32 * 5 * 2:
+            continue
+        answer = harvester_abi.CHAINLINK_LATEST_ROUND_DATA.decode_output(result)[1]
+        if answer > 0:
+            out[bn] = float(answer)
+    return out
+
+
+def univ3_mean_ticks(
+    observe: Callable[[int, Sequence[int]], Optional[List[int]]],
+    blocks: Sequence[Tuple[int, int]],
+    twap_s: int,
+    *,
+    max_targets: int = 32,
+    max_span_s: int = 86400,
+    retries: int = 3,
+) -> Tuple[Dict[int, int], int]:
+    # Mean tick of the TWAP ending at each (block, ts), and the number of observe() calls made.
+    # observe(block, seconds_agos) returns the tick cumulatives, None when the call reverted, and
+    # raises TransientCallError when it failed for another reason.
+    # tickCumulative is a function of time only, so the TWAP ending at an older block can be read at a
+    # later anchor block with both ends shifted by (anchor_ts - ts). Consecutive targets are grouped so
+    # one observe([t_n ... t_0]) at the group's last block covers all of them. A group whose oldest
+    # offset is outside the observation window reverts ("OLD"); the span cap is then halved and the
+    # group re-split, down to one target per call. A single block that still reverts is left out.
+    # A transient failure says nothing about the window: the same group is retried up to `retries`
+    # times and then left out, with the span cap unchanged.
+    out: Dict[int, int] = {}
+    n_calls = 0
+    span_cap = max(int(max_span_s), twap_s)
+    failures = 0
+    start = 0
+    while start < len(blocks):
+        end = start + 1
+        while (
+            end < len(blocks)
+            and end - start < max(1, max_targets)
+            and blocks[end][1] - blocks[start][1] + twap_s <= span_cap
+        ):
+            end += 1
+        anchor_bn, anchor_ts = blocks[end - 1]
+        offsets: List[int] = []
+        for _bn, ts in blocks[start:end]:
+            offsets.extend([anchor_ts - ts + twap_s, anchor_ts - ts])
+        seconds_agos = sorted(set(offsets), reverse=True)
+        n_calls += 1
+        try:
+            ticks = observe(anchor_bn, seconds_agos)
+            if ticks is not None and len(ticks) != len(seconds_agos):
+                raise TransientCallError(f"observe returned {len(ticks)} values for {len(seconds_agos)} offsets")
+        except TransientCallError:
+            failures += 1
+            if failures <= retries:
+                instrument.count("oracle.observe_retries")
+                continue
+            failures, start = 0, end
+            continue
+        failures = 0
+        if ticks is None:
+            if end - start > 1:
+                span_cap = max(twap_s, (anchor_ts - blocks[start][1] + twap_s) // 2)
+                continue
+            start = end
+            continue
+        cumulative = dict(zip(seconds_agos, ticks))
+        for bn, ts in blocks[start:end]:
+            age = anchor_ts - ts
+            out[bn] = _arithmetic_mean_tick([cumulative[age + twap_s], cumulative[age]], twap_s)
+        start = end
+    return out, n_calls
+
+
+def _univ3_mean_ticks(rpc: Rpc, spec: Dict[str, Any], blocks: Sequence[Tuple[int, int]]) -> Dict[int, float]:
+    # A block left unpriced by univ3_mean_ticks falls through to the next source in the registry.
+    def observe(bn: int, seconds_agos: Sequence[int]) -> Optional[List[int]]:
+        result = rpc.eth_call(spec["pool"], harvester_abi.UNIV3_OBSERVE.encode_call_hex(list(seconds_agos)), bn)
+        if result is None:
+            return None
+        return [int(t) for t in harvester_abi.UNIV3_OBSERVE.decode_output(result)[0]]
+
+    ticks, _n_calls = univ3_mean_ticks(observe, blocks, int(spec["twap_seconds"]))
+    return {bn: float(t) for bn, t in ticks.items()}
+
+
+def _source_id(spec: Dict[str, Any]) -> str:
+    if spec["type"] == "chainlink":
+        return f"chainlink:{spec['feed']}"
+    if spec["type"] == "univ3_twap":
+        return f"univ3:{spec['pool']}:{spec['twap_seconds']}"
+    return f"alias:{spec['of']}"
+
+
+def _observe(rpc: Optional[Rpc], cache: ObservationCache, spec: Dict[str, Any], blocks: Sequence[Tuple[int, int]]):
+    source = _source_id(spec)
+    found = cache.get_many(source, [bn for bn, _ts in blocks])
+    missing = [(bn, ts) for bn, ts in blocks if bn not in found]
+    if missing and rpc is not None:
+        if spec["type"] == "chainlink":
+            fetched = _chainlink_answers(rpc, spec, missing)
+        else:
+            fetched = _univ3_mean_ticks(rpc, spec, missing)
+        cache.put_many(source, fetched)
+        found.update(fetched)
+    return found
+
+
+def _raw_to_price(spec: Dict[str, Any], raw: float) -> float:
+    if spec["type"] == "chainlink":
+        return raw / float(10 ** spec["decimals"])
+    # tick = log_1.0001(token1/token0) in raw units
+    px = math.exp(raw * LN_1_0001) * float(10 ** (spec["decimals0"] - spec["decimals1"]))
+    return px if spec["base_is_token0"] else 1.0 / px
+
+
+class OracleService:
+    def __init__(
+        self, registry: Dict[str, List[Dict[str, Any]]], cache: ObservationCache, rpc: Optional[Rpc] = None
+    ) -> None:
+        # rpc=None serves from the cache only.
+        self.registry = registry
+        self.cache = cache
+        self.rpc = rpc
+        self._resolved: Dict[str, Dict[int, float]] = {}
+
+    def prices(self, series: str, blocks: Sequence[Tuple[int, int]]) -> Dict[int, float]:
+        # USD (or quote-unit) price per block for `series`; blocks no source could price are absent.
+        series = series.strip().lower()
+        known = self._resolved.setdefault(series, {})
+        todo = sorted({(int(bn), int(ts)) for bn, ts in blocks if int(bn) not in known})
+        for spec in self.registry.get(series, []):
+            if not todo:
+                break
+            if spec["type"] == "alias":
+                got = self.prices(spec["of"], todo)
+            else:
+                raw = _observe(self.rpc, self.cache, spec, todo)
+                got = {bn: _raw_to_price(spec, v) for bn, v in raw.items()}
+            quote = spec.get("quote")
+            if quote and spec["type"] != "alias":
+                quote_px = self.prices(quote, [(bn, ts) for bn, ts in todo if bn in got])
+                got = {bn: px * quote_px[bn] for bn, px in got.items() if bn in quote_px}
+            known.update(got)
+            todo = [(bn, ts) for bn, ts in todo if bn not in known]
+        return {int(bn): known[int(bn)] for bn, _ts in blocks if int(bn) in known}
+
+
+# ---- CLI ----
+
+
+def _out_token(selector: str, target: str) -> str:
+    if selector == VAULT_SEL:
+        return CVXCRV_ADDR
+    if selector in (COMPOUNDER_SEL, FX_SEL):
+        return OUT_TOKEN_BY_TARGET.get(target, "")
+    return ""
+
+
+def _load_call_blocks(path: str) -> Dict[str, List[Tuple[int, int]]]:
+    # series -> sorted unique (block, ts) of the calls that need it; ETH is needed at every call (gas).
+    by_series: Dict[str, Dict[int, int]] = {ETH: {}}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                bn = int(row.get("block_number") or "0")
+                ts = int(row.get("timestamp") or "0")
+            except ValueError:
+                continue
+            if bn <= 0 or ts <= 0:
+                continue
+            keys = [ETH]
+            token = _out_token(str(row.get("selector", "")).lower(), str(row.get("target", "")).lower())
+            if token:
+                keys.append(token)
+            for key in keys:
+                seen = by_series.setdefault(key, {})
+                if bn not in seen or ts < seen[bn]:
+                    seen[bn] = ts
+    return {k: sorted(v.items()) for k, v in by_series.items()}
+
+
+def _merge_points(existing: Any, points: Dict[int, float]) -> List[List[float]]:
+    merged: Dict[int, float] = {}
+    if isinstance(existing, list):
+        for item in existing:
+            if isinstance(item, (list, tuple)) and len(item) >= 2:
+                try:
+                    merged[int(item[0])] = float(item[1])
+                except (TypeError, ValueError):
+                    continue
+    merged.update(points)  # on-chain points win on equal timestamps
+    return [[float(ms), float(px)] for ms, px in sorted(merged.items())]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls-csv", default="data/f88e_harvester_calls_7d.csv")
+    parser.add_argument("--prices-json", default="data/coingecko_prices_7d.json", help="Base series to merge into")
+    parser.add_argument("--out", default="data/oracle_prices_7d.json")
+    parser.add_argument("--oracles", default="", help="Optional JSON of series -> source(s), on top of the built-ins")
+    parser.add_argument("--series", default="", help="Comma-separated series to price (default: all in the registry)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE)
+    parser.add_argument("--offline", action="store_true", help="Serve from the observation cache only")
+    parser.add_argument("--chain-id", default="1")
+    parser.add_argument("--base-url", default="https://api.etherscan.io/v2/api")
+    parser.add_argument("--sleep-ms", type=int, default=350)
+    parser.add_argument("--db", default="", help="Optional: also load the price series into this warehouse SQLite")
+    args = parser.parse_args()
+    instrument.phase("load")
+
+    registry = load_registry(args.oracles)
+    wanted = [s.strip().lower() for s in str(args.series).split(",") if s.strip()] or sorted(registry)
+    unknown = [s for s in wanted if s not in registry]
+    if unknown:
+        raise SystemExit(f"no oracle configured for: {', '.join(unknown)}")
+
+    blocks_by_series = _load_call_blocks(args.calls_csv)
+
+    rpc: Optional[Rpc] = None
+    if not args.offline:
+        import requests  # only needed when reading the chain; --offline runs from the cache
+
+        api_key = _load_etherscan_api_key()
+        session = requests.Session()
+        session.headers.update({"X-API-Key": api_key, "User-Agent": "etherscan-mcp-use/0.1"})
+        rpc = Rpc(
+            session=session,
+            base_url=str(args.base_url).rstrip("/"),
+            api_key=api_key,
+            chain_id=str(args.chain_id),
+            sleep_s=max(0.0, float(args.sleep_ms) / 1000.0),
+        )
+    cache = ObservationCache(args.cache)
+    service = OracleService(registry, cache, rpc)
+
+    payload: Dict[str, Any] = {}
+    if args.prices_json and os.path.exists(args.prices_json):
+        with open(args.prices_json) as f:
+            payload = json.load(f)
+        if not isinstance(payload, dict):
+            raise SystemExit("prices json invalid")
+    if not isinstance(payload.get("tokens"), dict):
+        payload["tokens"] = {}
+
+    instrument.phase("fetch")
+    for series in wanted:
+        blocks = blocks_by_series.get(series, [])
+        if not blocks:
+            print(f"{series}: no calls need this series, skipped")
+            continue
+        px = service.prices(series, blocks)
+        ts_by_block = dict(blocks)
+        points = {int(ts_by_block[bn]) * 1000: float(p) for bn, p in px.items()}
+        sources = [_source_id(s) for s in registry[series]]
+        if series == ETH:
+            entry = payload.get("eth") if isinstance(payload.get("eth"), dict) else {}
+        else:
+            entry = payload["tokens"].get(series) if isinstance(payload["tokens"].get(series), dict) else {}
+            entry.setdefault("address", series)
+        symbol = next((s.get("symbol") for s in registry[series] if s.get("symbol")), "")
+        if symbol and not entry.get("symbol"):
+            entry["symbol"] = symbol
+        entry["prices"] = _merge_points(entry.get("prices"), points)
+        entry["oracle"] = {"sources": sources, "blocks_priced": len(px), "blocks_wanted": len(blocks)}
+        if series == ETH:
+            payload["eth"] = entry
+        else:
+            payload["tokens"][series] = entry
+        print(f"{symbol or series}: {len(px)}/{len(blocks)} call blocks priced via {', '.join(sources)}")
+    cache.close()
+
+    payload.setdefault("meta", {})
+    if isinstance(payload["meta"], dict):
+        payload["meta"]["oracle"] = {
+            "generated_at": int(datetime.now(tz=timezone.utc).timestamp()),
+            "method": "per-call-block on-chain prices merged over the base series",
+        }
+
+    instrument.phase("write")
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(payload, f)
+    if args.db:
+        conn = warehouse.connect(args.db)
+        warehouse.import_prices_payload(conn, payload)
+        conn.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(instrument.run(main))
@@ -0,0 +1,335 @@
+import json
+import math
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+
+# DDSketch (Masson, Rim, Lee 2019): a quantile sketch with a relative-error guarantee.
+# Values are counted in logarithmic bins: bin i covers (gamma^(i-1), gamma^i] with
+# gamma = (1 + a) / (1 - a), and a quantile is answered with the bin's midpoint 2 * gamma^i / (gamma + 1).
+# The answer is then within a relative error `a` of the exact value at that rank. Negative values use a
+# mirrored set of bins, and zero (or |x| below MIN_INDEXABLE) has its own counter.
+# Two sketches with the same accuracy merge by adding bin counts, so buckets, shards and days
+# combine without keeping raw values. Quantiles follow the reports' _pct: rank = q * (n - 1), and
+# a fractional rank interpolates between the two neighbouring ranks' estimates.
+#
+# Error bounds: quantile_bounds(q) interpolates the edges of the bins holding those two ranks,
+# clamped to [min, max]; the exact _pct value is always inside it. The guarantee is lost only where
+# a rank lands in bins folded by _collapse (more than max_bins distinct magnitudes, i.e. over ~80
+# decades at 1%); there the lower edge widens to zero.
+#
+# ExactQuantiles keeps the sorted values behind the same interface and interpolates exactly like
+# _pct, so a tool can switch between exact and sketched stats with one flag (summarize()).
+# Both serialize to JSON-able dicts (to_dict/from_dict) for shards that are merged later.
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+DEFAULT_MAX_BINS = 2048
+MIN_INDEXABLE = 1e-30
+
+
+class DDSketch:
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY, max_bins: int = DEFAULT_MAX_BINS) -> None:
+        if not 0.0 < relative_accuracy < 1.0:
+            raise ValueError(f"relative_accuracy must be in (0, 1): {relative_accuracy}")
+        self.relative_accuracy = float(relative_accuracy)
+        self.max_bins = max(16, int(max_bins))
+        self.gamma = (1.0 + self.relative_accuracy) / (1.0 - self.relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.pos: Dict[int, float] = {}
+        self.neg: Dict[int, float] = {}
+        self.zero = 0.0
+        self.count = 0.0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        # largest folded bin index per side (see _collapse); None while nothing was folded
+        self.collapsed: Dict[str, Optional[int]] = {"pos": None, "neg": None}
+
+    def _index(self, magnitude: float) -> int:
+        return int(math.ceil(math.log(magnitude) / self._log_gamma))
+
+    def _value(self, index: int) -> float:
+        return 2.0 * self.gamma**index / (self.gamma + 1.0)
+
+    def add(self, value: float, weight: float = 1.0) -> None:
+        value = float(value)
+        if weight <= 0 or math.isnan(value):
+            return
+        if value > MIN_INDEXABLE:
+            i = self._index(value)
+            self.pos[i] = self.pos.get(i, 0.0) + weight
+            if len(self.pos) > self.max_bins:
+                self._collapse("pos")
+        elif value < -MIN_INDEXABLE:
+            i = self._index(-value)
+            self.neg[i] = self.neg.get(i, 0.0) + weight
+            if len(self.neg) > self.max_bins:
+                self._collapse("neg")
+        else:
+            self.zero += weight
+        self.count += weight
+        self.sum += value * weight
+        self.sum_sq += value * value * weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def extend(self, values: Iterable[float]) -> "DDSketch":
+        for v in values:
+            self.add(v)
+        return self
+
+    def _collapse(self, side: str) -> None:
+        # Fold the smallest-magnitude bins into one so the sketch stays bounded; only quantiles that
+        # fall in that folded low tail lose the accuracy guarantee.
+        bins = self.pos if side == "pos" else self.neg
+        keys = sorted(bins)
+        extra = len(keys) - self.max_bins
+        target = keys[extra]
+        for k in keys[:extra]:
+            bins[target] += bins.pop(k)
+        prev = self.collapsed[side]
+        self.collapsed[side] = target if prev is None else max(prev, target)
+
+    def merge(self, other: "DDSketch") -> "DDSketch":
+        if other.gamma != self.gamma:
+            raise ValueError("cannot merge sketches with different relative accuracy")
+        for side, mine, theirs in (("pos", self.pos, other.pos), ("neg", self.neg, other.neg)):
+            for k, c in theirs.items():
+                mine[k] = mine.get(k, 0.0) + c
+            folded = [i for i in (self.collapsed[side], other.collapsed[side]) if i is not None]
+            self.collapsed[side] = max(folded) if folded else None
+            if len(mine) > self.max_bins:
+                self._collapse(side)
+        self.zero += other.zero
+        self.count += other.count
+        self.sum += other.sum
+        self.sum_sq += other.sum_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def copy(self) -> "DDSketch":
+        out = DDSketch(self.relative_accuracy, self.max_bins)
+        return out.merge(self)
+
+    def _locate(self, rank: int) -> Tuple[str, int]:
+        # (side, bin index) holding the value of integer rank `rank`; side "zero" for the zero counter.
+        seen = 0.0
+        for k in sorted(self.neg, reverse=True):
+            seen += self.neg[k]
+            if seen > rank:
+                return "neg", k
+        seen += self.zero
+        if seen > rank:
+            return "zero", 0
+        for k in sorted(self.pos):
+            seen += self.pos[k]
+            if seen > rank:
+                return "pos", k
+        return ("pos", max(self.pos)) if self.pos else ("zero", 0)
+
+    def _estimate(self, rank: int) -> Tuple[float, float, float]:
+        # (estimate, lower, upper) for the value at integer rank `rank`.
+        side, k = self._locate(rank)
+        if side == "zero":
+            return 0.0, max(self.min, -MIN_INDEXABLE), min(self.max, MIN_INDEXABLE)
+        folded = self.collapsed[side] is not None and k <= int(self.collapsed[side] or 0)
+        lo_mag = 0.0 if folded else self.gamma ** (k - 1)
+        hi_mag = self.gamma**k
+        if side == "neg":
+            return max(self.min, -self._value(k)), max(self.min, -hi_mag), min(self.max, -lo_mag)
+        return min(self.max, self._value(k)), max(self.min, lo_mag), min(self.max, hi_mag)
+
+    def _interpolated(self, q: float) -> Optional[Tuple[float, float, float]]:
+        if self.count <= 0:
+            return None
+        if q <= 0:
+            return self.min, self.min, self.min
+        if q >= 1:
+            return self.max, self.max, self.max
+        rank = q * (self.count - 1)
+        f = int(rank)
+        a = self._estimate(f)
+        if rank == f:
+            return a
+        b = self._estimate(f + 1)
+        w = rank - f
+        return tuple(x * (1.0 - w) + y * w for x, y in zip(a, b))  # type: ignore[return-value]
+
+    def quantile(self, q: float) -> Optional[float]:
+        # q in [0, 1]; None when empty.
+        est = self._interpolated(q)
+        return None if est is None else est[0]
+
+    def quantile_bounds(self, q: float) -> Optional[Tuple[float, float]]:
+        # Interval that contains the exact (interpolated) rank-q value (see the header).
+        est = self._interpolated(q)
+        return None if est is None else (est[1], est[2])
+
+    def pct_bounds(self, p: float) -> Optional[Tuple[float, float]]:
+        return self.quantile_bounds(p / 100.0)
+
+    def pct(self, p: float) -> Optional[float]:
+        # Same argument as the reports' _pct (0..100).
+        return self.quantile(p / 100.0)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count > 0 else None
+
+    def cv(self) -> Optional[float]:
+        # Population std / mean from the running sums (same definition as the reports' _cv).
+        if self.count <= 0 or self.sum == 0:
+            return None
+        m = self.sum / self.count
+        var = max(self.sum_sq / self.count - m * m, 0.0)
+        return (var**0.5) / m
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": "ddsketch",
+            "relative_accuracy": self.relative_accuracy,
+            "max_bins": self.max_bins,
+            "pos": sorted([k, c] for k, c in self.pos.items()),
+            "neg": sorted([k, c] for k, c in self.neg.items()),
+            "zero": self.zero,
+            "count": self.count,
+            "sum": self.sum,
+            "sum_sq": self.sum_sq,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "collapsed": self.collapsed,
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "DDSketch":
+        out = cls(float(d["relative_accuracy"]), int(d.get("max_bins") or DEFAULT_MAX_BINS))
+        out.pos = {int(k): float(c) for k, c in d.get("pos") or []}
+        out.neg = {int(k): float(c) for k, c in d.get("neg") or []}
+        out.zero = float(d.get("zero") or 0.0)
+        out.count = float(d.get("count") or 0.0)
+        out.sum = float(d.get("sum") or 0.0)
+        out.sum_sq = float(d.get("sum_sq") or 0.0)
+        out.min = math.inf if d.get("min") is None else float(d["min"])
+        out.max = -math.inf if d.get("max") is None else float(d["max"])
+        collapsed = d.get("collapsed") or {}
+        out.collapsed = {side: collapsed.get(side) for side in ("pos", "neg")}
+        return out
+
+
+class ExactQuantiles:
+    # All values, sorted; pct() interpolates between neighbours exactly like the reports' _pct.
+    def __init__(self, values: Iterable[float] = ()) -> None:
+        self.values: List[float] = sorted(float(v) for v in values)
+
+    def add(self, value: float) -> None:
+        self.values.append(float(value))
+        self.values.sort()
+
+    def extend(self, values: Iterable[float]) -> "ExactQuantiles":
+        self.values = sorted(self.values + [float(v) for v in values])
+        return self
+
+    def merge(self, other: "ExactQuantiles") -> "ExactQuantiles":
+        return self.extend(other.values)
+
+    @property
+    def count(self) -> int:
+        return len(self.values)
+
+    @property
+    def sum(self) -> float:
+        return sum(self.values)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / len(self.values) if self.values else None
+
+    def pct(self, p: float) -> Optional[float]:
+        xs = self.values
+        if not xs:
+            return None
+        if p <= 0:
+            return xs[0]
+        if p >= 100:
+            return xs[-1]
+        k = (len(xs) - 1) * (p / 100.0)
+        f = int(k)
+        c = min(f + 1, len(xs) - 1)
+        if f == c:
+            return xs[f]
+        return xs[f] * (c - k) + xs[c] * (k - f)
+
+    def pct_bounds(self, p: float) -> Optional[Tuple[float, float]]:
+        v = self.pct(p)
+        return None if v is None else (v, v)
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.pct(q * 100.0)
+
+    def cv(self) -> Optional[float]:
+        xs = self.values
+        if not xs:
+            return None
+        m = sum(xs) / len(xs)
+        if m == 0:
+            return None
+        var = sum((x - m) ** 2 for x in xs) / len(xs)
+        return (var**0.5) / m
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"kind": "exact", "values": self.values}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "ExactQuantiles":
+        return cls(d.get("values") or [])
+
+
+Quantiles = Union[DDSketch, ExactQuantiles]
+
+
+def summarize(values: Iterable[float], relative_accuracy: Optional[float] = None) -> Quantiles:
+    # Exact stats when relative_accuracy is None, a DDSketch otherwise.
+    if relative_accuracy is None:
+        return ExactQuantiles(values)
+    return DDSketch(relative_accuracy).extend(values)
+
+
+def from_dict(d: Dict[str, Any]) -> Quantiles:
+    if d.get("kind") == "exact":
+        return ExactQuantiles.from_dict(d)
+    return DDSketch.from_dict(d)
+
+
+def merge_all(items: Sequence[Quantiles]) -> Optional[Quantiles]:
+    # Merge into a fresh object; the inputs are left as they are.
+    if not items:
+        return None
+    first = items[0]
+    out: Quantiles
+    if isinstance(first, ExactQuantiles):
+        out = ExactQuantiles()
+    else:
+        out = DDSketch(first.relative_accuracy, first.max_bins)
+    for item in items:
+        out.merge(item)  # type: ignore[arg-type]
+    return out
+
+
+def load_sketch_file(path: str) -> Dict[str, Dict[str, Quantiles]]:
+    # {key: {metric: sketch}} as written by the tools' --sketches-out.
+    with open(path) as f:
+        payload = json.load(f)
+    sketches = payload.get("sketches") or {}
+    return {key: {m: from_dict(d) for m, d in metrics.items()} for key, metrics in sketches.items()}
+
+
+def merge_sketch_files(paths: Sequence[str]) -> Dict[str, Dict[str, Quantiles]]:
+    # Shards (e.g. one file per day or per worker) merged per key and metric.
+    out: Dict[str, Dict[str, Quantiles]] = {}
+    for path in paths:
+        for key, metrics in load_sketch_file(path).items():
+            mine = out.setdefault(key, {})
+            for m, sk in metrics.items():
+                mine[m] = merge_all([mine[m], sk]) if m in mine else sk  # type: ignore[assignment]
+    return out
@@ -0,0 +1,222 @@
+import hashlib
+import inspect
+import json
+import os
+import sys
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import instrument
+
+
+# Section results for the markdown reports, cached by input fingerprint.
+#
+# A report is a list of Sections. compute(inputs) returns a JSON-able result (dicts/lists of numbers
+# and strings). render(result) turns it into markdown through the section's templates and always
+# re-runs because it is cheap. A section's compute only re-runs when its key changes. The key covers:
+#   - the code it reaches: its own bytecode, the module-level helpers/constants it names (transitively),
+#     sibling tool modules it uses, and the inputs properties it reads (loaders and derived datasets);
+#   - content hashes of the files named by `files` and the values of the args named by `params`.
+# Editing one section's compute, or one input it reads, re-runs that section only. Template edits
+# re-render without recomputing. `inputs` should load lazily (cached_property), so a run where every
+# section hits the cache does not read the CSVs at all.
+# The cache is a JSON sidecar in data/ per report (see cache_path); delete it or pass the tool's
+# --refresh-sections to recompute everything.
+
+CACHE_VERSION = 1
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@dataclass(frozen=True)
+class Section:
+    name: str
+    compute: Callable[[Any], Any]
+    render: Optional[Callable[[Any], str]]  # None: the tool assembles the markdown from several results
+    files: Tuple[str, ...] = ()  # args attributes holding input paths
+    params: Tuple[str, ...] = ()  # other args attributes the result depends on
+
+
+def fill(template: str, values: Dict[str, Any]) -> str:
+    return template.format_map(values)
+
+
+def rows(template: str, items: Iterable[Dict[str, Any]]) -> str:
+    return "".join(template.format_map(item) for item in items)
+
+
+def cache_path(out_md: str) -> str:
+    stem, _ = os.path.splitext(os.path.basename(out_md))
+    return os.path.join("data", f"{stem}.sections.json")
+
+
+class _LazyModule:
+    # Stands in for a sibling module that is not imported yet; only its file is hashed.
+    def __init__(self, path: str) -> None:
+        self.__file__ = path
+
+
+def _local_stem(obj: Any) -> Optional[str]:
+    # File stem of the tools module defining obj (the same whether it runs as __main__ or is imported).
+    mod = sys.modules.get(getattr(obj, "__module__", "") or "")
+    path = getattr(mod, "__file__", None)
+    if not path or os.path.dirname(os.path.abspath(path)) != TOOLS_DIR:
+        return None
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _member_function(member: Any) -> Any:
+    if isinstance(member, (staticmethod, classmethod)):
+        return member.__func__
+    if isinstance(member, property):
+        return member.fget
+    if isinstance(member, cached_property):
+        return member.func
+    return member
+
+
+def _functions(obj: Any) -> List[Any]:
+    if inspect.isfunction(obj):
+        return [obj]
+    return [fn for fn in map(_member_function, vars(obj).values()) if inspect.isfunction(fn)]
+
+
+def _code_digest(code: Any, names: set) -> str:
+    # Bytecode, constants and referenced names (nested functions/comprehensions included): edits to
+    # comments or line positions do not change it.
+    h = hashlib.sha256(code.co_code)
+    h.update(repr(code.co_names).encode())
+    names.update(code.co_names)
+    for c in code.co_consts:
+        h.update((_code_digest(c, names) if inspect.iscode(c) else repr(c)).encode())
+    return h.hexdigest()
+
+
+def code_fingerprint(*roots: Any, members: Optional[type] = None) -> str:
+    # Hash of everything in this tools directory that `roots` (functions/classes) can reach by name.
+    # With `members`, attribute names that match a member of that class (the inputs properties a
+    # section reads) are followed too.
+    parts: Dict[str, str] = {}
+    seen: set = set()
+    todo: List[Tuple[str, Any]] = [(getattr(r, "__qualname__", repr(r)), r) for r in roots]
+    while todo:
+        name, obj = todo.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if inspect.ismodule(obj) or isinstance(obj, _LazyModule):
+            path = getattr(obj, "__file__", None)
+            if path and os.path.dirname(os.path.abspath(path)) == TOOLS_DIR:
+                with open(path, "rb") as f:
+                    parts[f"module:{os.path.basename(path)}"] = hashlib.sha256(f.read()).hexdigest()
+            continue
+        if inspect.isfunction(obj) or inspect.isclass(obj):
+            obj = inspect.unwrap(obj) if inspect.isfunction(obj) else obj  # memoized loaders (pendle_report)
+            stem = _local_stem(obj)
+            if stem is None:
+                continue
+            names: set = set()
+            digests = [_code_digest(fn.__code__, names) + repr(fn.__defaults__) for fn in _functions(obj)]
+            parts[f"code:{stem}.{obj.__qualname__}"] = hashlib.sha256("".join(digests).encode()).hexdigest()
+            scope = vars(sys.modules[obj.__module__])
+            for n in sorted(names):
+                if n in scope:
+                    todo.append((n, scope[n]))
+                elif os.path.exists(os.path.join(TOOLS_DIR, n + ".py")):
+                    # Sibling module imported inside a function (numpy-backed helpers are imported lazily).
+                    todo.append((n, sys.modules.get(n) or _LazyModule(os.path.join(TOOLS_DIR, n + ".py"))))
+                if members is not None and n in vars(members):
+                    todo.append((n, _member_function(vars(members)[n])))
+            continue
+        if isinstance(obj, (str, int, float, bool, tuple, list, dict, frozenset, type(None))):
+            parts[f"const:{name}"] = hashlib.sha256(repr(obj).encode()).hexdigest()
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+class SectionCache:
+    def __init__(self, path: Optional[str]) -> None:
+        # path=None: compute everything and persist nothing.
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        payload: Dict[str, Any] = {}
+        try:
+            if path:
+                with open(path) as f:
+                    payload = json.load(f)
+        except (OSError, ValueError):
+            payload = {}
+        if not isinstance(payload, dict) or payload.get("version") != CACHE_VERSION:
+            payload = {}
+        self.sections: Dict[str, Dict[str, Any]] = payload.get("sections") or {}
+        self.hashes: Dict[str, List[Any]] = payload.get("hashes") or {}
+
+    def file_fingerprint(self, path: str) -> Optional[str]:
+        # sha256 per file, reused while (size, mtime_ns) is unchanged.
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        hit = self.hashes.get(path)
+        if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+            return str(hit[2])
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        self.hashes[path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(
+                {"version": CACHE_VERSION, "sections": self.sections, "hashes": self.hashes},
+                f,
+                separators=(",", ":"),
+                ensure_ascii=False,
+            )
+        os.replace(tmp, self.path)
+
+
+def section_key(section: Section, inputs: Any, args: Any, cache: SectionCache) -> str:
+    files = {attr: cache.file_fingerprint(str(getattr(args, attr))) for attr in section.files}
+    params = {attr: getattr(args, attr) for attr in section.params}
+    payload = [section.name, code_fingerprint(section.compute, members=type(inputs)), files, params]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def compute_sections(
+    sections: Sequence[Section], inputs: Any, args: Any, path: Optional[str], refresh: bool = False
+) -> Dict[str, Any]:
+    # Section name -> result, recomputing only the sections whose key changed; path=None disables the cache.
+    cache = SectionCache(path)
+    results: Dict[str, Any] = {}
+    for section in sections:
+        key = section_key(section, inputs, args, cache)
+        entry = cache.sections.get(section.name)
+        if not refresh and isinstance(entry, dict) and entry.get("key") == key:
+            cache.hits += 1
+            instrument.count("sections.hits")
+            results[section.name] = entry.get("result")
+            continue
+        cache.misses += 1
+        instrument.count("sections.misses")
+        with instrument.span(f"section.{section.name}"):
+            # Round-trip through JSON so a fresh result renders exactly like a cached one.
+            result = json.loads(json.dumps(section.compute(inputs)))
+        cache.sections[section.name] = {"key": key, "result": result}
+        results[section.name] = result
+    cache.save()
+    return results
+
+
+def render_report(
+    sections: Sequence[Section], inputs: Any, args: Any, path: Optional[str], refresh: bool = False
+) -> str:
+    results = compute_sections(sections, inputs, args, path, refresh)
+    return "".join(s.render(results[s.name]) for s in sections if s.render is not None)
@@ -0,0 +1,391 @@
+import glob
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# A "run" is a maximal sequence of calls (sorted by (ts, tx_hash)) whose consecutive gaps are <= gap_s.
+# The index stores run boundaries as arrays plus an interned signature table, so reports read run
+# stats without re-clustering or re-joining "selector:target" strings.
+# Signature ids are assigned in order of first appearance, so an index grown with extend() is identical
+# to one built in one pass over the same calls (top_signatures breaks count ties by id).
+# Only the gap sweep uses numpy, and imports it itself, so `strategy --help` does not load it.
+
+# A persisted index records the CSV size and a hash of the CSV's first and last 4 KiB at that size.
+# load_or_update trusts it when those bytes are unchanged and the indexed tail key is still at position
+# n_calls - 1: a constant-cost check for the append-only case. Tools that rewrite the CSV in place
+# call invalidate().
+
+INDEX_VERSION = 3
+_EDGE_BYTES = 4096
+
+
+@dataclass(frozen=True)
+class CallKey:
+    ts: int
+    tx_hash: str
+    part: str  # "selector:target"
+
+
+def csv_edges(path: str, size: int) -> str:
+    # Hash of the first and the last 4 KiB of the first `size` bytes of `path` ("" if it is shorter).
+    if not os.path.exists(path) or os.path.getsize(path) < size:
+        return ""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        h.update(f.read(min(size, _EDGE_BYTES)))
+        if size > _EDGE_BYTES:
+            f.seek(max(_EDGE_BYTES, size - _EDGE_BYTES))
+            h.update(f.read(size - max(_EDGE_BYTES, size - _EDGE_BYTES)))
+    return h.hexdigest()
+
+
+@dataclass
+class RunIndex:
+    gap_s: int
+    n_calls: int = 0
+    last_ts: int = 0
+    last_tx: str = ""
+    csv_size: int = 0  # size of the CSV the index was last saved against
+    csv_edges: str = ""  # csv_edges(csv, csv_size)
+    run_id: List[int] = field(default_factory=list)  # per call
+    run_start: List[int] = field(default_factory=list)  # first call index per run
+    run_end: List[int] = field(default_factory=list)  # exclusive
+    run_start_ts: List[int] = field(default_factory=list)
+    run_sig: List[int] = field(default_factory=list)  # signature id per run
+    parts: List[str] = field(default_factory=list)  # interned "selector:target"
+    sigs: List[List[int]] = field(default_factory=list)  # part ids, ordered by part string
+    size_hist: Dict[int, int] = field(default_factory=dict)
+    sig_counts: Dict[int, int] = field(default_factory=dict)  # multi-call runs only
+    max_run: int = -1  # first run of maximal size
+    _part_ids: Dict[str, int] = field(default_factory=dict, repr=False)
+    _sig_ids: Dict[Tuple[int, ...], int] = field(default_factory=dict, repr=False)
+    _cur_parts: List[int] = field(default_factory=list, repr=False)
+
+    @property
+    def n_runs(self) -> int:
+        return len(self.run_start)
+
+    def run_size(self, r: int) -> int:
+        return self.run_end[r] - self.run_start[r]
+
+    def _intern_part(self, part: str) -> int:
+        pid = self._part_ids.get(part)
+        if pid is None:
+            pid = len(self.parts)
+            self.parts.append(part)
+            self._part_ids[part] = pid
+        return pid
+
+    def _intern_sig(self, part_ids: Sequence[int]) -> int:
+        key = tuple(sorted(part_ids, key=lambda p: self.parts[p]))
+        sid = self._sig_ids.get(key)
+        if sid is None:
+            sid = len(self.sigs)
+            self.sigs.append(list(key))
+            self._sig_ids[key] = sid
+        return sid
+
+    def _close_run(self) -> None:
+        r = self.n_runs - 1
+        size = self.run_size(r)
+        sid = self._intern_sig(self._cur_parts)
+        self.run_sig.append(sid)
+        self.size_hist[size] = self.size_hist.get(size, 0) + 1
+        if size > 1:
+            self.sig_counts[sid] = self.sig_counts.get(sid, 0) + 1
+        if self.max_run < 0 or size > self.run_size(self.max_run):
+            self.max_run = r
+
+    def _reopen_last_run(self) -> None:
+        # Undo the aggregates of the last (possibly still growing) run so appended calls can extend it.
+        r = self.n_runs - 1
+        size = self.run_size(r)
+        sid = self.run_sig.pop()
+        self.size_hist[size] -= 1
+        if not self.size_hist[size]:
+            del self.size_hist[size]
+        if size > 1:
+            self.sig_counts[sid] -= 1
+            if not self.sig_counts[sid]:
+                del self.sig_counts[sid]
+        # Part ids of the run are recoverable from its signature (a multiset, order is irrelevant).
+        self._cur_parts = list(self.sigs[sid])
+        if sid == len(self.sigs) - 1 and sid not in self.run_sig:
+            # Interned for this run alone: forget it, so the signature it ends up with gets the id a
+            # one-pass build would give it.
+            del self._sig_ids[tuple(self.sigs.pop())]
+        if self.max_run == r:
+            self.max_run = -1
+            best = 0
+            for i in range(r):
+                s = self.run_size(i)
+                if s > best:
+                    best = s
+                    self.max_run = i
+
+    def extend(self, keys: Sequence[CallKey]) -> bool:
+        # Append calls that sort after the indexed ones; False means the caller must rebuild.
+        if not keys:
+            return True
+        if self.n_calls and (keys[0].ts, keys[0].tx_hash) < (self.last_ts, self.last_tx):
+            return False
+        for a, b in zip(keys, keys[1:]):
+            if (b.ts, b.tx_hash) < (a.ts, a.tx_hash):
+                return False
+
+        if self.n_calls:
+            self._reopen_last_run()
+        prev_ts: Optional[int] = self.last_ts if self.n_calls else None
+        for k in keys:
+            i = self.n_calls
+            if prev_ts is None or k.ts - prev_ts > self.gap_s:
+                if self.n_runs:
+                    self._close_run()
+                self.run_start.append(i)
+                self.run_end.append(i)
+                self.run_start_ts.append(k.ts)
+                self._cur_parts = []
+            self.run_end[-1] = i + 1
+            self.run_id.append(self.n_runs - 1)
+            self._cur_parts.append(self._intern_part(k.part))
+            self.n_calls += 1
+            prev_ts = k.ts
+        self._close_run()
+        self.last_ts = keys[-1].ts
+        self.last_tx = keys[-1].tx_hash
+        return True
+
+    def sizes_sorted(self) -> List[float]:
+        out: List[float] = []
+        for size in sorted(self.size_hist):
+            out.extend([float(size)] * self.size_hist[size])
+        return out
+
+    def size_pct(self, p: float) -> float:
+        # Same interpolation as the reports' _pct over sorted run sizes, evaluated on the histogram.
+        n = sum(self.size_hist.values())
+        if not n:
+            raise ValueError("empty data")
+        sizes = sorted(self.size_hist)
+
+        def nth(i: int) -> float:
+            acc = 0
+            for s in sizes:
+                acc += self.size_hist[s]
+                if i < acc:
+                    return float(s)
+            return float(sizes[-1])
+
+        if p <= 0:
+            return float(sizes[0])
+        if p >= 100:
+            return float(sizes[-1])
+        k = (n - 1) * (p / 100.0)
+        f = int(k)
+        c = min(f + 1, n - 1)
+        if f == c:
+            return nth(f)
+        return nth(f) * (c - k) + nth(c) * (k - f)
+
+    def top_signatures(self, n: int) -> List[Tuple[List[str], int]]:
+        items = sorted(self.sig_counts.items(), key=lambda kv: (-kv[1], kv[0]))[:n]
+        return [([self.parts[p] for p in self.sigs[sid]], cnt) for sid, cnt in items]
+
+    def to_json(self) -> Dict[str, object]:
+        return {
+            "version": INDEX_VERSION,
+            "gap_s": self.gap_s,
+            "n_calls": self.n_calls,
+            "last_ts": self.last_ts,
+            "last_tx": self.last_tx,
+            "csv_size": self.csv_size,
+            "csv_edges": self.csv_edges,
+            "run_start": self.run_start,
+            "run_end": self.run_end,
+            "run_start_ts": self.run_start_ts,
+            "run_sig": self.run_sig,
+            "parts": self.parts,
+            "sigs": self.sigs,
+            "size_hist": {str(k): v for k, v in self.size_hist.items()},
+            "sig_counts": {str(k): v for k, v in self.sig_counts.items()},
+            "max_run": self.max_run,
+        }
+
+    @classmethod
+    def from_json(cls, payload: Dict[str, object]) -> "RunIndex":
+        idx = cls(gap_s=int(payload["gap_s"]))  # type: ignore[arg-type]
+        idx.n_calls = int(payload["n_calls"])  # type: ignore[arg-type]
+        idx.last_ts = int(payload["last_ts"])  # type: ignore[arg-type]
+        idx.last_tx = str(payload["last_tx"])
+        idx.csv_size = int(payload["csv_size"])  # type: ignore[arg-type]
+        idx.csv_edges = str(payload["csv_edges"])
+        idx.run_start = [int(x) for x in payload["run_start"]]  # type: ignore[union-attr]
+        idx.run_end = [int(x) for x in payload["run_end"]]  # type: ignore[union-attr]
+        idx.run_start_ts = [int(x) for x in payload["run_start_ts"]]  # type: ignore[union-attr]
+        idx.run_sig = [int(x) for x in payload["run_sig"]]  # type: ignore[union-attr]
+        idx.parts = [str(x) for x in payload["parts"]]  # type: ignore[union-attr]
+        idx.sigs = [[int(p) for p in s] for s in payload["sigs"]]  # type: ignore[union-attr]
+        idx.size_hist = {int(k): int(v) for k, v in payload["size_hist"].items()}  # type: ignore[union-attr]
+        idx.sig_counts = {int(k): int(v) for k, v in payload["sig_counts"].items()}  # type: ignore[union-attr]
+        idx.max_run = int(payload["max_run"])  # type: ignore[arg-type]
+        idx._part_ids = {p: i for i, p in enumerate(idx.parts)}
+        idx._sig_ids = {tuple(s): i for i, s in enumerate(idx.sigs)}
+        idx.run_id = []
+        for r, (a, b) in enumerate(zip(idx.run_start, idx.run_end)):
+            idx.run_id.extend([r] * (b - a))
+        return idx
+
+
+def build(keys: Sequence[CallKey], gap_s: int) -> RunIndex:
+    idx = RunIndex(gap_s=int(gap_s))
+    if not idx.extend(keys):
+        raise ValueError("calls must be sorted by (ts, tx_hash)")
+    return idx
+
+
+def index_path(calls_csv: str, gap_s: int) -> str:
+    base, _ = os.path.splitext(calls_csv)
+    return f"{base}.runs.gap{int(gap_s)}.json"
+
+
+def load(path: str) -> Optional[RunIndex]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            payload = json.load(f)
+        if not isinstance(payload, dict) or payload.get("version") != INDEX_VERSION:
+            return None
+        return RunIndex.from_json(payload)
+    except Exception:
+        return None
+
+
+def save(path: str, idx: RunIndex, calls_csv: str = "") -> None:
+    if calls_csv:
+        idx.csv_size = os.path.getsize(calls_csv) if os.path.exists(calls_csv) else 0
+        idx.csv_edges = csv_edges(calls_csv, idx.csv_size)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(idx.to_json(), f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def load_or_update(calls_csv: str, keys: Sequence[CallKey], gap_s: int) -> RunIndex:
+    # Reuse the persisted index when it covers a prefix of `keys` (only the tail is clustered);
+    # otherwise rebuild and persist.
+    path = index_path(calls_csv, gap_s)
+    idx = load(path)
+    if idx is not None and idx.gap_s == int(gap_s) and idx.n_calls <= len(keys) and _current(idx, calls_csv):
+        last = keys[idx.n_calls - 1] if idx.n_calls else None
+        if last is None or (last.ts, last.tx_hash) == (idx.last_ts, idx.last_tx):
+            tail = keys[idx.n_calls :]
+            if not tail and idx.csv_size == os.path.getsize(calls_csv):
+                return idx
+            if idx.extend(tail):
+                save(path, idx, calls_csv)
+                return idx
+    idx = build(keys, gap_s)
+    save(path, idx, calls_csv)
+    return idx
+
+
+def _current(idx: RunIndex, calls_csv: str) -> bool:
+    # The bytes the index was saved against are still there (the CSV was at most appended to).
+    return bool(idx.csv_edges) and csv_edges(calls_csv, idx.csv_size) == idx.csv_edges
+
+
+def extend_existing(calls_csv: str, keys: Sequence[CallKey]) -> None:
+    # Called by ingest tools after appending rows: extend every persisted gap index in place, or drop
+    # it when the new rows do not sort after the indexed tail (the next report run rebuilds it).
+    base, _ = os.path.splitext(calls_csv)
+    if not keys:
+        return
+    ordered = sorted(keys, key=lambda k: (k.ts, k.tx_hash))
+    for path in glob.glob(f"{glob.escape(base)}.runs.gap*.json"):
+        idx = load(path)
+        if idx is not None and _current(idx, calls_csv) and idx.extend(ordered):
+            save(path, idx, calls_csv)
+        else:
+            os.remove(path)
+
+
+@dataclass(frozen=True)
+class GapSweepRow:
+    gap_s: int
+    n_runs: int
+    multi_call_share: float  # share of calls that sit in runs of size > 1
+    size_p50: float
+    size_p90: float
+    size_max: int
+
+
+def _hist_pct(cum_counts, n: int, p: float) -> float:
+    # _pct over the sorted run sizes, where cum_counts[s] = #runs with size <= s.
+    import numpy as np
+
+    def nth(i: int) -> float:
+        return float(np.searchsorted(cum_counts, i, side="right"))
+
+    if p <= 0:
+        return nth(0)
+    if p >= 100:
+        return nth(n - 1)
+    k = (n - 1) * (p / 100.0)
+    f = int(k)
+    c = min(f + 1, n - 1)
+    if f == c:
+        return nth(f)
+    return nth(f) * (c - k) + nth(c) * (k - f)
+
+
+def gap_thresholds(lo: int, hi: int, count: int) -> List[int]:
+    # Log-spaced integer thresholds (timestamps are whole seconds, so duplicates collapse).
+    import numpy as np
+
+    lo = max(int(lo), 1)
+    hi = max(int(hi), lo)
+    xs = np.unique(np.rint(np.geomspace(lo, hi, max(int(count), 1))).astype(np.int64))
+    return [int(x) for x in xs]
+
+
+def gap_sweep(ts_sorted: Sequence[int], thresholds: Sequence[int]) -> List[GapSweepRow]:
+    # Runs break where gap > T. Per threshold, the break positions give every run size at once
+    # (np.diff of the cut points), and a bincount of the sizes gives the histogram the stats read.
+    import numpy as np
+
+    ts = np.asarray(ts_sorted, dtype=np.int64)
+    n = int(ts.size)
+    if n == 0:
+        return []
+    gaps = np.diff(ts)
+    ths = sorted(int(t) for t in thresholds)
+    # Runs per threshold: n minus the gaps <= T, all thresholds in one searchsorted.
+    n_runs_by_t = n - np.searchsorted(np.sort(gaps), np.asarray(ths, dtype=np.int64), side="right")
+
+    out: List[GapSweepRow] = []
+    for t, n_runs in zip(ths, n_runs_by_t.tolist()):
+        cuts = np.concatenate(([0], np.flatnonzero(gaps > t) + 1, [n]))
+        hist = np.bincount(np.diff(cuts))
+        cum = np.cumsum(hist)
+        out.append(
+            GapSweepRow(
+                gap_s=t,
+                n_runs=int(n_runs),
+                multi_call_share=(n - int(hist[1] if hist.size > 1 else 0)) / n,
+                size_p50=_hist_pct(cum, n_runs, 50),
+                size_p90=_hist_pct(cum, n_runs, 90),
+                size_max=int(hist.size - 1),
+            )
+        )
+    return out
+
+
+def invalidate(calls_csv: str) -> None:
+    base, _ = os.path.splitext(calls_csv)
+    for path in glob.glob(f"{glob.escape(base)}.runs.gap*.json"):
+        os.remove(path)
@@ -0,0 +1,644 @@
+import argparse
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import gas_paths
+import instrument
+
+
+COMPOUNDER_SEL = "0x04117561"
+VAULT_SEL = "0xc7f884c6"
+FX_SEL = "0x78f26f5b"
+ASDPENDLE_TARGET = "0x606462126e4bd5c4d153fe09967e4c46c9c7fecf"
+SDPENDLE_ADDR = "0x5ea630e00d6ee438d3dea1556a110359acdc10a9"
+PENDLE_ADDR = "0x808507121b80c02388fad14726482e061b8da827"
+
+
+@dataclass(frozen=True)
+class CallRow:
+    tx_hash: str
+    timestamp: int
+    block_number: int
+    selector: str
+    target: str
+    gas_price: int
+    arg1: str
+    arg2: str
+
+
+@dataclass(frozen=True)
+class HarvestRow:
+    tx_hash: str
+    timestamp: int
+    assets_wei: int
+    bounty_wei: int
+
+
+@dataclass(frozen=True)
+class JobModel:
+    label: str
+    key: Tuple[str, str, str]
+    k_token_per_wei: float
+    gas_used: int
+    rate_wei_per_s: float
+    token_usd: float
+    start_block: int
+
+
+@dataclass(frozen=True)
+class BotSpec:
+    name: str
+    k_scale: float
+    scan_blocks: int
+    latency_blocks: int
+    offset: int
+
+
+def _normalize_hex(value: Any) -> str:
+    if not isinstance(value, str):
+        return ""
+    v = value.strip().lower()
+    if not v:
+        return ""
+    if not v.startswith("0x"):
+        v = "0x" + v
+    return v
+
+
+def _pct(sorted_values: Sequence[float], p: float) -> float:
+    if not sorted_values:
+        raise ValueError("empty data")
+    if p <= 0:
+        return float(sorted_values[0])
+    if p >= 100:
+        return float(sorted_values[-1])
+    k = (len(sorted_values) - 1) * (p / 100.0)
+    f = int(k)
+    c = min(f + 1, len(sorted_values) - 1)
+    if f == c:
+        return float(sorted_values[f])
+    d0 = float(sorted_values[f]) * (c - k)
+    d1 = float(sorted_values[c]) * (k - f)
+    return d0 + d1
+
+
+def _fmt_ts(ts: int, tz: timezone) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).astimezone(tz).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _job_subkey(selector: str, arg1: str) -> str:
+    if selector != VAULT_SEL:
+        return ""
+    try:
+        return str(int(arg1))
+    except ValueError:
+        return str(arg1 or "")
+
+
+def _call_out_wei(row: CallRow) -> Optional[int]:
+    try:
+        if row.selector == COMPOUNDER_SEL:
+            return int(row.arg1)
+        if row.selector == VAULT_SEL:
+            return int(row.arg2)
+        if row.selector == FX_SEL:
+            return int(row.arg1)
+    except ValueError:
+        return None
+    return None
+
+
+def _load_calls(path: str) -> List[CallRow]:
+    out: List[CallRow] = []
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            out.append(
+                CallRow(
+                    tx_hash=_normalize_hex(row.get("tx_hash", "")),
+                    timestamp=int(row.get("timestamp") or "0"),
+                    block_number=int(row.get("block_number") or "0"),
+                    selector=_normalize_hex(row.get("selector", "")),
+                    target=_normalize_hex(row.get("target", "")),
+                    gas_price=int(row.get("gas_price") or "0"),
+                    arg1=str(row.get("arg1", "")),
+                    arg2=str(row.get("arg2", "")),
+                )
+            )
+    out.sort(key=lambda r: (r.timestamp, r.tx_hash))
+    return out
+
+
+def _load_harvest_logs(path: str) -> List[HarvestRow]:
+    out: List[HarvestRow] = []
+    if not os.path.exists(path):
+        return out
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            tx_hash = _normalize_hex(row.get("tx_hash", ""))
+            if not tx_hash:
+                continue
+            try:
+                out.append(
+                    HarvestRow(
+                        tx_hash=tx_hash,
+                        timestamp=int(row.get("time_stamp") or "0"),
+                        assets_wei=int(row.get("assets") or "0"),
+                        bounty_wei=int(row.get("harvester_bounty") or "0"),
+                    )
+                )
+            except ValueError:
+                continue
+    out.sort(key=lambda r: (r.timestamp, r.tx_hash))
+    return out
+
+
+def _load_config_rows(path: str) -> List[Dict[str, str]]:
+    with open(path, newline="") as f:
+        return [dict(row) for row in csv.DictReader(f)]
+
+
+def _load_price_medians(path: str, from_ts: int, to_ts: int) -> Dict[str, float]:
+    # One USD price per series (median over the window): the simulator runs O(events) per path,
+    # so per-event price lookups are replaced by a constant per job.
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        payload = json.load(f)
+    if not isinstance(payload, dict):
+        return {}
+
+    def median_in_window(prices: Any) -> Optional[float]:
+        if not isinstance(prices, list):
+            return None
+        xs: List[float] = []
+        for item in prices:
+            if not (isinstance(item, list) or isinstance(item, tuple)) or len(item) < 2:
+                continue
+            try:
+                ts_ms = int(item[0])
+                px = float(item[1])
+            except Exception:
+                continue
+            if from_ts * 1000 <= ts_ms <= to_ts * 1000 and px > 0:
+                xs.append(px)
+        if not xs:
+            return None
+        return _pct(sorted(xs), 50)
+
+    out: Dict[str, float] = {}
+    eth = payload.get("eth", {})
+    if isinstance(eth, dict):
+        px = median_in_window(eth.get("prices"))
+        if px:
+            out["eth"] = px
+    tokens = payload.get("tokens", {})
+    if isinstance(tokens, dict):
+        for addr, info in tokens.items():
+            if not isinstance(info, dict):
+                continue
+            px = median_in_window(info.get("prices"))
+            if px:
+                out[_normalize_hex(addr)] = px
+    return out
+
+
+def _parse_bot_spec(spec: str) -> BotSpec:
+    # name:k_scale:scan_blocks[:latency_blocks[:offset]]
+    parts = spec.split(":")
+    if len(parts) < 3 or len(parts) > 5:
+        raise SystemExit(f"invalid --bot spec {spec!r} (want name:k_scale:scan_blocks[:latency[:offset]])")
+    name = parts[0].strip()
+    k_scale = float(parts[1])
+    scan_blocks = int(parts[2])
+    latency_blocks = int(parts[3]) if len(parts) > 3 else 1
+    offset = int(parts[4]) if len(parts) > 4 else 0
+    if not name or k_scale <= 0 or scan_blocks <= 0 or latency_blocks < 0:
+        raise SystemExit(f"invalid --bot spec {spec!r}")
+    return BotSpec(
+        name=name,
+        k_scale=k_scale,
+        scan_blocks=scan_blocks,
+        latency_blocks=latency_blocks,
+        offset=offset % scan_blocks,
+    )
+
+
+def _estimate_rates(
+    calls: Sequence[CallRow], harvests: Sequence[HarvestRow]
+) -> Dict[Tuple[str, str, str], float]:
+    # Accrual rate (out-token wei per second) per job: median of minOut/gap between consecutive calls.
+    # minOut ~= expected_out at send time, so it approximates what accrued since the previous harvest.
+    by_job: Dict[Tuple[str, str, str], List[CallRow]] = {}
+    for c in calls:
+        key = (c.selector, c.target, _job_subkey(c.selector, c.arg1))
+        by_job.setdefault(key, []).append(c)
+
+    harvest_by_tx = {h.tx_hash: h for h in harvests}
+    rates: Dict[Tuple[str, str, str], float] = {}
+    for key, seq in by_job.items():
+        xs: List[float] = []
+        for i in range(1, len(seq)):
+            dt = seq[i].timestamp - seq[i - 1].timestamp
+            if dt <= 0:
+                continue
+            h = harvest_by_tx.get(seq[i].tx_hash)
+            if h is not None and h.assets_wei > 0:
+                out_wei: Optional[int] = h.assets_wei
+            else:
+                out_wei = _call_out_wei(seq[i])
+            if out_wei is None or out_wei <= 0:
+                continue
+            xs.append(float(out_wei) / float(dt))
+        if xs:
+            rates[key] = _pct(sorted(xs), 50)
+    return rates
+
+
+def _first_hit(
+    scan_idx: np.ndarray,
+    thr_wei: np.ndarray,
+    last: int,
+    rate_wei_per_block: float,
+    window: int = 1024,
+) -> int:
+    # First scan block b > last with rate*(b-last) >= thr(b); -1 if none.
+    # Searches a doubling window so the cost is O(gap), not O(remaining blocks).
+    start = int(np.searchsorted(scan_idx, last + 1))
+    n = scan_idx.shape[0]
+    while start < n:
+        stop = min(n, start + window)
+        cand = scan_idx[start:stop]
+        hit = rate_wei_per_block * (cand - last).astype(np.float64) >= thr_wei[cand]
+        if hit.any():
+            return int(cand[int(np.argmax(hit))])
+        start = stop
+        window *= 2
+    return -1
+
+
+def _simulate_path(
+    gas: np.ndarray,
+    jobs: Sequence[JobModel],
+    bots: Sequence[BotSpec],
+    *,
+    block_s: float,
+    bounty_rate: float,
+    eth_usd: float,
+    revert_gas: int,
+    rng: np.random.Generator,
+    events: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, np.ndarray]:
+    n_blocks = gas.shape[0]
+    n_bots = len(bots)
+    wins = np.zeros((len(jobs), n_bots), dtype=np.int64)
+    bounty_usd = np.zeros((len(jobs), n_bots), dtype=np.float64)
+    cost_usd = np.zeros((len(jobs), n_bots), dtype=np.float64)
+    reverts = np.zeros((len(jobs), n_bots), dtype=np.int64)
+    latencies = np.array([b.latency_blocks for b in bots], dtype=np.int64)
+    scan_idx = [np.arange(b.offset, n_blocks, b.scan_blocks, dtype=np.int64) for b in bots]
+
+    for j, job in enumerate(jobs):
+        rate_per_block = job.rate_wei_per_s * block_s
+        if rate_per_block <= 0 or job.k_token_per_wei <= 0:
+            continue
+        base_thr = job.k_token_per_wei * gas * 1e18
+        thr = [base_thr * b.k_scale for b in bots]
+        last = job.start_block
+        trig = np.empty(n_bots, dtype=np.int64)
+        while True:
+            for i in range(n_bots):
+                trig[i] = _first_hit(scan_idx[i], thr[i], last, rate_per_block)
+            active = trig >= 0
+            if not active.any():
+                break
+            land = np.where(active, trig + latencies, np.iinfo(np.int64).max)
+            land_block = int(land.min())
+            if land_block >= n_blocks:
+                break
+            tied = np.flatnonzero(land == land_block)
+            winner = int(tied[0]) if tied.shape[0] == 1 else int(rng.choice(tied))
+            accrued_wei = rate_per_block * float(land_block - last)
+            gp = float(gas[land_block])
+            wins[j, winner] += 1
+            bounty_usd[j, winner] += bounty_rate * accrued_wei / 1e18 * job.token_usd
+            cost_usd[j, winner] += job.gas_used * gp / 1e18 * eth_usd
+            # Bots that already sent (trigger before the winner landed) revert and still pay gas.
+            for i in np.flatnonzero(active & (trig < land_block)):
+                if i == winner:
+                    continue
+                reverts[j, i] += 1
+                cost_usd[j, i] += revert_gas * gp / 1e18 * eth_usd
+            if events is not None:
+                events.append(
+                    {
+                        "job": job.label,
+                        "block_offset": land_block,
+                        "winner": bots[winner].name,
+                        "accrued_token": accrued_wei / 1e18,
+                        "gas_price": int(gp),
+                        "tied": int(tied.shape[0]),
+                    }
+                )
+            last = land_block
+
+    return {"wins": wins, "bounty_usd": bounty_usd, "cost_usd": cost_usd, "reverts": reverts}
+
+
+def _run_chunk(task: Dict[str, Any]) -> List[Dict[str, np.ndarray]]:
+    rng = np.random.default_rng(task["seed"])
+    paths = task.get("paths")
+    if paths is None:
+        paths = task["model"].sample(task["n_paths"], task["n_blocks"], rng)
+    out: List[Dict[str, np.ndarray]] = []
+    for p in range(paths.shape[0]):
+        out.append(
+            _simulate_path(
+                paths[p],
+                task["jobs"],
+                task["bots"],
+                block_s=task["block_s"],
+                bounty_rate=task["bounty_rate"],
+                eth_usd=task["eth_usd"],
+                revert_gas=task["revert_gas"],
+                rng=rng,
+            )
+        )
+    return out
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls-csv", default="data/f88e_harvester_calls_7d.csv")
+    parser.add_argument("--harvest-logs", default="data/asdpendle_harvest_logs.csv")
+    parser.add_argument("--config-csv", default="data/f88e_harvester_bot_config_estimates.csv")
+    parser.add_argument("--prices-json", default="data/coingecko_prices_7d.json")
+    parser.add_argument("--out-md", default="asdpendle/harvester-bot-competition.md")
+    parser.add_argument("--out-events-csv", default="", help="Optional: per-harvest winners on the observed gas path")
+    parser.add_argument(
+        "--bot",
+        action="append",
+        default=[],
+        help="name:k_scale:scan_blocks[:latency_blocks[:offset]] (repeatable; k_scale multiplies config k)",
+    )
+    parser.add_argument(
+        "--paths",
+        type=int,
+        default=200,
+        help="Monte-Carlo gas paths (0 = observed path only; with --gas-paths, at most this many, 0 = all in the file)",
+    )
+    parser.add_argument("--gas-model", default="bootstrap", choices=["bootstrap", "regime"])
+    parser.add_argument("--gas-paths", default="", help="Optional: pre-generated paths from gas_paths.py (.npz/.npy)")
+    parser.add_argument("--bootstrap-block-len", type=int, default=300, help="block-bootstrap window (blocks)")
+    parser.add_argument("--step-blocks", type=int, default=25, help="regime model step (blocks)")
+    parser.add_argument("--block-s", type=float, default=12.0)
+    parser.add_argument("--revert-gas", type=int, default=60000, help="gas burnt by a losing (reverted) tx")
+    parser.add_argument("--bounty-rate", type=float, default=0.0, help="0 = p50(harvester_bounty/assets) from logs")
+    parser.add_argument("--workers", type=int, default=0, help="0 = os.cpu_count()")
+    parser.add_argument("--chunk-paths", type=int, default=25)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    bots = [_parse_bot_spec(s) for s in (args.bot or ["f88e:1.0:1:1", "ours:0.95:2:1:1"])]
+    if len({b.name for b in bots}) != len(bots):
+        raise SystemExit("duplicate bot names")
+
+    calls = [c for c in _load_calls(args.calls_csv) if c.block_number > 0]
+    if not calls:
+        raise SystemExit("empty calls csv")
+    harvests = _load_harvest_logs(args.harvest_logs)
+    cfg_rows = _load_config_rows(args.config_csv)
+
+    tz_bj = timezone(timedelta(hours=8))
+    start_ts = calls[0].timestamp
+    end_ts = calls[-1].timestamp
+    first_block = min(c.block_number for c in calls)
+    n_blocks = max(c.block_number for c in calls) - first_block + 1
+    block_s = float(args.block_s)
+
+    prices = _load_price_medians(args.prices_json, start_ts, end_ts)
+    eth_usd = prices.get("eth", 0.0)
+    if SDPENDLE_ADDR not in prices and PENDLE_ADDR in prices:
+        prices[SDPENDLE_ADDR] = prices[PENDLE_ADDR]
+
+    bounty_rates = sorted(
+        float(h.bounty_wei) / float(h.assets_wei) for h in harvests if h.assets_wei > 0 and h.bounty_wei > 0
+    )
+    bounty_rate = float(args.bounty_rate) or (_pct(bounty_rates, 50) if bounty_rates else 0.0)
+
+    rates = _estimate_rates(calls, harvests)
+    first_call_block: Dict[Tuple[str, str, str], int] = {}
+    for c in calls:
+        key = (c.selector, c.target, _job_subkey(c.selector, c.arg1))
+        first_call_block.setdefault(key, c.block_number - first_block)
+
+    jobs: List[JobModel] = []
+    for row in cfg_rows:
+        key = (
+            _normalize_hex(row.get("selector", "")),
+            _normalize_hex(row.get("target", "")),
+            str(row.get("subkey", "") or ""),
+        )
+        try:
+            k = float(row.get("k_token_per_wei_p50") or "0")
+            gu = int(float(row.get("gas_used_p50") or "0"))
+        except ValueError:
+            continue
+        rate = rates.get(key, 0.0)
+        if k <= 0 or gu <= 0 or rate <= 0 or key not in first_call_block:
+            continue
+        jobs.append(
+            JobModel(
+                label=str(row.get("job", "")),
+                key=key,
+                k_token_per_wei=k,
+                gas_used=gu,
+                rate_wei_per_s=rate,
+                token_usd=prices.get(_normalize_hex(row.get("out_token_addr", "")), 0.0),
+                start_block=first_call_block[key],
+            )
+        )
+    if not jobs:
+        raise SystemExit("no simulable jobs (need k, gas_used and an accrual rate)")
+
+    _, observed = gas_paths.observed_gas_by_block(
+        [c.block_number for c in calls], [c.gas_price for c in calls]
+    )
+
+    # Observed path (deterministic except same-block tie breaks).
+    obs_events: List[Dict[str, Any]] = []
+    obs = _simulate_path(
+        observed,
+        jobs,
+        bots,
+        block_s=block_s,
+        bounty_rate=bounty_rate,
+        eth_usd=eth_usd,
+        revert_gas=int(args.revert_gas),
+        rng=np.random.default_rng(args.seed),
+        events=obs_events,
+    )
+
+    # Monte-Carlo over synthetic gas paths (fitted here, or pre-generated by gas_paths.py), chunked across processes.
+    mc: List[Dict[str, np.ndarray]] = []
+    n_paths = max(0, int(args.paths))
+    preset: Optional[np.ndarray] = None
+    model: Optional[gas_paths.GasPathModel] = None
+    if args.gas_paths:
+        loaded = gas_paths.load_paths(args.gas_paths)
+        preset = loaded.at_blocks(range(first_block, first_block + n_blocks))
+        n_paths = min(n_paths, loaded.n_paths) if n_paths else loaded.n_paths
+        gas_source = f"`{args.gas_paths}`（{loaded.meta.get('model', 'preset')}）"
+    elif n_paths:
+        model = gas_paths.fit_model(
+            observed,
+            args.gas_model,
+            block_len=int(args.bootstrap_block_len),
+            step_blocks=int(args.step_blocks),
+        )
+        gas_source = f"{args.gas_model}（block_len={int(args.bootstrap_block_len)}, step={int(args.step_blocks)}）"
+    else:
+        gas_source = "无"
+    if n_paths:
+        chunk = max(1, int(args.chunk_paths))
+        sizes = [min(chunk, n_paths - i) for i in range(0, n_paths, chunk)]
+        seeds = np.random.SeedSequence(int(args.seed)).spawn(len(sizes))
+        tasks = [
+            {
+                "seed": seeds[i],
+                "n_paths": sizes[i],
+                "n_blocks": n_blocks,
+                "model": model,
+                "paths": preset[sum(sizes[:i]) : sum(sizes[: i + 1])] if preset is not None else None,
+                "jobs": jobs,
+                "bots": bots,
+                "block_s": block_s,
+                "bounty_rate": bounty_rate,
+                "eth_usd": eth_usd,
+                "revert_gas": int(args.revert_gas),
+            }
+            for i in range(len(sizes))
+        ]
+        workers = int(args.workers) or (os.cpu_count() or 1)
+        if workers <= 1 or len(tasks) == 1:
+            for t in tasks:
+                mc.extend(_run_chunk(t))
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as ex:
+                for res in ex.map(_run_chunk, tasks):
+                    mc.extend(res)
+
+    if args.out_events_csv:
+        os.makedirs(os.path.dirname(args.out_events_csv) or ".", exist_ok=True)
+        with open(args.out_events_csv, "w", newline="") as f:
+            fields = ["job", "block_number", "timestamp_est", "winner", "accrued_token", "gas_price", "tied"]
+            w = csv.DictWriter(f, fieldnames=fields)
+            w.writeheader()
+            for e in obs_events:
+                w.writerow(
+                    {
+                        "job": e["job"],
+                        "block_number": first_block + e["block_offset"],
+                        "timestamp_est": int(start_ts + e["block_offset"] * block_s),
+                        "winner": e["winner"],
+                        "accrued_token": f"{e['accrued_token']:.6g}",
+                        "gas_price": e["gas_price"],
+                        "tied": e["tied"],
+                    }
+                )
+
+    def share(xs: np.ndarray) -> np.ndarray:
+        total = float(xs.sum())
+        return xs / total if total > 0 else np.zeros_like(xs, dtype=np.float64)
+
+    os.makedirs(os.path.dirname(args.out_md), exist_ok=True)
+    with open(args.out_md, "w") as f:
+        f.write("# harvester bot 竞争模拟（同一 gas / 区块时钟）\n\n")
+        f.write("数据源：\n")
+        f.write(f"- calls：`{args.calls_csv}`\n")
+        f.write(f"- harvest logs：`{args.harvest_logs}`\n")
+        f.write(f"- config：`{args.config_csv}`\n")
+        f.write(f"- prices：`{args.prices_json}`（每个 token 取窗口内 p50 价格）\n")
+        f.write(f"- 窗口：`{_fmt_ts(start_ts, tz_bj)}` → `{_fmt_ts(end_ts, tz_bj)}` (UTC+8)，blocks={n_blocks}\n\n")
+
+        f.write("## 1) 模型\n\n")
+        f.write(
+            "- 每个 job：`expected(b) = rate * (b - last_harvest_block) * block_s`，`rate` 为相邻调用 minOut/gap 的 p50"
+            "（asdPENDLE 用 Harvest.assets）。\n"
+            "- 每个 bot：每 `scan_blocks` 个块扫描一次，满足 `expected(b) >= k_scale * k_job * gas_price(b)` 即发 tx，"
+            "`latency_blocks` 后上链；最早上链者赢得本次 harvest，同块并列随机。\n"
+            "- 赢家拿 `bounty = bounty_rate * expected`，付 `gas_used_p50 * gas_price`；已发出但落后的 tx 视为 revert，"
+            f"付 `{int(args.revert_gas)}` gas。\n"
+            f"- bounty_rate（Harvest logs p50）：`{bounty_rate:.6g}`；ETH_usd（p50）：`{eth_usd:.6g}`\n"
+            f"- gas 路径：观测路径（bot tx gas_price 按块前向填充）+ {n_paths} 条合成路径，来源 {gas_source}，"
+            f"seed={int(args.seed)}\n\n"
+        )
+        f.write("| bot | k_scale | scan_blocks | latency_blocks | offset |\n")
+        f.write("|---|---:|---:|---:|---:|\n")
+        for b in bots:
+            f.write(f"| {b.name} | {b.k_scale:.4g} | {b.scan_blocks} | {b.latency_blocks} | {b.offset} |\n")
+
+        f.write("\n## 2) 观测 gas 路径：每个 job 的胜者分布\n\n")
+        f.write("| job | harvests | " + " | ".join(f"{b.name} wins" for b in bots) + " |\n")
+        f.write("|---|---:|" + "---:|" * len(bots) + "\n")
+        for j, job in enumerate(jobs):
+            row_wins = obs["wins"][j]
+            f.write(
+                f"| {job.label} | {int(row_wins.sum())} | " + " | ".join(str(int(x)) for x in row_wins) + " |\n"
+            )
+        tot_wins = obs["wins"].sum(axis=0)
+        tot_bounty = obs["bounty_usd"].sum(axis=0)
+        tot_cost = obs["cost_usd"].sum(axis=0)
+        win_share = share(tot_wins)
+        bounty_share = share(tot_bounty)
+        f.write("\n| bot | wins | win_share | bounty_usd | bounty_share | cost_usd | net_usd | reverts |\n")
+        f.write("|---|---:|---:|---:|---:|---:|---:|---:|\n")
+        for i, b in enumerate(bots):
+            f.write(
+                f"| {b.name} | {int(tot_wins[i])} | {win_share[i]:.3f} | {tot_bounty[i]:.4g} | {bounty_share[i]:.3f} | "
+                f"{tot_cost[i]:.4g} | {tot_bounty[i] - tot_cost[i]:.4g} | {int(obs['reverts'][:, i].sum())} |\n"
+            )
+        if args.out_events_csv:
+            f.write(f"\n- 每次 harvest 的胜者明细：`{args.out_events_csv}`\n")
+
+        f.write("\n## 3) Monte-Carlo（gas 路径分布下的 bounty share）\n\n")
+        if not mc:
+            f.write("- 未运行（`--paths 0`）。\n")
+        else:
+            shares = np.stack([share(r["bounty_usd"].sum(axis=0)) for r in mc])
+            nets = np.stack([r["bounty_usd"].sum(axis=0) - r["cost_usd"].sum(axis=0) for r in mc])
+            win_shares = np.stack([share(r["wins"].sum(axis=0)) for r in mc])
+            f.write(f"- paths：{len(mc)}\n\n")
+            f.write(
+                "| bot | win_share(p50) | bounty_share(p10) | bounty_share(p50) | bounty_share(p90) | "
+                "net_usd(p10) | net_usd(p50) | net_usd(p90) |\n"
+            )
+            f.write("|---|---:|---:|---:|---:|---:|---:|---:|\n")
+            for i, b in enumerate(bots):
+                s10, s50, s90 = np.percentile(shares[:, i], [10, 50, 90])
+                n10, n50, n90 = np.percentile(nets[:, i], [10, 50, 90])
+                w50 = float(np.percentile(win_shares[:, i], 50))
+                f.write(
+                    f"| {b.name} | {w50:.3f} | {s10:.3f} | {s50:.3f} | {s90:.3f} | "
+                    f"{n10:.4g} | {n50:.4g} | {n90:.4g} |\n"
+                )
+
+        f.write("\n## 4) 局限\n\n")
+        f.write("- `rate` 为常数（线性累积）；真实 accrual 有跳涨（DepositReward），会让阈值低/扫描快的一方更占优。\n")
+        f.write("- bounty_rate 只在 asdPENDLE 上观测到，其它 job 沿用同一比例；USD 缺价的 job 计为 0。\n")
+        f.write("- 未建模 priority fee 竞价：同块并列按随机处理。\n")
+
+    print(f"simulated {len(jobs)} jobs x {len(bots)} bots, {len(mc)} MC paths -> {args.out_md}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(instrument.run(main))
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# Robust per-job threshold model: minOut_token ≈ intercept_token + slope_token_per_gwei * gas_price_gwei.
+# Huber M-estimation via IRLS, solved for every job at once on a (jobs, calls) padded matrix.
+# The fitted state keeps Huber-weighted sufficient statistics (Σw, Σwx, Σwy, Σwxx, Σwxy) so new calls
+# are folded in with one weighting step against the current fit instead of refitting from scratch.
+# The residual scale and bands are then recomputed against the moved line over all of the job's calls.
+# The moments cannot drop calls, so a job whose window lost calls at the front (rolled out of the 7d
+# window) or gained calls before its tail is refitted from the window instead.
+# A fit on fewer than MIN_FIT_N calls is not reported (the residuals of a near-exact fit are noise).
+# numpy is imported inside the functions, so importing this module (config --help) stays cheap.
+
+JobKey = Tuple[str, str, str]
+
+HUBER_C = 1.345
+MAD_TO_SIGMA = 1.4826
+STATE_VERSION = 2
+MIN_FIT_N = 10
+
+
+@dataclass
+class JobFit:
+    n: int
+    intercept_token: float
+    slope_token_per_gwei: float
+    scale_token: float  # robust residual sigma (MAD-based) from the last full fit
+    resid_rel_p10: float  # band of (minOut - pred) / pred
+    resid_rel_p90: float
+    sums: List[float] = field(default_factory=lambda: [0.0] * 5)  # Σw, Σwx, Σwy, Σwxx, Σwxy
+    n_since_refit: int = 0
+    first_ts: int = 0  # (first_ts, first_tx) .. (last_ts, last_tx): the calls in `sums`
+    first_tx: str = ""
+    last_ts: int = 0
+    last_tx: str = ""
+
+    @property
+    def slope_token_per_wei(self) -> float:
+        return self.slope_token_per_gwei / 1e9
+
+    def predict_token(self, gas_price_wei: float) -> float:
+        return self.intercept_token + self.slope_token_per_gwei * (float(gas_price_wei) / 1e9)
+
+
+def _pad(groups: Sequence[Sequence[float]]) -> Tuple[np.ndarray, np.ndarray]:
+    import numpy as np
+
+    width = max((len(g) for g in groups), default=0)
+    out = np.zeros((len(groups), max(width, 1)))
+    mask = np.zeros(out.shape, dtype=bool)
+    for j, g in enumerate(groups):
+        out[j, : len(g)] = g
+        mask[j, : len(g)] = True
+    return out, mask
+
+
+def _moments(x: np.ndarray, y: np.ndarray, w: np.ndarray) -> np.ndarray:
+    import numpy as np
+
+    return np.stack(
+        [w.sum(axis=1), (w * x).sum(axis=1), (w * y).sum(axis=1), (w * x * x).sum(axis=1), (w * x * y).sum(axis=1)],
+        axis=1,
+    )
+
+
+def _solve(sums: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Weighted least squares from sufficient statistics; degenerate jobs (one distinct gas price)
+    # fall back to the ratio model through the origin, i.e. the old p50(out/gas_price) form.
+    import numpy as np
+
+    s0, sx, sy, sxx, sxy = (sums[:, i] for i in range(5))
+    det = s0 * sxx - sx * sx
+    ok = np.abs(det) > 1e-12 * np.maximum(s0 * sxx, 1e-300)
+    safe_det = np.where(ok, det, 1.0)
+    slope = np.where(ok, (s0 * sxy - sx * sy) / safe_det, sxy / np.where(sxx > 0, sxx, 1.0))
+    intercept = np.where(ok, (sy - slope * sx) / np.where(s0 > 0, s0, 1.0), 0.0)
+    return intercept, slope
+
+
+def _masked_median(a: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    import numpy as np
+
+    return np.nanmedian(np.where(mask, a, np.nan), axis=1)
+
+
+def _robust_scale(r: np.ndarray, y: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    import numpy as np
+
+    mad = _masked_median(np.abs(r - _masked_median(r, mask)[:, None]), mask)
+    # A zero MAD (more than half the points on the line) would make every other point an outlier.
+    floor = 1e-9 * np.maximum(_masked_median(np.abs(y), mask), 1e-30)
+    return np.maximum(MAD_TO_SIGMA * np.nan_to_num(mad), floor)
+
+
+def _rel_bands(
+    x: np.ndarray, y: np.ndarray, mask: np.ndarray, intercept: np.ndarray, slope: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    # p10/p90 of (y - pred) / pred per job.
+    import numpy as np
+
+    pred = intercept[:, None] + slope[:, None] * x
+    rel = np.where(mask & (pred > 0), (y - pred) / np.where(pred > 0, pred, 1.0), np.nan)
+    with np.errstate(all="ignore"):
+        lo, hi = np.nanpercentile(np.where(np.isnan(rel).all(axis=1)[:, None], 0.0, rel), [10, 90], axis=1)
+    return lo, hi
+
+
+def _huber_weights(r: np.ndarray, scale: np.ndarray, c: float) -> np.ndarray:
+    import numpy as np
+
+    u = np.abs(r) / (c * scale[:, None])
+    return np.where(u <= 1.0, 1.0, 1.0 / np.maximum(u, 1e-300))
+
+
+def fit(
+    jobs: Sequence[JobKey],
+    gas_price_wei: Sequence[Sequence[float]],
+    out_token: Sequence[Sequence[float]],
+    *,
+    c: float = HUBER_C,
+    max_iter: int = 50,
+    tol: float = 1e-10,
+) -> Dict[JobKey, JobFit]:
+    import numpy as np
+
+    if not jobs:
+        return {}
+    x, mask = _pad([[g / 1e9 for g in gs] for gs in gas_price_wei])
+    y, _ = _pad(out_token)
+    m = mask.astype(float)
+
+    intercept, slope = _solve(_moments(x, y, m))
+    scale = np.ones(len(jobs))
+    w = m
+    for _ in range(max_iter):
+        r = y - (intercept[:, None] + slope[:, None] * x)
+        scale = _robust_scale(r, y, mask)
+        w = m * _huber_weights(r, scale, c)
+        new_intercept, new_slope = _solve(_moments(x, y, w))
+        step = np.abs(new_intercept - intercept) + np.abs(new_slope - slope) * np.maximum(np.abs(x).max(axis=1), 1.0)
+        intercept, slope = new_intercept, new_slope
+        if np.all(step <= tol * np.maximum(np.abs(y).max(axis=1), 1e-30)):
+            break
+
+    sums = _moments(x, y, w)
+    lo, hi = _rel_bands(x, y, mask, intercept, slope)
+
+    out: Dict[JobKey, JobFit] = {}
+    for j, key in enumerate(jobs):
+        out[key] = JobFit(
+            n=int(mask[j].sum()),
+            intercept_token=float(intercept[j]),
+            slope_token_per_gwei=float(slope[j]),
+            scale_token=float(scale[j]),
+            resid_rel_p10=float(lo[j]),
+            resid_rel_p90=float(hi[j]),
+            sums=[float(v) for v in sums[j]],
+        )
+    return out
+
+
+def update(
+    state: Dict[JobKey, JobFit],
+    key: JobKey,
+    gas_price_wei: Sequence[float],
+    out_token: Sequence[float],
+    *,
+    c: float = HUBER_C,
+) -> JobFit:
+    # One IRLS step on the new points only: weight them against the current fit and scale, add their
+    # moments and re-solve. Old points keep the weights they had; call fit() again for a full refit.
+    # scale_token and the residual bands still describe the old line: follow with refresh_bands().
+    import numpy as np
+
+    jf = state[key]
+    x = np.asarray([g / 1e9 for g in gas_price_wei], dtype=float)[None, :]
+    y = np.asarray(out_token, dtype=float)[None, :]
+    r = y - (jf.intercept_token + jf.slope_token_per_gwei * x)
+    w = _huber_weights(r, np.array([jf.scale_token]), c)
+    sums = np.asarray(jf.sums)[None, :] + _moments(x, y, w)
+    intercept, slope = _solve(sums)
+    jf.sums = [float(v) for v in sums[0]]
+    jf.intercept_token = float(intercept[0])
+    jf.slope_token_per_gwei = float(slope[0])
+    jf.n += int(x.shape[1])
+    jf.n_since_refit += int(x.shape[1])
+    return jf
+
+
+def refresh_bands(jf: JobFit, gas_price_wei: Sequence[float], out_token: Sequence[float]) -> JobFit:
+    # Recompute scale_token and the residual bands of the current line over the job's calls.
+    import numpy as np
+
+    x = np.asarray([g / 1e9 for g in gas_price_wei], dtype=float)[None, :]
+    y = np.asarray(out_token, dtype=float)[None, :]
+    if not x.size:
+        return jf
+    mask = np.ones(x.shape, dtype=bool)
+    intercept = np.array([jf.intercept_token])
+    slope = np.array([jf.slope_token_per_gwei])
+    jf.scale_token = float(_robust_scale(y - (intercept[:, None] + slope[:, None] * x), y, mask)[0])
+    lo, hi = _rel_bands(x, y, mask, intercept, slope)
+    jf.resid_rel_p10, jf.resid_rel_p90 = float(lo[0]), float(hi[0])
+    return jf
+
+
+def _key_str(key: JobKey) -> str:
+    return "|".join(key)
+
+
+def load_state(path: str) -> Dict[JobKey, JobFit]:
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            payload = json.load(f)
+    except Exception:
+        return {}
+    if not isinstance(payload, dict) or payload.get("version") != STATE_VERSION:
+        return {}
+    out: Dict[JobKey, JobFit] = {}
+    for k, v in payload.get("jobs", {}).items():
+        sel, tgt, sub = (k.split("|") + ["", "", ""])[:3]
+        out[(sel, tgt, sub)] = JobFit(**v)
+    return out
+
+
+def save_state(path: str, state: Dict[JobKey, JobFit]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    payload = {"version": STATE_VERSION, "jobs": {_key_str(k): vars(v) for k, v in state.items()}}
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def fit_incremental(
+    state_path: str,
+    points_by_job: Dict[JobKey, List[Tuple[int, str, float, float]]],
+    *,
+    refit: bool = False,
+    refit_after: int = 0,
+) -> Dict[JobKey, JobFit]:
+    # points_by_job: key -> [(ts, tx_hash, gas_price_wei, out_token)] sorted by (ts, tx_hash).
+    # Jobs already in the state only see points after their stored (last_ts, last_tx); new jobs, an
+    # explicit refit, or more than `refit_after` folded-in points since the last full fit trigger fit().
+    state = {} if refit else load_state(state_path)
+    full: List[JobKey] = []
+    for key, pts in points_by_job.items():
+        if not pts:
+            continue
+        jf = state.get(key)
+        if jf is None:
+            full.append(key)
+            continue
+        new = [p for p in pts if (p[0], p[1]) > (jf.last_ts, jf.last_tx)]
+        if len(pts) - len(new) != jf.n or (pts[0][0], pts[0][1]) != (jf.first_ts, jf.first_tx):
+            full.append(key)  # calls expired from (or were inserted into) the fitted window
+            continue
+        if refit_after and jf.n_since_refit + len(new) > refit_after:
+            full.append(key)
+            continue
+        if new:
+            update(state, key, [p[2] for p in new], [p[3] for p in new])
+            refresh_bands(state[key], [p[2] for p in pts], [p[3] for p in pts])
+    if full:
+        fitted = fit(
+            full,
+            [[p[2] for p in points_by_job[k]] for k in full],
+            [[p[3] for p in points_by_job[k]] for k in full],
+        )
+        state.update(fitted)
+    for key, pts in points_by_job.items():
+        if pts and key in state:
+            # Same calls as a full refit over this window would see.
+            assert state[key].n == len(pts), (key, state[key].n, len(pts))
+            state[key].first_ts, state[key].first_tx = pts[0][0], pts[0][1]
+            state[key].last_ts, state[key].last_tx = pts[-1][0], pts[-1][1]
+    if state_path:
+        save_state(state_path, state)
+    return state
+
+
+def abs_rel_errors(pred_token: Sequence[float], actual_token: Sequence[float]) -> List[float]:
+    return [abs(p - a) / a for p, a in zip(pred_token, actual_token) if a > 0 and p > 0]
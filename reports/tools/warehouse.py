@@ -0,0 +1,555 @@
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import instrument
+
+
+# Local SQLite warehouse for the harvester datasets. One indexed table per data file:
+#   calls              <- data/f88e_harvester_calls_7d.csv           (append_harvester_calls.py)
+#   receipts           <- data/f88e_harvester_receipts_full.csv      (backfill_receipts.py)
+#                         or data/f88e_harvester_receipts_sample.csv (fetch_receipts_sample.py) until the
+#                         full backfill has rows
+#   harvest_logs       <- data/asdpendle_harvest_logs.csv            (append_asdpendle_harvest_logs.py)
+#   harvest_txs        <- data/asdpendle_harvest_txs.csv             (append_asdpendle_harvest_txs.py)
+#   receipt_logs       <- data/f88e_harvester_receipt_logs.csv       (backfill_receipts.py)
+#   config_estimates   <- data/f88e_harvester_bot_config_estimates.csv
+#   prices             <- data/coingecko_prices_7d.json (series = "eth" or token address, ts in ms)
+# Ingest tools write here directly with --db; `warehouse.py sync` imports the files incrementally
+# (CSV tails are read from the last imported byte offset). Wei amounts exceed int64 and stay TEXT.
+# The offset is only trusted while the bytes before it look unchanged: the stored fingerprint hashes the
+# first and the last 4 KiB before the offset, so a sync reads those 8 KiB plus the new bytes, never the
+# whole prefix. A file rewritten in place, like the 7d calls CSV, drops the table's rows and is imported
+# from scratch. Log tables are keyed by (tx_hash, log_index); a row without log_index is rejected.
+
+DEFAULT_DB = "data/harvester.sqlite"
+SCHEMA_VERSION = 3
+_EDGE_BYTES = 4096
+
+# table -> [(column, type)], primary key, secondary indexes
+TABLES: Dict[str, Tuple[List[Tuple[str, str]], Sequence[str], List[Sequence[str]]]] = {
+    "calls": (
+        [
+            ("tx_hash", "TEXT NOT NULL"),
+            ("timestamp", "INTEGER"),
+            ("block_number", "INTEGER"),
+            ("from", "TEXT"),
+            ("to", "TEXT"),
+            ("gas", "INTEGER"),
+            ("gas_price", "INTEGER"),
+            ("selector", "TEXT"),
+            ("function", "TEXT"),
+            ("decoded", "INTEGER"),
+            ("target", "TEXT"),
+            ("arg1", "TEXT"),
+            ("arg2", "TEXT"),
+            ("input_len", "INTEGER"),
+            ("input", "TEXT"),
+        ],
+        ["tx_hash"],
+        [["timestamp"], ["selector", "target", "arg1"], ["block_number"]],
+    ),
+    "receipts": (
+        [
+            ("tx_hash", "TEXT NOT NULL"),
+            ("timestamp", "INTEGER"),
+            ("selector", "TEXT"),
+            ("target", "TEXT"),
+            ("subkey", "TEXT"),
+            ("arg1", "TEXT"),
+            ("arg2", "TEXT"),
+            ("tx_gas_price", "INTEGER"),
+            ("receipt_status", "INTEGER"),
+            ("gas_used", "INTEGER"),
+            ("effective_gas_price", "INTEGER"),
+            ("fee_wei", "TEXT"),
+        ],
+        ["tx_hash"],
+        [["selector", "target", "subkey"], ["timestamp"]],
+    ),
+    "harvest_logs": (
+        [
+            ("tx_hash", "TEXT NOT NULL"),
+            ("log_index", "INTEGER NOT NULL"),
+            ("block_number", "INTEGER"),
+            ("time_stamp", "INTEGER"),
+            ("caller", "TEXT"),
+            ("receiver", "TEXT"),
+            ("assets", "TEXT"),
+            ("performance_fee", "TEXT"),
+            ("harvester_bounty", "TEXT"),
+        ],
+        ["tx_hash", "log_index"],
+        [["time_stamp"]],
+    ),
+    "harvest_txs": (
+        [
+            ("tx_hash", "TEXT NOT NULL"),
+            ("timestamp", "INTEGER"),
+            ("from", "TEXT"),
+            ("to", "TEXT"),
+            ("block_number", "INTEGER"),
+            ("compounder", "TEXT"),
+            ("min_assets", "TEXT"),
+        ],
+        ["tx_hash"],
+        [["timestamp"], ["compounder", "timestamp"]],
+    ),
+    "receipt_logs": (
+        [
+            ("tx_hash", "TEXT NOT NULL"),
+            ("log_index", "INTEGER NOT NULL"),
+            ("block_number", "INTEGER"),
+            ("timestamp", "INTEGER"),
+            ("address", "TEXT"),
+            ("event", "TEXT"),
+            ("args", "TEXT"),  # decoded event fields as JSON (uint256 as strings)
+        ],
+        ["tx_hash", "log_index"],
+        [["event", "address", "timestamp"]],
+    ),
+    "config_estimates": (
+        [
+            ("selector", "TEXT NOT NULL"),
+            ("target", "TEXT NOT NULL"),
+            ("subkey", "TEXT NOT NULL DEFAULT ''"),
+            ("job", "TEXT"),
+            ("data", "TEXT"),  # full CSV row as JSON; its columns change with the config builder
+        ],
+        ["selector", "target", "subkey"],
+        [],
+    ),
+    "prices": (
+        [
+            ("series", "TEXT NOT NULL"),
+            ("ts_ms", "INTEGER NOT NULL"),
+            ("price", "REAL"),
+        ],
+        ["series", "ts_ms"],
+        [],
+    ),
+}
+
+RECEIPTS_FULL_CSV = "data/f88e_harvester_receipts_full.csv"
+RECEIPTS_SAMPLE_CSV = "data/f88e_harvester_receipts_sample.csv"
+
+DEFAULT_SOURCES = {
+    "calls": "data/f88e_harvester_calls_7d.csv",
+    "receipts": RECEIPTS_FULL_CSV,
+    "harvest_logs": "data/asdpendle_harvest_logs.csv",
+    "harvest_txs": "data/asdpendle_harvest_txs.csv",
+    "receipt_logs": "data/f88e_harvester_receipt_logs.csv",
+    "config_estimates": "data/f88e_harvester_bot_config_estimates.csv",
+    "prices": "data/coingecko_prices_7d.json",
+}
+
+
+def _q(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _schema_sql() -> List[str]:
+    out: List[str] = []
+    for table, (cols, pk, indexes) in TABLES.items():
+        col_sql = ", ".join(f"{_q(c)} {t}" for c, t in cols)
+        without_rowid = " WITHOUT ROWID" if table == "prices" else ""
+        out.append(
+            f"CREATE TABLE IF NOT EXISTS {table} ({col_sql}, PRIMARY KEY ({', '.join(_q(c) for c in pk)})){without_rowid}"
+        )
+        for idx in indexes:
+            name = f"idx_{table}_{'_'.join(idx)}"
+            out.append(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(_q(c) for c in idx)})")
+    out.append(
+        "CREATE TABLE IF NOT EXISTS ingest_files "
+        "(path TEXT PRIMARY KEY, tbl TEXT, header TEXT, offset INTEGER, mtime REAL, prefix_edges TEXT)"
+    )
+    out.append("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+    return out
+
+
+def connect(path: str = DEFAULT_DB) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with conn:
+        for stmt in _schema_sql():
+            conn.execute(stmt)
+        cols = [r[1] for r in conn.execute("PRAGMA table_info(ingest_files)")]
+        if "prefix_edges" not in cols:
+            # Older offsets carry no (or a whole-prefix) fingerprint: leave it NULL so the next sync
+            # re-imports those files, which also drops log rows stored under the old log_index = -1 default.
+            conn.execute("ALTER TABLE ingest_files ADD COLUMN prefix_edges TEXT")
+        conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+    return conn
+
+
+# ---- writes ----
+
+
+def _cell(value: Any, col_type: str) -> Any:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if value == "":
+            return None
+    if col_type.startswith("INTEGER"):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    if col_type.startswith("REAL"):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    return str(value)
+
+
+def _row_adapter(table: str, fieldnames: Sequence[str]):
+    cols, _, _ = TABLES[table]
+    pos = {name: i for i, name in enumerate(fieldnames)}
+    if table == "config_estimates":
+
+        def adapt_config(row: Sequence[Any]) -> Tuple[Any, ...]:
+            d = {name: (row[i] if i < len(row) else "") for name, i in pos.items()}
+            return (
+                str(d.get("selector", "")).lower(),
+                str(d.get("target", "")).lower(),
+                str(d.get("subkey", "") or ""),
+                d.get("job", ""),
+                json.dumps(d, sort_keys=True),
+            )
+
+        return adapt_config
+
+    picks = [(pos.get(c), t) for c, t in cols]
+    keyed_by_log = any(c == "log_index" for c, _ in cols)
+    if keyed_by_log and "log_index" not in pos:
+        raise ValueError(f"{table}: rows have no log_index column (key is tx_hash, log_index)")
+
+    def adapt(row: Sequence[Any]) -> Tuple[Any, ...]:
+        out = []
+        for (i, t), (c, _) in zip(picks, cols):
+            v = _cell(row[i] if i is not None and i < len(row) else None, t)
+            if v is None and c == "log_index":
+                raise ValueError(f"{table}: row without log_index: {list(row)[:4]}")
+            out.append(v)
+        return tuple(out)
+
+    return adapt
+
+
+def _insert_sql(table: str, replace: bool = False) -> str:
+    cols = [c for c, _ in TABLES[table][0]]
+    verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+    return f"{verb} INTO {table} ({', '.join(_q(c) for c in cols)}) VALUES ({', '.join('?' * len(cols))})"
+
+
+def insert_rows(
+    conn: sqlite3.Connection,
+    table: str,
+    fieldnames: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    *,
+    replace: bool = False,
+) -> int:
+    adapt = _row_adapter(table, fieldnames)
+    sql = _insert_sql(table, replace or table == "config_estimates")
+    before = conn.total_changes
+    with conn:
+        conn.executemany(sql, (adapt(r) for r in rows))
+    return conn.total_changes - before
+
+
+def sink(conn: sqlite3.Connection, table: str):
+    # AppendStore on_flush callback: mirror every flushed CSV batch into `table`.
+    def on_flush(fieldnames: Sequence[str], rows: Sequence[Sequence[Any]]) -> None:
+        insert_rows(conn, table, fieldnames, rows)
+
+    return on_flush
+
+
+def import_prices_payload(conn: sqlite3.Connection, payload: Dict[str, Any]) -> int:
+    # Same shape as coingecko_prices_7d.json: {"eth": {"prices": [[ms, usd], ...]}, "tokens": {addr: {...}}}.
+    series: Dict[str, Any] = {}
+    if isinstance(payload.get("eth"), dict):
+        series["eth"] = payload["eth"].get("prices", [])
+    tokens = payload.get("tokens", {})
+    if isinstance(tokens, dict):
+        for addr, info in tokens.items():
+            if isinstance(addr, str) and isinstance(info, dict):
+                series[addr.strip().lower()] = info.get("prices", [])
+    n = 0
+    with conn:
+        for name, points in series.items():
+            if not isinstance(points, list):
+                continue
+            rows = []
+            for item in points:
+                if not isinstance(item, (list, tuple)) or len(item) < 2:
+                    continue
+                try:
+                    rows.append((name, int(item[0]), float(item[1])))
+                except (TypeError, ValueError):
+                    continue
+            # A refreshed file is the new truth for its series (e.g. sdPENDLE overridden by TWAP).
+            conn.execute("DELETE FROM prices WHERE series = ?", (name,))
+            conn.executemany("INSERT OR REPLACE INTO prices (series, ts_ms, price) VALUES (?, ?, ?)", rows)
+            n += len(rows)
+    return n
+
+
+def _prefix_edges(path: str, n: int) -> str:
+    # Fingerprint of the first n bytes: their length plus a hash of the first and last 4 KiB.
+    with open(path, "rb") as f:
+        head = f.read(min(n, _EDGE_BYTES))
+        f.seek(max(n - _EDGE_BYTES, len(head)))
+        tail = f.read(n - f.tell())
+    return f"{n}:{hashlib.blake2b(head + tail, digest_size=16).hexdigest()}"
+
+
+def _iter_csv_tail(path: str, offset: int, chunk_bytes: int = 8 << 20) -> Iterator[Tuple[List[List[str]], int]]:
+    # Yields (rows, end_offset) for complete lines after `offset`; a trailing partial line is left
+    # for the next sync.
+    with open(path, "rb") as f:
+        f.seek(offset)
+        carry = b""
+        pos = offset
+        while True:
+            data = f.read(chunk_bytes)
+            if not data:
+                break
+            data = carry + data
+            cut = data.rfind(b"\n")
+            if cut < 0:
+                carry = data
+                continue
+            carry = data[cut + 1 :]
+            block = data[: cut + 1]
+            pos += len(block)
+            rows = [r for r in csv.reader(io.StringIO(block.decode("utf-8"), newline="")) if r]
+            yield rows, pos
+
+
+def import_csv(conn: sqlite3.Connection, table: str, path: str) -> int:
+    if not os.path.exists(path):
+        return 0
+    key = os.path.abspath(path)
+    with open(path, newline="") as f:
+        header_line = f.readline()
+    header = next(csv.reader([header_line]), [])
+    header_offset = len(header_line.encode("utf-8"))
+    size = os.path.getsize(path)
+
+    mtime = os.path.getmtime(path)
+
+    row = conn.execute(
+        "SELECT header, offset, mtime, prefix_edges FROM ingest_files WHERE path = ?", (key,)
+    ).fetchone()
+    full = table == "config_estimates"  # rewritten in place by the builder, never appended
+    if row is not None and row[3] is not None and int(row[1]) == size and float(row[2]) == mtime:
+        return 0
+    _row_adapter(table, header)  # reject a header the table cannot take before dropping any rows
+    offset = header_offset
+    resumed = False
+    if row is not None and not full and row[0] == ",".join(header) and header_offset <= int(row[1]) <= size:
+        if row[3] is not None and _prefix_edges(path, int(row[1])) == row[3]:
+            offset, resumed = int(row[1]), True
+    if not resumed:
+        # New file, or the imported prefix changed under us: its rows are no longer the file's rows.
+        with conn:
+            conn.execute(f"DELETE FROM {table}")
+
+    n = 0
+    for rows, end in _iter_csv_tail(path, offset):
+        n += insert_rows(conn, table, header, rows)
+        offset = end
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO ingest_files (path, tbl, header, offset, mtime, prefix_edges) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, table, ",".join(header), offset, mtime, _prefix_edges(path, offset)),
+        )
+    return n
+
+
+def import_prices_json(conn: sqlite3.Connection, path: str) -> int:
+    if not os.path.exists(path):
+        return 0
+    key = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    row = conn.execute("SELECT mtime, offset FROM ingest_files WHERE path = ?", (key,)).fetchone()
+    if row is not None and float(row[0]) == mtime and int(row[1]) == os.path.getsize(path):
+        return 0
+    with open(path) as f:
+        payload = json.load(f)
+    n = import_prices_payload(conn, payload) if isinstance(payload, dict) else 0
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO ingest_files (path, tbl, header, offset, mtime) VALUES (?, 'prices', '', ?, ?)",
+            (key, os.path.getsize(path), mtime),
+        )
+    return n
+
+
+def receipts_source(full: str, sample: str = RECEIPTS_SAMPLE_CSV) -> str:
+    # The full receipts backfill once it has a data row, else the sample it supersedes.
+    try:
+        with open(full, newline="") as f:
+            if f.readline() and f.readline():
+                return full
+    except OSError:
+        pass
+    return sample
+
+
+def sync(conn: sqlite3.Connection, sources: Optional[Dict[str, str]] = None) -> Dict[str, int]:
+    out: Dict[str, int] = {}
+    for table, path in (sources or DEFAULT_SOURCES).items():
+        if not path:
+            continue
+        if table == "receipts":
+            path = receipts_source(path)
+        out[table] = import_prices_json(conn, path) if table == "prices" else import_csv(conn, table, path)
+    return out
+
+
+# ---- queries ----
+
+
+def price_at(conn: sqlite3.Connection, series: str, ts_s: int) -> Optional[float]:
+    # Nearest point (ties to the earlier one), clamped to the series ends; two PK range probes.
+    ts_ms = int(ts_s) * 1000
+    before = conn.execute(
+        "SELECT ts_ms, price FROM prices WHERE series = ? AND ts_ms <= ? ORDER BY ts_ms DESC LIMIT 1",
+        (series, ts_ms),
+    ).fetchone()
+    after = conn.execute(
+        "SELECT ts_ms, price FROM prices WHERE series = ? AND ts_ms >= ? ORDER BY ts_ms ASC LIMIT 1",
+        (series, ts_ms),
+    ).fetchone()
+    if before is None and after is None:
+        return None
+    if before is None:
+        return float(after[1])
+    if after is None:
+        return float(before[1])
+    return float(before[1]) if ts_ms - before[0] <= after[0] - ts_ms else float(after[1])
+
+
+def price_series(conn: sqlite3.Connection) -> Dict[str, List[Tuple[int, float]]]:
+    out: Dict[str, List[Tuple[int, float]]] = {}
+    for series, ts_ms, price in conn.execute("SELECT series, ts_ms, price FROM prices ORDER BY series, ts_ms"):
+        out.setdefault(series, []).append((int(ts_ms), float(price)))
+    return out
+
+
+def calls_with_price(
+    conn: sqlite3.Connection,
+    series: str,
+    *,
+    selector: Optional[str] = None,
+    target: Optional[str] = None,
+) -> List[Tuple[str, int, Optional[float]]]:
+    # As-of join (latest price at or before each call) as correlated PK probes: (tx_hash, ts, usd).
+    where, params = _job_filter(selector, target)
+    sql = (
+        "SELECT c.tx_hash, c.timestamp, ("
+        "  SELECT p.price FROM prices p WHERE p.series = ? AND p.ts_ms <= c.timestamp * 1000"
+        "  ORDER BY p.ts_ms DESC LIMIT 1"
+        f") FROM calls c{where} ORDER BY c.timestamp, c.tx_hash"
+    )
+    return [(r[0], int(r[1]), r[2]) for r in conn.execute(sql, [series] + params)]
+
+
+def _job_filter(selector: Optional[str], target: Optional[str]) -> Tuple[str, List[Any]]:
+    clauses: List[str] = []
+    params: List[Any] = []
+    if selector:
+        clauses.append("c.selector = ?")
+        params.append(selector.lower())
+    if target:
+        clauses.append("c.target = ?")
+        params.append(target.lower())
+    return ((" WHERE " + " AND ".join(clauses)) if clauses else ""), params
+
+
+def calls(
+    conn: sqlite3.Connection,
+    *,
+    selector: Optional[str] = None,
+    target: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    where, params = _job_filter(selector, target)
+    cur = conn.execute(f"SELECT * FROM calls c{where} ORDER BY c.timestamp, c.tx_hash", params)
+    names = [d[0] for d in cur.description]
+    return [dict(zip(names, r)) for r in cur]
+
+
+def harvest_logs(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    cur = conn.execute("SELECT * FROM harvest_logs ORDER BY time_stamp, tx_hash, log_index")
+    names = [d[0] for d in cur.description]
+    return [dict(zip(names, r)) for r in cur]
+
+
+def calls_with_harvest_logs(
+    conn: sqlite3.Connection,
+    *,
+    selector: Optional[str] = None,
+    target: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    # call <-> Harvest log by tx_hash (PK lookup on harvest_logs); one row per matched log.
+    where, params = _job_filter(selector, target)
+    cur = conn.execute(
+        "SELECT c.tx_hash, c.timestamp, c.gas_price, c.arg1, h.log_index, h.time_stamp, h.assets, h.harvester_bounty "
+        f"FROM calls c JOIN harvest_logs h ON h.tx_hash = c.tx_hash{where} "
+        "ORDER BY h.time_stamp, c.tx_hash, h.log_index",
+        params,
+    )
+    names = [d[0] for d in cur.description]
+    return [dict(zip(names, r)) for r in cur]
+
+
+def receipts_by_job(conn: sqlite3.Connection) -> Dict[Tuple[str, str, str], List[Dict[str, Any]]]:
+    cur = conn.execute("SELECT * FROM receipts ORDER BY selector, target, subkey, timestamp, tx_hash")
+    names = [d[0] for d in cur.description]
+    out: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = {}
+    for r in cur:
+        d = dict(zip(names, r))
+        out.setdefault((d["selector"] or "", d["target"] or "", d["subkey"] or ""), []).append(d)
+    return out
+
+
+def config_rows(conn: sqlite3.Connection) -> List[Dict[str, str]]:
+    return [json.loads(r[0]) for r in conn.execute("SELECT data FROM config_estimates ORDER BY rowid")]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["sync", "stats"])
+    parser.add_argument("--db", default=DEFAULT_DB)
+    for table, path in DEFAULT_SOURCES.items():
+        parser.add_argument(f"--{table.replace('_', '-')}", dest=table, default=path)
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    if args.command == "sync":
+        added = sync(conn, {t: getattr(args, t) for t in DEFAULT_SOURCES})
+        for table, n in added.items():
+            print(f"{table}: +{n}")
+    for table in TABLES:
+        (n,) = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+        print(f"{table}\t{n}")
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(instrument.run(main))